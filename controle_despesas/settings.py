@@ -229,7 +229,29 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 OPENAI_API_KEY = config('OPENAI_API_KEY', default=None)
 OPENAI_CHAT_MODEL = config('OPENAI_CHAT_MODEL', default='gpt-4o-mini')
 OPENAI_TRANSCRIPTION_MODEL = config('OPENAI_TRANSCRIPTION_MODEL', default='whisper-1')
+# Contexto enviado ao modelo: últimas N trocas do histórico, dentro do orçamento de tokens
 OPENAI_CHAT_MAX_HISTORY = config('OPENAI_CHAT_MAX_HISTORY', default=8, cast=int)
+OPENAI_CHAT_CONTEXT_TOKENS = config('OPENAI_CHAT_CONTEXT_TOKENS', default=1500, cast=int)
+# Timeouts (segundos) e repetições com backoff para 429/5xx e falhas de conexão
+OPENAI_CONNECT_TIMEOUT = config('OPENAI_CONNECT_TIMEOUT', default=5.0, cast=float)
+OPENAI_READ_TIMEOUT = config('OPENAI_READ_TIMEOUT', default=30.0, cast=float)
+OPENAI_TRANSCRIPTION_TIMEOUT = config('OPENAI_TRANSCRIPTION_TIMEOUT', default=120.0, cast=float)
+OPENAI_MAX_RETRIES = config('OPENAI_MAX_RETRIES', default=2, cast=int)
+OPENAI_RETRY_BACKOFF = config('OPENAI_RETRY_BACKOFF', default=0.5, cast=float)
+OPENAI_RETRY_BACKOFF_MAX = config('OPENAI_RETRY_BACKOFF_MAX', default=8.0, cast=float)
+# Interpretação local (sem chamar o modelo) das mensagens comuns do chat
+CHAT_INTERPRETADOR_LOCAL = config('CHAT_INTERPRETADOR_LOCAL', default=True, cast=bool)
+# Cota diária de tokens da OpenAI por casa (0 = sem limite); Casa.cota_diaria_tokens sobrepõe
+LLM_COTA_DIARIA_TOKENS = config('LLM_COTA_DIARIA_TOKENS', default=0, cast=int)
+# Áudios do chat: tamanho máximo (verificado durante o upload) e validade das transcrições guardadas no banco
+CHAT_AUDIO_MAX_BYTES = config('CHAT_AUDIO_MAX_BYTES', default=10 * 1024 * 1024, cast=int)
+CHAT_TRANSCRICAO_CACHE_TIMEOUT = config('CHAT_TRANSCRICAO_CACHE_TIMEOUT', default=7 * 24 * 60 * 60, cast=int)
+# O áudio do chat vai direto para disco com hash e limite; os demais arquivos seguem o padrão
+FILE_UPLOAD_HANDLERS = [
+    'core.services.transcricao.AudioUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
 
 # Email / SMTP settings
 # Use console backend in DEBUG mode or if EMAIL_HOST_USER is not configured
@@ -308,6 +330,24 @@ CACHES = {
     }
 }
 
+# Tempo de vida (segundos) do cache de dashboard/relatórios por casa.
+# As chaves são versionadas pela casa, então gravações não dependem do timeout.
+DADOS_CASA_CACHE_TIMEOUT = config('DADOS_CASA_CACHE_TIMEOUT', default=60 * 60, cast=int)
+
+# Exportações em segundo plano (comando processar_exportacoes)
+EXPORTACAO_WORKERS = config('EXPORTACAO_WORKERS', default=2, cast=int)
+# Por quanto tempo (segundos) um arquivo gerado é mantido e reaproveitado
+EXPORTACAO_RETENCAO = config('EXPORTACAO_RETENCAO', default=24 * 60 * 60, cast=int)
+# Validade (segundos) de um link de download
+EXPORTACAO_LINK_VALIDADE = config('EXPORTACAO_LINK_VALIDADE', default=60 * 60, cast=int)
+# Após quanto tempo (segundos) uma exportação em processamento é devolvida à fila
+EXPORTACAO_TEMPO_LIMITE = config('EXPORTACAO_TEMPO_LIMITE', default=30 * 60, cast=int)
+
+# Relatórios em PDF já renderizados, por casa, período e versão dos dados
+RELATORIO_PDF_CACHE_DIR = config('RELATORIO_PDF_CACHE_DIR', default=str(BASE_DIR / 'cache' / 'relatorios'))
+# PDFs sem acesso há mais que isso (segundos) são apagados por processar_exportacoes
+RELATORIO_PDF_RETENCAO = config('RELATORIO_PDF_RETENCAO', default=7 * 24 * 60 * 60, cast=int)
+
 # Limites de taxa para APIs sensíveis (DESABILITADO temporariamente para debug)
 RATE_LIMIT_ENABLED = False  # not DEBUG
 RATE_LIMIT_CHAT = '20/minute'  # 20 mensagens por minuto
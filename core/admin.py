@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import Usuario, Casa, Conta, Categoria, Transacao, ChatHistory
+from django.db.models import Avg, Count, Q, Sum
+from django.db.models.functions import TruncDate
+from .models import Usuario, Casa, Conta, Categoria, Transacao, ResumoMensal, ChatHistory, Exportacao, UsoLLM
 
 
 @admin.register(Usuario)
@@ -19,7 +21,7 @@ class UsuarioAdmin(UserAdmin):
 @admin.register(Casa)
 class CasaAdmin(admin.ModelAdmin):
     """Admin para Casa"""
-    list_display = ['nome', 'codigo_convite', 'criada_em', 'qtd_membros']
+    list_display = ['nome', 'codigo_convite', 'criada_em', 'qtd_membros', 'cota_diaria_tokens']
     search_fields = ['nome', 'codigo_convite']
     readonly_fields = ['criada_em', 'codigo_convite']
     
@@ -56,6 +58,20 @@ class TransacaoAdmin(admin.ModelAdmin):
     filter_horizontal = ['dividido_entre']
 
 
+@admin.register(ResumoMensal)
+class ResumoMensalAdmin(admin.ModelAdmin):
+    """Admin para Resumo Mensal (somente leitura, mantido automaticamente)"""
+    list_display = ['casa', 'mes', 'tipo', 'status', 'categoria', 'conta', 'total', 'quantidade']
+    list_filter = ['tipo', 'status', 'casa']
+    date_hierarchy = 'mes'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(ChatHistory)
 class ChatHistoryAdmin(admin.ModelAdmin):
     """Admin para Histórico de Chat"""
@@ -78,3 +94,69 @@ class ChatHistoryAdmin(admin.ModelAdmin):
         """Desabilita a edição de histórico"""
         return False
 
+
+@admin.register(Exportacao)
+class ExportacaoAdmin(admin.ModelAdmin):
+    """Admin para Exportações (geradas pelo comando processar_exportacoes)"""
+    list_display = ['casa', 'formato', 'status', 'progresso', 'criada_em', 'concluida_em', 'expira_em']
+    list_filter = ['status', 'formato', 'casa']
+    readonly_fields = [
+        'casa', 'solicitada_por', 'formato', 'parametros', 'chave', 'progresso', 'arquivo',
+        'erro', 'criada_em', 'iniciada_em', 'concluida_em', 'expira_em',
+    ]
+    date_hierarchy = 'criada_em'
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(UsoLLM)
+class UsoLLMAdmin(admin.ModelAdmin):
+    """Admin para Uso da OpenAI (somente leitura), com totais por intenção, modelo e dia"""
+    list_display = [
+        'criado_em', 'operacao', 'modelo', 'intent', 'casa', 'usuario',
+        'tokens_prompt', 'tokens_prompt_cache', 'tokens_resposta', 'tokens_total',
+        'duracao_ms', 'repeticoes', 'sucesso',
+    ]
+    list_filter = ['operacao', 'modelo', 'intent', 'sucesso', 'casa']
+    date_hierarchy = 'criado_em'
+    list_select_related = ['casa', 'usuario']
+    
+    AGREGADOS = {
+        'chamadas': Count('id'),
+        'tokens': Sum('tokens_total'),
+        'tokens_prompt': Sum('tokens_prompt'),
+        'tokens_cache': Sum('tokens_prompt_cache'),
+        'tokens_resposta': Sum('tokens_resposta'),
+        'tokens_medio': Avg('tokens_total'),
+        'duracao_media': Avg('duracao_ms'),
+        'repeticoes': Sum('repeticoes'),
+        'falhas': Count('id', filter=Q(sucesso=False)),
+    }
+    
+    def changelist_view(self, request, extra_context=None):
+        """Acrescenta à listagem os totais do período/filtros selecionados"""
+        resposta = super().changelist_view(request, extra_context)
+        context_data = getattr(resposta, 'context_data', None)
+        if not context_data or 'cl' not in context_data:
+            return resposta
+        
+        queryset = context_data['cl'].queryset.order_by()
+        context_data['resumo_total'] = queryset.aggregate(**self.AGREGADOS)
+        context_data['resumo_por_intent'] = (
+            queryset.values('operacao', 'intent').annotate(**self.AGREGADOS).order_by('-tokens')
+        )
+        context_data['resumo_por_modelo'] = (
+            queryset.values('modelo').annotate(**self.AGREGADOS).order_by('-tokens')
+        )
+        context_data['resumo_por_dia'] = (
+            queryset.annotate(dia=TruncDate('criado_em')).values('dia')
+            .annotate(**self.AGREGADOS).order_by('-dia')[:14]
+        )
+        return resposta
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
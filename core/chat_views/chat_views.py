@@ -1,19 +1,44 @@
+import asyncio
+import json
 import logging
+import time
+from contextlib import aclosing
 from typing import Dict, Any
 from decimal import Decimal
 from datetime import datetime, timedelta
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import transaction
 from django.db.models import Sum, Count
+from django.db.models.functions import Coalesce
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.views.decorators.http import require_POST
 from rest_framework import status
 from rest_framework.decorators import api_view, parser_classes
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.response import Response
 
-from core.models import Transacao, Conta, Categoria, ChatHistory
+from core.models import Transacao, Conta, Categoria, ChatHistory, ResumoMensal
 from core.serializers.chat_serializers import ChatMessageSerializer, ChatResponseSerializer
 from core.services.openai_client import OpenAIClient, OpenAIClientError
+from core.services.busca import buscar_transacoes
+from core.services.contexto_chat import amontar_contexto, montar_contexto
+from core.services.categorias import obter_ou_criar_categoria
+from core.services.duplicatas import duplicata_recente, pendente_recente
+from core.services.interpretador_local import (
+    aregistrar_interpretacao, interpretar_localmente, registrar_interpretacao,
+)
+from core.services.resumos import cobre_meses_completos
+from core.services.similaridade import escolher_alvo, ranquear_candidatos
+from core.services.transcricao import (
+    atranscrever_audio, audio_acima_do_limite, mensagem_audio_acima_do_limite, transcrever_audio,
+)
+from core.services.uso_llm import (
+    CotaExcedida, aregistrar_uso, averificar_cota, registrar_uso, verificar_cota,
+)
 
 logger = logging.getLogger('chat_views')
 
@@ -39,10 +64,11 @@ def save_chat_transaction(user, transaction_data, original_message, status='paga
     tipo_transacao = transaction_data.get('type', 'despesa')
     tipo_categoria = 'despesa' if tipo_transacao == 'despesa' else 'receita'
     
-    categoria, _ = Categoria.objects.get_or_create(
-        casa=user.casa,
-        nome=category_name,
-        defaults={'tipo': tipo_categoria, 'cor': '#6c757d', 'icone': '💰', 'ativa': True}
+    categoria, _ = obter_ou_criar_categoria(
+        user.casa,
+        category_name,
+        tipo_categoria,
+        defaults={'cor': '#6c757d', 'icone': '💰', 'ativa': True}
     )
     
     # Processar data
@@ -59,23 +85,61 @@ def save_chat_transaction(user, transaction_data, original_message, status='paga
         data_transacao = timezone.now().astimezone(tz_br).date()
         logger.info(f"Nenhuma data fornecida, usando data atual: {data_transacao}")
     
+    valor = Decimal(str(transaction_data.get('amount', 0)))
+    titulo = transaction_data.get('title', original_message[:100])
+
+    # Pagamento de uma pendência registrada há pouco (mesmo valor e data):
+    # atualiza a pendência em vez de criar outra linha
+    if status == 'paga':
+        pendente = pendente_recente(user.casa, data_transacao, valor)
+        if pendente:
+            pendente.conta = conta
+            pendente.categoria = categoria
+            pendente.tipo = tipo_transacao
+            pendente.titulo = titulo
+            pendente.observacao = transaction_data.get('notes', f'Atualizado via chat: {original_message}')
+            pendente.pago_por = user
+            pendente.status = 'paga'
+            pendente.save()
+            pendente.possivel_duplicata = None
+            logger.info(f"Transação pendente atualizada para paga: ID {pendente.id}")
+            return pendente
+
+    # Mesma data, valor e título gravados há pouco: pode ser a mensagem
+    # repetida ou duas compras iguais. Grava e deixa o usuário decidir.
+    similar = duplicata_recente(user.casa, data_transacao, valor, titulo)
+
     # Criar a transação
     transacao = Transacao.objects.create(
         casa=user.casa,
         conta=conta,
         categoria=categoria,
         tipo=tipo_transacao,
-        valor=Decimal(str(transaction_data.get('amount', 0))),
-        titulo=transaction_data.get('title', original_message[:100]),
+        valor=valor,
+        titulo=titulo,
         data=data_transacao,
         observacao=transaction_data.get('notes', f'Criado via chat: {original_message}'),
         pago_por=user,
         status=status
     )
+    transacao.possivel_duplicata = similar
+    if similar:
+        logger.info(f"Transação {transacao.id} é possível duplicata da ID {similar.id}")
 
     return transacao
 
 
+def aviso_possivel_duplicata(transacao) -> str:
+    """Aviso ao usuário quando ``save_chat_transaction`` apontou uma possível duplicata."""
+    similar = getattr(transacao, 'possivel_duplicata', None)
+    if not similar:
+        return ''
+    return (
+        f"⚠️ Possível duplicata: já existe \"{similar.titulo}\" de R$ {similar.valor:.2f} "
+        f"em {similar.data.strftime('%d/%m/%Y')}. Se foi repetição, exclua uma delas nas transações."
+    )
+
+
 def update_chat_transaction(transaction_id, user, transaction_data, original_message):
     """Atualiza uma transação existente."""
     try:
@@ -91,10 +155,11 @@ def update_chat_transaction(transaction_id, user, transaction_data, original_mes
         transacao.tipo = transaction_data['type']
     
     if 'category' in transaction_data:
-        categoria, _ = Categoria.objects.get_or_create(
-            casa=user.casa,
-            nome=transaction_data['category'],
-            defaults={'tipo': transacao.tipo, 'cor': '#6c757d', 'icone': '💰', 'ativa': True}
+        categoria, _ = obter_ou_criar_categoria(
+            user.casa,
+            transaction_data['category'],
+            transacao.tipo,
+            defaults={'cor': '#6c757d', 'icone': '💰', 'ativa': True}
         )
         transacao.categoria = categoria
     
@@ -110,24 +175,73 @@ def update_chat_transaction(transaction_id, user, transaction_data, original_mes
 
 
 def search_transactions(user, criteria):
-    """Busca transações baseado em critérios."""
+    """
+    Busca transações baseado em critérios.
+    
+    Categoria e título vão para a busca textual (ver core.services.busca),
+    ordenada por relevância e data; a data é um filtro exato.
+    """
     if not user.casa:
         return Transacao.objects.none()
     
     queryset = Transacao.objects.filter(casa=user.casa)
     
-    if criteria.get('category'):
-        queryset = queryset.filter(categoria__nome__icontains=criteria['category'])
     if criteria.get('date'):
         try:
             date_obj = datetime.fromisoformat(criteria['date']).date()
             queryset = queryset.filter(data=date_obj)
         except:
             pass
-    if criteria.get('title_contains'):
-        queryset = queryset.filter(titulo__icontains=criteria['title_contains'])
     
-    return queryset.order_by('-data', '-id')[:10]
+    texto = ' '.join(filter(None, (criteria.get('category'), criteria.get('title_contains'))))
+    if texto:
+        return buscar_transacoes(user.casa, texto, timezone.localdate(), limite=10, queryset=queryset)
+    
+    return queryset.order_by('-data', '-criada_em', '-id')[:10]
+
+
+def find_edit_target(user, criteria):
+    """
+    Localiza a transação a editar a partir dos critérios do chat.
+    
+    Primeiro tenta a correspondência aproximada do título (trigramas), com
+    valor e recência como desempate (ver core.services.similaridade); se
+    ela não apontar um alvo claro, recorre a ``search_transactions``.
+    Retorna ``(transacao ou None, candidatas)``, onde ``candidatas`` são as
+    transações a listar quando for preciso pedir esclarecimento.
+    """
+    if not user.casa:
+        return None, []
+    
+    texto = criteria.get('title_contains') or criteria.get('category') or ''
+    valores = [
+        Decimal(str(criteria[chave])) for chave in ('min_amount', 'max_amount')
+        if criteria.get(chave) not in (None, '')
+    ]
+    valor = sum(valores) / len(valores) if valores else None
+    data = None
+    if criteria.get('date'):
+        try:
+            data = datetime.fromisoformat(criteria['date']).date()
+        except (TypeError, ValueError):
+            pass
+    
+    candidatos = ranquear_candidatos(user.casa, texto, valor=valor, data=data, hoje=timezone.localdate())
+    alvo = escolher_alvo(candidatos)
+    if alvo:
+        logger.info(
+            f"Alvo da edição resolvido por similaridade: ID {alvo.transacao_id} "
+            f"(pontuação {alvo.pontuacao}, {len(candidatos)} candidata(s))"
+        )
+        return Transacao.objects.get(pk=alvo.transacao_id), []
+    
+    found = list(search_transactions(user, criteria))
+    if len(found) == 1:
+        return found[0], []
+    if candidatos:
+        por_id = Transacao.objects.in_bulk([c.transacao_id for c in candidatos[:10]])
+        return None, [por_id[c.transacao_id] for c in candidatos[:10] if c.transacao_id in por_id]
+    return None, found
 
 
 def save_chat_history(user, user_message, assistant_response, intent, transcribed_text=None):
@@ -141,442 +255,568 @@ def save_chat_history(user, user_message, assistant_response, intent, transcribe
     )
 
 
-@api_view(['POST'])
-@parser_classes([JSONParser, MultiPartParser, FormParser])
-def chat_message_view(request):
-    """Endpoint principal para processar mensagens do chat financeiro."""
+def completar_resposta(parsed_response, transcribed_text=None):
+    """Preenche os campos que o modelo deixou de fora da resposta estruturada."""
+    # Garantir que sempre há uma resposta válida
+    if not parsed_response:
+        logger.warning("OpenAI retornou resposta vazia")
+        parsed_response = {
+            'intent': 'unknown',
+            'clarification_needed': False,
+            'assistant_message': '😕 Desculpe, não consegui processar sua mensagem. Pode reformular?'
+        }
     
-    serializer = ChatMessageSerializer(data=request.data)
-    if not serializer.is_valid():
-        return Response({"error": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+    # Garantir que assistant_message existe
+    if 'assistant_message' not in parsed_response or not parsed_response['assistant_message']:
+        logger.warning("Resposta sem assistant_message, adicionando padrão")
+        parsed_response['assistant_message'] = '🤔 Recebi sua mensagem, mas não tenho certeza do que fazer. Pode me dar mais detalhes?'
+    
+    # Garantir que intent existe
+    if 'intent' not in parsed_response:
+        parsed_response['intent'] = 'unknown'
+    
+    # Garantir que clarification_needed existe
+    if 'clarification_needed' not in parsed_response:
+        parsed_response['clarification_needed'] = False
+    
+    if transcribed_text:
+        parsed_response['transcribed_text'] = transcribed_text
 
-    validated_data = serializer.validated_data
-    message_text = validated_data.get('message', '').strip()
-    audio_file = validated_data.get('audio')
-    context = validated_data.get('context', [])
+    return parsed_response
 
-    try:
-        client = OpenAIClient()
 
-        # Transcrever áudio se houver
-        transcribed_text = None
-        if audio_file:
-            logger.info("Transcrevendo áudio...")
-            transcribed_text = client.transcribe_audio(audio_file)
-            message_text = transcribed_text
-            logger.info(f"Áudio transcrito: {transcribed_text[:100]}...")
+def interpretacao_local(user, message_text, context):
+    """
+    Resposta do interpretador local para a casa do usuário, ou None.
 
-        if not message_text:
-            return Response(
-                {"error": "Mensagem vazia"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+    Mensagens comuns ("gastei 50 no mercado") dispensam a chamada ao modelo;
+    os acertos são gravados por ``registrar_interpretacao``. Síncrona
+    (lê as categorias e contas da casa).
+    """
+    if not settings.CHAT_INTERPRETADOR_LOCAL or not user.is_authenticated:
+        return None
+    inicio = time.monotonic()
+    parsed_response = interpretar_localmente(message_text, user.casa, context)
+    if parsed_response:
+        registrar_interpretacao('local', time.monotonic() - inicio, user.casa_id)
+        logger.info(f"⚡ Interpretado localmente: intent={parsed_response['intent']}")
+    return parsed_response
 
-        # Processar mensagem
-        logger.info(f"Processando: {message_text[:100]}...")
+
+def interpretar_mensagem(user, client, message_text, context):
+    """Interpreta pelo caminho local quando possível; senão consulta o modelo."""
+    parsed_response = interpretacao_local(user, message_text, context)
+    if parsed_response is None:
+        verificar_cota(user)
+        inicio = time.monotonic()
         parsed_response = client.parse_user_message(message=message_text, context=context)
-        
-        # Garantir que sempre há uma resposta válida
-        if not parsed_response:
-            logger.warning("OpenAI retornou resposta vazia")
-            parsed_response = {
-                'intent': 'unknown',
-                'clarification_needed': False,
-                'assistant_message': '😕 Desculpe, não consegui processar sua mensagem. Pode reformular?'
-            }
-        
-        # Garantir que assistant_message existe
-        if 'assistant_message' not in parsed_response or not parsed_response['assistant_message']:
-            logger.warning("Resposta sem assistant_message, adicionando padrão")
-            parsed_response['assistant_message'] = '🤔 Recebi sua mensagem, mas não tenho certeza do que fazer. Pode me dar mais detalhes?'
-        
-        # Garantir que intent existe
-        if 'intent' not in parsed_response:
-            parsed_response['intent'] = 'unknown'
-        
-        # Garantir que clarification_needed existe
-        if 'clarification_needed' not in parsed_response:
-            parsed_response['clarification_needed'] = False
-        
-        if transcribed_text:
-            parsed_response['transcribed_text'] = transcribed_text
+        registrar_interpretacao('llm', time.monotonic() - inicio, getattr(user, 'casa_id', None))
+    return parsed_response
 
-        intent = parsed_response.get('intent')
-        needs_clarification = parsed_response.get('clarification_needed', False)
-        
-        # Log completo da resposta para debug
-        logger.debug(f"🔍 RESPOSTA COMPLETA DA IA: {parsed_response}")
 
-        # ===== CRIAR TRANSAÇÃO =====
-        if intent == 'create_transaction' and not needs_clarification:
-            transaction_data = parsed_response.get('transaction')
-            
-            logger.debug(f"🔍 TRANSACTION_DATA RECEBIDA: tipo={type(transaction_data)}, valor={transaction_data}")
+async def ainterpretar_mensagem(user, client, message_text, context):
+    """Versão assíncrona de ``interpretar_mensagem``."""
+    parsed_response = await sync_to_async(interpretacao_local)(user, message_text, context)
+    if parsed_response is None:
+        await averificar_cota(user)
+        inicio = time.monotonic()
+        parsed_response = await client.aparse_user_message(message=message_text, context=context)
+        await aregistrar_interpretacao('llm', time.monotonic() - inicio, getattr(user, 'casa_id', None))
+    return parsed_response
+
+
+def processar_intencao(user, parsed_response, message_text):
+    """
+    Executa a ação pedida pelo modelo e ajusta ``parsed_response`` com a mensagem final.
+
+    Cria ou edita transações, monta relatórios e define/consulta metas.
+    É síncrona (ORM e ``transaction.atomic`` das gravações); a view
+    assíncrona a chama por ``sync_to_async``.
+    """
+    intent = parsed_response.get('intent')
+    needs_clarification = parsed_response.get('clarification_needed', False)
+    
+    # Log completo da resposta para debug
+    logger.debug(f"🔍 RESPOSTA COMPLETA DA IA: {parsed_response}")
+
+    # ===== CRIAR TRANSAÇÃO =====
+    if intent == 'create_transaction' and not needs_clarification:
+        transaction_data = parsed_response.get('transaction')
+        
+        logger.debug(f"🔍 TRANSACTION_DATA RECEBIDA: tipo={type(transaction_data)}, valor={transaction_data}")
+        
+        # Verificar se é array de transações ou uma única
+        if isinstance(transaction_data, list):
+            # Múltiplas transações
+            logger.info(f"📦 Processando {len(transaction_data)} transações")
+            transacoes_salvas = []
             
-            # Verificar se é array de transações ou uma única
-            if isinstance(transaction_data, list):
-                # Múltiplas transações
-                logger.info(f"📦 Processando {len(transaction_data)} transações")
-                transacoes_salvas = []
+            if user.is_authenticated:
+                for idx, trans_data in enumerate(transaction_data):
+                    if trans_data.get('amount'):
+                        try:
+                            transacao = save_chat_transaction(
+                                user=user,
+                                transaction_data=trans_data,
+                                original_message=f"{message_text} (item {idx+1})",
+                                status='paga'
+                            )
+                            transacoes_salvas.append(transacao)
+                            logger.info(f"✅ Transação {idx+1} criada: ID {transacao.id}")
+                        except Exception as e:
+                            logger.error(f"❌ Erro na transação {idx+1}: {e}")
                 
-                if request.user.is_authenticated:
-                    for idx, trans_data in enumerate(transaction_data):
-                        if trans_data.get('amount'):
-                            try:
-                                transacao = save_chat_transaction(
-                                    user=request.user,
-                                    transaction_data=trans_data,
-                                    original_message=f"{message_text} (item {idx+1})",
-                                    status='paga'
-                                )
-                                transacoes_salvas.append(transacao)
-                                logger.info(f"✅ Transação {idx+1} criada: ID {transacao.id}")
-                            except Exception as e:
-                                logger.error(f"❌ Erro na transação {idx+1}: {e}")
+                if transacoes_salvas:
+                    total = sum(t.valor for t in transacoes_salvas)
+                    lista_itens = "\n".join([
+                        f"  • {t.titulo}: R$ {t.valor:.2f}"
+                        for t in transacoes_salvas
+                    ])
                     
-                    if transacoes_salvas:
-                        total = sum(t.valor for t in transacoes_salvas)
-                        lista_itens = "\n".join([
-                            f"  • {t.titulo}: R$ {t.valor:.2f}"
-                            for t in transacoes_salvas
-                        ])
-                        
-                        parsed_response['transaction_saved'] = True
-                        parsed_response['transaction_ids'] = [t.id for t in transacoes_salvas]
-                        parsed_response['assistant_message'] = (
-                            f"✅ {len(transacoes_salvas)} despesas registradas!\n\n"
-                            f"{lista_itens}\n\n"
-                            f"💸 Total: R$ {total:.2f}"
-                        )
-                    else:
-                        parsed_response['assistant_message'] = "⚠️ Não foi possível registrar as transações. Verifique os valores."
-            
-            elif isinstance(transaction_data, dict) and transaction_data.get('amount'):
-                # Transação única
-                if request.user.is_authenticated:
-                    try:
-                        transacao = save_chat_transaction(
-                            user=request.user,
-                            transaction_data=transaction_data,
-                            original_message=message_text,
-                            status='paga'
-                        )
-                        
-                        tipo_emoji = "💸" if transacao.tipo == "despesa" else "💰"
-                        parsed_response['transaction_saved'] = True
-                        parsed_response['transaction_id'] = transacao.id
-                        parsed_response['assistant_message'] = (
-                            f"✅ {transacao.tipo.capitalize()} registrada!\n\n"
-                            f"{tipo_emoji} R$ {transacao.valor:.2f}\n"
-                            f"📝 {transacao.titulo}\n"
-                            f"🏷️ {transacao.categoria.nome}\n"
-                            f"🏦 {transacao.conta.nome}\n"
-                            f"📅 {transacao.data.strftime('%d/%m/%Y')}"
-                        )
-                        logger.info(f"Transação criada: ID {transacao.id}")
-                    except Exception as e:
-                        logger.error(f"Erro ao salvar transação: {e}")
-                        parsed_response['transaction_saved'] = False
-                        parsed_response['assistant_message'] = f"⚠️ Erro ao salvar: {str(e)}"
-            else:
-                logger.warning("Dados de transação inválidos ou sem valor")
-                if not parsed_response.get('assistant_message'):
-                    parsed_response['assistant_message'] = "⚠️ Preciso saber o valor da compra para registrar."
-                    parsed_response['clarification_needed'] = True
-
-        # ===== EDITAR TRANSAÇÃO =====
-        elif intent == 'edit_transaction' and not needs_clarification:
-            search_criteria = parsed_response.get('search_criteria', {})
-            transaction_data = parsed_response.get('transaction', {})
-            
-            if request.user.is_authenticated and search_criteria:
+                    parsed_response['transaction_saved'] = True
+                    parsed_response['transaction_ids'] = [t.id for t in transacoes_salvas]
+                    parsed_response['assistant_message'] = (
+                        f"✅ {len(transacoes_salvas)} despesas registradas!\n\n"
+                        f"{lista_itens}\n\n"
+                        f"💸 Total: R$ {total:.2f}"
+                    )
+                    avisos = [aviso for aviso in map(aviso_possivel_duplicata, transacoes_salvas) if aviso]
+                    if avisos:
+                        parsed_response['assistant_message'] += '\n\n' + '\n'.join(avisos)
+                else:
+                    parsed_response['assistant_message'] = "⚠️ Não foi possível registrar as transações. Verifique os valores."
+        
+        elif isinstance(transaction_data, dict) and transaction_data.get('amount'):
+            # Transação única
+            if user.is_authenticated:
                 try:
-                    found = search_transactions(request.user, search_criteria)
+                    transacao = save_chat_transaction(
+                        user=user,
+                        transaction_data=transaction_data,
+                        original_message=message_text,
+                        status='paga'
+                    )
                     
-                    if found.count() == 1:
-                        transacao = update_chat_transaction(
-                            transaction_id=found.first().id,
-                            user=request.user,
-                            transaction_data=transaction_data,
-                            original_message=message_text
-                        )
-                        parsed_response['transaction_saved'] = True
-                        parsed_response['assistant_message'] = (
-                            f"✅ Transação atualizada!\n\n"
-                            f"📝 {transacao.titulo}\n"
-                            f"💰 R$ {transacao.valor:.2f}\n"
-                            f"📅 {transacao.data.strftime('%d/%m/%Y')}"
-                        )
-                    elif found.count() == 0:
-                        parsed_response['assistant_message'] = "❌ Nenhuma transação encontrada."
-                        parsed_response['clarification_needed'] = True
-                    else:
-                        trans_list = "\n".join([
-                            f"  {i+1}. {t.data.strftime('%d/%m')} - {t.titulo} - R$ {t.valor:.2f}"
-                            for i, t in enumerate(found[:5])
-                        ])
-                        parsed_response['assistant_message'] = (
-                            f"🔍 Encontrei {found.count()} transações:\n\n{trans_list}\n\n"
-                            "Seja mais específico (data, valor exato)."
-                        )
-                        parsed_response['clarification_needed'] = True
+                    tipo_emoji = "💸" if transacao.tipo == "despesa" else "💰"
+                    parsed_response['transaction_saved'] = True
+                    parsed_response['transaction_id'] = transacao.id
+                    parsed_response['assistant_message'] = (
+                        f"✅ {transacao.tipo.capitalize()} registrada!\n\n"
+                        f"{tipo_emoji} R$ {transacao.valor:.2f}\n"
+                        f"📝 {transacao.titulo}\n"
+                        f"🏷️ {transacao.categoria.nome}\n"
+                        f"🏦 {transacao.conta.nome}\n"
+                        f"📅 {transacao.data.strftime('%d/%m/%Y')}"
+                    )
+                    aviso = aviso_possivel_duplicata(transacao)
+                    if aviso:
+                        parsed_response['possible_duplicate_id'] = transacao.possivel_duplicata.id
+                        parsed_response['assistant_message'] += f"\n\n{aviso}"
+                    logger.info(f"Transação criada: ID {transacao.id}")
                 except Exception as e:
-                    logger.error(f"Erro ao editar: {e}")
-                    parsed_response['assistant_message'] = f"⚠️ Erro: {str(e)}"
+                    logger.error(f"Erro ao salvar transação: {e}")
+                    parsed_response['transaction_saved'] = False
+                    parsed_response['assistant_message'] = f"⚠️ Erro ao salvar: {str(e)}"
+        else:
+            logger.warning("Dados de transação inválidos ou sem valor")
+            if not parsed_response.get('assistant_message'):
+                parsed_response['assistant_message'] = "⚠️ Preciso saber o valor da compra para registrar."
+                parsed_response['clarification_needed'] = True
 
-        # ===== RELATÓRIOS =====
-        elif intent == 'query_summary' and not needs_clarification:
-            query = parsed_response.get('query', {})
-            logger.info(f"📊 Gerando relatório: {query}")
-            
-            if request.user.is_authenticated:
-                try:
-                    # Definir período
-                    hoje = datetime.now().date()
-                    period = query.get('period', {})
-                    
-                    if period.get('start_date') and period.get('end_date'):
-                        inicio = datetime.fromisoformat(period['start_date']).date()
-                        fim = datetime.fromisoformat(period['end_date']).date()
+    # ===== EDITAR TRANSAÇÃO =====
+    elif intent == 'edit_transaction' and not needs_clarification:
+        search_criteria = parsed_response.get('search_criteria', {})
+        transaction_data = parsed_response.get('transaction', {})
+        
+        if user.is_authenticated and search_criteria:
+            try:
+                alvo, candidatas = find_edit_target(user, search_criteria)
+                
+                if alvo:
+                    transacao = update_chat_transaction(
+                        transaction_id=alvo.id,
+                        user=user,
+                        transaction_data=transaction_data,
+                        original_message=message_text
+                    )
+                    parsed_response['transaction_saved'] = True
+                    parsed_response['assistant_message'] = (
+                        f"✅ Transação atualizada!\n\n"
+                        f"📝 {transacao.titulo}\n"
+                        f"💰 R$ {transacao.valor:.2f}\n"
+                        f"📅 {transacao.data.strftime('%d/%m/%Y')}"
+                    )
+                elif not candidatas:
+                    parsed_response['assistant_message'] = "❌ Nenhuma transação encontrada."
+                    parsed_response['clarification_needed'] = True
+                else:
+                    trans_list = "\n".join([
+                        f"  {i+1}. {t.data.strftime('%d/%m')} - {t.titulo} - R$ {t.valor:.2f}"
+                        for i, t in enumerate(candidatas[:5])
+                    ])
+                    parsed_response['assistant_message'] = (
+                        f"🔍 Encontrei {len(candidatas)} transações:\n\n{trans_list}\n\n"
+                        "Seja mais específico (data, valor exato)."
+                    )
+                    parsed_response['clarification_needed'] = True
+            except Exception as e:
+                logger.error(f"Erro ao editar: {e}")
+                parsed_response['assistant_message'] = f"⚠️ Erro: {str(e)}"
+
+    # ===== RELATÓRIOS =====
+    elif intent == 'query_summary' and not needs_clarification:
+        query = parsed_response.get('query', {})
+        logger.info(f"📊 Gerando relatório: {query}")
+        
+        if user.is_authenticated:
+            try:
+                # Definir período
+                hoje = datetime.now().date()
+                period = query.get('period', {})
+                
+                if period.get('start_date') and period.get('end_date'):
+                    inicio = datetime.fromisoformat(period['start_date']).date()
+                    fim = datetime.fromisoformat(period['end_date']).date()
+                else:
+                    # Mês atual por padrão
+                    inicio = hoje.replace(day=1)
+                    if hoje.month == 12:
+                        fim = hoje.replace(day=31)
                     else:
-                        # Mês atual por padrão
-                        inicio = hoje.replace(day=1)
-                        if hoje.month == 12:
-                            fim = hoje.replace(day=31)
-                        else:
-                            proximo = hoje.replace(month=hoje.month + 1, day=1)
-                            fim = proximo - timedelta(days=1)
-                    
-                    logger.info(f"📊 Período: {inicio} a {fim}")
-                    
-                    # Buscar transações
+                        proximo = hoje.replace(month=hoje.month + 1, day=1)
+                        fim = proximo - timedelta(days=1)
+                
+                logger.info(f"📊 Período: {inicio} a {fim}")
+                
+                # Períodos de meses completos são respondidos pelo resumo
+                # mensal; os demais consultam as transações diretamente
+                if cobre_meses_completos(inicio, fim):
+                    queryset = ResumoMensal.objects.filter(
+                        casa=user.casa,
+                        mes__gte=inicio,
+                        mes__lte=fim
+                    )
+                    soma, contagem = Sum('total'), Coalesce(Sum('quantidade'), 0)
+                else:
                     queryset = Transacao.objects.filter(
-                        casa=request.user.casa,
+                        casa=user.casa,
                         data__gte=inicio,
                         data__lte=fim
                     )
-                    
-                    category_filter = query.get('category')
-                    if category_filter:
-                        queryset = queryset.filter(categoria__nome__icontains=category_filter)
-                    
-                    type_filter = query.get('type')
-                    if type_filter and type_filter != 'todas':
-                        queryset = queryset.filter(tipo=type_filter)
-                    
-                    # Calcular totais
-                    despesas_agg = queryset.filter(tipo='despesa').aggregate(
-                        total=Sum('valor'), count=Count('id')
+                    soma, contagem = Sum('valor'), Count('id')
+                
+                category_filter = query.get('category')
+                if category_filter:
+                    queryset = queryset.filter(categoria__nome__icontains=category_filter)
+                
+                type_filter = query.get('type')
+                if type_filter and type_filter != 'todas':
+                    queryset = queryset.filter(tipo=type_filter)
+                
+                # Calcular totais
+                despesas_agg = queryset.filter(tipo='despesa').aggregate(
+                    total=soma, count=contagem
+                )
+                receitas_agg = queryset.filter(tipo='receita').aggregate(
+                    total=soma, count=contagem
+                )
+                
+                total_despesas = despesas_agg['total'] or 0
+                total_receitas = receitas_agg['total'] or 0
+                saldo = total_receitas - total_despesas
+                
+                # Top categorias
+                top_despesas = queryset.filter(tipo='despesa').values(
+                    'categoria_id', 'categoria__nome'
+                ).annotate(
+                    total=soma, count=contagem
+                ).order_by('-total')[:5]
+                
+                # Montar relatório
+                periodo_texto = f"{inicio.strftime('%d/%m/%Y')} a {fim.strftime('%d/%m/%Y')}"
+                
+                relatorio = [
+                    "📊 **RELATÓRIO FINANCEIRO**",
+                    f"📅 Período: {periodo_texto}",
+                    "",
+                    "💰 **RESUMO**",
+                    f"• Receitas: R$ {total_receitas:,.2f} ({receitas_agg['count']} transações)",
+                    f"• Despesas: R$ {total_despesas:,.2f} ({despesas_agg['count']} transações)",
+                    f"• Saldo: R$ {saldo:,.2f}",
+                    ""
+                ]
+                
+                if top_despesas:
+                    relatorio.append("📉 **TOP 5 DESPESAS**")
+                    for item in top_despesas:
+                        cat = item['categoria__nome'] or 'Outros'
+                        relatorio.append(f"• {cat}: R$ {item['total']:,.2f}")
+                    relatorio.append("")
+                
+                # Análise
+                if saldo > 0:
+                    relatorio.append(f"✅ Saldo positivo de R$ {saldo:,.2f}")
+                elif saldo < 0:
+                    relatorio.append(f"⚠️ Saldo negativo de R$ {abs(saldo):,.2f}")
+                else:
+                    relatorio.append("⚖️ Receitas e despesas equilibradas")
+                
+                if total_receitas > 0:
+                    percentual = (total_despesas / total_receitas) * 100
+                    relatorio.append(f"📊 Você gastou {percentual:.1f}% das receitas")
+                
+                parsed_response['assistant_message'] = "\n".join(relatorio)
+                parsed_response['report_generated'] = True
+                logger.info("📊 Relatório gerado com sucesso")
+                
+            except Exception as e:
+                logger.error(f"Erro no relatório: {e}")
+                parsed_response['assistant_message'] = f"⚠️ Erro ao gerar relatório: {str(e)}"
+
+    # ===== DEFINIR META =====
+    elif intent == 'set_goal' and not needs_clarification:
+        goal_data = parsed_response.get('goal', {})
+        logger.info(f"🎯 Definindo meta: {goal_data}")
+        
+        if user.is_authenticated and goal_data.get('amount'):
+            try:
+                from core.models import Meta as MetaFinanceira
+                
+                # Extrair dados
+                tipo_meta = goal_data.get('type', 'monthly_spending')
+                valor_meta = Decimal(str(goal_data['amount']))
+                
+                # Determinar mês/ano
+                hoje = datetime.now().date()
+                mes = hoje.month
+                ano = hoje.year
+                
+                # Buscar ou criar categoria se necessário
+                categoria_meta = None
+                if tipo_meta == 'category_limit' and goal_data.get('category'):
+                    categoria_meta, _ = obter_ou_criar_categoria(
+                        user.casa,
+                        goal_data['category'],
+                        'despesa',
+                        defaults={'cor': '#6c757d', 'icone': '🎯', 'ativa': True}
                     )
-                    receitas_agg = queryset.filter(tipo='receita').aggregate(
-                        total=Sum('valor'), count=Count('id')
+                
+                # Criar ou atualizar meta
+                meta, criada = MetaFinanceira.objects.update_or_create(
+                    casa=user.casa,
+                    tipo=tipo_meta,
+                    categoria=categoria_meta,
+                    mes=mes,
+                    ano=ano,
+                    defaults={
+                        'valor': valor_meta,
+                        'criada_por': user,
+                        'ativa': True
+                    }
+                )
+                
+                tipo_texto = dict(MetaFinanceira.TIPO_META_CHOICES).get(tipo_meta, 'Meta')
+                periodo_texto = f"{mes}/{ano}"
+                
+                if criada:
+                    parsed_response['assistant_message'] = (
+                        f"✅ Meta definida com sucesso!\n\n"
+                        f"🎯 {tipo_texto}\n"
+                        f"💰 R$ {valor_meta:,.2f}\n"
+                        f"📅 Período: {periodo_texto}"
                     )
-                    
-                    total_despesas = despesas_agg['total'] or 0
-                    total_receitas = receitas_agg['total'] or 0
-                    saldo = total_receitas - total_despesas
-                    
-                    # Top categorias
-                    top_despesas = queryset.filter(tipo='despesa').values(
-                        'categoria__nome'
-                    ).annotate(
-                        total=Sum('valor'), count=Count('id')
-                    ).order_by('-total')[:5]
-                    
-                    # Montar relatório
-                    periodo_texto = f"{inicio.strftime('%d/%m/%Y')} a {fim.strftime('%d/%m/%Y')}"
-                    
-                    relatorio = [
-                        "📊 **RELATÓRIO FINANCEIRO**",
-                        f"📅 Período: {periodo_texto}",
-                        "",
-                        "💰 **RESUMO**",
-                        f"• Receitas: R$ {total_receitas:,.2f} ({receitas_agg['count']} transações)",
-                        f"• Despesas: R$ {total_despesas:,.2f} ({despesas_agg['count']} transações)",
-                        f"• Saldo: R$ {saldo:,.2f}",
-                        ""
-                    ]
-                    
-                    if top_despesas:
-                        relatorio.append("📉 **TOP 5 DESPESAS**")
-                        for item in top_despesas:
-                            cat = item['categoria__nome'] or 'Outros'
-                            relatorio.append(f"• {cat}: R$ {item['total']:,.2f}")
-                        relatorio.append("")
-                    
-                    # Análise
-                    if saldo > 0:
-                        relatorio.append(f"✅ Saldo positivo de R$ {saldo:,.2f}")
-                    elif saldo < 0:
-                        relatorio.append(f"⚠️ Saldo negativo de R$ {abs(saldo):,.2f}")
-                    else:
-                        relatorio.append("⚖️ Receitas e despesas equilibradas")
-                    
-                    if total_receitas > 0:
-                        percentual = (total_despesas / total_receitas) * 100
-                        relatorio.append(f"📊 Você gastou {percentual:.1f}% das receitas")
-                    
-                    parsed_response['assistant_message'] = "\n".join(relatorio)
-                    parsed_response['report_generated'] = True
-                    logger.info("📊 Relatório gerado com sucesso")
-                    
-                except Exception as e:
-                    logger.error(f"Erro no relatório: {e}")
-                    parsed_response['assistant_message'] = f"⚠️ Erro ao gerar relatório: {str(e)}"
+                else:
+                    parsed_response['assistant_message'] = (
+                        f"✅ Meta atualizada!\n\n"
+                        f"🎯 {tipo_texto}\n"
+                        f"💰 R$ {valor_meta:,.2f} (novo valor)\n"
+                        f"📅 Período: {periodo_texto}"
+                    )
+                
+                parsed_response['goal_set'] = True
+                logger.info(f"🎯 Meta {'criada' if criada else 'atualizada'}: ID {meta.id}")
+                
+            except Exception as e:
+                logger.error(f"Erro ao definir meta: {e}")
+                parsed_response['assistant_message'] = f"⚠️ Erro ao definir meta: {str(e)}"
 
-        # ===== DEFINIR META =====
-        elif intent == 'set_goal' and not needs_clarification:
-            goal_data = parsed_response.get('goal', {})
-            logger.info(f"🎯 Definindo meta: {goal_data}")
-            
-            if request.user.is_authenticated and goal_data.get('amount'):
-                try:
-                    from core.models import Meta as MetaFinanceira
-                    
-                    # Extrair dados
-                    tipo_meta = goal_data.get('type', 'monthly_spending')
-                    valor_meta = Decimal(str(goal_data['amount']))
-                    
-                    # Determinar mês/ano
-                    hoje = datetime.now().date()
-                    mes = hoje.month
-                    ano = hoje.year
-                    
-                    # Buscar ou criar categoria se necessário
-                    categoria_meta = None
-                    if tipo_meta == 'category_limit' and goal_data.get('category'):
-                        categoria_meta, _ = Categoria.objects.get_or_create(
-                            casa=request.user.casa,
-                            nome=goal_data['category'],
-                            defaults={'tipo': 'despesa', 'cor': '#6c757d', 'icone': '🎯', 'ativa': True}
-                        )
-                    
-                    # Criar ou atualizar meta
-                    meta, criada = MetaFinanceira.objects.update_or_create(
-                        casa=request.user.casa,
-                        tipo=tipo_meta,
-                        categoria=categoria_meta,
-                        mes=mes,
-                        ano=ano,
-                        defaults={
-                            'valor': valor_meta,
-                            'criada_por': request.user,
-                            'ativa': True
-                        }
+    # ===== CONSULTAR META =====
+    elif intent == 'check_goal':
+        logger.info("🎯 Consultando metas")
+        
+        if user.is_authenticated:
+            try:
+                from core.models import Meta as MetaFinanceira
+                
+                # Buscar metas ativas do mês atual
+                hoje = datetime.now().date()
+                metas = MetaFinanceira.objects.filter(
+                    casa=user.casa,
+                    mes=hoje.month,
+                    ano=hoje.year,
+                    ativa=True
+                )
+                
+                if not metas.exists():
+                    parsed_response['assistant_message'] = (
+                        "📊 Você ainda não definiu metas para este mês.\n\n"
+                        "💡 Dica: Diga 'quero gastar no máximo R$ 1500 este mês' para definir uma meta!"
                     )
+                else:
+                    # Calcular gastos do mês
+                    inicio_mes = hoje.replace(day=1)
+                    gastos_mes = Transacao.objects.filter(
+                        casa=user.casa,
+                        tipo='despesa',
+                        data__gte=inicio_mes,
+                        data__lte=hoje
+                    ).aggregate(total=Sum('valor'))['total'] or 0
                     
-                    tipo_texto = dict(MetaFinanceira.TIPO_META_CHOICES).get(tipo_meta, 'Meta')
-                    periodo_texto = f"{mes}/{ano}"
+                    relatorio_metas = ["🎯 **SUAS METAS**\n"]
                     
-                    if criada:
-                        parsed_response['assistant_message'] = (
-                            f"✅ Meta definida com sucesso!\n\n"
-                            f"🎯 {tipo_texto}\n"
-                            f"💰 R$ {valor_meta:,.2f}\n"
-                            f"📅 Período: {periodo_texto}"
-                        )
-                    else:
-                        parsed_response['assistant_message'] = (
-                            f"✅ Meta atualizada!\n\n"
-                            f"🎯 {tipo_texto}\n"
-                            f"💰 R$ {valor_meta:,.2f} (novo valor)\n"
-                            f"📅 Período: {periodo_texto}"
+                    for meta in metas:
+                        tipo_texto = dict(MetaFinanceira.TIPO_META_CHOICES).get(meta.tipo)
+                        percentual = (gastos_mes / meta.valor * 100) if meta.valor > 0 else 0
+                        
+                        status_emoji = "✅" if percentual <= 100 else "⚠️"
+                        
+                        relatorio_metas.append(
+                            f"{status_emoji} {tipo_texto}\n"
+                            f"   Meta: R$ {meta.valor:,.2f}\n"
+                            f"   Gasto: R$ {gastos_mes:,.2f} ({percentual:.1f}%)\n"
+                            f"   Restante: R$ {(meta.valor - gastos_mes):,.2f}\n"
                         )
                     
-                    parsed_response['goal_set'] = True
-                    logger.info(f"🎯 Meta {'criada' if criada else 'atualizada'}: ID {meta.id}")
+                    parsed_response['assistant_message'] = "\n".join(relatorio_metas)
+                    parsed_response['goal_checked'] = True
                     
-                except Exception as e:
-                    logger.error(f"Erro ao definir meta: {e}")
-                    parsed_response['assistant_message'] = f"⚠️ Erro ao definir meta: {str(e)}"
+            except Exception as e:
+                logger.error(f"Erro ao consultar metas: {e}")
+                parsed_response['assistant_message'] = f"⚠️ Erro ao consultar metas: {str(e)}"
 
-        # ===== CONSULTAR META =====
-        elif intent == 'check_goal':
-            logger.info("🎯 Consultando metas")
-            
-            if request.user.is_authenticated:
-                try:
-                    from core.models import Meta as MetaFinanceira
-                    
-                    # Buscar metas ativas do mês atual
-                    hoje = datetime.now().date()
-                    metas = MetaFinanceira.objects.filter(
-                        casa=request.user.casa,
-                        mes=hoje.month,
-                        ano=hoje.year,
-                        ativa=True
-                    )
-                    
-                    if not metas.exists():
-                        parsed_response['assistant_message'] = (
-                            "📊 Você ainda não definiu metas para este mês.\n\n"
-                            "💡 Dica: Diga 'quero gastar no máximo R$ 1500 este mês' para definir uma meta!"
-                        )
-                    else:
-                        # Calcular gastos do mês
-                        inicio_mes = hoje.replace(day=1)
-                        gastos_mes = Transacao.objects.filter(
-                            casa=request.user.casa,
-                            tipo='despesa',
-                            data__gte=inicio_mes,
-                            data__lte=hoje
-                        ).aggregate(total=Sum('valor'))['total'] or 0
-                        
-                        relatorio_metas = ["🎯 **SUAS METAS**\n"]
-                        
-                        for meta in metas:
-                            tipo_texto = dict(MetaFinanceira.TIPO_META_CHOICES).get(meta.tipo)
-                            percentual = (gastos_mes / meta.valor * 100) if meta.valor > 0 else 0
-                            
-                            status_emoji = "✅" if percentual <= 100 else "⚠️"
-                            
-                            relatorio_metas.append(
-                                f"{status_emoji} {tipo_texto}\n"
-                                f"   Meta: R$ {meta.valor:,.2f}\n"
-                                f"   Gasto: R$ {gastos_mes:,.2f} ({percentual:.1f}%)\n"
-                                f"   Restante: R$ {(meta.valor - gastos_mes):,.2f}\n"
-                            )
-                        
-                        parsed_response['assistant_message'] = "\n".join(relatorio_metas)
-                        parsed_response['goal_checked'] = True
-                        
-                except Exception as e:
-                    logger.error(f"Erro ao consultar metas: {e}")
-                    parsed_response['assistant_message'] = f"⚠️ Erro ao consultar metas: {str(e)}"
-
-        # ===== CASOS NÃO TRATADOS (greeting, small_talk, unknown) =====
-        # Se chegou aqui e não tem mensagem, fornecer resposta padrão
-        if not parsed_response.get('assistant_message'):
-            if intent == 'greeting':
-                parsed_response['assistant_message'] = (
-                    "👋 Olá! Eu sou seu assistente financeiro.\n\n"
-                    "Posso ajudar você a:\n"
-                    "• Registrar despesas e receitas\n"
-                    "• Consultar seus gastos\n"
-                    "• Definir e acompanhar metas\n"
-                    "• Gerar relatórios\n\n"
-                    "Como posso ajudar?"
-                )
-            elif intent == 'small_talk':
-                parsed_response['assistant_message'] = (
-                    "😊 Obrigado pela mensagem! Estou aqui para ajudar com suas finanças.\n\n"
-                    "O que você gostaria de fazer?"
-                )
-            elif intent == 'unknown':
-                parsed_response['assistant_message'] = (
-                    "❓ Desculpe, não entendi sua solicitação.\n\n"
-                    "Você pode:\n"
-                    "• Registrar gastos: 'Gastei 50 reais no mercado'\n"
-                    "• Ver relatórios: 'Quanto gastei este mês?'\n"
-                    "• Definir metas: 'Quero gastar no máximo 1500 este mês'\n\n"
-                    "Como posso ajudar?"
-                )
-            else:
-                # Fallback para qualquer outro caso
-                parsed_response['assistant_message'] = (
-                    "🤔 Recebi sua mensagem.\n\n"
-                    "Precisa de ajuda com despesas, receitas ou relatórios?"
-                )
+    # ===== CASOS NÃO TRATADOS (greeting, small_talk, unknown) =====
+    # Se chegou aqui e não tem mensagem, fornecer resposta padrão
+    if not parsed_response.get('assistant_message'):
+        if intent == 'greeting':
+            parsed_response['assistant_message'] = (
+                "👋 Olá! Eu sou seu assistente financeiro.\n\n"
+                "Posso ajudar você a:\n"
+                "• Registrar despesas e receitas\n"
+                "• Consultar seus gastos\n"
+                "• Definir e acompanhar metas\n"
+                "• Gerar relatórios\n\n"
+                "Como posso ajudar?"
+            )
+        elif intent == 'small_talk':
+            parsed_response['assistant_message'] = (
+                "😊 Obrigado pela mensagem! Estou aqui para ajudar com suas finanças.\n\n"
+                "O que você gostaria de fazer?"
+            )
+        elif intent == 'unknown':
+            parsed_response['assistant_message'] = (
+                "❓ Desculpe, não entendi sua solicitação.\n\n"
+                "Você pode:\n"
+                "• Registrar gastos: 'Gastei 50 reais no mercado'\n"
+                "• Ver relatórios: 'Quanto gastei este mês?'\n"
+                "• Definir metas: 'Quero gastar no máximo 1500 este mês'\n\n"
+                "Como posso ajudar?"
+            )
+        else:
+            # Fallback para qualquer outro caso
+            parsed_response['assistant_message'] = (
+                "🤔 Recebi sua mensagem.\n\n"
+                "Precisa de ajuda com despesas, receitas ou relatórios?"
+            )
+
+    return parsed_response
+
+
+def serializar_resposta(parsed_response):
+    """Valida a resposta contra o schema do chat; se não bater, devolve os dados como estão."""
+    response_serializer = ChatResponseSerializer(data=parsed_response)
+    if response_serializer.is_valid():
+        logger.info(
+            f"✅ Resposta enviada: intent={parsed_response.get('intent')}, "
+            f"clarification={parsed_response.get('clarification_needed')}"
+        )
+        return response_serializer.data
+    logger.warning(f"⚠️ Schema inválido: {response_serializer.errors}")
+    logger.warning(f"Dados recebidos: {parsed_response}")
+    # Retornar mesmo assim, mas com aviso
+    return parsed_response
+
+
+def resposta_de_erro(exc):
+    """Corpo devolvido (com status 200, para o frontend não quebrar) quando o chat falha."""
+    if isinstance(exc, CotaExcedida):
+        mensagem = (
+            "📊 Sua casa atingiu o limite diário de uso do assistente. "
+            "Registre pelo formulário ou tente novamente amanhã."
+        )
+    elif isinstance(exc, OpenAIClientError):
+        logger.error(f"❌ Erro OpenAI: {exc}")
+        mensagem = "🔌 Erro ao conectar com o assistente. Por favor, tente novamente."
+    else:
+        logger.exception("❌ Erro inesperado no chat")
+        mensagem = "⚠️ Ocorreu um erro inesperado. Por favor, tente novamente."
+    return {
+        "intent": "unknown",
+        "clarification_needed": False,
+        "assistant_message": mensagem,
+        "error": str(exc),
+    }
+
+
+@api_view(['POST'])
+@parser_classes([JSONParser, MultiPartParser, FormParser])
+def chat_message_view(request):
+    """Endpoint principal para processar mensagens do chat financeiro."""
+    
+    dados = request.data
+    if audio_acima_do_limite(request):
+        return Response(
+            {"error": mensagem_audio_acima_do_limite()},
+            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+
+    serializer = ChatMessageSerializer(data=dados)
+    if not serializer.is_valid():
+        return Response({"error": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    validated_data = serializer.validated_data
+    message_text = validated_data.get('message', '').strip()
+    audio_file = validated_data.get('audio')
+    # O histórico vem do banco, limitado pelo orçamento de tokens; o
+    # ``context`` enviado pelo cliente é ignorado
+    context = montar_contexto(request.user)
+    client = None
+    intent = None
+
+    try:
+        client = OpenAIClient()
+
+        # Transcrever áudio se houver
+        transcribed_text = None
+        if audio_file:
+            verificar_cota(request.user)
+            logger.info("Transcrevendo áudio...")
+            transcribed_text = transcrever_audio(request.user, client, audio_file)
+            message_text = transcribed_text
+            logger.info(f"Áudio transcrito: {transcribed_text[:100]}...")
+
+        if not message_text:
+            return Response(
+                {"error": "Mensagem vazia"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Processar mensagem
+        logger.info(f"Processando: {message_text[:100]}...")
+        parsed_response = completar_resposta(
+            interpretar_mensagem(request.user, client, message_text, context), transcribed_text
+        )
+        intent = parsed_response.get('intent')
+        processar_intencao(request.user, parsed_response, message_text)
 
         # Salvar histórico
         if request.user.is_authenticated:
@@ -585,45 +825,229 @@ def chat_message_view(request):
                     user=request.user,
                     user_message=message_text,
                     assistant_response=parsed_response.get('assistant_message', ''),
-                    intent=intent,
+                    intent=parsed_response.get('intent'),
                     transcribed_text=transcribed_text
                 )
             except Exception as e:
                 logger.warning(f"Erro ao salvar histórico: {e}")
 
-        # Validar resposta antes de retornar
-        response_serializer = ChatResponseSerializer(data=parsed_response)
-        if response_serializer.is_valid():
-            logger.info(f"✅ Resposta enviada: intent={intent}, clarification={needs_clarification}")
-            return Response(response_serializer.data, status=status.HTTP_200_OK)
-        else:
-            logger.warning(f"⚠️ Schema inválido: {response_serializer.errors}")
-            logger.warning(f"Dados recebidos: {parsed_response}")
-            # Retornar mesmo assim, mas com aviso
-            return Response(parsed_response, status=status.HTTP_200_OK)
+        return Response(serializar_resposta(parsed_response), status=status.HTTP_200_OK)
 
-    except OpenAIClientError as exc:
-        logger.error(f"❌ Erro OpenAI: {exc}")
-        return Response(
-            {
-                "intent": "unknown",
-                "clarification_needed": False,
-                "assistant_message": "🔌 Erro ao conectar com o assistente. Por favor, tente novamente.",
-                "error": str(exc)
-            },
-            status=status.HTTP_200_OK  # Retornar 200 para o frontend não quebrar
-        )
     except Exception as exc:
-        logger.exception("❌ Erro inesperado no chat")
-        return Response(
-            {
-                "intent": "unknown",
-                "clarification_needed": False,
-                "assistant_message": "⚠️ Ocorreu um erro inesperado. Por favor, tente novamente.",
-                "error": str(exc)
-            },
-            status=status.HTTP_200_OK  # Retornar 200 para o frontend não quebrar
+        return Response(resposta_de_erro(exc), status=status.HTTP_200_OK)
+
+    finally:
+        # Uma única gravação com todas as chamadas feitas, qualquer que seja a saída
+        if client is not None:
+            registrar_uso(request.user, client.chamadas, intent)
+
+
+def _dados_da_requisicao(request):
+    """Corpo JSON ou multipart no formato que ``ChatMessageSerializer`` espera (None se inválido)."""
+    if request.content_type == 'application/json':
+        try:
+            dados = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return dados if isinstance(dados, dict) else None
+    dados = request.POST.dict()
+    dados.update(request.FILES.dict())
+    return dados
+
+
+def _json(dados, status_code=status.HTTP_200_OK):
+    return JsonResponse(dados, status=status_code, json_dumps_params={'ensure_ascii': False})
+
+
+def _validar_mensagem(request):
+    """Retorna ``(dados validados, None)`` ou ``(None, resposta de erro)``."""
+    dados = _dados_da_requisicao(request)
+    if dados is None:
+        return None, _json({"error": "JSON inválido"}, status.HTTP_400_BAD_REQUEST)
+    if audio_acima_do_limite(request):
+        return None, _json({"error": mensagem_audio_acima_do_limite()}, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    serializer = ChatMessageSerializer(data=dados)
+    if not serializer.is_valid():
+        return None, _json({"error": serializer.errors}, status.HTTP_400_BAD_REQUEST)
+    return serializer.validated_data, None
+
+
+async def _salvar_historico_async(user, message_text, parsed_response, transcribed_text):
+    if not user.is_authenticated:
+        return
+    try:
+        await ChatHistory.objects.acreate(
+            usuario=user,
+            user_message=message_text,
+            assistant_response=parsed_response.get('assistant_message', ''),
+            intent=parsed_response.get('intent'),
+            transcribed_text=transcribed_text
+        )
+    except Exception as e:
+        logger.warning(f"Erro ao salvar histórico: {e}")
+
+
+@require_POST
+async def chat_message_async_view(request):
+    """
+    Variante assíncrona de ``chat_message_view`` para servidores ASGI.
+
+    Transcrição e interpretação aguardam o ``AsyncOpenAI`` sem ocupar uma
+    thread durante a chamada, e o histórico é gravado pelo ORM assíncrono;
+    assim um processo atende várias conversas simultâneas. As ações sobre
+    transações e metas usam ``transaction.atomic`` e rodam em
+    ``processar_intencao`` via ``sync_to_async``.
+    """
+    validated_data, erro = _validar_mensagem(request)
+    if erro:
+        return erro
+
+    message_text = validated_data.get('message', '').strip()
+    audio_file = validated_data.get('audio')
+    user = await request.auser()
+    context = await amontar_contexto(user)
+    client = None
+    intent = None
+
+    try:
+        client = OpenAIClient()
+
+        transcribed_text = None
+        if audio_file:
+            await averificar_cota(user)
+            logger.info("Transcrevendo áudio...")
+            transcribed_text = await atranscrever_audio(user, client, audio_file)
+            message_text = transcribed_text
+            logger.info(f"Áudio transcrito: {transcribed_text[:100]}...")
+
+        if not message_text:
+            return _json({"error": "Mensagem vazia"}, status.HTTP_400_BAD_REQUEST)
+
+        logger.info(f"Processando: {message_text[:100]}...")
+        parsed_response = completar_resposta(
+            await ainterpretar_mensagem(user, client, message_text, context), transcribed_text
         )
+        intent = parsed_response.get('intent')
+        await sync_to_async(processar_intencao)(user, parsed_response, message_text)
+        await _salvar_historico_async(user, message_text, parsed_response, transcribed_text)
+
+        return _json(serializar_resposta(parsed_response))
+
+    except Exception as exc:
+        return _json(resposta_de_erro(exc))
+
+    finally:
+        if client is not None:
+            await asyncio.shield(aregistrar_uso(user, client.chamadas, intent))
+
+
+# Etapas anunciadas pelo streaming; as intenções que gravam dados anunciam "salvando"
+ETAPAS_STREAM = {
+    'transcrevendo': 'Transcrevendo o áudio...',
+    'interpretando': 'Interpretando a mensagem...',
+    'salvando': 'Salvando...',
+}
+INTENCOES_QUE_GRAVAM = ('create_transaction', 'edit_transaction', 'set_goal')
+
+
+def _evento_sse(nome, dados):
+    """Formata um evento Server-Sent Events com os dados em JSON (uma linha)."""
+    conteudo = json.dumps(dados, ensure_ascii=False, cls=DjangoJSONEncoder)
+    return f"event: {nome}\ndata: {conteudo}\n\n"
+
+
+def _evento_status(etapa):
+    return _evento_sse('status', {'etapa': etapa, 'mensagem': ETAPAS_STREAM[etapa]})
+
+
+async def _eventos_chat(user, message_text, audio_file, context):
+    """
+    Gera os eventos do chat em streaming.
+
+    ``status`` anuncia cada etapa, ``transcricao`` traz o texto do áudio,
+    ``texto`` traz trechos de ``assistant_message`` conforme o modelo os
+    produz e ``resposta`` encerra com o mesmo corpo de ``chat_message_view``.
+
+    O uso da OpenAI é gravado no ``finally``, protegido por ``asyncio.shield``:
+    se o navegador desconecta no meio do streaming (``GeneratorExit`` ou
+    ``CancelledError``), os tokens já gastos ainda contam na cota da casa.
+    """
+    client = None
+    intent = None
+    try:
+        client = OpenAIClient()
+
+        transcribed_text = None
+        if audio_file:
+            await averificar_cota(user)
+            yield _evento_status('transcrevendo')
+            transcribed_text = await atranscrever_audio(user, client, audio_file)
+            message_text = transcribed_text
+            yield _evento_sse('transcricao', {'texto': transcribed_text})
+
+        if not message_text:
+            yield _evento_sse('resposta', {"error": "Mensagem vazia"})
+            return
+
+        yield _evento_status('interpretando')
+        parsed_response = await sync_to_async(interpretacao_local)(user, message_text, context)
+        if parsed_response is None:
+            await averificar_cota(user)
+            inicio = time.monotonic()
+            # aclosing: numa desconexão o stream da OpenAI fecha antes do finally e anota a chamada
+            async with aclosing(client.astream_user_message(message=message_text, context=context)) as partes:
+                async for tipo, valor in partes:
+                    if tipo == 'texto':
+                        yield _evento_sse('texto', {'delta': valor})
+                    else:
+                        parsed_response = valor
+            await aregistrar_interpretacao('llm', time.monotonic() - inicio, getattr(user, 'casa_id', None))
+        parsed_response = completar_resposta(parsed_response, transcribed_text)
+        intent = parsed_response.get('intent')
+
+        if parsed_response['intent'] in INTENCOES_QUE_GRAVAM and not parsed_response['clarification_needed']:
+            yield _evento_status('salvando')
+        await sync_to_async(processar_intencao)(user, parsed_response, message_text)
+        await _salvar_historico_async(user, message_text, parsed_response, transcribed_text)
+
+        yield _evento_sse('resposta', serializar_resposta(parsed_response))
+
+    except Exception as exc:
+        yield _evento_sse('resposta', resposta_de_erro(exc))
+
+    finally:
+        if client is not None:
+            await asyncio.shield(aregistrar_uso(user, client.chamadas, intent))
+
+
+@require_POST
+async def chat_message_stream_view(request):
+    """
+    Variante em streaming (Server-Sent Events) de ``chat_message_async_view``.
+
+    O primeiro evento sai antes de qualquer chamada à OpenAI, então o
+    navegador mostra o andamento imediatamente em vez de uma tela parada.
+    Recebe o mesmo corpo (JSON ou multipart) dos demais endpoints do chat.
+    """
+    validated_data, erro = _validar_mensagem(request)
+    if erro:
+        return erro
+
+    user = await request.auser()
+    resposta = StreamingHttpResponse(
+        _eventos_chat(
+            user,
+            validated_data.get('message', '').strip(),
+            validated_data.get('audio'),
+            await amontar_contexto(user),
+        ),
+        content_type='text/event-stream; charset=utf-8',
+    )
+    resposta['Cache-Control'] = 'no-cache'
+    # Impede que proxies (nginx) acumulem os eventos antes de repassá-los
+    resposta['X-Accel-Buffering'] = 'no'
+    return resposta
 
 
 @api_view(['GET'])
@@ -672,3 +1096,16 @@ def chat_history_view(request):
         'messages': messages,
         'count': len(messages)
     }, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+def chat_clear_history_view(request):
+    """Apaga o histórico do usuário; o contexto enviado ao modelo recomeça do zero."""
+    if not request.user.is_authenticated:
+        return Response(
+            {"error": "Usuário não autenticado"},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+
+    removidas, _ = ChatHistory.objects.filter(usuario=request.user).delete()
+    return Response({'deleted': removidas}, status=status.HTTP_200_OK)
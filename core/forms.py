@@ -4,6 +4,11 @@ from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Field, Submit, Row, Column, Div, HTML
 from .models import Usuario, Casa, Conta, Categoria, Transacao
 from django.db.models import Q
+from django.utils import timezone
+from core.services.categorias import normalizar_nome
+from core.services.relatorios import (
+    GRANULARIDADES, MAX_BALDES, intervalo_periodo, quantidade_baldes, somar_meses,
+)
 
 
 class RegistroForm(UserCreationForm):
@@ -174,6 +179,24 @@ class CategoriaForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         # Não usar FormHelper para ter controle total no template
     
+    def clean(self):
+        cleaned_data = super().clean()
+        nome = cleaned_data.get('nome')
+        tipo = cleaned_data.get('tipo')
+        casa = self.casa or getattr(self.instance, 'casa', None)
+        
+        # Nomes que diferem só em acentos, maiúsculas ou espaços são a mesma categoria
+        if nome and tipo and casa:
+            existente = Categoria.objects.filter(
+                casa=casa,
+                tipo=tipo,
+                nome_normalizado=normalizar_nome(nome)
+            ).exclude(pk=self.instance.pk).first()
+            if existente:
+                self.add_error('nome', f'Já existe a categoria "{existente.nome}" deste tipo.')
+        
+        return cleaned_data
+    
     def save(self, commit=True):
         instance = super().save(commit=False)
         if self.casa:
@@ -401,6 +424,40 @@ class FiltroTransacaoForm(forms.Form):
     )
 
 
+class FiltroRelatorioForm(forms.Form):
+    """Intervalo e granularidade dos relatórios (padrão: últimos 12 meses, por mês)"""
+    inicio = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}), label='De')
+    fim = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}), label='Até')
+    granularidade = forms.ChoiceField(
+        choices=[(chave, rotulo) for chave, (_, rotulo) in GRANULARIDADES.items()],
+        required=False,
+        label='Agrupar por',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    
+    def __init__(self, *args, **kwargs):
+        self.hoje = kwargs.pop('hoje', None) or timezone.now().date()
+        super().__init__(*args, **kwargs)
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.errors:
+            return cleaned_data
+        
+        _, fim_padrao = intervalo_periodo(self.hoje, '12meses')
+        fim = cleaned_data.get('fim') or fim_padrao
+        inicio = cleaned_data.get('inicio') or somar_meses(fim.replace(day=1), -11)
+        granularidade = cleaned_data.get('granularidade') or 'mes'
+        
+        if inicio > fim:
+            raise forms.ValidationError('A data inicial deve ser anterior à data final.')
+        if quantidade_baldes(inicio, fim, granularidade) > MAX_BALDES:
+            raise forms.ValidationError('Intervalo grande demais para esta granularidade. Escolha um agrupamento maior.')
+        
+        cleaned_data.update(inicio=inicio, fim=fim, granularidade=granularidade)
+        return cleaned_data
+
+
 class CustomPasswordResetForm(PasswordResetForm):
     """Permite buscar usuário por email ou username ao solicitar redefinição.
 
@@ -481,3 +538,59 @@ class FiltroTransacaoForm(forms.Form):
                 css_class='d-flex gap-2'
             )
         )
+    
+    def filtrar_queryset(self, queryset):
+        """Aplica ao queryset de transações os filtros válidos do formulário"""
+        if not self.is_valid():
+            return queryset
+        
+        dados = self.cleaned_data
+        if dados.get('data_inicio'):
+            queryset = queryset.filter(data__gte=dados['data_inicio'])
+        if dados.get('data_fim'):
+            queryset = queryset.filter(data__lte=dados['data_fim'])
+        for campo in ('tipo', 'categoria', 'conta', 'status'):
+            if dados.get(campo):
+                queryset = queryset.filter(**{campo: dados[campo]})
+        return queryset
+
+
+class ImportacaoExtratoForm(forms.Form):
+    """Upload de extrato bancário (OFX ou CSV) para importação em massa"""
+    arquivo = forms.FileField(label='Arquivo do extrato', help_text='OFX exportado pelo banco ou CSV.')
+    formato = forms.ChoiceField(label='Formato')
+    conta = forms.ModelChoiceField(
+        queryset=Conta.objects.none(),
+        label='Conta',
+        help_text='Usada nas linhas que não indicam a conta.'
+    )
+    status = forms.ChoiceField(choices=Transacao.STATUS_CHOICES, initial='paga', label='Status')
+    
+    def __init__(self, *args, **kwargs):
+        from core.services.importacao import LAYOUTS_CSV
+        casa = kwargs.pop('casa', None)
+        super().__init__(*args, **kwargs)
+        
+        self.fields['formato'].choices = [('ofx', 'OFX')] + [
+            (chave, layout.nome) for chave, layout in LAYOUTS_CSV.items()
+        ]
+        if casa:
+            self.fields['conta'].queryset = Conta.objects.filter(casa=casa, ativa=True)
+        
+        self.helper = FormHelper()
+        self.helper.form_method = 'post'
+        self.helper.form_tag = True
+        self.helper.attrs = {'enctype': 'multipart/form-data'}
+        self.helper.layout = Layout(
+            'arquivo',
+            Row(
+                Column('formato', css_class='form-group col-md-4 mb-3'),
+                Column('conta', css_class='form-group col-md-4 mb-3'),
+                Column('status', css_class='form-group col-md-4 mb-3'),
+            ),
+            Div(
+                Submit('submit', 'Importar', css_class='btn btn-primary'),
+                HTML('<a href="{% url \'transacao_list\' %}" class="btn btn-secondary">Cancelar</a>'),
+                css_class='d-flex gap-2'
+            )
+        )
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Transacao
+from core.services.duplicatas import grupos_duplicados, mesclar_duplicadas, preencher_impressoes
+
+
+class Command(BaseCommand):
+    help = (
+        'Preenche a impressão digital das transações e reporta (ou mescla) '
+        'duplicatas: mesma casa, data, valor e título normalizado'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--casa',
+            type=int,
+            help='Limita a verificação às transações de uma casa (ID)'
+        )
+        parser.add_argument(
+            '--mesclar',
+            action='store_true',
+            help='Exclui as cópias, mantendo a transação mais antiga de cada grupo'
+        )
+        parser.add_argument(
+            '--recalcular',
+            action='store_true',
+            help='Recalcula a impressão de todas as transações, não só das vazias'
+        )
+
+    def handle(self, *args, **options):
+        transacoes = Transacao.objects.all()
+        if options['casa']:
+            transacoes = transacoes.filter(casa_id=options['casa'])
+
+        preenchidas = preencher_impressoes(transacoes, apenas_vazias=not options['recalcular'])
+        if preenchidas:
+            self.stdout.write(f'{preenchidas} impressão(ões) preenchida(s).')
+
+        grupos = grupos_duplicados(transacoes)
+        if not grupos:
+            self.stdout.write(self.style.SUCCESS('Nenhuma transação duplicada encontrada.'))
+            return
+
+        titulos = dict(
+            Transacao.objects.filter(pk__in=[grupo['manter'] for grupo in grupos]).values_list('pk', 'titulo')
+        )
+        for grupo in grupos:
+            self.stdout.write(self.style.WARNING(
+                f"Casa ID {grupo['casa_id']}: \"{titulos.get(grupo['manter'], '')}\" "
+                f"{grupo['qtd']}x (mantém ID {grupo['manter']})"
+            ))
+
+        copias = sum(grupo['qtd'] - 1 for grupo in grupos)
+        if options['mesclar']:
+            excluidas = mesclar_duplicadas(transacoes, excluir=True)
+            self.stdout.write(self.style.SUCCESS(
+                f'{len(grupos)} grupo(s) mesclado(s), {excluidas} transação(ões) excluída(s).'
+            ))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f'{len(grupos)} grupo(s) com {copias} cópia(s). Execute com --mesclar para excluí-las.'
+            ))
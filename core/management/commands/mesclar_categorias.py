@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Categoria
+from core.services.categorias import grupos_duplicados, mesclar_categorias
+
+
+class Command(BaseCommand):
+    help = (
+        'Mescla categorias duplicadas (mesmo nome normalizado e tipo) ou, com '
+        '--destino/--origem, categorias escolhidas manualmente'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--casa',
+            type=int,
+            help='ID da casa a verificar (padrão: todas)'
+        )
+        parser.add_argument(
+            '--destino',
+            type=int,
+            help='ID da categoria que permanece'
+        )
+        parser.add_argument(
+            '--origem',
+            type=int,
+            action='append',
+            help='ID de uma categoria a mesclar no destino (pode ser repetido)'
+        )
+        parser.add_argument(
+            '--simular',
+            action='store_true',
+            help='Apenas lista o que seria mesclado'
+        )
+
+    def handle(self, *args, **options):
+        if options['destino'] or options['origem']:
+            if not (options['destino'] and options['origem']):
+                raise CommandError('Informe --destino e ao menos um --origem.')
+            try:
+                destino = Categoria.objects.get(pk=options['destino'])
+            except Categoria.DoesNotExist:
+                raise CommandError(f"Categoria ID {options['destino']} não encontrada.")
+            origens = list(Categoria.objects.filter(pk__in=options['origem']))
+            if len(origens) != len(set(options['origem'])):
+                raise CommandError('Alguma categoria de origem não foi encontrada.')
+            grupos = [[destino, *origens]]
+        else:
+            categorias = Categoria.objects.all()
+            if options['casa']:
+                categorias = categorias.filter(casa_id=options['casa'])
+            grupos = grupos_duplicados(categorias)
+
+        if not grupos:
+            self.stdout.write(self.style.SUCCESS('Nenhuma categoria duplicada encontrada.'))
+            return
+
+        total = 0
+        for destino, *origens in grupos:
+            nomes = ', '.join(f'"{origem.nome}" (ID {origem.pk})' for origem in origens)
+            self.stdout.write(
+                f'Casa ID {destino.casa_id}: {nomes} -> "{destino.nome}" (ID {destino.pk})'
+            )
+            if options['simular']:
+                continue
+            try:
+                total += mesclar_categorias(destino, origens)
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        if options['simular']:
+            self.stdout.write(self.style.WARNING('Simulação: nada foi alterado.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'{len(grupos)} grupo(s) mesclado(s), {total} transação(ões) reatribuída(s).'
+            ))
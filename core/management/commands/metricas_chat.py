@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from core.services.interpretador_local import metricas_interpretador
+
+
+class Command(BaseCommand):
+    help = 'Mostra a taxa de acerto do interpretador local do chat e a economia de chamadas ao modelo'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=7,
+            help='Quantidade de dias considerados (padrão: 7)'
+        )
+
+    def handle(self, *args, **options):
+        metricas = metricas_interpretador(dias=options['dias'])
+        total = metricas['local'] + metricas['llm']
+
+        if not total:
+            self.stdout.write(self.style.WARNING(
+                f"Nenhuma mensagem interpretada nos últimos {metricas['dias']} dia(s)."
+            ))
+            return
+
+        self.stdout.write(f"Últimos {metricas['dias']} dia(s): {total} mensagem(ns) interpretada(s)")
+        self.stdout.write(
+            f"  Local: {metricas['local']} (média {metricas['local_ms_medio']:.1f} ms)"
+        )
+        self.stdout.write(
+            f"  Modelo: {metricas['llm']} (média {metricas['llm_ms_medio']:.0f} ms)"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Taxa de acerto local: {metricas['taxa_acerto']:.1%} | "
+            f"chamadas ao modelo evitadas: {metricas['chamadas_evitadas']} | "
+            f"tempo economizado: {metricas['segundos_economizados']:.1f} s"
+        ))
@@ -0,0 +1,67 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.services.relatorio_pdf import limpar_cache_pdf
+from core.services.tarefas_exportacao import (
+    limpar_expiradas, processar_pendentes, recuperar_interrompidas,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera os arquivos das exportações pendentes (CSV, XLSX e PDF) com um pool '
+        'de threads e apaga as expiradas e os PDFs antigos do cache. Sem --uma-vez, '
+        'fica consultando a fila.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.EXPORTACAO_WORKERS,
+            help='Quantidade de threads (padrão: EXPORTACAO_WORKERS)'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=5,
+            help='Segundos entre consultas à fila quando ela está vazia (padrão: 5)'
+        )
+        parser.add_argument(
+            '--uma-vez',
+            action='store_true',
+            help='Processa o que estiver na fila e termina'
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+
+        try:
+            while True:
+                devolvidas = recuperar_interrompidas()
+                if devolvidas:
+                    self.stdout.write(self.style.WARNING(f'{devolvidas} exportação(ões) interrompida(s) devolvida(s) à fila.'))
+
+                removidas = limpar_expiradas()
+                if removidas:
+                    self.stdout.write(f'{removidas} exportação(ões) expirada(s) removida(s).')
+
+                pdfs = limpar_cache_pdf()
+                if pdfs:
+                    self.stdout.write(f'{pdfs} relatório(s) PDF antigo(s) removido(s) do cache.')
+
+                concluidas = processar_pendentes(workers=workers)
+                for pk in concluidas:
+                    self.stdout.write(f'Exportação ID {pk} concluída.')
+
+                if options['uma_vez']:
+                    break
+                if not concluidas:
+                    time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write('Interrompido.')
+            return
+
+        self.stdout.write(self.style.SUCCESS(f'{len(concluidas)} exportação(ões) concluída(s).'))
@@ -0,0 +1,64 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.models import Casa
+from core.services.resumos import reconstruir_resumos
+
+
+def _inicializar_processo():
+    """Prepara o Django em cada processo do pool (necessário no modo 'spawn')."""
+    django.setup()
+    connections.close_all()
+
+
+def _reconstruir_casa(casa_id):
+    return casa_id, reconstruir_resumos(casa_id)
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o resumo mensal das transações, processando as casas em paralelo'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--casa',
+            type=int,
+            action='append',
+            help='ID da casa a reconstruir (pode ser repetido). Padrão: todas'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Quantidade de processos paralelos (padrão: 1, sem pool)'
+        )
+
+    def handle(self, *args, **options):
+        casas = Casa.objects.order_by('pk')
+        if options['casa']:
+            casas = casas.filter(pk__in=options['casa'])
+        casa_ids = list(casas.values_list('pk', flat=True))
+
+        workers = max(1, options['workers'])
+        total_linhas = 0
+
+        if workers == 1 or len(casa_ids) <= 1:
+            for casa_id in casa_ids:
+                _, linhas = _reconstruir_casa(casa_id)
+                total_linhas += linhas
+                self.stdout.write(f'Casa ID {casa_id}: {linhas} linha(s)')
+        else:
+            # Conexões abertas não podem ser herdadas pelos processos filhos
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_processo) as pool:
+                futuros = [pool.submit(_reconstruir_casa, casa_id) for casa_id in casa_ids]
+                for futuro in as_completed(futuros):
+                    casa_id, linhas = futuro.result()
+                    total_linhas += linhas
+                    self.stdout.write(f'Casa ID {casa_id}: {linhas} linha(s)')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Resumo mensal reconstruído para {len(casa_ids)} casa(s): {total_linhas} linha(s).'
+        ))
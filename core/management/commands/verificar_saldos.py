@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Conta
+from core.services.saldos import verificar_saldos
+
+
+class Command(BaseCommand):
+    help = 'Recalcula os saldos das contas a partir das transações e reporta (ou corrige) divergências'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--corrigir',
+            action='store_true',
+            help='Grava o saldo recalculado nas contas divergentes'
+        )
+        parser.add_argument(
+            '--casa',
+            type=int,
+            help='Limita a verificação às contas de uma casa (ID)'
+        )
+
+    def handle(self, *args, **options):
+        contas = Conta.objects.all()
+        if options['casa']:
+            contas = contas.filter(casa_id=options['casa'])
+
+        divergencias = verificar_saldos(contas, corrigir=options['corrigir'])
+
+        if not divergencias:
+            self.stdout.write(self.style.SUCCESS(f'{contas.count()} conta(s) verificada(s): nenhuma divergência.'))
+            return
+
+        for item in divergencias:
+            self.stdout.write(self.style.WARNING(
+                f"Conta ID {item['conta_id']} ({item['nome']}, casa {item['casa_id']}): "
+                f"materializado R$ {item['materializado']} | recalculado R$ {item['real']} "
+                f"| diferença R$ {item['diferenca']}"
+            ))
+
+        if options['corrigir']:
+            self.stdout.write(self.style.SUCCESS(f'{len(divergencias)} conta(s) corrigida(s).'))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f'{len(divergencias)} conta(s) com divergência. Execute com --corrigir para reparar.'
+            ))
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.2 on 2026-10-17 07:18
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Q, Sum
+
+
+def preencher_saldos(apps, schema_editor):
+    """Calcula o saldo materializado inicial a partir das transações existentes."""
+    Conta = apps.get_model('core', 'Conta')
+    Transacao = apps.get_model('core', 'Transacao')
+
+    totais = Transacao.objects.values('conta_id').annotate(
+        receitas=Sum('valor', filter=Q(tipo='receita')),
+        despesas=Sum('valor', filter=Q(tipo='despesa')),
+    ).order_by()
+
+    for item in totais:
+        saldo = (item['receitas'] or Decimal('0.00')) - (item['despesas'] or Decimal('0.00'))
+        Conta.objects.filter(pk=item['conta_id']).update(saldo_transacoes=saldo)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_meta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conta',
+            name='saldo_transacoes',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Efeito líquido das transações, mantido a cada gravação (ver verificar_saldos)', max_digits=14, verbose_name='Saldo das Transações'),
+        ),
+        migrations.RunPython(preencher_saldos, migrations.RunPython.noop),
+    ]
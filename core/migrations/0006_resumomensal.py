@@ -0,0 +1,65 @@
+# Generated by Django 5.0.2 on 2026-10-17 07:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def preencher_resumos(apps, schema_editor):
+    """Gera o resumo mensal inicial a partir das transações existentes."""
+    ResumoMensal = apps.get_model('core', 'ResumoMensal')
+    Transacao = apps.get_model('core', 'Transacao')
+
+    agregados = Transacao.objects.annotate(mes=TruncMonth('data')).values(
+        'casa_id', 'mes', 'tipo', 'status', 'categoria_id', 'conta_id'
+    ).annotate(soma=Sum('valor'), qtd=Count('id')).order_by()
+
+    ResumoMensal.objects.bulk_create(
+        [
+            ResumoMensal(
+                casa_id=item['casa_id'],
+                mes=item['mes'],
+                tipo=item['tipo'],
+                status=item['status'],
+                categoria_id=item['categoria_id'],
+                conta_id=item['conta_id'],
+                total=item['soma'],
+                quantidade=item['qtd'],
+            )
+            for item in agregados
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_conta_saldo_transacoes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primeiro dia do mês')),
+                ('tipo', models.CharField(choices=[('despesa', 'Despesa'), ('receita', 'Receita')], max_length=10)),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('paga', 'Paga'), ('cancelada', 'Cancelada')], max_length=10)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('quantidade', models.IntegerField(default=0)),
+                ('casa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumos_mensais', to='core.casa')),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumos_mensais', to='core.categoria')),
+                ('conta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumos_mensais', to='core.conta')),
+            ],
+            options={
+                'verbose_name': 'Resumo Mensal',
+                'verbose_name_plural': 'Resumos Mensais',
+                'ordering': ['-mes'],
+                'indexes': [models.Index(fields=['casa', 'status', 'mes'], name='core_resumo_casa_id_8b083c_idx')],
+                'unique_together': {('casa', 'mes', 'tipo', 'status', 'categoria', 'conta')},
+            },
+        ),
+        migrations.RunPython(preencher_resumos, migrations.RunPython.noop),
+    ]
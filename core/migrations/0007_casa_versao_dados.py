@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-17 07:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_resumomensal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='casa',
+            name='versao_dados',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Incrementada a cada gravação de transações, contas, categorias e metas (invalida o cache)', verbose_name='Versão dos Dados'),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.0.2 on 2026-10-17 07:41
+
+import unicodedata
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def normalizar_nome(nome):
+    """Cópia de ``core.services.categorias.normalizar_nome`` na data desta migração."""
+    decomposto = unicodedata.normalize('NFKD', nome or '')
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.casefold().split())
+
+
+def mesclar_duplicadas(apps, schema_editor):
+    """Preenche o nome normalizado e mescla categorias que passam a coincidir."""
+    Categoria = apps.get_model('core', 'Categoria')
+    Meta = apps.get_model('core', 'Meta')
+    ResumoMensal = apps.get_model('core', 'ResumoMensal')
+    Transacao = apps.get_model('core', 'Transacao')
+
+    grupos = {}
+    for categoria in Categoria.objects.order_by('pk'):
+        categoria.nome_normalizado = normalizar_nome(categoria.nome)
+        Categoria.objects.filter(pk=categoria.pk).update(nome_normalizado=categoria.nome_normalizado)
+        chave = (categoria.casa_id, categoria.tipo, categoria.nome_normalizado)
+        grupos.setdefault(chave, []).append(categoria.pk)
+
+    casas_alteradas = set()
+    for (casa_id, _, _), ids in grupos.items():
+        if len(ids) < 2:
+            continue
+        destino, origens = ids[0], ids[1:]
+        Transacao.objects.filter(categoria_id__in=origens).update(categoria_id=destino)
+
+        ocupados = set(Meta.objects.filter(categoria_id=destino).values_list('tipo', 'mes', 'ano'))
+        for meta in Meta.objects.filter(categoria_id__in=origens).order_by('-criada_em'):
+            chave = (meta.tipo, meta.mes, meta.ano)
+            if chave in ocupados:
+                meta.delete()
+            else:
+                ocupados.add(chave)
+                Meta.objects.filter(pk=meta.pk).update(categoria_id=destino)
+
+        Categoria.objects.filter(pk__in=origens).delete()
+        casas_alteradas.add(casa_id)
+
+    # As categorias mescladas têm o mesmo tipo: saldos não mudam, mas o
+    # resumo mensal das casas afetadas precisa ser regerado
+    for casa_id in casas_alteradas:
+        ResumoMensal.objects.filter(casa_id=casa_id).delete()
+        agregados = Transacao.objects.filter(casa_id=casa_id).annotate(mes=TruncMonth('data')).values(
+            'mes', 'tipo', 'status', 'categoria_id', 'conta_id'
+        ).annotate(soma=Sum('valor'), qtd=Count('id')).order_by()
+        ResumoMensal.objects.bulk_create(
+            [
+                ResumoMensal(
+                    casa_id=casa_id,
+                    mes=item['mes'],
+                    tipo=item['tipo'],
+                    status=item['status'],
+                    categoria_id=item['categoria_id'],
+                    conta_id=item['conta_id'],
+                    total=item['soma'],
+                    quantidade=item['qtd'],
+                )
+                for item in agregados
+            ],
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_casa_versao_dados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoria',
+            name='nome_normalizado',
+            field=models.CharField(default='', editable=False, help_text='Nome sem acentos, maiúsculas ou espaços repetidos; único por casa e tipo', max_length=100, verbose_name='Nome Normalizado'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(mesclar_duplicadas, migrations.RunPython.noop),
+    ]
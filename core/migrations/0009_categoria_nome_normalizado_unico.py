@@ -0,0 +1,17 @@
+# Generated by Django 5.0.2 on 2026-10-17 07:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_categoria_nome_normalizado'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='categoria',
+            constraint=models.UniqueConstraint(fields=('casa', 'tipo', 'nome_normalizado'), name='categoria_nome_normalizado_unico'),
+        ),
+    ]
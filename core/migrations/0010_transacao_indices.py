@@ -0,0 +1,25 @@
+# Generated by Django 5.0.2 on 2026-10-17 07:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_categoria_nome_normalizado_unico'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transacao',
+            index=models.Index(fields=['casa', '-data', '-criada_em', '-id'], name='transacao_casa_ordem_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transacao',
+            index=models.Index(fields=['casa', 'tipo', '-data'], name='transacao_casa_tipo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transacao',
+            index=models.Index(condition=models.Q(('status', 'paga')), fields=['casa', 'data', 'tipo', 'valor'], name='transacao_paga_idx'),
+        ),
+    ]
@@ -0,0 +1,123 @@
+# Generated by Django 5.0.2 on 2026-10-17 07:49
+
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def documento_transacao(titulo, observacao, categoria, conta):
+    """Cópia de ``core.services.busca.documento_transacao`` na data desta migração."""
+    texto = ' '.join(parte or '' for parte in (titulo, observacao, categoria, conta))
+    decomposto = unicodedata.normalize('NFKD', texto)
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.casefold().split())
+
+
+SQLITE_FTS = [
+    """
+    CREATE VIRTUAL TABLE core_transacao_fts USING fts5(
+        documento,
+        content='core_transacaobusca',
+        content_rowid='transacao_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER core_transacaobusca_ai AFTER INSERT ON core_transacaobusca BEGIN
+        INSERT INTO core_transacao_fts(rowid, documento) VALUES (new.transacao_id, new.documento);
+    END
+    """,
+    """
+    CREATE TRIGGER core_transacaobusca_ad AFTER DELETE ON core_transacaobusca BEGIN
+        INSERT INTO core_transacao_fts(core_transacao_fts, rowid, documento)
+        VALUES ('delete', old.transacao_id, old.documento);
+    END
+    """,
+    """
+    CREATE TRIGGER core_transacaobusca_au AFTER UPDATE ON core_transacaobusca BEGIN
+        INSERT INTO core_transacao_fts(core_transacao_fts, rowid, documento)
+        VALUES ('delete', old.transacao_id, old.documento);
+        INSERT INTO core_transacao_fts(rowid, documento) VALUES (new.transacao_id, new.documento);
+    END
+    """,
+]
+
+SQLITE_FTS_REVERSO = [
+    'DROP TRIGGER IF EXISTS core_transacaobusca_ai',
+    'DROP TRIGGER IF EXISTS core_transacaobusca_ad',
+    'DROP TRIGGER IF EXISTS core_transacaobusca_au',
+    'DROP TABLE IF EXISTS core_transacao_fts',
+]
+
+POSTGRESQL_GIN = (
+    "CREATE INDEX transacaobusca_documento_gin ON core_transacaobusca "
+    "USING gin (to_tsvector('portuguese', documento))"
+)
+
+
+def _sqlite_tem_fts5(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return any('ENABLE_FTS5' in linha[0] for linha in cursor.fetchall())
+
+
+def criar_indice_textual(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(POSTGRESQL_GIN)
+    elif vendor == 'sqlite' and _sqlite_tem_fts5(schema_editor):
+        for sql in SQLITE_FTS:
+            schema_editor.execute(sql)
+
+
+def remover_indice_textual(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS transacaobusca_documento_gin')
+    elif vendor == 'sqlite':
+        for sql in SQLITE_FTS_REVERSO:
+            schema_editor.execute(sql)
+
+
+def indexar_existentes(apps, schema_editor):
+    Transacao = apps.get_model('core', 'Transacao')
+    TransacaoBusca = apps.get_model('core', 'TransacaoBusca')
+
+    linhas = Transacao.objects.values_list(
+        'id', 'casa_id', 'titulo', 'observacao', 'categoria__nome', 'conta__nome'
+    ).order_by().iterator(chunk_size=2000)
+    lote = []
+    for pk, casa_id, titulo, observacao, categoria, conta in linhas:
+        lote.append(TransacaoBusca(
+            transacao_id=pk, casa_id=casa_id,
+            documento=documento_transacao(titulo, observacao, categoria, conta),
+        ))
+        if len(lote) >= 500:
+            TransacaoBusca.objects.bulk_create(lote)
+            lote = []
+    TransacaoBusca.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_transacao_indices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransacaoBusca',
+            fields=[
+                ('transacao', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='busca', serialize=False, to='core.transacao')),
+                ('documento', models.TextField(blank=True)),
+                ('casa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.casa')),
+            ],
+            options={
+                'verbose_name': 'Documento de Busca',
+                'verbose_name_plural': 'Documentos de Busca',
+            },
+        ),
+        migrations.RunPython(criar_indice_textual, remover_indice_textual),
+        migrations.RunPython(indexar_existentes, migrations.RunPython.noop),
+    ]
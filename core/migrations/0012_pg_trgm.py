@@ -0,0 +1,27 @@
+from django.db import DatabaseError, migrations, transaction
+
+
+def habilitar_pg_trgm(apps, schema_editor):
+    """
+    Tenta habilitar a extensão pg_trgm (usada na correspondência aproximada
+    do chat). Sem permissão para criar extensões, a correspondência passa a
+    ser calculada na aplicação.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except DatabaseError:
+        pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_transacaobusca'),
+    ]
+
+    operations = [
+        migrations.RunPython(habilitar_pg_trgm, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.2 on 2026-10-17 08:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_pg_trgm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Exportacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('formato', models.CharField(choices=[('csv', 'CSV'), ('xlsx', 'Excel (XLSX)'), ('pdf', 'PDF')], max_length=4)),
+                ('parametros', models.JSONField(blank=True, default=dict, help_text='Filtros da lista de transações')),
+                ('chave', models.CharField(help_text='Hash da casa (e versão dos dados), formato e parâmetros; pedidos iguais reaproveitam o arquivo', max_length=64)),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('processando', 'Processando'), ('concluida', 'Concluída'), ('erro', 'Erro')], default='pendente', max_length=12)),
+                ('progresso', models.PositiveSmallIntegerField(default=0, help_text='Percentual concluído')),
+                ('arquivo', models.FileField(blank=True, upload_to='exportacoes/%Y/%m/')),
+                ('erro', models.TextField(blank=True)),
+                ('criada_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciada_em', models.DateTimeField(blank=True, null=True)),
+                ('concluida_em', models.DateTimeField(blank=True, null=True)),
+                ('expira_em', models.DateTimeField(blank=True, null=True)),
+                ('casa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exportacoes', to='core.casa')),
+                ('solicitada_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='exportacoes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Exportação',
+                'verbose_name_plural': 'Exportações',
+                'ordering': ['-criada_em'],
+                'indexes': [models.Index(fields=['casa', 'chave'], name='core_export_casa_id_024239_idx'), models.Index(fields=['status', 'criada_em'], name='core_export_status_a3650f_idx')],
+            },
+        ),
+    ]
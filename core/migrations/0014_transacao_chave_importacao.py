@@ -0,0 +1,22 @@
+# Generated by Django 5.0.2 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_exportacao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transacao',
+            name='chave_importacao',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='transacao',
+            constraint=models.UniqueConstraint(condition=models.Q(('chave_importacao', ''), _negated=True), fields=('casa', 'chave_importacao'), name='transacao_chave_importacao_unica'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.0.2 on 2026-10-17 12:00
+
+import hashlib
+import unicodedata
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def impressao_transacao(data, valor, titulo):
+    """Cópia de ``core.services.duplicatas.impressao_transacao`` na data desta migração."""
+    decomposto = unicodedata.normalize('NFKD', titulo or '')
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    centavos = int((Decimal(str(valor)) * 100).to_integral_value())
+    texto = f"{data.isoformat()}|{centavos}|{' '.join(sem_acentos.casefold().split())}"
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+def preencher_impressoes(apps, schema_editor):
+    """Calcula a impressão digital das transações existentes, em lotes."""
+    Transacao = apps.get_model('core', 'Transacao')
+
+    linhas = Transacao.objects.order_by('pk').values_list('pk', 'data', 'valor', 'titulo')
+    ultimo = 0
+    while True:
+        lote = list(linhas.filter(pk__gt=ultimo)[:1000])
+        if not lote:
+            break
+        ultimo = lote[-1][0]
+        Transacao.objects.bulk_update(
+            [
+                Transacao(pk=pk, impressao=impressao_transacao(data, valor, titulo))
+                for pk, data, valor, titulo in lote
+            ],
+            ['impressao'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_transacao_chave_importacao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transacao',
+            name='impressao',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='transacao',
+            index=models.Index(fields=['casa', 'impressao'], name='transacao_impressao_idx'),
+        ),
+        migrations.RunPython(preencher_impressoes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.2 on 2026-10-17 12:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_transacao_impressao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='casa',
+            name='cota_diaria_tokens',
+            field=models.PositiveIntegerField(blank=True, help_text='Limite diário de tokens da OpenAI no chat; vazio usa LLM_COTA_DIARIA_TOKENS, 0 = sem limite', null=True, verbose_name='Cota Diária de Tokens'),
+        ),
+        migrations.CreateModel(
+            name='UsoLLM',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('operacao', models.CharField(choices=[('chat', 'Interpretação'), ('transcricao', 'Transcrição')], max_length=12)),
+                ('modelo', models.CharField(max_length=100)),
+                ('intent', models.CharField(blank=True, help_text='Intenção da mensagem que originou a chamada', max_length=50)),
+                ('duracao_ms', models.PositiveIntegerField(default=0, help_text='Duração total, incluindo repetições')),
+                ('tokens_prompt', models.PositiveIntegerField(default=0)),
+                ('tokens_prompt_cache', models.PositiveIntegerField(default=0, help_text='Tokens do prompt servidos do cache da OpenAI')),
+                ('tokens_resposta', models.PositiveIntegerField(default=0)),
+                ('tokens_total', models.PositiveIntegerField(default=0)),
+                ('repeticoes', models.PositiveSmallIntegerField(default=0, help_text='Tentativas repetidas após falhas transitórias')),
+                ('sucesso', models.BooleanField(default=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('casa', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='usos_llm', to='core.casa')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='usos_llm', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Uso da OpenAI',
+                'verbose_name_plural': 'Uso da OpenAI',
+                'ordering': ['-criado_em'],
+                'indexes': [models.Index(fields=['casa', 'criado_em'], name='core_usollm_casa_id_b25aa7_idx'), models.Index(fields=['criado_em'], name='core_usollm_criado__95de24_idx')],
+            },
+        ),
+    ]
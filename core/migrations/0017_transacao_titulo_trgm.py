@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+def _pg_trgm_instalada(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def criar_indice_trigramas(apps, schema_editor):
+    """
+    Índice GIN de trigramas do título, usado pela correspondência aproximada
+    do chat. Só existe no PostgreSQL com a extensão pg_trgm (ver 0012).
+    """
+    if schema_editor.connection.vendor != 'postgresql' or not _pg_trgm_instalada(schema_editor):
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS transacao_titulo_trgm ON core_transacao '
+        'USING gin (titulo gin_trgm_ops)'
+    )
+
+
+def remover_indice_trigramas(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS transacao_titulo_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_uso_llm'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice_trigramas, remover_indice_trigramas),
+    ]
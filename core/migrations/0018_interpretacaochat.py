@@ -0,0 +1,29 @@
+# Generated by Django 5.0.2 on 2026-10-17 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_transacao_titulo_trgm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InterpretacaoChat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origem', models.CharField(choices=[('local', 'Interpretador local'), ('llm', 'Modelo')], max_length=5)),
+                ('duracao_ms', models.PositiveIntegerField(default=0)),
+                ('criada_em', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('casa', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='interpretacoes_chat', to='core.casa')),
+            ],
+            options={
+                'verbose_name': 'Interpretação do Chat',
+                'verbose_name_plural': 'Interpretações do Chat',
+                'ordering': ['-criada_em'],
+            },
+        ),
+    ]
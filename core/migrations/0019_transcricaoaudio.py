@@ -0,0 +1,36 @@
+# Generated by Django 5.0.2 on 2026-10-17 12:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_interpretacaochat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranscricaoAudio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64)),
+                ('modelo', models.CharField(max_length=100)),
+                ('texto', models.TextField()),
+                ('criada_em', models.DateTimeField(auto_now_add=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transcricoes_audio', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Transcrição de Áudio',
+                'verbose_name_plural': 'Transcrições de Áudio',
+                'ordering': ['-criada_em'],
+                'indexes': [models.Index(fields=['usuario', 'criada_em'], name='core_transc_usuario_1e06f4_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='transcricaoaudio',
+            constraint=models.UniqueConstraint(fields=('usuario', 'sha256', 'modelo'), name='transcricao_audio_unica'),
+        ),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 5.0.2 on 2026-10-17 12:00
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def normalizar_nome(nome):
+    """Cópia de ``core.services.categorias.normalizar_nome`` na data desta migração."""
+    decomposto = unicodedata.normalize('NFKD', nome or '')
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.casefold().split())
+
+
+# O SQLite recria a tabela ao adicionar a coluna, e os gatilhos do FTS5 (0011) vão junto
+SQLITE_GATILHOS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS core_transacaobusca_ai AFTER INSERT ON core_transacaobusca BEGIN
+        INSERT INTO core_transacao_fts(rowid, documento) VALUES (new.transacao_id, new.documento);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_transacaobusca_ad AFTER DELETE ON core_transacaobusca BEGIN
+        INSERT INTO core_transacao_fts(core_transacao_fts, rowid, documento)
+        VALUES ('delete', old.transacao_id, old.documento);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_transacaobusca_au AFTER UPDATE ON core_transacaobusca BEGIN
+        INSERT INTO core_transacao_fts(core_transacao_fts, rowid, documento)
+        VALUES ('delete', old.transacao_id, old.documento);
+        INSERT INTO core_transacao_fts(rowid, documento) VALUES (new.transacao_id, new.documento);
+    END
+    """,
+]
+
+
+def recriar_gatilhos_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'core_transacao_fts'")
+        if cursor.fetchone() is None:
+            return
+    for sql in SQLITE_GATILHOS:
+        schema_editor.execute(sql)
+
+
+def preencher_titulos(apps, schema_editor):
+    TransacaoBusca = apps.get_model('core', 'TransacaoBusca')
+
+    lote = []
+    for busca in TransacaoBusca.objects.only('pk').annotate(
+        titulo_original=models.F('transacao__titulo')
+    ).order_by().iterator(chunk_size=2000):
+        busca.titulo = normalizar_nome(busca.titulo_original)
+        lote.append(busca)
+        if len(lote) >= 500:
+            TransacaoBusca.objects.bulk_update(lote, ['titulo'])
+            lote = []
+    TransacaoBusca.objects.bulk_update(lote, ['titulo'])
+
+
+def _pg_trgm_instalada(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def mover_indice_trigramas(apps, schema_editor):
+    """
+    O índice GIN de trigramas passa do título original (0017) para o título
+    normalizado, que é o comparado pela correspondência aproximada do chat.
+    """
+    if schema_editor.connection.vendor != 'postgresql' or not _pg_trgm_instalada(schema_editor):
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS transacao_titulo_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS transacaobusca_titulo_trgm ON core_transacaobusca '
+        'USING gin (titulo gin_trgm_ops)'
+    )
+
+
+def restaurar_indice_trigramas(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql' or not _pg_trgm_instalada(schema_editor):
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS transacaobusca_titulo_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS transacao_titulo_trgm ON core_transacao '
+        'USING gin (titulo gin_trgm_ops)'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_transcricaoaudio'),
+    ]
+
+    operations = [
+        # Ao desfazer, a remoção da coluna também recria a tabela: os gatilhos voltam depois dela
+        migrations.RunPython(migrations.RunPython.noop, recriar_gatilhos_fts),
+        migrations.AddField(
+            model_name='transacaobusca',
+            name='titulo',
+            field=models.CharField(blank=True, default='', help_text='Título normalizado (trigramas do chat)', max_length=200),
+        ),
+        migrations.RunPython(recriar_gatilhos_fts, migrations.RunPython.noop),
+        migrations.RunPython(preencher_titulos, migrations.RunPython.noop),
+        migrations.RunPython(mover_indice_trigramas, restaurar_indice_trigramas),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator
 from decimal import Decimal
@@ -45,6 +45,18 @@ class Casa(models.Model):
     nome = models.CharField(max_length=100)
     criada_em = models.DateTimeField(auto_now_add=True)
     codigo_convite = models.CharField(max_length=8, unique=True, blank=True)
+    versao_dados = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Versão dos Dados',
+        help_text='Incrementada a cada gravação de transações, contas, categorias e metas (invalida o cache)'
+    )
+    cota_diaria_tokens = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Cota Diária de Tokens',
+        help_text='Limite diário de tokens da OpenAI no chat; vazio usa LLM_COTA_DIARIA_TOKENS, 0 = sem limite'
+    )
     
     class Meta:
         verbose_name = 'Casa'
@@ -64,6 +76,11 @@ class Casa(models.Model):
                 self.save()
                 return codigo
     
+    @staticmethod
+    def incrementar_versao(casa_id):
+        """Marca os dados da casa como alterados, invalidando o que estiver em cache"""
+        Casa.objects.filter(pk=casa_id).update(versao_dados=models.F('versao_dados') + 1)
+    
     @property
     def tem_vaga(self):
         """Verifica se ainda há vaga na casa (máximo 2 membros)"""
@@ -71,11 +88,53 @@ class Casa(models.Model):
     
     @property
     def saldo_total(self):
-        """Calcula o saldo total de todas as contas"""
-        return sum(conta.saldo_atual for conta in self.contas.all())
+        """Calcula o saldo total de todas as contas com uma única agregação"""
+        return self.contas.aggregate(
+            total=models.Sum(models.F('saldo_inicial') + models.F('saldo_transacoes'))
+        )['total'] or Decimal('0.00')
 
 
-class Conta(models.Model):
+class VersionaCasaMixin:
+    """Incrementa ``Casa.versao_dados`` sempre que o registro é gravado ou excluído"""
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        Casa.incrementar_versao(self.casa_id)
+    
+    def delete(self, *args, **kwargs):
+        casa_id = self.casa_id
+        resultado = super().delete(*args, **kwargs)
+        Casa.incrementar_versao(casa_id)
+        return resultado
+
+
+class IndexaTransacoesMixin:
+    """Regrava o documento de busca das transações quando o ``nome`` do registro muda"""
+    
+    def save(self, *args, **kwargs):
+        nome_anterior = None
+        if self.pk is not None:
+            nome_anterior = type(self)._base_manager.filter(pk=self.pk).values_list('nome', flat=True).first()
+        super().save(*args, **kwargs)
+        if nome_anterior is not None and nome_anterior != self.nome:
+            from core.services.busca import indexar_transacoes
+            indexar_transacoes(self.transacoes.all())
+
+
+class ContaQuerySet(models.QuerySet):
+    """QuerySet de contas com anotações de saldo"""
+    
+    def with_saldo(self):
+        """
+        Anota ``saldo_calculado`` a partir do saldo materializado, sem agregar
+        transações (a conferência com as transações fica em ``verificar_saldos``)
+        """
+        return self.annotate(
+            saldo_calculado=models.F('saldo_inicial') + models.F('saldo_transacoes')
+        )
+
+
+class Conta(VersionaCasaMixin, IndexaTransacoesMixin, models.Model):
     """Modelo de Conta Bancária"""
     TIPO_CHOICES = [
         ('conta_corrente', 'Conta Corrente'),
@@ -93,6 +152,16 @@ class Conta(models.Model):
     cor = models.CharField(max_length=7, default='#007bff', help_text='Cor em hexadecimal')
     ativa = models.BooleanField(default=True)
     criada_em = models.DateTimeField(auto_now_add=True)
+    saldo_transacoes = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        editable=False,
+        verbose_name='Saldo das Transações',
+        help_text='Efeito líquido das transações, mantido a cada gravação (ver verificar_saldos)'
+    )
+    
+    objects = ContaQuerySet.as_manager()
     
     class Meta:
         verbose_name = 'Conta'
@@ -104,15 +173,13 @@ class Conta(models.Model):
     
     @property
     def saldo_atual(self):
-        """Calcula o saldo atual da conta baseado nas transações"""
-        receitas = self.transacoes.filter(tipo='receita').aggregate(
-            total=models.Sum('valor'))['total'] or Decimal('0.00')
-        despesas = self.transacoes.filter(tipo='despesa').aggregate(
-            total=models.Sum('valor'))['total'] or Decimal('0.00')
-        return self.saldo_inicial + receitas - despesas
+        """Saldo atual da conta (anotado por ``with_saldo()`` ou materializado)"""
+        if 'saldo_calculado' in self.__dict__:
+            return self.saldo_calculado
+        return self.saldo_inicial + self.saldo_transacoes
 
 
-class Categoria(models.Model):
+class Categoria(VersionaCasaMixin, IndexaTransacoesMixin, models.Model):
     """Modelo de Categoria de Transação"""
     TIPO_CHOICES = [
         ('despesa', 'Despesa'),
@@ -125,15 +192,32 @@ class Categoria(models.Model):
     icone = models.CharField(max_length=50, default='bi-tag', help_text='Classe do ícone Bootstrap Icons')
     cor = models.CharField(max_length=7, default='#6c757d', help_text='Cor em hexadecimal')
     ativa = models.BooleanField(default=True)
+    nome_normalizado = models.CharField(
+        max_length=100,
+        editable=False,
+        verbose_name='Nome Normalizado',
+        help_text='Nome sem acentos, maiúsculas ou espaços repetidos; único por casa e tipo'
+    )
     
     class Meta:
         verbose_name = 'Categoria'
         verbose_name_plural = 'Categorias'
         ordering = ['tipo', 'nome']
         unique_together = ['casa', 'nome', 'tipo']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['casa', 'tipo', 'nome_normalizado'],
+                name='categoria_nome_normalizado_unico',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.nome} ({self.get_tipo_display()})"
+    
+    def save(self, *args, **kwargs):
+        from core.services.categorias import normalizar_nome
+        self.nome_normalizado = normalizar_nome(self.nome)
+        super().save(*args, **kwargs)
 
 
 class Transacao(models.Model):
@@ -179,6 +263,12 @@ class Transacao(models.Model):
     # Anexos
     comprovante = models.FileField(upload_to='comprovantes/', null=True, blank=True)
     
+    # Impressão digital da linha do extrato de origem (ver core.services.importacao)
+    chave_importacao = models.CharField(max_length=64, blank=True, default='', editable=False)
+    
+    # Data, valor e título normalizado; detecta duplicatas (ver core.services.duplicatas)
+    impressao = models.CharField(max_length=64, blank=True, default='', editable=False)
+    
     criada_em = models.DateTimeField(auto_now_add=True)
     atualizada_em = models.DateTimeField(auto_now=True)
     
@@ -186,14 +276,92 @@ class Transacao(models.Model):
         verbose_name = 'Transação'
         verbose_name_plural = 'Transações'
         ordering = ['-data', '-criada_em']
+        constraints = [
+            # Reimportar o mesmo extrato não duplica transações
+            models.UniqueConstraint(
+                fields=['casa', 'chave_importacao'],
+                condition=~models.Q(chave_importacao=''),
+                name='transacao_chave_importacao_unica',
+            ),
+        ]
+        indexes = [
+            # Lista, transações recentes, paginação por cursor e busca do chat
+            models.Index(fields=['casa', '-data', '-criada_em', '-id'], name='transacao_casa_ordem_idx'),
+            # Filtro por tipo na lista e na busca
+            models.Index(fields=['casa', 'tipo', '-data'], name='transacao_casa_tipo_idx'),
+            # Relatórios: somas das transações pagas por intervalo; inclui
+            # tipo e valor para que a soma seja respondida só pelo índice
+            models.Index(
+                fields=['casa', 'data', 'tipo', 'valor'],
+                condition=models.Q(status='paga'),
+                name='transacao_paga_idx',
+            ),
+            # Verificação de duplicatas na gravação (chat) e no comando deduplicar_transacoes
+            models.Index(fields=['casa', 'impressao'], name='transacao_impressao_idx'),
+        ]
     
     def __str__(self):
         return f"{self.titulo} - R$ {self.valor} ({self.data})"
     
+    # Campos que alimentam os dados derivados (saldo das contas e resumos mensais)
+    CAMPOS_ESTADO = ('casa_id', 'conta_id', 'categoria_id', 'tipo', 'status', 'data', 'valor')
+    
     def save(self, *args, **kwargs):
+        from core.services.busca import indexar_transacoes
+        from core.services.duplicatas import impressao_transacao
         # Garantir que o tipo da transação coincide com o tipo da categoria
         self.tipo = self.categoria.tipo
-        super().save(*args, **kwargs)
+        self.impressao = impressao_transacao(
+            self._meta.get_field('data').to_python(self.data),
+            self._meta.get_field('valor').to_python(self.valor),
+            self.titulo,
+        )
+        with transaction.atomic():
+            anterior = self._estado_gravado()
+            super().save(*args, **kwargs)
+            self._propagar_alteracao(anterior, self._estado())
+            indexar_transacoes([self.pk])
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            anterior = self._estado_gravado()
+            resultado = super().delete(*args, **kwargs)
+            self._propagar_alteracao(anterior, None)
+        return resultado
+    
+    @staticmethod
+    def _propagar_alteracao(anterior, atual):
+        """Atualiza saldos, resumos mensais e a versão da casa com a diferença entre dois estados"""
+        from core.services import resumos, saldos
+        # A versão vem primeiro: o UPDATE trava a linha da casa, que
+        # reconstruir_resumos também trava antes de agregar
+        for casa_id in sorted({estado['casa_id'] for estado in (anterior, atual) if estado}):
+            Casa.incrementar_versao(casa_id)
+        saldos.aplicar_variacao(anterior, atual)
+        resumos.aplicar_variacao(anterior, atual)
+    
+    def _estado(self):
+        """Retorna os campos relevantes do estado em memória"""
+        estado = {campo: getattr(self, campo) for campo in self.CAMPOS_ESTADO}
+        estado['data'] = self._meta.get_field('data').to_python(self.data)
+        estado['valor'] = self._meta.get_field('valor').to_python(self.valor)
+        return estado
+    
+    def _estado_gravado(self):
+        """
+        Retorna os campos relevantes do estado gravado no banco, se existir.
+
+        A linha fica travada até o fim da transação de banco, para que duas
+        edições simultâneas não calculem a diferença a partir do mesmo estado.
+        """
+        if self.pk is None:
+            return None
+        return (
+            Transacao.objects.select_for_update()
+            .filter(pk=self.pk)
+            .values(*self.CAMPOS_ESTADO)
+            .first()
+        )
     
     @property
     def valor_dividido(self):
@@ -204,7 +372,46 @@ class Transacao(models.Model):
         return self.valor
 
 
-class Meta(models.Model):
+class TransacaoBusca(models.Model):
+    """Documento de busca textual de uma transação (ver core.services.busca)"""
+    transacao = models.OneToOneField(Transacao, on_delete=models.CASCADE, primary_key=True, related_name='busca')
+    casa = models.ForeignKey(Casa, on_delete=models.CASCADE, related_name='+')
+    documento = models.TextField(blank=True)
+    titulo = models.CharField(max_length=200, blank=True, default='', help_text='Título normalizado (trigramas do chat)')
+    
+    class Meta:
+        verbose_name = 'Documento de Busca'
+        verbose_name_plural = 'Documentos de Busca'
+    
+    def __str__(self):
+        return f"Busca da transação {self.transacao_id}"
+
+
+class ResumoMensal(models.Model):
+    """Totais mensais pré-agregados das transações, mantidos a cada gravação"""
+    casa = models.ForeignKey(Casa, on_delete=models.CASCADE, related_name='resumos_mensais')
+    mes = models.DateField(help_text='Primeiro dia do mês')
+    tipo = models.CharField(max_length=10, choices=Transacao.TIPO_CHOICES)
+    status = models.CharField(max_length=10, choices=Transacao.STATUS_CHOICES)
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name='resumos_mensais')
+    conta = models.ForeignKey(Conta, on_delete=models.CASCADE, related_name='resumos_mensais')
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantidade = models.IntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Resumo Mensal'
+        verbose_name_plural = 'Resumos Mensais'
+        ordering = ['-mes']
+        unique_together = [['casa', 'mes', 'tipo', 'status', 'categoria', 'conta']]
+        indexes = [
+            models.Index(fields=['casa', 'status', 'mes']),
+        ]
+    
+    def __str__(self):
+        return f"{self.casa} - {self.mes:%m/%Y} - {self.get_tipo_display()} - R$ {self.total}"
+
+
+class Meta(VersionaCasaMixin, models.Model):
     """Modelo para armazenar metas financeiras."""
     
     TIPO_META_CHOICES = [
@@ -320,3 +527,133 @@ class ChatHistory(models.Model):
     def __str__(self):
         return f"{self.usuario.username} - {self.created_at.strftime('%d/%m/%Y %H:%M')}"
 
+
+
+class Exportacao(models.Model):
+    """Arquivo de exportação gerado em segundo plano (ver core.services.tarefas_exportacao)"""
+    FORMATO_CHOICES = [
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel (XLSX)'),
+        ('pdf', 'PDF'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('processando', 'Processando'),
+        ('concluida', 'Concluída'),
+        ('erro', 'Erro'),
+    ]
+    
+    casa = models.ForeignKey(Casa, on_delete=models.CASCADE, related_name='exportacoes')
+    solicitada_por = models.ForeignKey(
+        Usuario, on_delete=models.SET_NULL, null=True, blank=True, related_name='exportacoes'
+    )
+    formato = models.CharField(max_length=4, choices=FORMATO_CHOICES)
+    parametros = models.JSONField(default=dict, blank=True, help_text='Filtros da lista de transações')
+    chave = models.CharField(
+        max_length=64,
+        help_text='Hash da casa (e versão dos dados), formato e parâmetros; pedidos iguais reaproveitam o arquivo'
+    )
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default='pendente')
+    progresso = models.PositiveSmallIntegerField(default=0, help_text='Percentual concluído')
+    arquivo = models.FileField(upload_to='exportacoes/%Y/%m/', blank=True)
+    erro = models.TextField(blank=True)
+    criada_em = models.DateTimeField(auto_now_add=True)
+    iniciada_em = models.DateTimeField(null=True, blank=True)
+    concluida_em = models.DateTimeField(null=True, blank=True)
+    expira_em = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'Exportação'
+        verbose_name_plural = 'Exportações'
+        ordering = ['-criada_em']
+        indexes = [
+            models.Index(fields=['casa', 'chave']),
+            models.Index(fields=['status', 'criada_em']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_formato_display()} - {self.casa.nome} ({self.get_status_display()})"
+
+
+class UsoLLM(models.Model):
+    """Uma chamada à API da OpenAI feita pelo chat: duração, tokens e repetições (ver core.services.uso_llm)"""
+    OPERACAO_CHOICES = [
+        ('chat', 'Interpretação'),
+        ('transcricao', 'Transcrição'),
+    ]
+    
+    casa = models.ForeignKey(Casa, on_delete=models.CASCADE, null=True, blank=True, related_name='usos_llm')
+    usuario = models.ForeignKey(
+        Usuario, on_delete=models.SET_NULL, null=True, blank=True, related_name='usos_llm'
+    )
+    operacao = models.CharField(max_length=12, choices=OPERACAO_CHOICES)
+    modelo = models.CharField(max_length=100)
+    intent = models.CharField(max_length=50, blank=True, help_text='Intenção da mensagem que originou a chamada')
+    duracao_ms = models.PositiveIntegerField(default=0, help_text='Duração total, incluindo repetições')
+    tokens_prompt = models.PositiveIntegerField(default=0)
+    tokens_prompt_cache = models.PositiveIntegerField(default=0, help_text='Tokens do prompt servidos do cache da OpenAI')
+    tokens_resposta = models.PositiveIntegerField(default=0)
+    tokens_total = models.PositiveIntegerField(default=0)
+    repeticoes = models.PositiveSmallIntegerField(default=0, help_text='Tentativas repetidas após falhas transitórias')
+    sucesso = models.BooleanField(default=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Uso da OpenAI'
+        verbose_name_plural = 'Uso da OpenAI'
+        ordering = ['-criado_em']
+        indexes = [
+            models.Index(fields=['casa', 'criado_em']),
+            models.Index(fields=['criado_em']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_operacao_display()} - {self.modelo} ({self.tokens_total} tokens)"
+
+
+class InterpretacaoChat(models.Model):
+    """Uma mensagem do chat interpretada localmente ou pelo modelo (ver core.services.interpretador_local)"""
+    ORIGEM_CHOICES = [
+        ('local', 'Interpretador local'),
+        ('llm', 'Modelo'),
+    ]
+    
+    casa = models.ForeignKey(Casa, on_delete=models.CASCADE, null=True, blank=True, related_name='interpretacoes_chat')
+    origem = models.CharField(max_length=5, choices=ORIGEM_CHOICES)
+    duracao_ms = models.PositiveIntegerField(default=0)
+    criada_em = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        verbose_name = 'Interpretação do Chat'
+        verbose_name_plural = 'Interpretações do Chat'
+        ordering = ['-criada_em']
+    
+    def __str__(self):
+        return f"{self.get_origem_display()} ({self.duracao_ms} ms)"
+
+
+class TranscricaoAudio(models.Model):
+    """Texto de um áudio do chat, reaproveitado quando o mesmo usuário reenvia o mesmo conteúdo (ver core.services.transcricao)"""
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='transcricoes_audio')
+    sha256 = models.CharField(max_length=64)
+    modelo = models.CharField(max_length=100)
+    texto = models.TextField()
+    criada_em = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Transcrição de Áudio'
+        verbose_name_plural = 'Transcrições de Áudio'
+        ordering = ['-criada_em']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['usuario', 'sha256', 'modelo'],
+                name='transcricao_audio_unica',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['usuario', 'criada_em']),
+        ]
+    
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.modelo})"
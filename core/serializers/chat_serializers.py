@@ -19,7 +19,7 @@ class ChatMessageSerializer(serializers.Serializer):
     context = serializers.JSONField(
         required=False,
         allow_null=True,
-        help_text="Histórico de conversa para manter contexto"
+        help_text="Obsoleto e ignorado: o servidor monta o contexto a partir do histórico salvo"
     )
     pending_transaction_id = serializers.IntegerField(
         required=False,
@@ -78,6 +78,11 @@ class ChatResponseSerializer(serializers.Serializer):
         allow_null=True,
         help_text="ID da transação criada/atualizada"
     )
+    possible_duplicate_id = serializers.IntegerField(
+        required=False,
+        allow_null=True,
+        help_text="ID de uma transação igual gravada há pouco (a nova foi salva mesmo assim)"
+    )
     transaction_saved = serializers.BooleanField(
         required=False,
         help_text="Indica se a transação foi salva com sucesso"
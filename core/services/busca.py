@@ -0,0 +1,175 @@
+"""
+Busca textual nas transações.
+
+Cada transação tem uma linha em ``TransacaoBusca`` com o título, a
+observação e os nomes da categoria e da conta já normalizados (sem acentos
+nem maiúsculas, ver ``normalizar_nome``), além do título normalizado sozinho,
+usado pela correspondência por trigramas do chat (``core.services.similaridade``).
+Sobre o documento:
+
+- no PostgreSQL há um índice GIN de ``to_tsvector('portuguese', documento)``,
+  consultado com prefixos (``mercad:*``) e ordenado por ``ts_rank``;
+- no SQLite há uma tabela FTS5 (``core_transacao_fts``) mantida por gatilhos
+  a partir de ``core_transacaobusca`` e ordenada por ``bm25``.
+
+Em outros bancos, ou se o SQLite não tiver FTS5, a busca recai em
+``contains`` (LIKE) sobre o documento normalizado.
+
+A relevância é ponderada pela idade da transação, de modo que, entre
+resultados igualmente relevantes, os mais recentes vêm primeiro.
+``indexar_transacoes`` deve ser chamada sempre que o texto de transações
+mudar por um caminho que não passe por ``Transacao.save()``.
+"""
+import re
+from datetime import date
+from typing import Iterable, List, Optional
+
+from django.db import connection
+from django.db.models import Case, IntegerField, When
+
+from core.services.categorias import normalizar_nome
+
+TABELA_FTS = 'core_transacao_fts'
+CONFIGURACAO_PG = 'portuguese'
+
+# Dias para a relevância de uma transação cair à metade
+MEIA_VIDA_DIAS = 180
+
+
+def documento_transacao(titulo, observacao, categoria, conta) -> str:
+    """Texto normalizado indexado para uma transação."""
+    return normalizar_nome(' '.join(parte or '' for parte in (titulo, observacao, categoria, conta)))
+
+
+def termos_busca(texto: str) -> List[str]:
+    """Palavras da consulta, normalizadas e sem pontuação."""
+    return re.findall(r'\w+', normalizar_nome(texto))
+
+
+def indexar_transacoes(transacoes) -> int:
+    """
+    (Re)grava o documento de busca das transações indicadas.
+
+    ``transacoes`` pode ser um queryset de ``Transacao`` ou uma lista de IDs.
+    O documento é montado com uma única consulta e gravado com um upsert.
+    Retorna a quantidade de transações indexadas.
+    """
+    from core.models import Transacao, TransacaoBusca
+
+    if not hasattr(transacoes, 'values_list'):
+        transacoes = Transacao.objects.filter(pk__in=list(transacoes))
+
+    linhas = transacoes.order_by().values_list(
+        'id', 'casa_id', 'titulo', 'observacao', 'categoria__nome', 'conta__nome'
+    )
+    documentos = [
+        TransacaoBusca(
+            transacao_id=pk, casa_id=casa_id,
+            documento=documento_transacao(titulo, observacao, categoria, conta),
+            titulo=normalizar_nome(titulo),
+        )
+        for pk, casa_id, titulo, observacao, categoria, conta in linhas
+    ]
+    TransacaoBusca.objects.bulk_create(
+        documentos, batch_size=500,
+        update_conflicts=True, unique_fields=['transacao'], update_fields=['casa', 'documento', 'titulo'],
+    )
+    return len(documentos)
+
+
+def fts5_disponivel() -> bool:
+    """Indica se o banco é SQLite com a tabela FTS5 criada pela migração."""
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [TABELA_FTS])
+        return cursor.fetchone() is not None
+
+
+def _ids_postgresql(casa_id: int, termos: List[str], hoje: date, limite: int) -> List[int]:
+    consulta = ' & '.join(f'{termo}:*' for termo in termos)
+    sql = f"""
+        SELECT b.transacao_id
+        FROM core_transacaobusca b
+        JOIN core_transacao t ON t.id = b.transacao_id
+        WHERE b.casa_id = %s
+          AND to_tsvector('{CONFIGURACAO_PG}', b.documento) @@ to_tsquery('{CONFIGURACAO_PG}', %s)
+        ORDER BY ts_rank(to_tsvector('{CONFIGURACAO_PG}', b.documento), to_tsquery('{CONFIGURACAO_PG}', %s))
+                 / (1 + GREATEST(%s::date - t.data, 0) / %s::float) DESC,
+                 t.data DESC, t.id DESC
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [casa_id, consulta, consulta, hoje, MEIA_VIDA_DIAS, limite])
+        return [linha[0] for linha in cursor.fetchall()]
+
+
+def _ids_sqlite(casa_id: int, termos: List[str], hoje: date, limite: int) -> List[int]:
+    # Cada termo entre aspas (sem operadores FTS) e com prefixo; termos separados = AND
+    consulta = ' '.join(f'"{termo}"*' for termo in termos)
+    sql = f"""
+        SELECT t.id
+        FROM {TABELA_FTS} f
+        JOIN core_transacao t ON t.id = f.rowid
+        WHERE {TABELA_FTS} MATCH %s AND t.casa_id = %s
+        ORDER BY -bm25({TABELA_FTS})
+                 / (1 + MAX(julianday(%s) - julianday(t.data), 0) / %s) DESC,
+                 t.data DESC, t.id DESC
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [consulta, casa_id, hoje.isoformat(), MEIA_VIDA_DIAS, limite])
+        return [linha[0] for linha in cursor.fetchall()]
+
+
+def _ids_generico(casa_id: int, termos: List[str], limite: int) -> List[int]:
+    from core.models import TransacaoBusca
+
+    queryset = TransacaoBusca.objects.filter(casa_id=casa_id)
+    for termo in termos:
+        queryset = queryset.filter(documento__contains=termo)
+    return list(
+        queryset.order_by('-transacao__data', '-transacao_id').values_list('transacao_id', flat=True)[:limite]
+    )
+
+
+def buscar_ids(casa, texto: str, hoje: Optional[date] = None, limite: int = 20) -> List[int]:
+    """
+    IDs das transações da casa que contêm todas as palavras de ``texto``
+    (como prefixo), da mais relevante para a menos relevante.
+    """
+    termos = termos_busca(texto)
+    if not termos:
+        return []
+    hoje = hoje or date.today()
+    casa_id = getattr(casa, 'pk', casa)
+
+    if connection.vendor == 'postgresql':
+        return _ids_postgresql(casa_id, termos, hoje, limite)
+    if fts5_disponivel():
+        return _ids_sqlite(casa_id, termos, hoje, limite)
+    return _ids_generico(casa_id, termos, limite)
+
+
+def ordenar_por_ids(queryset, ids: Iterable[int]):
+    """Restringe ``queryset`` aos ``ids`` mantendo a ordem da lista."""
+    ids = list(ids)
+    if not ids:
+        return queryset.none()
+    posicao = Case(*[When(pk=pk, then=i) for i, pk in enumerate(ids)], output_field=IntegerField())
+    return queryset.filter(pk__in=ids).annotate(posicao_busca=posicao).order_by('posicao_busca')
+
+
+def buscar_transacoes(casa, texto: str, hoje: Optional[date] = None, limite: int = 20, queryset=None):
+    """
+    Queryset das transações que casam com ``texto``, ordenado por relevância
+    e data. ``queryset`` permite aplicar filtros adicionais (data, valor...).
+    """
+    from core.models import Transacao
+
+    if queryset is None:
+        return ordenar_por_ids(Transacao.objects.filter(casa=casa), buscar_ids(casa, texto, hoje, limite))
+    # Com filtros extras, busca mais candidatos para não perder resultados
+    # relevantes descartados pelos filtros
+    ids = buscar_ids(casa, texto, hoje, limite=max(limite * 10, 200))
+    return ordenar_por_ids(queryset, ids)[:limite]
@@ -0,0 +1,40 @@
+"""
+Cache por casa dos dados calculados de dashboard e relatórios.
+
+As chaves incluem ``Casa.versao_dados``, incrementada a cada gravação de
+transações, contas, categorias e metas. Depois de uma gravação as entradas
+antigas simplesmente deixam de ser lidas (e expiram pelo timeout), de forma
+que os dados novos aparecem imediatamente sem invalidação explícita.
+"""
+from typing import Any, Callable
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def chave_casa(casa, nome: str, *partes: Any) -> str:
+    """
+    Monta a chave de cache de ``nome`` para a versão atual dos dados da casa.
+
+    ``criada_em`` entra na chave para que uma casa recriada com o mesmo ID
+    não reaproveite entradas de outra.
+    """
+    componentes = [
+        'casa',
+        str(casa.pk),
+        format(casa.criada_em.timestamp(), '.6f'),
+        f'v{casa.versao_dados}',
+        nome,
+        *(str(parte) for parte in partes),
+    ]
+    return ':'.join(componentes)
+
+
+def obter_ou_calcular(casa, nome: str, calcular: Callable[[], Any], *partes: Any) -> Any:
+    """Retorna o valor em cache para a versão atual da casa ou o calcula e grava."""
+    chave = chave_casa(casa, nome, *partes)
+    valor = cache.get(chave)
+    if valor is None:
+        valor = calcular()
+        cache.set(chave, valor, timeout=settings.DADOS_CASA_CACHE_TIMEOUT)
+    return valor
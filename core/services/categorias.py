@@ -0,0 +1,129 @@
+"""
+Nomes canônicos de categorias e mesclagem de duplicatas.
+
+Duas categorias da mesma casa e do mesmo tipo são consideradas a mesma
+quando seus nomes coincidem após ``normalizar_nome`` (sem acentos,
+maiúsculas ou espaços repetidos). ``Categoria.nome_normalizado`` guarda essa
+forma e é único por casa × tipo, de modo que relatórios podem agrupar por
+``categoria_id`` sem somar duplicatas pelo nome.
+"""
+import logging
+import unicodedata
+from typing import Iterable, List
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+
+logger = logging.getLogger(__name__)
+
+
+def normalizar_nome(nome: str) -> str:
+    """Forma canônica de um nome: sem acentos, em minúsculas e com espaços simples."""
+    decomposto = unicodedata.normalize('NFKD', nome or '')
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.casefold().split())
+
+
+def obter_ou_criar_categoria(casa, nome: str, tipo: str, defaults: dict = None):
+    """
+    Busca a categoria pelo nome normalizado e tipo, criando-a se não existir.
+
+    Substitui ``Categoria.objects.get_or_create(casa=..., nome=...)``, que
+    ignorava o tipo e diferenças de acentuação/caixa. Retorna ``(categoria, criada)``.
+    """
+    from core.models import Categoria
+
+    nome = ' '.join((nome or '').split()) or 'Outros'
+    filtro = {'casa': casa, 'tipo': tipo, 'nome_normalizado': normalizar_nome(nome)}
+
+    categoria = Categoria.objects.filter(**filtro).first()
+    if categoria:
+        return categoria, False
+
+    try:
+        with transaction.atomic():
+            return Categoria.objects.create(casa=casa, nome=nome, tipo=tipo, **(defaults or {})), True
+    except IntegrityError:
+        # Outra requisição criou a categoria entre a busca e o INSERT
+        return Categoria.objects.get(**filtro), False
+
+
+def mesclar_categorias(destino, origens: Iterable) -> int:
+    """
+    Move transações e metas das categorias ``origens`` para ``destino`` e as exclui.
+
+    As transações são reatribuídas com um único UPDATE. Como origem e destino
+    têm o mesmo tipo, os saldos das contas não mudam; o resumo mensal é
+    reconstruído ao final. Metas que colidiriam com uma meta já existente
+    no destino (mesmo tipo e mês) são descartadas. Retorna a quantidade de
+    transações reatribuídas.
+    """
+    from core.models import Meta, Transacao
+    from core.services.busca import indexar_transacoes
+    from core.services.resumos import reconstruir_resumos
+
+    origens = [origem for origem in origens if origem.pk != destino.pk]
+    if not origens:
+        return 0
+    for origem in origens:
+        if origem.casa_id != destino.casa_id or origem.tipo != destino.tipo:
+            raise ValueError(
+                f'Categoria ID {origem.pk} não pode ser mesclada em ID {destino.pk}: '
+                f'casa ou tipo diferentes'
+            )
+
+    ids_origem = [origem.pk for origem in origens]
+
+    with transaction.atomic():
+        transacoes = Transacao.objects.filter(categoria_id__in=ids_origem)
+        ids_transacoes = list(transacoes.values_list('id', flat=True))
+        reatribuidas = transacoes.update(categoria=destino)
+
+        ocupados = set(
+            Meta.objects.filter(categoria=destino).values_list('tipo', 'mes', 'ano')
+        )
+        for meta in Meta.objects.filter(categoria_id__in=ids_origem).order_by('-criada_em'):
+            chave = (meta.tipo, meta.mes, meta.ano)
+            if chave in ocupados:
+                meta.delete()
+            else:
+                ocupados.add(chave)
+                Meta.objects.filter(pk=meta.pk).update(categoria=destino)
+
+        for origem in origens:
+            origem.delete()
+
+        reconstruir_resumos(destino.casa_id)
+        indexar_transacoes(ids_transacoes)
+
+    logger.info(
+        f"Categorias {ids_origem} mescladas na categoria ID {destino.pk}: "
+        f"{reatribuidas} transação(ões) reatribuída(s)"
+    )
+    return reatribuidas
+
+
+def grupos_duplicados(categorias) -> List[list]:
+    """
+    Agrupa as categorias de mesmo nome normalizado, casa e tipo.
+
+    Cada grupo é uma lista cuja primeira categoria (a mais antiga) é a que
+    permanece na mesclagem.
+    """
+    from core.models import Categoria
+
+    chaves = categorias.values('casa_id', 'tipo', 'nome_normalizado').annotate(
+        qtd=Count('id')
+    ).filter(qtd__gt=1).order_by()
+
+    grupos = []
+    for chave in chaves:
+        grupo = list(
+            Categoria.objects.filter(
+                casa_id=chave['casa_id'],
+                tipo=chave['tipo'],
+                nome_normalizado=chave['nome_normalizado'],
+            ).order_by('pk')
+        )
+        grupos.append(grupo)
+    return grupos
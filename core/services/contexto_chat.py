@@ -0,0 +1,89 @@
+"""
+Contexto da conversa enviado ao modelo, montado no servidor a partir do
+``ChatHistory``.
+
+Antes o navegador mandava a lista ``context`` que quisesse e ela seguia
+inteira para a OpenAI. Agora o histórico vem do banco (índice
+``usuario, -created_at``), limitado a ``OPENAI_CHAT_MAX_HISTORY`` trocas e a
+um orçamento de ``OPENAI_CHAT_CONTEXT_TOKENS`` tokens. Quando o orçamento
+estoura, as trocas mais antigas são descartadas primeiro.
+
+A contagem de tokens é uma estimativa conservadora (bytes UTF-8 / 4, mais o
+custo fixo de cada mensagem no formato de chat). Assim o módulo não depende
+do tokenizador do modelo, e acentos e emojis não são subestimados.
+"""
+import math
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+# Tokens extras por mensagem no formato de chat (papel e delimitadores)
+TOKENS_POR_MENSAGEM = 4
+BYTES_POR_TOKEN = 4
+
+
+def estimar_tokens(texto: str) -> int:
+    """Estimativa (por excesso) de tokens de ``texto``."""
+    return math.ceil(len((texto or '').encode('utf-8')) / BYTES_POR_TOKEN)
+
+
+def tokens_da_mensagem(mensagem: Dict[str, str]) -> int:
+    return TOKENS_POR_MENSAGEM + estimar_tokens(mensagem.get('content', ''))
+
+
+def _historico(usuario, max_trocas: int):
+    from core.models import ChatHistory
+
+    return (
+        ChatHistory.objects.filter(usuario=usuario)
+        .order_by('-created_at', '-id')
+        .values_list('user_message', 'assistant_response')[:max_trocas]
+    )
+
+
+def _limitar(trocas, limite_tokens: int) -> List[Dict[str, str]]:
+    """
+    Recebe as trocas da mais recente para a mais antiga e devolve as
+    mensagens em ordem cronológica, sem ultrapassar ``limite_tokens``.
+    """
+    selecionadas = []
+    total = 0
+    for user_message, assistant_response in trocas:
+        troca = [
+            {'role': 'user', 'content': user_message},
+            {'role': 'assistant', 'content': assistant_response},
+        ]
+        custo = sum(tokens_da_mensagem(mensagem) for mensagem in troca)
+        if total + custo > limite_tokens:
+            break
+        total += custo
+        selecionadas.append(troca)
+    return [mensagem for troca in reversed(selecionadas) for mensagem in troca]
+
+
+def _limites(max_trocas: Optional[int], limite_tokens: Optional[int]):
+    if max_trocas is None:
+        max_trocas = settings.OPENAI_CHAT_MAX_HISTORY
+    if limite_tokens is None:
+        limite_tokens = settings.OPENAI_CHAT_CONTEXT_TOKENS
+    return max(max_trocas, 0), max(limite_tokens, 0)
+
+
+def montar_contexto(usuario, max_trocas: Optional[int] = None, limite_tokens: Optional[int] = None) -> List[Dict[str, str]]:
+    """
+    Mensagens anteriores do usuário (``role``/``content``), em ordem
+    cronológica e dentro do orçamento. Lista vazia para usuários anônimos.
+    """
+    max_trocas, limite_tokens = _limites(max_trocas, limite_tokens)
+    if not usuario.is_authenticated or not max_trocas:
+        return []
+    return _limitar(_historico(usuario, max_trocas), limite_tokens)
+
+
+async def amontar_contexto(usuario, max_trocas: Optional[int] = None, limite_tokens: Optional[int] = None) -> List[Dict[str, str]]:
+    """Versão assíncrona de ``montar_contexto`` (ORM assíncrono)."""
+    max_trocas, limite_tokens = _limites(max_trocas, limite_tokens)
+    if not usuario.is_authenticated or not max_trocas:
+        return []
+    trocas = [troca async for troca in _historico(usuario, max_trocas)]
+    return _limitar(trocas, limite_tokens)
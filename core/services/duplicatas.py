@@ -0,0 +1,158 @@
+"""
+Impressão digital de transações e detecção de duplicatas.
+
+Duas transações da mesma casa são possíveis duplicatas quando têm a mesma
+data, o mesmo valor (em centavos) e o mesmo título após ``normalizar_nome``.
+``Transacao.impressao`` guarda o SHA-256 dessa forma e é indexado junto com
+a casa, de modo que a verificação no momento da gravação é uma busca no
+índice em vez de uma varredura por valor/data.
+
+Duas compras iguais no mesmo dia são legítimas, então a impressão só serve
+para avisar: o chat grava a transação e aponta a possível duplicata. A única
+união automática é a de uma pendência recente de mesmo valor e data com o
+pagamento dela (``pendente_recente``), qualquer que seja o título.
+"""
+import hashlib
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Exists, Min, OuterRef
+from django.utils import timezone
+
+from core.services.categorias import normalizar_nome
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_LOTE = 1000
+
+# Intervalo em que uma transação igual vinda do chat é apontada como possível
+# duplicata (ou, se pendente, unida ao pagamento)
+JANELA_RECENTE = timedelta(days=2)
+
+
+def impressao_transacao(data, valor, titulo: str) -> str:
+    """SHA-256 de ``data|centavos|título normalizado``; a casa fica no índice."""
+    centavos = int((Decimal(str(valor)) * 100).to_integral_value())
+    texto = f'{data.isoformat()}|{centavos}|{normalizar_nome(titulo)}'
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+def duplicatas(casa, data, valor, titulo: str):
+    """Transações da casa com a mesma impressão digital, das mais antigas às mais novas."""
+    from core.models import Transacao
+
+    return Transacao.objects.filter(
+        casa=casa, impressao=impressao_transacao(data, valor, titulo)
+    ).order_by('criada_em', 'pk')
+
+
+def duplicata_recente(casa, data, valor, titulo: str, janela: timedelta = JANELA_RECENTE):
+    """
+    Transação não cancelada mais recente com a mesma impressão, criada dentro da janela.
+
+    Usada pelo chat depois de criar uma transação, para avisar o usuário de
+    uma possível mensagem repetida; a nova transação é gravada mesmo assim.
+    """
+    return duplicatas(casa, data, valor, titulo).filter(
+        criada_em__gte=timezone.now() - janela
+    ).exclude(status='cancelada').last()
+
+
+def pendente_recente(casa, data, valor, janela: timedelta = JANELA_RECENTE):
+    """
+    Pendência mais recente da casa com o mesmo valor e data, criada dentro da janela.
+
+    Quando o chat registra um pagamento, ele é unido a essa pendência em vez
+    de criar outra linha. O título não entra na comparação: "conta de luz"
+    registrada como pendente e "paguei a Enel" são a mesma transação.
+    """
+    from core.models import Transacao
+
+    return Transacao.objects.filter(
+        casa=casa, valor=Decimal(str(valor)), data=data, status='pendente',
+        criada_em__gte=timezone.now() - janela,
+    ).order_by('-criada_em', '-pk').first()
+
+
+def preencher_impressoes(transacoes, apenas_vazias: bool = True) -> int:
+    """
+    Calcula e grava a impressão digital das transações em lotes.
+
+    A normalização do título é feita em Python (acentos Unicode), então as
+    linhas são lidas por chave primária e gravadas com ``bulk_update``.
+    Retorna a quantidade de transações atualizadas.
+    """
+    from core.models import Transacao
+
+    if apenas_vazias:
+        transacoes = transacoes.filter(impressao='')
+    linhas = transacoes.order_by('pk').values_list('pk', 'data', 'valor', 'titulo', 'impressao')
+
+    atualizadas = 0
+    ultimo = 0
+    while True:
+        lote = list(linhas.filter(pk__gt=ultimo)[:TAMANHO_LOTE])
+        if not lote:
+            break
+        ultimo = lote[-1][0]
+        alteradas = []
+        for pk, data, valor, titulo, atual in lote:
+            impressao = impressao_transacao(data, valor, titulo)
+            if impressao != atual:
+                alteradas.append(Transacao(pk=pk, impressao=impressao))
+        Transacao.objects.bulk_update(alteradas, ['impressao'])
+        atualizadas += len(alteradas)
+    return atualizadas
+
+
+def grupos_duplicados(transacoes):
+    """
+    Agrupa por casa e impressão as transações repetidas.
+
+    Retorna dicionários com ``casa_id``, ``impressao``, ``qtd`` e ``manter``
+    (o ID mais antigo do grupo, que permanece na mesclagem).
+    """
+    return list(
+        transacoes.exclude(impressao='').values('casa_id', 'impressao').annotate(
+            qtd=Count('id'), manter=Min('id')
+        ).filter(qtd__gt=1).order_by('casa_id', 'manter')
+    )
+
+
+def mesclar_duplicadas(transacoes, excluir: bool = False) -> int:
+    """
+    Conta as cópias (transações com a impressão de outra mais antiga) e, com
+    ``excluir=True``, as exclui, mantendo a mais antiga de cada grupo.
+
+    Compras repetidas podem ser legítimas, então por padrão nada é excluído.
+    As cópias são selecionadas com um único ``EXISTS`` correlacionado sobre o
+    índice (casa, impressão) e excluídas em bloco. Como a exclusão em bloco
+    não passa por ``Transacao.delete``, saldos e resumos mensais das casas
+    afetadas são recalculados ao final. Retorna a quantidade de cópias.
+    """
+    from core.models import Conta, Transacao
+    from core.services.resumos import reconstruir_resumos
+    from core.services.saldos import verificar_saldos
+
+    anterior = Transacao.objects.filter(
+        casa_id=OuterRef('casa_id'), impressao=OuterRef('impressao'), pk__lt=OuterRef('pk')
+    )
+    copias = transacoes.exclude(impressao='').filter(Exists(anterior))
+    if not excluir:
+        return copias.count()
+
+    with transaction.atomic():
+        casas = set(copias.values_list('casa_id', flat=True).distinct())
+        if not casas:
+            return 0
+        excluidas = Transacao.objects.filter(pk__in=copias.values('pk')).delete()[1].get(
+            Transacao._meta.label, 0
+        )
+        verificar_saldos(Conta.objects.filter(casa_id__in=casas), corrigir=True)
+        for casa_id in casas:
+            reconstruir_resumos(casa_id)
+
+    logger.info(f"{excluidas} transação(ões) duplicada(s) excluída(s) em {len(casas)} casa(s)")
+    return excluidas
@@ -0,0 +1,172 @@
+"""
+Exportação das transações de uma casa.
+
+As linhas saem de ``values_list`` com os nomes relacionados já unidos na
+consulta e são lidas com ``iterator(chunk_size=...)`` (cursor do lado do
+servidor no PostgreSQL), de modo que uma exportação com dezenas de milhares
+de transações faz uma única consulta e mantém em memória apenas um lote por
+vez. O CSV é gerado direto para um ``StreamingHttpResponse``; a planilha
+XLSX é escrita por um workbook ``write_only`` do openpyxl em um arquivo
+temporário, servido em seguida com ``FileResponse``.
+
+As mesmas funções são usadas pelas exportações em segundo plano
+(ver ``core.services.tarefas_exportacao``) e pelo extrato do relatório em
+PDF (``core.services.relatorio_pdf``).
+"""
+import csv
+from decimal import Decimal
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional, Sequence
+
+from django.db.models import Count, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+
+TAMANHO_LOTE = 2000
+# Linhas de CSV enviadas juntas em cada pedaço da resposta
+LINHAS_POR_BLOCO = 500
+
+CABECALHO = ('Data', 'Tipo', 'Título', 'Categoria', 'Conta', 'Valor', 'Status', 'Pago Por')
+
+_CAMPOS = (
+    'data', 'tipo', 'titulo', 'categoria__nome', 'conta__nome', 'valor', 'status',
+    'pago_por__first_name', 'pago_por__last_name', 'pago_por__username',
+)
+
+
+def linhas_exportacao(transacoes, ao_avancar: Optional[Callable[[int], None]] = None) -> Iterator[tuple]:
+    """
+    Linhas de ``transacoes`` (mais recentes primeiro) como tuplas de valores
+    Python na ordem de ``CABECALHO``. ``ao_avancar``, se informado, recebe a
+    quantidade de linhas lidas ao fim de cada lote.
+    """
+    from core.models import Transacao
+
+    tipos = dict(Transacao.TIPO_CHOICES)
+    status = dict(Transacao.STATUS_CHOICES)
+
+    linhas = transacoes.order_by('-data', '-criada_em', '-id').values_list(*_CAMPOS).iterator(
+        chunk_size=TAMANHO_LOTE
+    )
+    lidas = 0
+    for data, tipo, titulo, categoria, conta, valor, situacao, nome, sobrenome, usuario in linhas:
+        yield (
+            data, tipos.get(tipo, tipo), titulo, categoria, conta, valor,
+            status.get(situacao, situacao), f'{nome} {sobrenome}'.strip() or usuario or '',
+        )
+        lidas += 1
+        if ao_avancar and lidas % TAMANHO_LOTE == 0:
+            ao_avancar(lidas)
+    if ao_avancar:
+        ao_avancar(lidas)
+
+
+class _Eco:
+    """Pseudo-arquivo cujo ``write`` devolve o que recebe, para usar ``csv.writer`` em um gerador."""
+
+    def write(self, valor):
+        return valor
+
+
+def gerar_csv(linhas: Iterable[Sequence], cabecalho: Sequence[str] = CABECALHO) -> Iterator[str]:
+    """
+    Gera o CSV linha a linha: BOM (para o Excel reconhecer UTF-8), cabeçalho
+    e as linhas, com datas em dd/mm/aaaa e valores como ``R$ 1234.56``.
+    """
+    escritor = csv.writer(_Eco())
+    yield '\ufeff' + escritor.writerow(cabecalho)
+    bloco = []
+    for data, tipo, titulo, categoria, conta, valor, status, pago_por in linhas:
+        bloco.append(escritor.writerow([
+            data.strftime('%d/%m/%Y'), tipo, titulo, categoria, conta, f'R$ {valor}', status, pago_por,
+        ]))
+        if len(bloco) >= LINHAS_POR_BLOCO:
+            yield ''.join(bloco)
+            bloco = []
+    if bloco:
+        yield ''.join(bloco)
+
+
+FORMATO_MOEDA = '"R$" #,##0.00;[Red]-"R$" #,##0.00'
+FORMATO_DATA = 'DD/MM/YYYY'
+FORMATO_MES = 'MM/YYYY'
+
+
+def _celulas(planilha, valores, formatos=None, negrito=False):
+    """Linha de ``WriteOnlyCell`` com os formatos numéricos por coluna (índice -> formato)."""
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    linha = []
+    for indice, valor in enumerate(valores):
+        celula = WriteOnlyCell(planilha, value=valor)
+        if formatos and indice in formatos:
+            celula.number_format = formatos[indice]
+        if negrito:
+            celula.font = Font(bold=True)
+        linha.append(celula)
+    return linha
+
+
+def _nova_planilha(workbook, titulo, cabecalho, larguras):
+    from openpyxl.utils import get_column_letter
+
+    planilha = workbook.create_sheet(titulo)
+    # Em modo write_only, larguras e painéis congelados precisam vir antes das linhas
+    for indice, largura in enumerate(larguras, start=1):
+        planilha.column_dimensions[get_column_letter(indice)].width = largura
+    planilha.freeze_panes = 'A2'
+    planilha.append(_celulas(planilha, cabecalho, negrito=True))
+    return planilha
+
+
+def totais_categoria_exportacao(transacoes) -> Iterator[tuple]:
+    """Totais pagos por categoria: (categoria, tipo, quantidade, total)."""
+    from core.models import Transacao
+
+    tipos = dict(Transacao.TIPO_CHOICES)
+    totais = transacoes.filter(status='paga').values(
+        'categoria_id', 'categoria__nome', 'tipo'
+    ).annotate(quantidade=Count('id'), total=Sum('valor')).order_by('tipo', '-total', 'categoria__nome')
+    for item in totais:
+        yield item['categoria__nome'], tipos.get(item['tipo'], item['tipo']), item['quantidade'], item['total']
+
+
+def totais_mensais_exportacao(transacoes) -> Iterator[tuple]:
+    """Totais pagos por mês: (mês, receitas, despesas, saldo)."""
+    zero = Value(Decimal('0.00'))
+    totais = transacoes.filter(status='paga').annotate(mes=TruncMonth('data')).values('mes').annotate(
+        receitas=Coalesce(Sum('valor', filter=Q(tipo='receita')), zero),
+        despesas=Coalesce(Sum('valor', filter=Q(tipo='despesa')), zero),
+    ).order_by('mes')
+    for item in totais:
+        yield item['mes'], item['receitas'], item['despesas'], item['receitas'] - item['despesas']
+
+
+def gerar_xlsx(transacoes, arquivo: BinaryIO, ao_avancar: Optional[Callable[[int], None]] = None) -> None:
+    """
+    Escreve em ``arquivo`` uma planilha com as abas Transações, Por categoria
+    e Por mês. Datas e valores vão como células tipadas (data e número com
+    formato de moeda), para que o Excel possa somar e filtrar sem conversão.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+
+    planilha = _nova_planilha(workbook, 'Transações', CABECALHO, (12, 10, 40, 20, 20, 14, 12, 20))
+    formatos = {0: FORMATO_DATA, 5: FORMATO_MOEDA}
+    for linha in linhas_exportacao(transacoes, ao_avancar):
+        planilha.append(_celulas(planilha, linha, formatos))
+
+    planilha = _nova_planilha(
+        workbook, 'Por categoria', ('Categoria', 'Tipo', 'Transações', 'Total pago'), (25, 10, 12, 16)
+    )
+    for linha in totais_categoria_exportacao(transacoes):
+        planilha.append(_celulas(planilha, linha, {3: FORMATO_MOEDA}))
+
+    planilha = _nova_planilha(
+        workbook, 'Por mês', ('Mês', 'Receitas', 'Despesas', 'Saldo'), (10, 16, 16, 16)
+    )
+    for linha in totais_mensais_exportacao(transacoes):
+        planilha.append(_celulas(planilha, linha, {0: FORMATO_MES, 1: FORMATO_MOEDA, 2: FORMATO_MOEDA, 3: FORMATO_MOEDA}))
+
+    workbook.save(arquivo)
+
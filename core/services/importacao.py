@@ -0,0 +1,395 @@
+"""
+Importação de extratos bancários (OFX e CSV).
+
+Os arquivos são lidos em fluxo: o OFX é tokenizado em blocos de texto (vale
+tanto para o SGML das versões 1.x, sem tags de fechamento, quanto para o
+XML das 2.x) e o CSV é lido linha a linha conforme um ``LayoutCsv``. Cada
+linha vira uma ``LinhaExtrato`` com o valor assinado (negativo = despesa).
+
+A gravação usa ``bulk_create`` em lotes dentro de uma única transação de
+banco. Categorias e contas são resolvidas por dicionários montados com uma
+consulta por casa; sem categoria no arquivo, vale a da última transação com
+o mesmo título e, por fim, "Outros". Como ``bulk_create`` não passa pelo
+``save()``, saldos, resumo mensal e índice de busca são atualizados ao final.
+
+Cada transação importada guarda em ``Transacao.chave_importacao`` uma
+impressão digital da linha de origem (o FITID no OFX; data, valor,
+descrição e ordem da repetição no CSV), única por casa: reimportar o mesmo
+extrato, ou um que se sobreponha a outro, não duplica lançamentos.
+"""
+import codecs
+import csv
+import hashlib
+import html
+import io
+import logging
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import F
+
+from core.services.categorias import normalizar_nome, obter_ou_criar_categoria
+from core.services.duplicatas import impressao_transacao
+
+logger = logging.getLogger(__name__)
+
+# Transações gravadas por INSERT
+TAMANHO_LOTE = 1000
+# Bytes lidos do arquivo OFX por vez
+TAMANHO_BLOCO_OFX = 64 * 1024
+
+CATEGORIA_PADRAO = 'Outros'
+VALOR_MAXIMO = Decimal('9999999999.99')
+
+
+class ErroImportacao(Exception):
+    """Arquivo ou linha do extrato que não pode ser importado"""
+    pass
+
+
+@dataclass(frozen=True)
+class LayoutCsv:
+    """Colunas (pelo nome no cabeçalho) e formatos de um CSV de extrato."""
+    nome: str
+    data: str = 'Data'
+    descricao: str = 'Descrição'
+    valor: str = 'Valor'
+    # Colunas opcionais: usadas apenas se existirem no cabeçalho
+    categoria: Optional[str] = 'Categoria'
+    conta: Optional[str] = 'Conta'
+    delimitador: str = ';'
+    formato_data: str = '%d/%m/%Y'
+    separador_decimal: str = ','
+    # Faturas de cartão trazem as compras com valor positivo
+    despesa_positiva: bool = False
+    codificacao: str = 'utf-8-sig'
+
+
+LAYOUTS_CSV = {
+    'padrao': LayoutCsv('CSV padrão (Data;Descrição;Valor)'),
+    'nubank_conta': LayoutCsv(
+        'Nubank - conta', descricao='Descrição', delimitador=',', separador_decimal='.',
+    ),
+    'nubank_cartao': LayoutCsv(
+        'Nubank - cartão', data='date', descricao='title', valor='amount', categoria='category',
+        delimitador=',', formato_data='%Y-%m-%d', separador_decimal='.', despesa_positiva=True,
+    ),
+}
+
+
+@dataclass
+class LinhaExtrato:
+    numero: int
+    data: date
+    descricao: str
+    valor: Decimal
+    categoria: str = ''
+    conta: str = ''
+    # Identificador da linha no banco (FITID do OFX), quando houver
+    id_externo: str = ''
+
+
+@dataclass
+class ResultadoImportacao:
+    lidas: int = 0
+    importadas: int = 0
+    duplicadas: int = 0
+    ignoradas: int = 0
+    categorias_criadas: List[str] = field(default_factory=list)
+
+
+def converter_valor(texto: str, separador_decimal: str = ',') -> Decimal:
+    """Converte ``1.234,56``, ``-R$ 10,00`` ou ``1234.56`` (conforme o separador) em ``Decimal``."""
+    texto = re.sub(r'[^\d,.\-+]', '', texto or '')
+    if separador_decimal == ',':
+        texto = texto.replace('.', '').replace(',', '.')
+    else:
+        texto = texto.replace(',', '')
+    try:
+        return Decimal(texto)
+    except InvalidOperation:
+        raise ErroImportacao(f'valor inválido: "{texto}"')
+
+
+# ---------------------------------------------------------------------------
+# CSV
+# ---------------------------------------------------------------------------
+
+def ler_csv(arquivo: BinaryIO, layout: LayoutCsv) -> Iterator[LinhaExtrato]:
+    """Linhas de um CSV de extrato, lidas uma a uma."""
+    texto = io.TextIOWrapper(arquivo, encoding=layout.codificacao, errors='replace', newline='')
+    leitor = csv.reader(texto, delimiter=layout.delimitador)
+
+    cabecalho = next(leitor, None)
+    if not cabecalho:
+        raise ErroImportacao('Arquivo CSV vazio.')
+    posicoes = {normalizar_nome(coluna): indice for indice, coluna in enumerate(cabecalho)}
+
+    def posicao(coluna, obrigatoria=True):
+        indice = posicoes.get(normalizar_nome(coluna)) if coluna else None
+        if indice is None and obrigatoria:
+            raise ErroImportacao(f'Coluna "{coluna}" não encontrada no cabeçalho do CSV.')
+        return indice
+
+    col_data, col_descricao, col_valor = posicao(layout.data), posicao(layout.descricao), posicao(layout.valor)
+    col_categoria, col_conta = posicao(layout.categoria, False), posicao(layout.conta, False)
+    sinal = -1 if layout.despesa_positiva else 1
+
+    for numero, colunas in enumerate(leitor, start=2):
+        if not any(valor.strip() for valor in colunas):
+            continue
+        try:
+            linha = LinhaExtrato(
+                numero=numero,
+                data=datetime.strptime(colunas[col_data].strip(), layout.formato_data).date(),
+                descricao=colunas[col_descricao].strip(),
+                valor=sinal * converter_valor(colunas[col_valor], layout.separador_decimal),
+            )
+            if col_categoria is not None:
+                linha.categoria = colunas[col_categoria].strip()
+            if col_conta is not None:
+                linha.conta = colunas[col_conta].strip()
+        except IndexError:
+            raise ErroImportacao(f'Linha {numero}: quantidade de colunas diferente do cabeçalho.')
+        except ValueError:
+            raise ErroImportacao(
+                f'Linha {numero}: data "{colunas[col_data]}" fora do formato {layout.formato_data}.'
+            )
+        except ErroImportacao as e:
+            raise ErroImportacao(f'Linha {numero}: {e}')
+        yield linha
+
+
+# ---------------------------------------------------------------------------
+# OFX
+# ---------------------------------------------------------------------------
+
+_TAG_OFX = re.compile(r'<(/?)([A-Za-z0-9.]+)[^>]*>([^<]*)')
+
+
+def _codificacao_ofx(inicio: bytes) -> str:
+    cabecalho = inicio.upper()
+    if b'CHARSET:1252' in cabecalho or b'WINDOWS-1252' in cabecalho:
+        return 'cp1252'
+    if b'ISO-8859-1' in cabecalho or b'CHARSET:8859-1' in cabecalho:
+        return 'latin-1'
+    return 'utf-8'
+
+
+def _tags_ofx(arquivo: BinaryIO) -> Iterator[Tuple[bool, str, str]]:
+    """``(fechamento, tag, texto)`` de cada tag do arquivo, lido em blocos."""
+    bloco = arquivo.read(TAMANHO_BLOCO_OFX)
+    decodificador = codecs.getincrementaldecoder(_codificacao_ofx(bloco[:1024]))(errors='replace')
+    pendente = ''
+    while bloco:
+        pendente += decodificador.decode(bloco)
+        # Processa até a última tag completa; o resto aguarda o próximo bloco
+        corte = pendente.rfind('<')
+        if corte <= 0:
+            bloco = arquivo.read(TAMANHO_BLOCO_OFX)
+            continue
+        for fechamento, tag, texto in _TAG_OFX.findall(pendente[:corte]):
+            yield fechamento == '/', tag.upper(), texto
+        pendente = pendente[corte:]
+        bloco = arquivo.read(TAMANHO_BLOCO_OFX)
+    pendente += decodificador.decode(b'', final=True)
+    for fechamento, tag, texto in _TAG_OFX.findall(pendente):
+        yield fechamento == '/', tag.upper(), texto
+
+
+def ler_ofx(arquivo: BinaryIO) -> Iterator[LinhaExtrato]:
+    """Lançamentos (``<STMTTRN>``) de um arquivo OFX, lidos em fluxo."""
+    conta_banco = ''
+    atual = None
+    quantidade = 0
+    for fechamento, tag, texto in _tags_ofx(arquivo):
+        texto = html.unescape(texto.strip())
+        if tag == 'STMTTRN':
+            if not fechamento:
+                atual = {}
+                continue
+            if atual is not None:
+                quantidade += 1
+                yield _linha_ofx(quantidade, atual, conta_banco)
+            atual = None
+        elif fechamento or not texto:
+            continue
+        elif atual is not None:
+            atual[tag] = texto
+        elif tag == 'ACCTID':
+            conta_banco = texto
+    if atual is not None:
+        # SGML sem o fechamento do último lançamento
+        yield _linha_ofx(quantidade + 1, atual, conta_banco)
+
+
+def _linha_ofx(numero: int, campos: Dict[str, str], conta_banco: str) -> LinhaExtrato:
+    try:
+        data = datetime.strptime(campos['DTPOSTED'][:8], '%Y%m%d').date()
+        valor = converter_valor(campos['TRNAMT'], ',' if ',' in campos['TRNAMT'] else '.')
+    except (KeyError, ValueError, ErroImportacao):
+        raise ErroImportacao(f'Lançamento {numero} do OFX sem data ou valor válidos.')
+    nome, memo = campos.get('NAME', ''), campos.get('MEMO', '')
+    descricao = memo if not nome or nome in memo else f'{nome} - {memo}' if memo else nome
+    fitid = campos.get('FITID', '')
+    return LinhaExtrato(
+        numero=numero, data=data, descricao=descricao or 'Lançamento importado', valor=valor,
+        id_externo=f'{conta_banco}:{fitid}' if fitid else '',
+    )
+
+
+# ---------------------------------------------------------------------------
+# Gravação
+# ---------------------------------------------------------------------------
+
+class _Resolvedor:
+    """Categorias e contas da casa em memória, consultadas uma vez por importação."""
+
+    def __init__(self, casa, conta_padrao, resultado: ResultadoImportacao):
+        from core.models import Categoria, Conta, Transacao
+
+        self.casa = casa
+        self.conta_padrao = conta_padrao
+        self.resultado = resultado
+        self.categorias = {
+            (tipo, nome): pk
+            for pk, tipo, nome in Categoria.objects.filter(casa=casa).values_list('pk', 'tipo', 'nome_normalizado')
+        }
+        self.contas = {
+            normalizar_nome(nome): pk for pk, nome in Conta.objects.filter(casa=casa).values_list('pk', 'nome')
+        }
+        # Categoria mais recente usada para cada título
+        self.por_titulo = {
+            (tipo, normalizar_nome(titulo)): categoria_id
+            for titulo, tipo, categoria_id in Transacao.objects.filter(casa=casa).order_by(
+                'data', 'id'
+            ).values_list('titulo', 'tipo', 'categoria_id').iterator(chunk_size=2000)
+        }
+
+    def categoria(self, linha: LinhaExtrato, tipo: str) -> int:
+        nome = linha.categoria or CATEGORIA_PADRAO
+        if not linha.categoria:
+            categoria_id = self.por_titulo.get((tipo, normalizar_nome(linha.descricao)))
+            if categoria_id:
+                return categoria_id
+
+        chave = (tipo, normalizar_nome(nome))
+        if chave not in self.categorias:
+            categoria, criada = obter_ou_criar_categoria(self.casa, nome, tipo)
+            self.categorias[chave] = categoria.pk
+            if criada:
+                self.resultado.categorias_criadas.append(categoria.nome)
+        return self.categorias[chave]
+
+    def conta(self, linha: LinhaExtrato) -> int:
+        if not linha.conta:
+            return self.conta_padrao.pk
+        conta_id = self.contas.get(normalizar_nome(linha.conta))
+        if conta_id is None:
+            raise ErroImportacao(f'Linha {linha.numero}: conta "{linha.conta}" não encontrada.')
+        return conta_id
+
+
+def chave_importacao(conta_id: int, linha: LinhaExtrato, ocorrencia: int) -> str:
+    """Impressão digital da linha: FITID quando existe, senão conteúdo e ordem da repetição."""
+    if linha.id_externo:
+        conteudo = f'id|{conta_id}|{linha.id_externo}'
+    else:
+        centavos = int(linha.valor * 100)
+        conteudo = f'csv|{conta_id}|{linha.data.isoformat()}|{centavos}|{normalizar_nome(linha.descricao)}|{ocorrencia}'
+    return hashlib.sha256(conteudo.encode()).hexdigest()
+
+
+def _lotes(itens: Iterable, tamanho: int) -> Iterator[list]:
+    lote = []
+    for item in itens:
+        lote.append(item)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def importar_extrato(casa, usuario, linhas: Iterable[LinhaExtrato], conta, status: str = 'paga') -> ResultadoImportacao:
+    """
+    Grava as ``linhas`` como transações da casa, na ``conta`` informada (ou
+    na indicada pela linha). Tudo ocorre em uma transação de banco: um erro
+    em qualquer linha desfaz a importação inteira.
+    """
+    from core.models import Conta, Transacao
+    from core.services.busca import indexar_transacoes
+    from core.services.resumos import reconstruir_resumos
+    from core.services.saldos import efeito_no_saldo
+
+    resultado = ResultadoImportacao()
+    ocorrencias = defaultdict(int)
+    efeitos = defaultdict(Decimal)
+
+    with transaction.atomic():
+        resolvedor = _Resolvedor(casa, conta, resultado)
+
+        for lote in _lotes(linhas, TAMANHO_LOTE):
+            novas = {}
+            for linha in lote:
+                resultado.lidas += 1
+                valor = abs(linha.valor).quantize(Decimal('0.01'))
+                if not valor:
+                    resultado.ignoradas += 1
+                    continue
+                if valor > VALOR_MAXIMO:
+                    raise ErroImportacao(f'Linha {linha.numero}: valor {linha.valor} acima do permitido.')
+
+                tipo = 'despesa' if linha.valor < 0 else 'receita'
+                conta_id = resolvedor.conta(linha)
+                base = (conta_id, linha.data, linha.valor, normalizar_nome(linha.descricao))
+                ocorrencias[base] += 1
+                chave = chave_importacao(conta_id, linha, ocorrencias[base])
+                if chave in novas:
+                    resultado.duplicadas += 1
+                    continue
+                titulo = (linha.descricao or 'Lançamento importado')[:200]
+                novas[chave] = Transacao(
+                    casa=casa, conta_id=conta_id, categoria_id=resolvedor.categoria(linha, tipo),
+                    tipo=tipo, titulo=titulo, valor=valor,
+                    data=linha.data, status=status, pago_por=usuario, chave_importacao=chave,
+                    impressao=impressao_transacao(linha.data, valor, titulo),
+                )
+
+            existentes = set(Transacao.objects.filter(
+                casa=casa, chave_importacao__in=list(novas)
+            ).values_list('chave_importacao', flat=True))
+            resultado.duplicadas += len(existentes)
+            gravar = [transacao for chave, transacao in novas.items() if chave not in existentes]
+            if not gravar:
+                continue
+
+            Transacao.objects.bulk_create(gravar, batch_size=TAMANHO_LOTE)
+            ids = [transacao.pk for transacao in gravar]
+            if None in ids:
+                # Bancos sem RETURNING no INSERT em massa
+                ids = list(Transacao.objects.filter(
+                    casa=casa, chave_importacao__in=[t.chave_importacao for t in gravar]
+                ).values_list('pk', flat=True))
+            indexar_transacoes(ids)
+
+            for transacao in gravar:
+                efeitos[transacao.conta_id] += efeito_no_saldo(transacao.tipo, transacao.valor)
+            resultado.importadas += len(gravar)
+
+        if resultado.importadas:
+            for conta_id, efeito in efeitos.items():
+                if efeito:
+                    Conta.objects.filter(pk=conta_id).update(saldo_transacoes=F('saldo_transacoes') + efeito)
+            reconstruir_resumos(casa.pk)
+
+    logger.info(
+        f"Extrato importado na casa ID {casa.pk}: {resultado.importadas} nova(s), "
+        f"{resultado.duplicadas} duplicada(s), {resultado.ignoradas} ignorada(s)"
+    )
+    return resultado
@@ -0,0 +1,333 @@
+"""
+Interpretação local (sem LLM) das mensagens mais comuns do chat.
+
+Boa parte do tráfego são frases curtas como "gastei 50 no mercado",
+"recebi 3000 de salário" ou "quanto gastei este mês", e cada uma pagava uma
+chamada completa ao modelo. Aqui essas frases são reconhecidas por uma
+gramática fechada em português (verbo, valor, descrição, hoje/ontem) e pelos
+nomes de categorias e contas já cadastrados na casa, produzindo o mesmo
+dicionário estruturado que ``OpenAIClient.parse_user_message`` devolve.
+
+O reconhecimento é conservador: qualquer coisa fora da gramática, mais de um
+valor, categoria desconhecida ou ambígua, ou uma pergunta pendente do
+assistente no histórico devolve ``None`` e a mensagem segue para o modelo.
+
+Cada mensagem interpretada grava em ``InterpretacaoChat`` a origem (local ou
+modelo) e o tempo gasto, no banco para que todos os processos web e o
+comando ``metricas_chat`` vejam os mesmos números; ``metricas_interpretador``
+resume a taxa de acerto e a economia estimada.
+"""
+import re
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from core.services.cache_casa import obter_ou_calcular
+from core.services.categorias import normalizar_nome
+
+VERBOS = {
+    'gastei': 'despesa',
+    'paguei': 'despesa',
+    'comprei': 'despesa',
+    'recebi': 'receita',
+    'ganhei': 'receita',
+}
+DIAS_RELATIVOS = {'hoje': 0, 'ontem': 1, 'anteontem': 2}
+
+# Palavras frequentes nas descrições e a categoria padrão (do seed_data) que
+# elas indicam; só valem se a casa tiver a categoria cadastrada
+PALAVRAS_CATEGORIA = {
+    'mercado': 'Alimentação',
+    'supermercado': 'Alimentação',
+    'padaria': 'Alimentação',
+    'restaurante': 'Alimentação',
+    'lanche': 'Alimentação',
+    'almoco': 'Alimentação',
+    'jantar': 'Alimentação',
+    'ifood': 'Alimentação',
+    'acougue': 'Alimentação',
+    'feira': 'Alimentação',
+    'uber': 'Transporte',
+    'taxi': 'Transporte',
+    'onibus': 'Transporte',
+    'metro': 'Transporte',
+    'gasolina': 'Transporte',
+    'combustivel': 'Transporte',
+    'estacionamento': 'Transporte',
+    'aluguel': 'Moradia',
+    'condominio': 'Moradia',
+    'luz': 'Moradia',
+    'agua': 'Moradia',
+    'gas': 'Moradia',
+    'farmacia': 'Saúde',
+    'remedio': 'Saúde',
+    'medico': 'Saúde',
+    'consulta': 'Saúde',
+    'escola': 'Educação',
+    'faculdade': 'Educação',
+    'curso': 'Educação',
+    'livro': 'Educação',
+    'cinema': 'Lazer',
+    'bar': 'Lazer',
+    'roupa': 'Vestuário',
+    'roupas': 'Vestuário',
+    'tenis': 'Vestuário',
+    'internet': 'Telefone/Internet',
+    'celular': 'Telefone/Internet',
+    'salario': 'Salário',
+    'freela': 'Freelance',
+    'freelance': 'Freelance',
+    'dividendos': 'Investimentos',
+    'rendimento': 'Investimentos',
+}
+
+# Preposições que ligam o valor à descrição ("no mercado") e a descrição à conta ("no nubank")
+PREPOSICOES = r'(?:no|na|nos|nas|em|de|do|da|dos|das|com|pro|pra|para|pelo|pela)'
+PREPOSICOES_CONTA = {'no', 'na', 'com', 'pelo', 'pela', 'via'}
+ARTIGOS = {'o', 'a'}
+MAX_PALAVRAS_DESCRICAO = 4
+
+VALOR = (
+    r'(?:r\$\s*)?'
+    r'(?P<valor>\d{1,3}(?:\.\d{3})+(?:,\d{1,2})?|\d+(?:[.,]\d{1,2})?)'
+    r'(?:\s*(?:reais|real|contos?))?'
+)
+QUANDO = r'(?P<{nome}>hoje|ontem|anteontem)'
+
+RE_TRANSACAO = re.compile(
+    r'^(?:' + QUANDO.format(nome='quando_antes') + r',?\s+)?(?:eu\s+)?'
+    r'(?P<verbo>' + '|'.join(VERBOS) + r')\s+' + VALOR +
+    r'\s+' + PREPOSICOES + r'\s+(?P<descricao>[^\W\d_]+(?:\s+[^\W\d_]+)*?)'
+    r'(?:,?\s+' + QUANDO.format(nome='quando_depois') + r')?$'
+)
+RE_CONSULTA = re.compile(
+    r'^quanto\s+(?:eu\s+)?(?P<verbo>gastei|recebi|ganhei)'
+    r'(?:\s+(?:com|de|em)\s+(?P<categoria>[^\W\d_]+(?:\s+[^\W\d_]+)*?))?'
+    r'(?:\s+(?P<periodo>hoje|ontem|(?:n?este|n?esse|no)\s+m[eê]s|(?:no\s+)?m[eê]s\s+passado))?$'
+)
+
+# "Hoje", "ontem" e "anteontem" e a janela das métricas seguem o dia de Brasília
+def _hoje() -> date:
+    return datetime.now(ZoneInfo('America/Sao_Paulo')).date()
+
+
+def _limpar(mensagem: str) -> str:
+    """Minúsculas, espaços simples e sem pontuação final (acentos preservados para o título)."""
+    return ' '.join((mensagem or '').lower().split()).rstrip(' .!?')
+
+
+def _valor(texto: str) -> Optional[Decimal]:
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    elif re.fullmatch(r'\d{1,3}(?:\.\d{3})+', texto):
+        texto = texto.replace('.', '')
+    try:
+        valor = Decimal(texto)
+    except InvalidOperation:
+        return None
+    return valor if valor > 0 else None
+
+
+def _vocabulario(casa) -> Dict[str, list]:
+    """Categorias e contas ativas da casa, em cache pela versão dos dados."""
+    from core.models import Categoria, Conta
+
+    def calcular():
+        return {
+            'categorias': [
+                (nome, normalizado or normalizar_nome(nome), tipo)
+                for nome, normalizado, tipo in Categoria.objects.filter(casa=casa, ativa=True)
+                .values_list('nome', 'nome_normalizado', 'tipo')
+            ],
+            'contas': [
+                (nome, normalizar_nome(nome))
+                for nome in Conta.objects.filter(casa=casa, ativa=True).values_list('nome', flat=True)
+            ],
+        }
+
+    return obter_ou_calcular(casa, 'vocabulario_chat', calcular)
+
+
+def _categoria(palavras: List[str], tipo: str, categorias: list) -> Optional[str]:
+    """
+    Categoria da casa indicada pelas palavras da descrição: pelo nome (ou
+    parte dele) ou por ``PALAVRAS_CATEGORIA``. ``None`` se nenhuma ou mais de uma.
+    """
+    normalizadas = [normalizar_nome(palavra) for palavra in palavras]
+    frase = ' '.join(normalizadas)
+    encontradas = set()
+    for nome, normalizado, tipo_categoria in categorias:
+        if tipo_categoria != tipo:
+            continue
+        partes = {parte for parte in re.findall(r'[^\W\d_]+', normalizado) if len(parte) >= 4}
+        if normalizado == frase or partes & set(normalizadas):
+            encontradas.add(nome)
+        else:
+            padroes = {PALAVRAS_CATEGORIA.get(palavra) for palavra in normalizadas}
+            if normalizado in {normalizar_nome(padrao) for padrao in padroes if padrao}:
+                encontradas.add(nome)
+    return encontradas.pop() if len(encontradas) == 1 else None
+
+
+def _separar_conta(palavras: List[str], contas: list) -> Tuple[List[str], Optional[str]]:
+    """Remove do fim da descrição um "no/com o <conta>" de conta conhecida."""
+    por_nome = {normalizado: nome for nome, normalizado in contas}
+    for tamanho in range(len(palavras) - 1, 0, -1):
+        nome = por_nome.get(normalizar_nome(' '.join(palavras[-tamanho:])))
+        if not nome:
+            continue
+        resto = palavras[:-tamanho]
+        if len(resto) >= 2 and resto[-1] in ARTIGOS:
+            resto = resto[:-1]
+        if len(resto) >= 2 and resto[-1] in PREPOSICOES_CONTA:
+            return resto[:-1], nome
+    return palavras, None
+
+
+def _aguarda_resposta(contexto) -> bool:
+    """True se a última fala do assistente no histórico foi uma pergunta."""
+    for item in reversed(contexto or []):
+        if isinstance(item, dict) and item.get('role') == 'assistant':
+            return (item.get('content') or '').rstrip().endswith('?')
+    return False
+
+
+def _transacao(texto: str, vocabulario: dict, hoje: date) -> Optional[Dict]:
+    encontrado = RE_TRANSACAO.match(texto)
+    if not encontrado or (encontrado['quando_antes'] and encontrado['quando_depois']):
+        return None
+
+    valor = _valor(encontrado['valor'])
+    palavras, conta = _separar_conta(encontrado['descricao'].split(), vocabulario['contas'])
+    if valor is None or not palavras or len(palavras) > MAX_PALAVRAS_DESCRICAO or 'e' in palavras:
+        return None
+
+    tipo = VERBOS[encontrado['verbo']]
+    categoria = _categoria(palavras, tipo, vocabulario['categorias'])
+    if not categoria:
+        return None
+
+    quando = encontrado['quando_antes'] or encontrado['quando_depois'] or 'hoje'
+    titulo = ' '.join(palavras)
+    titulo = titulo[0].upper() + titulo[1:]
+    transacao = {
+        'type': tipo,
+        'amount': float(valor),
+        'title': titulo,
+        'category': categoria,
+        'date': (hoje - timedelta(days=DIAS_RELATIVOS[quando])).isoformat(),
+    }
+    if conta:
+        transacao['account'] = conta
+    return {
+        'intent': 'create_transaction',
+        'clarification_needed': False,
+        'assistant_message': f"Registrando {tipo} de R$ {valor:.2f} ({titulo}).",
+        'transaction': transacao,
+    }
+
+
+def _consulta(texto: str, vocabulario: dict, hoje: date) -> Optional[Dict]:
+    encontrado = RE_CONSULTA.match(texto)
+    if not encontrado:
+        return None
+
+    tipo = 'despesa' if encontrado['verbo'] == 'gastei' else 'receita'
+    query = {'summary_type': 'month_total', 'type': tipo}
+    if encontrado['categoria']:
+        categoria = _categoria(encontrado['categoria'].split(), tipo, vocabulario['categorias'])
+        if not categoria:
+            return None
+        query.update(summary_type='category_total', category=categoria)
+
+    periodo = encontrado['periodo'] or 'este mes'
+    if periodo in DIAS_RELATIVOS:
+        inicio = fim = hoje - timedelta(days=DIAS_RELATIVOS[periodo])
+        if not encontrado['categoria']:
+            query['summary_type'] = 'period_total'
+    elif 'passado' in periodo:
+        fim = hoje.replace(day=1) - timedelta(days=1)
+        inicio = fim.replace(day=1)
+    else:
+        inicio = hoje.replace(day=1)
+        fim = (inicio + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    query['period'] = {'start_date': inicio.isoformat(), 'end_date': fim.isoformat()}
+
+    return {
+        'intent': 'query_summary',
+        'clarification_needed': False,
+        'assistant_message': 'Consultando seus lançamentos...',
+        'query': query,
+    }
+
+
+def interpretar_localmente(mensagem: str, casa, contexto=None, hoje: Optional[date] = None) -> Optional[Dict]:
+    """
+    Interpreta ``mensagem`` sem o modelo quando ela cabe na gramática local.
+
+    Retorna o dicionário no formato de ``OpenAIClient.parse_user_message``
+    (``create_transaction`` com uma transação ou ``query_summary``) ou
+    ``None`` quando não há confiança suficiente.
+    """
+    texto = _limpar(mensagem)
+    if casa is None or not texto or _aguarda_resposta(contexto):
+        return None
+
+    hoje = hoje or _hoje()
+    vocabulario = _vocabulario(casa)
+    return _transacao(texto, vocabulario, hoje) or _consulta(texto, vocabulario, hoje)
+
+
+def _interpretacao(origem: str, segundos: float, casa_id=None):
+    from core.models import InterpretacaoChat
+
+    return InterpretacaoChat(casa_id=casa_id, origem=origem, duracao_ms=int(round(segundos * 1000)))
+
+
+def registrar_interpretacao(origem: str, segundos: float, casa_id=None) -> None:
+    """Grava uma mensagem interpretada por ``origem`` ('local' ou 'llm') e o tempo gasto."""
+    _interpretacao(origem, segundos, casa_id).save()
+
+
+async def aregistrar_interpretacao(origem: str, segundos: float, casa_id=None) -> None:
+    """Versão assíncrona de ``registrar_interpretacao``."""
+    await _interpretacao(origem, segundos, casa_id).asave()
+
+
+def metricas_interpretador(dias: int = 7, hoje: Optional[date] = None) -> Dict:
+    """
+    Totais dos últimos ``dias``: mensagens por origem, taxa de acerto local,
+    tempo médio de cada caminho e a economia estimada (chamadas ao modelo
+    evitadas e segundos poupados, pelo tempo médio do modelo no período).
+    """
+    from core.models import InterpretacaoChat
+
+    hoje = hoje or _hoje()
+    inicio = timezone.make_aware(datetime.combine(hoje - timedelta(days=dias - 1), time.min))
+    fim = timezone.make_aware(datetime.combine(hoje + timedelta(days=1), time.min))
+    por_origem = {
+        linha['origem']: linha
+        for linha in InterpretacaoChat.objects.filter(criada_em__gte=inicio, criada_em__lt=fim)
+        .values('origem').annotate(quantidade=Count('id'), duracao_ms=Sum('duracao_ms')).order_by()
+    }
+
+    def total(origem, campo):
+        return por_origem.get(origem, {}).get(campo) or 0
+
+    local, llm = total('local', 'quantidade'), total('llm', 'quantidade')
+    llm_ms_medio = total('llm', 'duracao_ms') / llm if llm else 0.0
+    local_ms_medio = total('local', 'duracao_ms') / local if local else 0.0
+    return {
+        'dias': dias,
+        'local': local,
+        'llm': llm,
+        'taxa_acerto': local / (local + llm) if local + llm else 0.0,
+        'local_ms_medio': local_ms_medio,
+        'llm_ms_medio': llm_ms_medio,
+        'chamadas_evitadas': local,
+        'segundos_economizados': local * max(llm_ms_medio - local_ms_medio, 0) / 1000,
+    }
@@ -0,0 +1,130 @@
+"""
+Leitura incremental de um objeto JSON recebido em pedaços (streaming).
+
+Usado pelo chat em streaming: a resposta estruturada do modelo chega token a
+token e o texto de ``assistant_message`` é repassado ao navegador assim que
+cada trecho da string é decodificado, sem esperar o objeto completo. O
+leitor acompanha apenas o necessário para isso (pilha de objetos/listas,
+chaves e strings com seus escapes) e delimita o objeto de primeiro nível,
+dispensando a busca por regex em todo o texto ao final.
+"""
+import json
+from typing import List, Optional, Tuple
+
+ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class LeitorJsonIncremental:
+    """
+    Consome um objeto JSON em pedaços e emite o texto dos campos string indicados.
+
+    ``caminhos`` são tuplas de chaves a partir da raiz, por exemplo
+    ``('assistant_message',)``. Texto antes do primeiro ``{`` (cercas de
+    Markdown, por exemplo) e depois do fechamento do objeto é ignorado.
+    """
+
+    def __init__(self, *caminhos: Tuple[str, ...]) -> None:
+        self._caminhos = set(caminhos)
+        self._partes: List[str] = []
+        self._posicao = 0
+        self._inicio: Optional[int] = None
+        self._fim: Optional[int] = None
+        # Cada nível aberto: [tipo ('obj' ou 'lista'), última chave, esperando ('chave' ou 'valor')]
+        self._pilha: List[list] = []
+        self._string: Optional[str] = None  # 'chave', 'valor' ou 'alvo'
+        self._chave: List[str] = []
+        self._escape: Optional[str] = None
+        self._surrogate: Optional[int] = None
+
+    @property
+    def completo(self) -> bool:
+        return self._fim is not None
+
+    def alimentar(self, pedaco: str) -> str:
+        """Processa mais um pedaço e retorna o texto dos campos-alvo decodificado nele."""
+        self._partes.append(pedaco)
+        saida = []
+        for caractere in pedaco:
+            posicao = self._posicao
+            self._posicao += 1
+            if self._fim is not None:
+                continue
+            if self._string is not None:
+                decodificado = self._ler_string(caractere)
+                if decodificado is None:
+                    continue
+                if self._string == 'chave':
+                    self._chave.append(decodificado)
+                elif self._string == 'alvo':
+                    saida.append(decodificado)
+                continue
+            self._ler_estrutura(caractere, posicao)
+        return ''.join(saida)
+
+    def resultado(self) -> dict:
+        """Objeto completo; ``ValueError`` se ele ainda não foi fechado ou for inválido."""
+        if self._fim is None:
+            raise ValueError('Objeto JSON incompleto')
+        return json.loads(''.join(self._partes)[self._inicio:self._fim])
+
+    def _ler_estrutura(self, caractere: str, posicao: int) -> None:
+        if not self._pilha:
+            if caractere == '{':
+                self._inicio = posicao
+                self._pilha.append(['obj', None, 'chave'])
+            return
+
+        topo = self._pilha[-1]
+        if caractere == '"':
+            if topo[0] == 'obj' and topo[2] == 'chave':
+                self._string = 'chave'
+                self._chave = []
+            else:
+                caminho = tuple(nivel[1] if nivel[0] == 'obj' else None for nivel in self._pilha)
+                self._string = 'alvo' if caminho in self._caminhos else 'valor'
+        elif caractere == ':':
+            topo[2] = 'valor'
+        elif caractere == ',':
+            topo[2] = 'chave'
+        elif caractere in '{[':
+            self._pilha.append(['obj' if caractere == '{' else 'lista', None, 'chave'])
+        elif caractere in '}]':
+            self._pilha.pop()
+            if not self._pilha:
+                self._fim = posicao + 1
+
+    def _ler_string(self, caractere: str) -> Optional[str]:
+        """Avança dentro de uma string; retorna o caractere decodificado, se houver."""
+        if self._escape is None:
+            if caractere == '\\':
+                self._escape = ''
+                return None
+            if caractere == '"':
+                if self._string == 'chave':
+                    self._pilha[-1][1] = ''.join(self._chave)
+                self._string = None
+                return None
+            return caractere
+
+        if self._escape == '':
+            if caractere == 'u':
+                self._escape = 'u'
+                return None
+            self._escape = None
+            return ESCAPES.get(caractere, caractere)
+
+        self._escape += caractere
+        if len(self._escape) < 5:
+            return None
+        try:
+            codigo = int(self._escape[1:], 16)
+        except ValueError:
+            codigo = 0xFFFD
+        self._escape = None
+        if 0xD800 <= codigo < 0xDC00:
+            self._surrogate = codigo
+            return None
+        if 0xDC00 <= codigo < 0xE000 and self._surrogate is not None:
+            codigo = 0x10000 + ((self._surrogate - 0xD800) << 10) + (codigo - 0xDC00)
+        self._surrogate = None
+        return chr(codigo)
@@ -1,24 +1,189 @@
+import asyncio
 import json
+import os
+import random
 import re
 import logging
+import threading
+import time
+import weakref
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 from zoneinfo import ZoneInfo
 
 from django.conf import settings
 
+from core.services.json_incremental import LeitorJsonIncremental
+
 try:
-    from openai import OpenAI  # type: ignore[import-not-found]
+    from openai import (  # type: ignore[import-not-found]
+        APIConnectionError, APIStatusError, AsyncOpenAI, OpenAI, Timeout,
+    )
 except ImportError:  # pragma: no cover - dependência opcional em testes
-    OpenAI = None  # type: ignore[assignment]
+    OpenAI = AsyncOpenAI = None  # type: ignore[assignment]
+    APIConnectionError = APIStatusError = Timeout = None  # type: ignore[assignment]
 
 logger = logging.getLogger(__name__)
 
+# Cliente do SDK compartilhado pelo processo: (configuração, instância)
+_compartilhado = None
+# Clientes assíncronos, um por event loop: loop -> (configuração, instância, sinal de substituição)
+_compartilhados_async = weakref.WeakKeyDictionary()
+_trava_compartilhado = threading.Lock()
+
 
 class OpenAIClientError(Exception):
     """Erro genérico para problemas ao conversar com a API da OpenAI."""
 
 
+def _configuracao_cliente():
+    return (
+        settings.OPENAI_API_KEY,
+        settings.OPENAI_CONNECT_TIMEOUT,
+        settings.OPENAI_READ_TIMEOUT,
+    )
+
+
+def _criar_cliente(classe):
+    return classe(
+        api_key=settings.OPENAI_API_KEY,
+        timeout=Timeout(settings.OPENAI_READ_TIMEOUT, connect=settings.OPENAI_CONNECT_TIMEOUT),
+        max_retries=0,
+    )
+
+
+def obter_cliente_openai():
+    """
+    Retorna a instância do SDK compartilhada pelo processo.
+
+    O cliente do SDK mantém um pool de conexões HTTP keep-alive; reaproveitá-lo
+    evita um novo handshake TLS a cada mensagem do chat. A instância é criada
+    sob uma trava na primeira chamada e recriada apenas se a chave ou os
+    timeouts configurados mudarem. As repetições do SDK ficam desligadas:
+    quem repete é ``OpenAIClient._com_repeticao``.
+    """
+    global _compartilhado
+
+    configuracao = _configuracao_cliente()
+    atual = _compartilhado
+    if atual is not None and atual[0] == configuracao:
+        return atual[1]
+
+    with _trava_compartilhado:
+        if _compartilhado is None or _compartilhado[0] != configuracao:
+            _compartilhado = (configuracao, _criar_cliente(OpenAI))
+        return _compartilhado[1]
+
+
+async def _fechar_com_o_loop(loop, cliente, substituido) -> None:
+    """
+    Fica pendente enquanto o cliente está em uso. Termina quando o cliente é
+    substituído ou é cancelada quando o loop encerra (``asyncio.run`` e o
+    asgiref cancelam as tarefas pendentes antes de fechá-lo), e então fecha o
+    pool de conexões e tira o cliente do registro.
+    """
+    try:
+        await substituido
+    finally:
+        # Com o loop já fechado sem cancelar as tarefas, quem finaliza a
+        # corrotina é o coletor de lixo, a qualquer momento (até com a trava
+        # tomada nesta mesma thread). O registro já foi limpo por
+        # ``_descartar_loops_fechados`` e as conexões não podem mais ser fechadas.
+        if not loop.is_closed():
+            with _trava_compartilhado:
+                atual = _compartilhados_async.get(loop)
+                if atual is not None and atual[1] is cliente:
+                    del _compartilhados_async[loop]
+            try:
+                await cliente.close()
+            except Exception as exc:
+                logger.debug(f"Erro ao fechar o cliente assíncrono da OpenAI: {exc}")
+
+
+def _descartar_loops_fechados() -> None:
+    # Loops fechados sem cancelar as tarefas: as conexões deles não podem mais
+    # ser usadas e o próprio cliente mantém o loop vivo, então sai à força
+    for loop in [loop for loop in _compartilhados_async if loop.is_closed()]:
+        del _compartilhados_async[loop]
+
+
+def obter_cliente_openai_async():
+    """
+    Retorna o ``AsyncOpenAI`` compartilhado pelo event loop em execução.
+
+    As conexões do cliente assíncrono pertencem ao loop que as abriu, então
+    há uma instância por loop (em um servidor ASGI, uma por processo),
+    fechada junto com o loop. Deve ser chamada de dentro de uma corrotina.
+    """
+    loop = asyncio.get_running_loop()
+    configuracao = _configuracao_cliente()
+    with _trava_compartilhado:
+        _descartar_loops_fechados()
+        atual = _compartilhados_async.get(loop)
+        if atual is None or atual[0] != configuracao:
+            if atual is not None:
+                atual[2].set_result(None)
+            cliente = _criar_cliente(AsyncOpenAI)
+            # A tarefa fica referenciada pelo próprio sinal enquanto o aguarda
+            substituido = loop.create_future()
+            loop.create_task(_fechar_com_o_loop(loop, cliente, substituido))
+            atual = (configuracao, cliente, substituido)
+            _compartilhados_async[loop] = atual
+        return atual[1]
+
+
+def _deve_repetir(exc: Exception) -> bool:
+    """Falhas de conexão/timeout, limite de taxa (429) e erros 5xx são transitórios."""
+    if APIConnectionError is not None and isinstance(exc, APIConnectionError):
+        return True
+    if APIStatusError is not None and isinstance(exc, APIStatusError):
+        return exc.status_code == 429 or exc.status_code >= 500
+    return False
+
+
+def _espera(tentativa: int, exc: Exception) -> float:
+    """Backoff exponencial com jitter total, respeitando ``Retry-After`` quando enviado."""
+    maximo = settings.OPENAI_RETRY_BACKOFF_MAX
+    resposta = getattr(exc, 'response', None)
+    retry_after = resposta.headers.get('retry-after') if resposta is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), maximo)
+        except ValueError:
+            pass
+    return random.uniform(0, min(maximo, settings.OPENAI_RETRY_BACKOFF * 2 ** tentativa))
+
+
+def _campo(objeto: Any, nome: str) -> Any:
+    """Atributo de um objeto do SDK ou chave de um dicionário (None se ausente)."""
+    if isinstance(objeto, dict):
+        return objeto.get(nome)
+    return getattr(objeto, nome, None)
+
+
+def _inteiro(valor: Any) -> int:
+    return valor if isinstance(valor, int) else 0
+
+
+def _uso_da_resposta(resposta: Any) -> Dict[str, Any]:
+    """Tokens informados em ``usage`` (chat ou transcrição); zeros se a resposta não os traz."""
+    uso = _campo(resposta, 'usage')
+    detalhes = _campo(uso, 'prompt_tokens_details') or _campo(uso, 'input_token_details')
+    prompt = _inteiro(_campo(uso, 'prompt_tokens') or _campo(uso, 'input_tokens'))
+    resposta_tokens = _inteiro(_campo(uso, 'completion_tokens') or _campo(uso, 'output_tokens'))
+    dados = {
+        'tokens_prompt': prompt,
+        'tokens_prompt_cache': _inteiro(_campo(detalhes, 'cached_tokens')),
+        'tokens_resposta': resposta_tokens,
+        'tokens_total': _inteiro(_campo(uso, 'total_tokens')) or prompt + resposta_tokens,
+    }
+    modelo = _campo(resposta, 'model')
+    if isinstance(modelo, str) and modelo:
+        dados['modelo'] = modelo
+    return dados
+
+
 class OpenAIClient:
     """Wrapper responsável por centralizar as chamadas à API da OpenAI."""
 
@@ -340,9 +505,71 @@ class OpenAIClient:
                 "Biblioteca 'openai' não instalada. Execute 'pip install openai'."
             )
 
-        self._client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self._client = obter_cliente_openai()
         self._chat_model = settings.OPENAI_CHAT_MODEL
         self._transcription_model = settings.OPENAI_TRANSCRIPTION_MODEL
+        # Telemetria das chamadas feitas por esta instância (gravada em UsoLLM pelas views)
+        self.chamadas: List[Dict[str, Any]] = []
+        self._tentativas = 0
+
+    @contextmanager
+    def _medir(self, operacao: str, modelo: str):
+        """
+        Anota em ``self.chamadas`` a duração, as repetições e o uso de tokens
+        da chamada do bloco. O bloco guarda a resposta em ``medicao['resposta']``.
+        """
+        inicio = time.monotonic()
+        self._tentativas = 0
+        medicao: Dict[str, Any] = {}
+        chamada = {'operacao': operacao, 'modelo': modelo, 'sucesso': False}
+        try:
+            yield medicao
+            chamada['sucesso'] = True
+        finally:
+            chamada.update(_uso_da_resposta(medicao.get('resposta')))
+            chamada['duracao_ms'] = int(round((time.monotonic() - inicio) * 1000))
+            chamada['repeticoes'] = max(self._tentativas - 1, 0)
+            self.chamadas.append(chamada)
+
+    @staticmethod
+    def _proxima_espera(tentativa: int, exc: Exception) -> Optional[float]:
+        """Segundos até repetir a chamada que falhou, ou None se não deve repetir."""
+        if tentativa >= settings.OPENAI_MAX_RETRIES or not _deve_repetir(exc):
+            return None
+        espera = _espera(tentativa, exc)
+        logger.warning(
+            "Falha transitória na OpenAI (%s); tentativa %d em %.2fs",
+            exc.__class__.__name__, tentativa + 2, espera,
+        )
+        return espera
+
+    def _com_repeticao(self, chamada: Callable[[], Any]) -> Any:
+        """Executa ``chamada`` repetindo falhas transitórias até ``OPENAI_MAX_RETRIES`` vezes."""
+        tentativa = 0
+        while True:
+            self._tentativas = tentativa + 1
+            try:
+                return chamada()
+            except Exception as exc:
+                espera = self._proxima_espera(tentativa, exc)
+                if espera is None:
+                    raise
+                tentativa += 1
+                time.sleep(espera)
+
+    async def _com_repeticao_async(self, chamada: Callable[[], Awaitable[Any]]) -> Any:
+        """Versão assíncrona de ``_com_repeticao``: a espera não bloqueia o event loop."""
+        tentativa = 0
+        while True:
+            self._tentativas = tentativa + 1
+            try:
+                return await chamada()
+            except Exception as exc:
+                espera = self._proxima_espera(tentativa, exc)
+                if espera is None:
+                    raise
+                tentativa += 1
+                await asyncio.sleep(espera)
 
     def _extract_json_payload(self, raw_response: Any) -> str:
         """Tenta extrair o texto JSON das diferentes formas de resposta do SDK."""
@@ -392,12 +619,12 @@ class OpenAIClient:
 
         raise ValueError("Não foi possível extrair o texto do JSON retornado pela OpenAI.")
 
-    def parse_user_message(
+    def _parametros_chat(
         self,
         message: str,
         context: Optional[List[Dict[str, str]]] = None,
     ) -> Dict[str, Any]:
-        """Envia mensagem do usuário para o modelo e retorna JSON estruturado."""
+        """Monta os argumentos de ``chat.completions.create`` para a mensagem e o histórico."""
 
         context = context or []
 
@@ -423,45 +650,61 @@ class OpenAIClient:
             }
         )
 
+        return {
+            "model": self._chat_model,
+            "messages": input_messages,
+            "temperature": 0.2,
+            "max_tokens": 800,
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": self._STRUCTURED_RESPONSE_SCHEMA,
+            },
+        }
+
+    def parse_user_message(
+        self,
+        message: str,
+        context: Optional[List[Dict[str, str]]] = None,
+    ) -> Dict[str, Any]:
+        """Envia mensagem do usuário para o modelo e retorna JSON estruturado."""
+
+        parametros = self._parametros_chat(message, context)
         try:
-            response = self._client.chat.completions.create(
-                model=self._chat_model,
-                messages=input_messages,
-                temperature=0.2,
-                max_tokens=800,
-                response_format={
-                    "type": "json_schema",
-                    "json_schema": self._STRUCTURED_RESPONSE_SCHEMA,
-                },
-            )
+            with self._medir('chat', self._chat_model) as medicao:
+                response = self._com_repeticao(lambda: self._client.chat.completions.create(**parametros))
+                medicao['resposta'] = response
+        except Exception as exc:  # pragma: no cover - dependente da API externa
+            logger.exception("Falha ao chamar a OpenAI: %s", exc)
+            raise OpenAIClientError("Erro ao se comunicar com a OpenAI. Tente novamente em instantes.")
+
+        return self._interpretar_resposta(response)
+
+    async def aparse_user_message(
+        self,
+        message: str,
+        context: Optional[List[Dict[str, str]]] = None,
+    ) -> Dict[str, Any]:
+        """Versão assíncrona de ``parse_user_message``, via ``AsyncOpenAI``."""
+
+        parametros = self._parametros_chat(message, context)
+        client = obter_cliente_openai_async()
+        try:
+            with self._medir('chat', self._chat_model) as medicao:
+                response = await self._com_repeticao_async(lambda: client.chat.completions.create(**parametros))
+                medicao['resposta'] = response
         except Exception as exc:  # pragma: no cover - dependente da API externa
             logger.exception("Falha ao chamar a OpenAI: %s", exc)
             raise OpenAIClientError("Erro ao se comunicar com a OpenAI. Tente novamente em instantes.")
 
+        return self._interpretar_resposta(response)
+
+    def _interpretar_resposta(self, response: Any) -> Dict[str, Any]:
+        """Extrai e valida o JSON estruturado devolvido pelo modelo."""
+
         try:
             json_payload = self._extract_json_payload(response)
             logger.debug(f"JSON COMPLETO da OpenAI: {json_payload}")
-            parsed = json.loads(json_payload)
-            
-            # CORREÇÃO: Quando usa json_schema, o OpenAI retorna {"type":"object","properties":{...}}
-            # Precisamos extrair apenas o conteúdo de "properties"
-            if isinstance(parsed, dict) and parsed.get('type') == 'object' and 'properties' in parsed:
-                logger.debug("🔧 Detectado formato json_schema, extraindo 'properties'")
-                parsed = parsed['properties']
-            
-            # Validar que tem os campos obrigatórios
-            if not parsed.get('intent'):
-                logger.warning("Resposta sem 'intent', adicionando padrão")
-                parsed['intent'] = 'unknown'
-            
-            if not parsed.get('assistant_message'):
-                logger.warning("Resposta sem 'assistant_message', adicionando padrão")
-                parsed['assistant_message'] = 'Desculpe, não consegui processar sua mensagem.'
-            
-            if 'clarification_needed' not in parsed:
-                parsed['clarification_needed'] = False
-            
-            return parsed
+            return self._completar_estrutura(json.loads(json_payload))
             
         except json.JSONDecodeError as exc:
             logger.exception(f"JSON inválido da OpenAI: {exc}")
@@ -475,41 +718,142 @@ class OpenAIClient:
                 "A resposta do modelo não pôde ser interpretada. Por favor, tente novamente."
             )
 
+    @staticmethod
+    def _completar_estrutura(parsed: Dict[str, Any]) -> Dict[str, Any]:
+        """Desembrulha o formato json_schema e garante os campos obrigatórios."""
+
+        # CORREÇÃO: Quando usa json_schema, o OpenAI retorna {"type":"object","properties":{...}}
+        # Precisamos extrair apenas o conteúdo de "properties"
+        if isinstance(parsed, dict) and parsed.get('type') == 'object' and 'properties' in parsed:
+            logger.debug("🔧 Detectado formato json_schema, extraindo 'properties'")
+            parsed = parsed['properties']
+        
+        # Validar que tem os campos obrigatórios
+        if not parsed.get('intent'):
+            logger.warning("Resposta sem 'intent', adicionando padrão")
+            parsed['intent'] = 'unknown'
+        
+        if not parsed.get('assistant_message'):
+            logger.warning("Resposta sem 'assistant_message', adicionando padrão")
+            parsed['assistant_message'] = 'Desculpe, não consegui processar sua mensagem.'
+        
+        if 'clarification_needed' not in parsed:
+            parsed['clarification_needed'] = False
+        
+        return parsed
+
+    async def astream_user_message(
+        self,
+        message: str,
+        context: Optional[List[Dict[str, str]]] = None,
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Versão em streaming de ``aparse_user_message``.
+
+        Gera ``('texto', trecho)`` com os pedaços de ``assistant_message`` à
+        medida que o modelo os produz e, por fim, ``('resposta', dict)`` com o
+        JSON completo. A resposta é lida por ``LeitorJsonIncremental`` conforme
+        chega; só a abertura do stream é repetida em caso de falha transitória.
+        Fechar o gerador (``aclose``) fecha também o stream da OpenAI.
+        """
+
+        parametros = self._parametros_chat(message, context)
+        client = obter_cliente_openai_async()
+        leitor = LeitorJsonIncremental(('assistant_message',), ('properties', 'assistant_message'))
+        try:
+            with self._medir('chat', self._chat_model) as medicao:
+                stream = await self._com_repeticao_async(
+                    lambda: client.chat.completions.create(
+                        **parametros, stream=True, stream_options={'include_usage': True}
+                    )
+                )
+                try:
+                    async for chunk in stream:
+                        # O último chunk traz só o uso de tokens (include_usage)
+                        if getattr(chunk, 'usage', None):
+                            medicao['resposta'] = chunk
+                        choices = getattr(chunk, 'choices', None)
+                        delta = getattr(choices[0], 'delta', None) if choices else None
+                        pedaco = getattr(delta, 'content', None)
+                        if pedaco:
+                            texto = leitor.alimentar(pedaco)
+                            if texto:
+                                yield 'texto', texto
+                finally:
+                    # Se quem consome desistiu (desconexão), a resposta HTTP da
+                    # OpenAI é encerrada aqui em vez de continuar gerando tokens
+                    await stream.close()
+        except Exception as exc:  # pragma: no cover - dependente da API externa
+            logger.exception("Falha ao chamar a OpenAI: %s", exc)
+            raise OpenAIClientError("Erro ao se comunicar com a OpenAI. Tente novamente em instantes.")
+
+        try:
+            parsed = leitor.resultado()
+        except ValueError as exc:
+            logger.exception(f"JSON inválido da OpenAI: {exc}")
+            raise OpenAIClientError(
+                "A resposta do modelo não pôde ser interpretada. Por favor, tente novamente."
+            )
+        logger.debug(f"JSON COMPLETO da OpenAI: {parsed}")
+        yield 'resposta', self._completar_estrutura(parsed)
+
+    @staticmethod
+    def _preparar_audio(file_obj):
+        """
+        Entrega o upload ao SDK como ``(nome, arquivo)``, sem copiar o conteúdo.
+
+        Os uploads do Django apenas embrulham o arquivo real (temporário em
+        disco ou ``BytesIO``) em ``.file``; o nome informa o formato ao Whisper.
+        """
+        if not hasattr(file_obj, 'read'):
+            return file_obj
+        nome = os.path.basename(getattr(file_obj, 'name', None) or 'audio.webm')
+        return (nome, getattr(file_obj, 'file', None) or file_obj)
+
+    def _parametros_transcricao(self, audio_file) -> Dict[str, Any]:
+        # O arquivo volta ao início a cada tentativa
+        conteudo = audio_file[1] if isinstance(audio_file, tuple) else audio_file
+        if hasattr(conteudo, 'seek'):
+            conteudo.seek(0)
+        return {"model": self._transcription_model, "file": audio_file, "response_format": "text"}
+
+    @staticmethod
+    def _texto_transcrito(transcription: Any) -> str:
+        if hasattr(transcription, "text"):
+            return transcription.text.strip()
+        return str(transcription).strip()
+
     def transcribe_audio(self, file_obj) -> str:
         """Transcreve áudio enviado pelo usuário usando Whisper."""
 
         try:
-            # O OpenAI SDK precisa de um objeto file-like com nome
-            # Se for um InMemoryUploadedFile do Django, precisamos wrappear
-            if hasattr(file_obj, 'read'):
-                # Garantir que estamos no início do arquivo
-                file_obj.seek(0)
-                
-                # Criar uma tupla (nome_do_arquivo, conteúdo, tipo_mime)
-                file_name = getattr(file_obj, 'name', 'audio.webm')
-                file_content = file_obj.read()
-                
-                # Criar um objeto BytesIO para passar para a API
-                import io
-                audio_file = io.BytesIO(file_content)
-                audio_file.name = file_name
-                
-                transcription = self._client.audio.transcriptions.create(
-                    model=self._transcription_model,
-                    file=audio_file,
-                    response_format="text",
+            audio_file = self._preparar_audio(file_obj)
+            # Áudios longos demoram mais que o timeout de leitura do chat
+            client = self._client.with_options(timeout=settings.OPENAI_TRANSCRIPTION_TIMEOUT)
+            with self._medir('transcricao', self._transcription_model) as medicao:
+                transcription = self._com_repeticao(
+                    lambda: client.audio.transcriptions.create(**self._parametros_transcricao(audio_file))
                 )
-            else:
-                # Se já for um objeto file normal
-                transcription = self._client.audio.transcriptions.create(
-                    model=self._transcription_model,
-                    file=file_obj,
-                    response_format="text",
+                medicao['resposta'] = transcription
+            return self._texto_transcrito(transcription)
+        except Exception as exc:  # pragma: no cover - dependente da API externa
+            logger.exception("Erro ao transcrever áudio: %s", exc)
+            raise OpenAIClientError(
+                "Não foi possível transcrever o áudio enviado. Tente novamente ou digite a mensagem."
+            )
+
+    async def atranscribe_audio(self, file_obj) -> str:
+        """Versão assíncrona de ``transcribe_audio``, via ``AsyncOpenAI``."""
+
+        try:
+            audio_file = self._preparar_audio(file_obj)
+            client = obter_cliente_openai_async().with_options(timeout=settings.OPENAI_TRANSCRIPTION_TIMEOUT)
+            with self._medir('transcricao', self._transcription_model) as medicao:
+                transcription = await self._com_repeticao_async(
+                    lambda: client.audio.transcriptions.create(**self._parametros_transcricao(audio_file))
                 )
-            
-            if hasattr(transcription, "text"):
-                return transcription.text.strip()
-            return str(transcription).strip()
+                medicao['resposta'] = transcription
+            return self._texto_transcrito(transcription)
         except Exception as exc:  # pragma: no cover - dependente da API externa
             logger.exception("Erro ao transcrever áudio: %s", exc)
             raise OpenAIClientError(
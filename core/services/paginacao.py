@@ -0,0 +1,110 @@
+"""
+Paginação por cursor (keyset) para listas ordenadas de forma decrescente.
+
+Em vez de ``OFFSET``, cada página continua a partir da chave de ordenação do
+último (ou primeiro) item exibido, de modo que a página N custa o mesmo que
+a primeira e não há ``COUNT``. Os cursores são tokens assinados e opacos.
+"""
+from typing import List, Optional, Sequence
+
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+SALT_CURSOR = 'core.paginacao.cursor'
+
+
+class PaginaCursor:
+    """Uma página de resultados com os cursores para a próxima e a anterior."""
+
+    def __init__(self, itens: List, cursor_proxima: Optional[str], cursor_anterior: Optional[str]):
+        self.itens = itens
+        self.cursor_proxima = cursor_proxima
+        self.cursor_anterior = cursor_anterior
+
+    @property
+    def tem_proxima(self) -> bool:
+        return self.cursor_proxima is not None
+
+    @property
+    def tem_anterior(self) -> bool:
+        return self.cursor_anterior is not None
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+
+def _codificar(item, campos: Sequence[str], direcao: str) -> str:
+    valores = []
+    for campo in campos:
+        valor = getattr(item, campo)
+        valores.append(valor.isoformat() if hasattr(valor, 'isoformat') else valor)
+    return signing.dumps({'v': valores, 'd': direcao}, salt=SALT_CURSOR, compress=True)
+
+
+def _decodificar(modelo, cursor: str, campos: Sequence[str]):
+    """Retorna ``(valores, direcao)`` do cursor ou ``None`` se for inválido."""
+    try:
+        dados = signing.loads(cursor, salt=SALT_CURSOR)
+        valores = [
+            modelo._meta.get_field(campo).to_python(valor)
+            for campo, valor in zip(campos, dados['v'], strict=True)
+        ]
+    except (signing.BadSignature, KeyError, TypeError, ValueError, ValidationError):
+        return None
+    if dados.get('d') not in ('proxima', 'anterior'):
+        return None
+    return valores, dados['d']
+
+
+def _apos(campos: Sequence[str], valores: Sequence, lookup: str) -> Q:
+    """
+    Condição de "vem depois" na ordem de ``campos`` (comparação de tuplas).
+
+    Ex.: (a, b) < (x, y)  ==  a < x OR (a = x AND b < y)
+    """
+    condicao = Q()
+    for i, campo in enumerate(campos):
+        parte = Q(**{f'{campo}__{lookup}': valores[i]})
+        for anterior, valor in zip(campos[:i], valores[:i]):
+            parte &= Q(**{anterior: valor})
+        condicao |= parte
+    return condicao
+
+
+def paginar_por_cursor(queryset, cursor: Optional[str], campos: Sequence[str], tamanho: int = 20) -> PaginaCursor:
+    """
+    Retorna a página indicada por ``cursor`` de ``queryset`` em ordem
+    decrescente de ``campos`` (que devem identificar cada linha, ex.:
+    ``('data', 'criada_em', 'id')``). Sem cursor ou com cursor inválido,
+    retorna a primeira página.
+    """
+    campos = tuple(campos)
+    decrescente = [f'-{campo}' for campo in campos]
+    crescente = list(campos)
+
+    decodificado = _decodificar(queryset.model, cursor, campos) if cursor else None
+
+    if decodificado is None:
+        linhas = list(queryset.order_by(*decrescente)[:tamanho + 1])
+        itens = linhas[:tamanho]
+        tem_proxima, tem_anterior = len(linhas) > tamanho, False
+    else:
+        valores, direcao = decodificado
+        if direcao == 'proxima':
+            linhas = list(queryset.filter(_apos(campos, valores, 'lt')).order_by(*decrescente)[:tamanho + 1])
+            itens = linhas[:tamanho]
+            tem_proxima, tem_anterior = len(linhas) > tamanho, True
+        else:
+            linhas = list(queryset.filter(_apos(campos, valores, 'gt')).order_by(*crescente)[:tamanho + 1])
+            itens = list(reversed(linhas[:tamanho]))
+            tem_proxima, tem_anterior = True, len(linhas) > tamanho
+
+    return PaginaCursor(
+        itens,
+        cursor_proxima=_codificar(itens[-1], campos, 'proxima') if itens and tem_proxima else None,
+        cursor_anterior=_codificar(itens[0], campos, 'anterior') if itens and tem_anterior else None,
+    )
@@ -0,0 +1,336 @@
+"""
+Relatório financeiro em PDF.
+
+O relatório de um período (mês atual ou últimos 12 meses, ver
+``core.services.relatorios.intervalo_periodo``) traz o resumo, os totais por
+categoria, um gráfico da evolução mensal nos 12 meses que terminam no
+período e o extrato completo das transações, paginado.
+
+Gerar o extrato de uma casa com muitos lançamentos é caro, então o PDF
+pronto fica em disco (``RELATORIO_PDF_CACHE_DIR``) com nome derivado da casa,
+do período e de ``Casa.versao_dados``: enquanto os dados não mudam, os
+downloads seguintes servem o mesmo arquivo sem renderizar de novo. A cada
+renderização os arquivos desatualizados da casa (de qualquer período) são
+apagados, e ``limpar_cache_pdf`` (chamada por ``processar_exportacoes``)
+remove os que ficaram sem acesso por mais de ``RELATORIO_PDF_RETENCAO``.
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO, Callable, Optional
+
+from django.conf import settings
+
+from core.services.cache_casa import chave_casa
+from core.services.exportacao import linhas_exportacao
+from core.services.relatorios import serie_temporal, somar_meses, totais_por_categoria
+
+logger = logging.getLogger(__name__)
+
+# Linhas do extrato por tabela; tabelas menores quebram entre páginas mais rápido
+LINHAS_POR_TABELA = 200
+# Caracteres máximos de texto livre em uma célula do extrato
+LARGURA_TEXTO = 38
+
+AZUL = '#0d6efd'
+VERDE = '#198754'
+VERMELHO = '#dc3545'
+
+
+def _moeda(valor) -> str:
+    return f'R$ {valor:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.')
+
+
+def _cortar(texto: str, largura: int = LARGURA_TEXTO) -> str:
+    texto = texto or ''
+    return texto if len(texto) <= largura else texto[:largura - 1] + '…'
+
+
+@lru_cache(maxsize=None)
+def _estilos():
+    """Estilos de parágrafo e de tabela, montados uma única vez por processo."""
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.platypus import TableStyle
+
+    base = getSampleStyleSheet()
+    cabecalho = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(AZUL)),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ]
+    return {
+        'titulo': ParagraphStyle(
+            'RelatorioTitulo', parent=base['Heading1'], fontSize=18,
+            textColor=colors.HexColor(AZUL), spaceAfter=6, alignment=TA_CENTER,
+        ),
+        'subtitulo': ParagraphStyle('RelatorioSubtitulo', parent=base['Normal'], alignment=TA_CENTER),
+        'secao': ParagraphStyle(
+            'RelatorioSecao', parent=base['Heading2'], textColor=colors.HexColor(AZUL), spaceBefore=12,
+        ),
+        'normal': base['Normal'],
+        'resumo': TableStyle(cabecalho + [
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ]),
+        'categorias': TableStyle(cabecalho + [
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f2f2f2')]),
+        ]),
+        'extrato': TableStyle(cabecalho + [
+            ('FONTSIZE', (0, 0), (-1, -1), 7.5),
+            ('TOPPADDING', (0, 0), (-1, -1), 1.5),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 1.5),
+            ('ALIGN', (6, 0), (6, -1), 'RIGHT'),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f2f2f2')]),
+        ]),
+    }
+
+
+def _rodape(canvas, doc):
+    from reportlab.lib.units import cm
+
+    canvas.saveState()
+    canvas.setFont('Helvetica', 8)
+    canvas.drawString(doc.leftMargin, 1 * cm, doc.title)
+    canvas.drawRightString(doc.pagesize[0] - doc.rightMargin, 1 * cm, f'Página {doc.page}')
+    canvas.restoreState()
+
+
+def _resumo(totais: dict):
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Table
+
+    receitas, despesas = (
+        sum((Decimal(str(item['total'])) for item in totais[tipo]), Decimal('0.00'))
+        for tipo in ('receita', 'despesa')
+    )
+    tabela = Table([
+        ['Descrição', 'Valor'],
+        ['Receitas pagas', _moeda(receitas)],
+        ['Despesas pagas', _moeda(despesas)],
+        ['Saldo do período', _moeda(receitas - despesas)],
+    ], colWidths=[10 * cm, 5 * cm])
+    tabela.setStyle(_estilos()['resumo'])
+    return tabela
+
+
+def _categorias(totais: dict) -> list:
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, Table
+
+    linhas = [['Categoria', 'Tipo', 'Total pago', '% do tipo']]
+    for tipo, rotulo in (('receita', 'Receita'), ('despesa', 'Despesa')):
+        soma = sum(item['total'] for item in totais[tipo]) or 1
+        for item in totais[tipo]:
+            linhas.append([
+                _cortar(item['categoria']), rotulo, _moeda(item['total']), f"{item['total'] * 100 / soma:.1f}%",
+            ])
+    if len(linhas) == 1:
+        return [Paragraph('Nenhuma transação paga no período.', _estilos()['normal'])]
+
+    tabela = Table(linhas, colWidths=[7 * cm, 3 * cm, 4 * cm, 3 * cm], repeatRows=1)
+    tabela.setStyle(_estilos()['categorias'])
+    return [tabela]
+
+
+def _grafico_evolucao(casa, fim: date):
+    """Barras de receitas e despesas pagas nos 12 meses que terminam em ``fim``."""
+    from reportlab.graphics.charts.barcharts import VerticalBarChart
+    from reportlab.graphics.charts.legends import Legend
+    from reportlab.graphics.shapes import Drawing
+    from reportlab.lib import colors
+
+    serie = serie_temporal(casa, somar_meses(fim.replace(day=1), -11), fim, 'mes')
+
+    desenho = Drawing(480, 220)
+    grafico = VerticalBarChart()
+    grafico.x, grafico.y, grafico.width, grafico.height = 50, 45, 420, 150
+    grafico.data = [[item['receitas'] for item in serie], [item['despesas'] for item in serie]]
+    grafico.categoryAxis.categoryNames = [
+        date.fromisoformat(item['inicio']).strftime('%m/%y') for item in serie
+    ]
+    grafico.categoryAxis.labels.fontSize = 7
+    grafico.valueAxis.valueMin = 0
+    grafico.valueAxis.labels.fontSize = 7
+    grafico.valueAxis.labelTextFormat = lambda valor: f'{valor:,.0f}'.replace(',', '.')
+    grafico.bars[0].fillColor = colors.HexColor(VERDE)
+    grafico.bars[1].fillColor = colors.HexColor(VERMELHO)
+    grafico.groupSpacing = 6
+    desenho.add(grafico)
+
+    legenda = Legend()
+    legenda.x, legenda.y = 50, 15
+    legenda.columnMaximum = 1
+    legenda.fontSize = 8
+    legenda.colorNamePairs = [(colors.HexColor(VERDE), 'Receitas'), (colors.HexColor(VERMELHO), 'Despesas')]
+    desenho.add(legenda)
+    return desenho
+
+
+def _extrato(casa, inicio: date, fim: date, ao_avancar: Optional[Callable[[int], None]] = None) -> list:
+    """Extrato do período em tabelas de ``LINHAS_POR_TABELA`` linhas, com cabeçalho repetido."""
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, Table
+
+    from core.models import Transacao
+
+    cabecalho = ['Data', 'Título', 'Categoria', 'Conta', 'Tipo', 'Status', 'Valor']
+    larguras = [1.8 * cm, 5.4 * cm, 3 * cm, 2.6 * cm, 1.6 * cm, 1.6 * cm, 2.4 * cm]
+    estilo = _estilos()['extrato']
+
+    transacoes = Transacao.objects.filter(casa=casa, data__range=(inicio, fim))
+    elementos, bloco = [], []
+
+    def fechar_bloco():
+        tabela = Table([cabecalho] + bloco, colWidths=larguras, repeatRows=1)
+        tabela.setStyle(estilo)
+        elementos.append(tabela)
+
+    for data, tipo, titulo, categoria, conta, valor, status, _ in linhas_exportacao(transacoes, ao_avancar):
+        bloco.append([
+            data.strftime('%d/%m/%Y'), _cortar(titulo), _cortar(categoria, 18), _cortar(conta, 15),
+            tipo, status, _moeda(valor),
+        ])
+        if len(bloco) >= LINHAS_POR_TABELA:
+            fechar_bloco()
+            bloco = []
+    if bloco:
+        fechar_bloco()
+    if not elementos:
+        elementos.append(Paragraph('Nenhuma transação no período.', _estilos()['normal']))
+    return elementos
+
+
+def gerar_pdf(casa, arquivo: BinaryIO, inicio: date, fim: date,
+              ao_avancar: Optional[Callable[[int], None]] = None) -> None:
+    """Escreve em ``arquivo`` o relatório da casa entre ``inicio`` e ``fim``."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+    from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer
+
+    estilos = _estilos()
+    titulo = f'Relatório Financeiro - {casa.nome}'
+    periodo = f'{inicio:%d/%m/%Y} a {fim:%d/%m/%Y}'
+    totais = {tipo: totais_por_categoria(casa, tipo, inicio, fim) for tipo in ('receita', 'despesa')}
+    doc = SimpleDocTemplate(
+        arquivo, pagesize=A4, title=f'{titulo} ({periodo})',
+        leftMargin=1.5 * cm, rightMargin=1.5 * cm, topMargin=1.5 * cm, bottomMargin=1.8 * cm,
+    )
+
+    elementos = [
+        Paragraph(titulo, estilos['titulo']),
+        Paragraph(f'Período: {periodo}', estilos['subtitulo']),
+        Spacer(1, 0.6 * cm),
+        Paragraph('Resumo', estilos['secao']),
+        _resumo(totais),
+        Paragraph('Por categoria', estilos['secao']),
+        *_categorias(totais),
+        Paragraph('Evolução mensal', estilos['secao']),
+        _grafico_evolucao(casa, fim),
+        PageBreak(),
+        Paragraph('Extrato', estilos['secao']),
+        *_extrato(casa, inicio, fim, ao_avancar),
+    ]
+    doc.build(elementos, onFirstPage=_rodape, onLaterPages=_rodape)
+
+
+def _diretorio_cache() -> Path:
+    diretorio = Path(settings.RELATORIO_PDF_CACHE_DIR)
+    diretorio.mkdir(parents=True, exist_ok=True)
+    return diretorio
+
+
+def caminho_cache(casa, inicio: date, fim: date) -> Path:
+    """Arquivo do relatório para a versão atual dos dados da casa."""
+    versao = hashlib.sha256(chave_casa(casa, 'relatorio_pdf', inicio, fim).encode()).hexdigest()[:16]
+    return _diretorio_cache() / f'casa{casa.pk}_{inicio:%Y%m%d}_{fim:%Y%m%d}_{versao}.pdf'
+
+
+NOME_CACHE = re.compile(r'casa(?P<casa>\d+)_(?P<inicio>\d{8})_(?P<fim>\d{8})_[0-9a-f]+\.pdf')
+
+
+def _apagar(arquivo: Path) -> None:
+    try:
+        arquivo.unlink(missing_ok=True)
+    except OSError as e:
+        logger.warning(f"Não foi possível apagar {arquivo.name} do cache de relatórios: {e}")
+
+
+def _desatualizados(casa, manter: Path):
+    """Arquivos da casa que não correspondem à versão atual dos dados do seu período."""
+    for arquivo in manter.parent.glob(f'casa{casa.pk}_*.pdf'):
+        partes = NOME_CACHE.fullmatch(arquivo.name)
+        if arquivo == manter or not partes:
+            continue
+        inicio = datetime.strptime(partes['inicio'], '%Y%m%d').date()
+        fim = datetime.strptime(partes['fim'], '%Y%m%d').date()
+        if arquivo != caminho_cache(casa, inicio, fim):
+            yield arquivo
+
+
+def relatorio_pdf(casa, inicio: date, fim: date) -> BinaryIO:
+    """
+    PDF do período, aberto para leitura, renderizado só se ainda não existir
+    para a versão atual dos dados.
+
+    O arquivo é aberto aqui (e não reaberto pelo chamador a partir do
+    caminho) para que a limpeza de outra requisição não o apague entre as
+    duas operações. A gravação usa um arquivo temporário no mesmo diretório e
+    ``os.replace``, então um download concorrente nunca lê um PDF pela
+    metade. Cabe ao chamador fechar o arquivo.
+    """
+    caminho = caminho_cache(casa, inicio, fim)
+    try:
+        return open(caminho, 'rb')
+    except FileNotFoundError:
+        pass
+
+    descritor, temporario = tempfile.mkstemp(dir=caminho.parent, suffix='.tmp')
+    try:
+        with os.fdopen(descritor, 'wb') as arquivo:
+            gerar_pdf(casa, arquivo, inicio, fim)
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+    logger.info(f"Relatório PDF da casa ID {casa.pk} renderizado: {caminho.name}")
+
+    arquivo = open(caminho, 'rb')
+    for antigo in _desatualizados(casa, caminho):
+        _apagar(antigo)
+    return arquivo
+
+
+def limpar_cache_pdf(agora: Optional[float] = None) -> int:
+    """
+    Apaga os PDFs (e temporários abandonados) sem acesso há mais de
+    ``RELATORIO_PDF_RETENCAO`` segundos. Retorna quantos arquivos saíram.
+    """
+    limite = (agora or time.time()) - settings.RELATORIO_PDF_RETENCAO
+    removidos = 0
+    for arquivo in _diretorio_cache().iterdir():
+        if arquivo.suffix not in ('.pdf', '.tmp'):
+            continue
+        try:
+            estado = arquivo.stat()
+        except FileNotFoundError:
+            continue
+        if max(estado.st_atime, estado.st_mtime) < limite:
+            _apagar(arquivo)
+            removidos += 1
+    return removidos
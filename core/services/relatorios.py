@@ -0,0 +1,237 @@
+"""
+Cálculo dos dados exibidos no dashboard e nos gráficos de relatórios.
+
+As funções retornam apenas estruturas materializadas (listas, dicionários e
+valores), prontas para serem guardadas no cache por casa
+(ver ``core.services.cache_casa``) e, no caso dos gráficos, serializadas
+em JSON pela API de dados.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import List, Optional, Tuple
+
+from django.db.models import Q, Sum, Value
+from django.db.models.functions import (
+    Coalesce, TruncDay, TruncMonth, TruncQuarter, TruncWeek, TruncYear,
+)
+
+from core.services.resumos import cobre_meses_completos, fim_do_mes
+
+
+def dados_dashboard(casa, hoje: date) -> dict:
+    """Calcula os totais, contas e transações recentes exibidos no dashboard."""
+    from core.models import Conta, ResumoMensal, Transacao
+
+    primeiro_dia_mes = hoje.replace(day=1)
+
+    # Estatísticas gerais e do mês em uma única consulta ao resumo mensal,
+    # usando agregação condicional
+    resumos_pagos = ResumoMensal.objects.filter(casa=casa, status='paga')
+    zero = Value(Decimal('0.00'))
+
+    resumo = resumos_pagos.aggregate(
+        total_receitas=Coalesce(Sum('total', filter=Q(tipo='receita')), zero),
+        total_despesas=Coalesce(Sum('total', filter=Q(tipo='despesa')), zero),
+        receitas_mes=Coalesce(Sum('total', filter=Q(tipo='receita', mes__gte=primeiro_dia_mes)), zero),
+        despesas_mes=Coalesce(Sum('total', filter=Q(tipo='despesa', mes__gte=primeiro_dia_mes)), zero),
+    )
+
+    # Últimas transações
+    transacoes_recentes = list(
+        Transacao.objects.filter(casa=casa).select_related(
+            'categoria'
+        ).order_by('-data', '-criada_em')[:10]
+    )
+
+    # Contas: o saldo de todas (inclusive inativas) é anotado em uma única
+    # consulta; o saldo total é a soma delas, sem consulta adicional
+    todas_contas = list(Conta.objects.filter(casa=casa).with_saldo())
+    contas = [conta for conta in todas_contas if conta.ativa]
+    saldo_total = sum((conta.saldo_atual for conta in todas_contas), Decimal('0.00'))
+
+    return {
+        'total_receitas': resumo['total_receitas'],
+        'total_despesas': resumo['total_despesas'],
+        'saldo_total': saldo_total,
+        'receitas_mes': resumo['receitas_mes'],
+        'despesas_mes': resumo['despesas_mes'],
+        'saldo_mes': resumo['receitas_mes'] - resumo['despesas_mes'],
+        'transacoes_recentes': transacoes_recentes,
+        'contas': contas,
+    }
+
+
+PERIODOS = ('mes', '12meses')
+
+# Granularidade -> (função de truncamento, rótulo)
+GRANULARIDADES = {
+    'dia': (TruncDay, 'Dia'),
+    'semana': (TruncWeek, 'Semana'),
+    'mes': (TruncMonth, 'Mês'),
+    'trimestre': (TruncQuarter, 'Trimestre'),
+    'ano': (TruncYear, 'Ano'),
+}
+
+# Limite de pontos de uma série (ex.: ~5 anos por dia)
+MAX_BALDES = 2000
+
+
+def somar_meses(dia: date, meses: int) -> date:
+    """Desloca ``dia`` (que deve ser o primeiro do mês) em ``meses`` meses."""
+    indice = dia.year * 12 + dia.month - 1 + meses
+    return dia.replace(year=indice // 12, month=indice % 12 + 1)
+
+
+def intervalo_periodo(hoje: date, periodo: str) -> Tuple[date, date]:
+    """Intervalo do período: mês atual (``mes``) ou últimos 12 meses (``12meses``)."""
+    fim = fim_do_mes(hoje)
+    if periodo == 'mes':
+        return hoje.replace(day=1), fim
+    return somar_meses(hoje.replace(day=1), -11), fim
+
+
+def inicio_do_balde(dia: date, granularidade: str) -> date:
+    """Primeiro dia do balde (dia, semana iniciada na segunda, mês, trimestre ou ano) de ``dia``."""
+    if granularidade == 'dia':
+        return dia
+    if granularidade == 'semana':
+        return dia - timedelta(days=dia.weekday())
+    if granularidade == 'mes':
+        return dia.replace(day=1)
+    if granularidade == 'trimestre':
+        return dia.replace(month=3 * ((dia.month - 1) // 3) + 1, day=1)
+    return dia.replace(month=1, day=1)
+
+
+def proximo_balde(inicio: date, granularidade: str) -> date:
+    if granularidade == 'dia':
+        return inicio + timedelta(days=1)
+    if granularidade == 'semana':
+        return inicio + timedelta(days=7)
+    return somar_meses(inicio, {'mes': 1, 'trimestre': 3, 'ano': 12}[granularidade])
+
+
+def baldes(inicio: date, fim: date, granularidade: str) -> List[date]:
+    """Início de cada balde que intersecta o intervalo, em ordem."""
+    atual = inicio_do_balde(inicio, granularidade)
+    resultado = []
+    while atual <= fim:
+        resultado.append(atual)
+        atual = proximo_balde(atual, granularidade)
+    return resultado
+
+
+def quantidade_baldes(inicio: date, fim: date, granularidade: str) -> int:
+    """Quantidade aproximada de baldes, sem gerá-los (para validar o pedido)."""
+    dias = (fim - inicio).days + 1
+    return {'dia': dias, 'semana': dias // 7 + 2, 'mes': dias // 28 + 2,
+            'trimestre': dias // 90 + 2, 'ano': dias // 365 + 2}[granularidade]
+
+
+def rotulo_balde(inicio: date, granularidade: str) -> str:
+    if granularidade in ('dia', 'semana'):
+        return inicio.strftime('%d/%m/%Y')
+    if granularidade == 'mes':
+        return inicio.strftime('%b/%Y')
+    if granularidade == 'trimestre':
+        return f'T{(inicio.month - 1) // 3 + 1}/{inicio.year}'
+    return str(inicio.year)
+
+
+def _fonte(casa, inicio: date, fim: date, usar_resumo: bool = True):
+    """
+    Escolhe de onde somar as transações pagas do intervalo.
+
+    Intervalos de meses completos saem do resumo mensal; os demais, das
+    transações. Retorna ``(queryset, campo_data, campo_valor)``.
+    """
+    from core.models import ResumoMensal, Transacao
+
+    if usar_resumo and cobre_meses_completos(inicio, fim):
+        return (
+            ResumoMensal.objects.filter(casa=casa, status='paga', mes__range=(inicio, fim)),
+            'mes',
+            'total',
+        )
+    return (
+        Transacao.objects.filter(casa=casa, status='paga', data__range=(inicio, fim)),
+        'data',
+        'valor',
+    )
+
+
+def totais_por_categoria(casa, tipo: str, inicio: date, fim: date, limite: Optional[int] = None) -> List[dict]:
+    """
+    Soma as transações pagas do intervalo por categoria.
+
+    Categorias duplicadas são mescladas na origem (ver
+    ``core.services.categorias``), então basta agrupar por ``categoria_id``
+    e trazer nome e cor com um join simples.
+    """
+    queryset, _, campo_valor = _fonte(casa, inicio, fim)
+
+    totais = queryset.filter(
+        tipo=tipo
+    ).values('categoria_id', 'categoria__nome', 'categoria__cor').annotate(
+        total=Sum(campo_valor)
+    ).order_by('-total', 'categoria__nome')
+    if limite:
+        totais = totais[:limite]
+
+    return [
+        {'categoria': item['categoria__nome'], 'total': float(item['total']), 'cor': item['categoria__cor']}
+        for item in totais
+    ]
+
+
+def totais_por_conta(casa, tipo: str, inicio: date, fim: date) -> List[dict]:
+    """Soma as transações pagas do intervalo por conta."""
+    queryset, _, campo_valor = _fonte(casa, inicio, fim)
+
+    totais = queryset.filter(
+        tipo=tipo
+    ).values('conta_id', 'conta__nome').annotate(
+        total=Sum(campo_valor)
+    ).order_by('-total', 'conta__nome')
+
+    return [{'conta': item['conta__nome'], 'total': float(item['total'])} for item in totais]
+
+
+def serie_temporal(casa, inicio: date, fim: date, granularidade: str = 'mes') -> List[dict]:
+    """
+    Receitas, despesas e saldo pagos por balde de ``granularidade`` no intervalo.
+
+    A série inteira sai de uma única consulta agrupada pela data truncada
+    (``Trunc*``); baldes sem transações são preenchidos com zero em memória.
+    Com granularidade de mês ou maior e intervalo de meses completos, a
+    consulta é feita no resumo mensal.
+    """
+    truncar = GRANULARIDADES[granularidade][0]
+    queryset, campo_data, campo_valor = _fonte(
+        casa, inicio, fim, usar_resumo=granularidade in ('mes', 'trimestre', 'ano')
+    )
+    zero = Value(Decimal('0.00'))
+
+    totais = {
+        item['balde']: item
+        for item in queryset.annotate(
+            balde=truncar(campo_data)
+        ).values('balde').annotate(
+            receitas=Coalesce(Sum(campo_valor, filter=Q(tipo='receita')), zero),
+            despesas=Coalesce(Sum(campo_valor, filter=Q(tipo='despesa')), zero),
+        ).order_by()
+    }
+
+    serie = []
+    for balde in baldes(inicio, fim, granularidade):
+        item = totais.get(balde, {})
+        receitas = item.get('receitas') or Decimal('0.00')
+        despesas = item.get('despesas') or Decimal('0.00')
+        serie.append({
+            'inicio': balde.isoformat(),
+            'rotulo': rotulo_balde(balde, granularidade),
+            'receitas': float(receitas),
+            'despesas': float(despesas),
+            'saldo': float(receitas - despesas),
+        })
+    return serie
@@ -0,0 +1,138 @@
+"""
+Resumo mensal pré-agregado das transações.
+
+Cada linha de ``ResumoMensal`` guarda o total e a quantidade de transações de
+uma combinação casa × mês × tipo × status × categoria × conta. A tabela é
+atualizada incrementalmente a cada gravação de ``Transacao`` e pode ser
+reconstruída a partir das transações com ``reconstruir_resumos``.
+
+Dashboard e relatórios leem daqui, de forma que o custo das consultas cresce
+com o número de meses e não com o número de transações.
+"""
+import calendar
+import logging
+from datetime import date
+from decimal import Decimal
+from typing import Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_CHAVE = ('casa_id', 'tipo', 'status', 'categoria_id', 'conta_id')
+
+
+def _chave(estado: dict) -> dict:
+    """Monta a chave do resumo mensal a partir do estado de uma transação."""
+    chave = {campo: estado[campo] for campo in CAMPOS_CHAVE}
+    chave['mes'] = estado['data'].replace(day=1)
+    return chave
+
+
+def _valor(estado: dict) -> Decimal:
+    return Decimal(str(estado['valor'] or 0)).quantize(Decimal('0.01'))
+
+
+def _somar(chave: dict, total: Decimal, quantidade: int) -> None:
+    """Soma total/quantidade na linha da chave, criando-a se necessário."""
+    from core.models import ResumoMensal
+
+    atualizadas = ResumoMensal.objects.filter(**chave).update(
+        total=F('total') + total,
+        quantidade=F('quantidade') + quantidade,
+    )
+    if atualizadas:
+        return
+
+    try:
+        with transaction.atomic():
+            ResumoMensal.objects.create(**chave, total=total, quantidade=quantidade)
+    except IntegrityError:
+        # Outra requisição criou a linha entre o UPDATE e o INSERT
+        ResumoMensal.objects.filter(**chave).update(
+            total=F('total') + total,
+            quantidade=F('quantidade') + quantidade,
+        )
+
+
+def aplicar_variacao(anterior: Optional[dict], atual: Optional[dict]) -> None:
+    """
+    Aplica no resumo mensal a diferença entre dois estados de uma transação.
+
+    ``None`` representa a ausência da transação (criação ou exclusão).
+    Deve ser chamada dentro de ``transaction.atomic()``.
+    """
+    from core.models import ResumoMensal
+
+    chave_anterior = _chave(anterior) if anterior else None
+    chave_atual = _chave(atual) if atual else None
+
+    if chave_anterior and chave_anterior == chave_atual:
+        delta = _valor(atual) - _valor(anterior)
+        if delta:
+            _somar(chave_atual, delta, 0)
+        return
+
+    if chave_anterior:
+        _somar(chave_anterior, -_valor(anterior), -1)
+        ResumoMensal.objects.filter(**chave_anterior, quantidade=0).delete()
+    if chave_atual:
+        _somar(chave_atual, _valor(atual), 1)
+
+
+def reconstruir_resumos(casa_id: int) -> int:
+    """
+    Recalcula do zero o resumo mensal de uma casa com um único GROUP BY.
+
+    Usado após operações em massa que não passam pelo ``save()`` do modelo
+    (ex.: reatribuição de conta/categoria) e pelo comando ``reconstruir_resumos``.
+    Retorna a quantidade de linhas geradas.
+
+    A linha da casa é travada antes da agregação. ``Transacao.save``/``delete``
+    também passam por ela (``Casa.incrementar_versao``) antes de aplicar a
+    variação, então nenhuma variação se perde entre a agregação e a regravação.
+    """
+    from core.models import Casa, ResumoMensal, Transacao
+
+    with transaction.atomic():
+        Casa.objects.select_for_update().filter(pk=casa_id).values_list('pk').first()
+
+        agregados = Transacao.objects.filter(casa_id=casa_id).annotate(
+            mes=TruncMonth('data')
+        ).values('mes', 'tipo', 'status', 'categoria_id', 'conta_id').annotate(
+            soma=Sum('valor'),
+            qtd=Count('id'),
+        ).order_by()
+
+        linhas = [
+            ResumoMensal(
+                casa_id=casa_id,
+                mes=item['mes'],
+                tipo=item['tipo'],
+                status=item['status'],
+                categoria_id=item['categoria_id'],
+                conta_id=item['conta_id'],
+                total=item['soma'],
+                quantidade=item['qtd'],
+            )
+            for item in agregados
+        ]
+
+        ResumoMensal.objects.filter(casa_id=casa_id).delete()
+        ResumoMensal.objects.bulk_create(linhas, batch_size=500)
+        Casa.incrementar_versao(casa_id)
+
+    logger.info(f"Resumo mensal da casa ID {casa_id} reconstruído: {len(linhas)} linha(s)")
+    return len(linhas)
+
+
+def fim_do_mes(dia: date) -> date:
+    """Retorna o último dia do mês de ``dia``."""
+    return dia.replace(day=calendar.monthrange(dia.year, dia.month)[1])
+
+
+def cobre_meses_completos(inicio: date, fim: date) -> bool:
+    """Indica se o período começa no dia 1 e termina no último dia de um mês."""
+    return inicio.day == 1 and fim == fim_do_mes(fim) and inicio <= fim
@@ -0,0 +1,141 @@
+"""
+Manutenção incremental do saldo materializado de cada conta.
+
+O campo ``Conta.saldo_transacoes`` guarda o efeito líquido (receitas menos
+despesas) de todas as transações da conta. Ele é ajustado com ``F()`` dentro
+da mesma transação de banco que grava a ``Transacao``, de modo que ler o
+saldo de uma conta não exige nenhuma agregação.
+"""
+import logging
+from decimal import Decimal
+from typing import List, Optional
+
+from django.db import transaction
+from django.db.models import F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal('0.00')
+
+
+def efeito_no_saldo(tipo: str, valor) -> Decimal:
+    """Retorna quanto uma transação soma (receita) ou subtrai (despesa) do saldo."""
+    valor = Decimal(str(valor or 0)).quantize(Decimal('0.01'))
+    return valor if tipo == 'receita' else -valor
+
+
+def aplicar_variacao(anterior: Optional[dict], atual: Optional[dict]) -> None:
+    """
+    Aplica a diferença entre o estado anterior e o atual de uma transação.
+
+    Os estados são dicionários com ao menos ``conta_id``, ``tipo`` e ``valor``;
+    ``None`` representa a ausência da transação (criação ou exclusão).
+    Deve ser chamada dentro de ``transaction.atomic()``.
+    """
+    from core.models import Conta
+
+    variacoes = {}
+    if anterior:
+        conta_id = anterior['conta_id']
+        variacoes[conta_id] = variacoes.get(conta_id, ZERO) - efeito_no_saldo(anterior['tipo'], anterior['valor'])
+    if atual:
+        conta_id = atual['conta_id']
+        variacoes[conta_id] = variacoes.get(conta_id, ZERO) + efeito_no_saldo(atual['tipo'], atual['valor'])
+
+    for conta_id, delta in variacoes.items():
+        if delta:
+            Conta.objects.filter(pk=conta_id).update(
+                saldo_transacoes=F('saldo_transacoes') + delta
+            )
+
+
+def mover_transacoes(transacoes, nova_conta) -> int:
+    """
+    Reatribui em massa as transações para ``nova_conta`` mantendo os saldos.
+
+    Substitui ``queryset.update(conta=...)``, que não passa pelo ``save()``
+    do modelo e deixaria os saldos materializados e o resumo mensal
+    desatualizados.
+    """
+    from core.models import Conta
+    from core.services.busca import indexar_transacoes
+    from core.services.resumos import reconstruir_resumos
+
+    with transaction.atomic():
+        efeitos = transacoes.exclude(conta=nova_conta).values('conta_id').annotate(
+            efeito=expressao_efeito()
+        ).order_by()
+        efeitos = list(efeitos)
+
+        ids = list(transacoes.values_list('id', flat=True))
+        quantidade = transacoes.update(conta=nova_conta)
+
+        total = ZERO
+        for item in efeitos:
+            Conta.objects.filter(pk=item['conta_id']).update(
+                saldo_transacoes=F('saldo_transacoes') - item['efeito']
+            )
+            total += item['efeito']
+        if total:
+            Conta.objects.filter(pk=nova_conta.pk).update(
+                saldo_transacoes=F('saldo_transacoes') + total
+            )
+
+        if quantidade:
+            reconstruir_resumos(nova_conta.casa_id)
+            indexar_transacoes(ids)
+
+    return quantidade
+
+
+def expressao_efeito(prefixo: str = ''):
+    """Expressão de agregação com o efeito líquido das transações."""
+    campo = f'{prefixo}valor'
+    return (
+        Coalesce(Sum(campo, filter=Q(**{f'{prefixo}tipo': 'receita'})), Value(ZERO))
+        - Coalesce(Sum(campo, filter=Q(**{f'{prefixo}tipo': 'despesa'})), Value(ZERO))
+    )
+
+
+def verificar_saldos(contas=None, corrigir: bool = False) -> List[dict]:
+    """
+    Recalcula os saldos a partir das transações e compara com os materializados.
+
+    Retorna a lista de contas divergentes. Com ``corrigir=True`` o valor
+    recalculado é gravado nas contas divergentes.
+    """
+    from core.models import Casa, Conta
+
+    if contas is None:
+        contas = Conta.objects.all()
+
+    recalculados = contas.annotate(
+        efeito_real=expressao_efeito('transacoes__')
+    ).values('pk', 'nome', 'casa_id', 'saldo_transacoes', 'efeito_real')
+
+    divergencias = []
+    for conta in recalculados:
+        real = Decimal(conta['efeito_real'] or 0).quantize(Decimal('0.01'))
+        if real != conta['saldo_transacoes']:
+            divergencias.append({
+                'conta_id': conta['pk'],
+                'nome': conta['nome'],
+                'casa_id': conta['casa_id'],
+                'materializado': conta['saldo_transacoes'],
+                'real': real,
+                'diferenca': real - conta['saldo_transacoes'],
+            })
+
+    if corrigir:
+        with transaction.atomic():
+            for item in divergencias:
+                Conta.objects.filter(pk=item['conta_id']).update(saldo_transacoes=item['real'])
+                logger.info(
+                    f"Saldo da conta ID {item['conta_id']} corrigido: "
+                    f"{item['materializado']} -> {item['real']}"
+                )
+            for casa_id in {item['casa_id'] for item in divergencias}:
+                Casa.incrementar_versao(casa_id)
+
+    return divergencias
@@ -0,0 +1,217 @@
+"""
+Correspondência aproximada (por trigramas) para localizar a transação que o
+usuário quer editar pelo chat.
+
+Em "o chocolate custa 3,50" o título informado raramente é idêntico ao
+gravado ("3 chocolates"), e a busca por substring devolve várias linhas,
+forçando um pedido de esclarecimento. Aqui as transações de uma janela
+recente da casa são pontuadas por:
+
+- similaridade de trigramas entre o texto e o título (como no ``pg_trgm``);
+- proximidade do valor, quando os critérios trazem um valor;
+- recência dentro da janela.
+
+No PostgreSQL com a extensão ``pg_trgm`` a similaridade do título é
+calculada e filtrada no banco (``%`` e ``similarity()``), pelo índice GIN de
+trigramas do título normalizado guardado em ``TransacaoBusca``; nos demais,
+por um índice invertido de trigramas montado em memória sobre a janela. Os
+dois comparam o texto sem acentos nem maiúsculas (``normalizar_nome``), então
+pontuam igual. O alvo só é escolhido quando a melhor
+pontuação é alta o bastante e se destaca da segunda.
+"""
+import re
+import weakref
+from dataclasses import dataclass
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import BooleanField, F, FloatField, Func, Value
+
+from core.services.categorias import normalizar_nome
+
+# Janela de candidatos: dias para trás e quantidade máxima de transações
+JANELA_DIAS = 90
+MAX_CANDIDATOS = 300
+
+# Pesos da pontuação (somam 1)
+PESO_TITULO = 0.60
+PESO_VALOR = 0.25
+PESO_RECENCIA = 0.15
+
+# Similaridade mínima do título para um candidato ser considerado
+LIMIAR_TITULO = 0.2
+# Pontuação mínima do alvo e vantagem mínima sobre o segundo colocado
+LIMIAR_ALVO = 0.5
+MARGEM_ALVO = 0.05
+
+
+def trigramas(texto: str) -> Set[str]:
+    """
+    Trigramas de ``texto`` normalizado, no formato do ``pg_trgm``: cada
+    palavra é completada com dois espaços antes e um depois.
+    """
+    resultado = set()
+    for palavra in re.findall(r'[^\W_]+', normalizar_nome(texto)):
+        palavra = f'  {palavra} '
+        resultado.update(palavra[i:i + 3] for i in range(len(palavra) - 2))
+    return resultado
+
+
+def similaridade(a: Set[str], b: Set[str]) -> float:
+    """Razão entre trigramas em comum e trigramas distintos (0 a 1)."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class IndiceTrigramas:
+    """Índice invertido trigrama -> IDs, para comparar o texto só com quem tem trigramas em comum."""
+
+    def __init__(self, itens: Iterable[Tuple[int, str]]):
+        self.trigramas: Dict[int, Set[str]] = {}
+        self.indice: Dict[str, Set[int]] = {}
+        for pk, texto in itens:
+            conjunto = trigramas(texto)
+            self.trigramas[pk] = conjunto
+            for trigrama in conjunto:
+                self.indice.setdefault(trigrama, set()).add(pk)
+
+    def buscar(self, texto: str, limiar: float = LIMIAR_TITULO) -> Dict[int, float]:
+        """Similaridade de cada item com ``texto``, para os que atingem ``limiar``."""
+        consulta = trigramas(texto)
+        candidatos = set()
+        for trigrama in consulta:
+            candidatos |= self.indice.get(trigrama, set())
+        resultado = {}
+        for pk in candidatos:
+            valor = similaridade(consulta, self.trigramas[pk])
+            if valor >= limiar:
+                resultado[pk] = valor
+        return resultado
+
+
+# Resultado de ``pg_trgm_disponivel`` por conexão (a extensão só muda em migrações)
+_pg_trgm_por_conexao = weakref.WeakKeyDictionary()
+
+
+def pg_trgm_disponivel() -> bool:
+    """Indica se o banco é PostgreSQL com a extensão ``pg_trgm`` instalada."""
+    conexao = connections[DEFAULT_DB_ALIAS]
+    if conexao.vendor != 'postgresql':
+        return False
+    if conexao not in _pg_trgm_por_conexao:
+        with conexao.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _pg_trgm_por_conexao[conexao] = cursor.fetchone() is not None
+    return _pg_trgm_por_conexao[conexao]
+
+
+class Semelhante(Func):
+    """``a % b`` do ``pg_trgm``: similaridade acima de ``pg_trgm.similarity_threshold`` (usa o índice GIN)."""
+    template = '%(expressions)s'
+    arg_joiner = ' %% '
+    output_field = BooleanField()
+
+
+class Similaridade(Func):
+    """``similarity(a, b)`` do ``pg_trgm``."""
+    function = 'similarity'
+    output_field = FloatField()
+
+
+@dataclass
+class Candidato:
+    transacao_id: int
+    titulo: str
+    valor: Decimal
+    data: date
+    pontuacao: float
+
+
+def _janela(casa, data: Optional[date], hoje: date, queryset=None):
+    from core.models import Transacao
+
+    if queryset is None:
+        queryset = Transacao.objects.filter(casa=casa)
+    if data:
+        return queryset.filter(data=data)
+    return queryset.filter(data__gte=hoje - timedelta(days=JANELA_DIAS))
+
+
+CAMPOS_CANDIDATO = ('id', 'titulo', 'valor', 'data')
+ORDEM_CANDIDATOS = ('-data', '-criada_em', '-id')
+
+
+def consulta_trigramas(janela, texto: str):
+    """Candidatos da janela com título parecido, pontuados e ordenados pelo ``pg_trgm``."""
+    consulta = Value(normalizar_nome(texto))
+    return (
+        janela.filter(Semelhante(F('busca__titulo'), consulta))
+        .annotate(similaridade_titulo=Similaridade(F('busca__titulo'), consulta))
+        .order_by('-similaridade_titulo', *ORDEM_CANDIDATOS)
+        .values_list(*CAMPOS_CANDIDATO, 'similaridade_titulo')[:MAX_CANDIDATOS]
+    )
+
+
+def _similaridade_titulos(janela, texto: str) -> List[Tuple[int, str, Decimal, date, float]]:
+    if pg_trgm_disponivel():
+        # O limiar do operador % vale só para esta transação de banco
+        with transaction.atomic(), connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute("SELECT set_config('pg_trgm.similarity_threshold', %s, true)", [str(LIMIAR_TITULO)])
+            return list(consulta_trigramas(janela, texto))
+
+    linhas = list(janela.order_by(*ORDEM_CANDIDATOS).values_list(*CAMPOS_CANDIDATO)[:MAX_CANDIDATOS])
+    similares = IndiceTrigramas((pk, titulo) for pk, titulo, _, _ in linhas).buscar(texto)
+    return [(*linha, similares[linha[0]]) for linha in linhas if linha[0] in similares]
+
+
+def proximidade_valor(valor: Decimal, referencia: Decimal) -> float:
+    """1 para valores iguais, caindo até 0 conforme a razão entre eles se afasta de 1."""
+    if valor <= 0 or referencia <= 0:
+        return 0.0
+    return float(min(valor, referencia) / max(valor, referencia))
+
+
+def ranquear_candidatos(
+    casa, texto: str, valor: Optional[Decimal] = None, data: Optional[date] = None,
+    hoje: Optional[date] = None, queryset=None,
+) -> List[Candidato]:
+    """
+    Transações da janela recente (ou da ``data`` informada) cujo título se
+    parece com ``texto``, da maior para a menor pontuação.
+    """
+    hoje = hoje or date.today()
+    if not trigramas(texto):
+        return []
+
+    pesos = [(PESO_TITULO, 'titulo'), (PESO_RECENCIA, 'recencia')]
+    if valor is not None:
+        pesos.append((PESO_VALOR, 'valor'))
+    total_pesos = sum(peso for peso, _ in pesos)
+
+    candidatos = []
+    for pk, titulo, valor_transacao, data_transacao, sim in _similaridade_titulos(
+        _janela(casa, data, hoje, queryset), texto
+    ):
+        idade = max((hoje - data_transacao).days, 0)
+        componentes = {
+            'titulo': sim,
+            'recencia': max(0.0, 1 - idade / JANELA_DIAS),
+            'valor': proximidade_valor(valor_transacao, valor) if valor is not None else 0.0,
+        }
+        pontuacao = sum(peso * componentes[nome] for peso, nome in pesos) / total_pesos
+        candidatos.append(Candidato(pk, titulo, valor_transacao, data_transacao, round(pontuacao, 4)))
+
+    candidatos.sort(key=lambda c: (c.pontuacao, c.data, c.transacao_id), reverse=True)
+    return candidatos
+
+
+def escolher_alvo(candidatos: List[Candidato]) -> Optional[Candidato]:
+    """O melhor candidato, se passar do limiar e se destacar do segundo; senão ``None``."""
+    if not candidatos or candidatos[0].pontuacao < LIMIAR_ALVO:
+        return None
+    if len(candidatos) > 1 and candidatos[0].pontuacao - candidatos[1].pontuacao < MARGEM_ALVO:
+        return None
+    return candidatos[0]
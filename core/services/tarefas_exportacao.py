@@ -0,0 +1,216 @@
+"""
+Exportações em segundo plano.
+
+A requisição apenas registra uma ``Exportacao`` pendente (ou reaproveita
+uma equivalente) e responde na hora; o arquivo é gerado pelo comando
+``processar_exportacoes``, que consome a fila com um pool de threads e grava
+o resultado no ``MEDIA_ROOT``. O progresso fica na própria linha e o
+download é feito por um link assinado que expira.
+
+Dois pedidos são equivalentes quando têm a mesma casa, formato e
+parâmetros e os dados da casa não mudaram desde o primeiro (a chave inclui
+``Casa.versao_dados``, ver ``core.services.cache_casa``).
+"""
+import hashlib
+import json
+import logging
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from core.services.cache_casa import chave_casa
+from core.services.relatorios import intervalo_periodo
+
+logger = logging.getLogger(__name__)
+
+SALT_DOWNLOAD = 'core.exportacao.download'
+
+EXTENSOES = {'csv': 'csv', 'xlsx': 'xlsx', 'pdf': 'pdf'}
+TIPOS_CONTEUDO = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'pdf': 'application/pdf',
+}
+
+
+def chave_exportacao(casa, formato: str, parametros: dict) -> str:
+    """Hash que identifica pedidos equivalentes sobre a mesma versão dos dados."""
+    chave = chave_casa(casa, 'exportacao', formato, json.dumps(parametros, sort_keys=True))
+    return hashlib.sha256(chave.encode()).hexdigest()
+
+
+def solicitar_exportacao(casa, usuario, formato: str, parametros: dict) -> Tuple[object, bool]:
+    """
+    Registra uma exportação pendente ou reaproveita uma equivalente ainda
+    na fila, em andamento ou concluída e não expirada. Retorna
+    ``(exportacao, reaproveitada)``.
+    """
+    from core.models import Exportacao
+
+    if formato == 'pdf':
+        # Fixa o intervalo do período no momento do pedido
+        inicio, fim = intervalo_periodo(timezone.localdate(), parametros.get('periodo', 'mes'))
+        parametros = {**parametros, 'inicio': inicio.isoformat(), 'fim': fim.isoformat()}
+    chave = chave_exportacao(casa, formato, parametros)
+
+    existente = Exportacao.objects.filter(casa=casa, chave=chave).filter(
+        Q(status__in=('pendente', 'processando')) | Q(status='concluida', expira_em__gt=timezone.now())
+    ).order_by('-criada_em').first()
+    if existente:
+        return existente, True
+
+    exportacao = Exportacao.objects.create(
+        casa=casa, solicitada_por=usuario, formato=formato, parametros=parametros, chave=chave,
+    )
+    logger.info(f"Exportação ID {exportacao.pk} ({formato}) solicitada para a casa ID {casa.pk}")
+    return exportacao, False
+
+
+def _transacoes(exportacao):
+    from core.forms import FiltroTransacaoForm
+    from core.models import Transacao
+
+    filtro = FiltroTransacaoForm(exportacao.parametros, casa=exportacao.casa)
+    return filtro.filtrar_queryset(Transacao.objects.filter(casa=exportacao.casa))
+
+
+def _gerar_arquivo(exportacao, arquivo) -> None:
+    from core.models import Exportacao
+    from core.services.exportacao import gerar_csv, gerar_xlsx, linhas_exportacao
+    from core.services.relatorio_pdf import relatorio_pdf
+
+    if exportacao.formato == 'pdf':
+        # O relatório é renderizado (ou reaproveitado) no cache em disco e copiado
+        parametros = exportacao.parametros
+        with relatorio_pdf(
+            exportacao.casa, date.fromisoformat(parametros['inicio']), date.fromisoformat(parametros['fim'])
+        ) as origem:
+            shutil.copyfileobj(origem, arquivo)
+        return
+
+    transacoes = _transacoes(exportacao)
+    total = transacoes.count() or 1
+
+    def ao_avancar(lidas):
+        # Reserva os últimos pontos percentuais para a gravação do arquivo
+        Exportacao.objects.filter(pk=exportacao.pk).update(progresso=min(95, lidas * 95 // total))
+
+    if exportacao.formato == 'csv':
+        for bloco in gerar_csv(linhas_exportacao(transacoes, ao_avancar)):
+            arquivo.write(bloco.encode('utf-8'))
+    else:
+        gerar_xlsx(transacoes, arquivo, ao_avancar)
+
+
+def processar_exportacao(exportacao_id: int) -> bool:
+    """
+    Gera o arquivo de uma exportação pendente. A exportação é reservada com
+    um UPDATE condicional, de modo que dois processos nunca geram a mesma.
+    Retorna ``True`` se a exportação foi concluída.
+    """
+    from core.models import Exportacao
+
+    reservada = Exportacao.objects.filter(pk=exportacao_id, status='pendente').update(
+        status='processando', iniciada_em=timezone.now(), progresso=0, erro='',
+    )
+    if not reservada:
+        return False
+
+    exportacao = Exportacao.objects.select_related('casa').get(pk=exportacao_id)
+    try:
+        with tempfile.TemporaryFile() as arquivo:
+            _gerar_arquivo(exportacao, arquivo)
+            arquivo.seek(0)
+            nome = f'{exportacao.formato}_{exportacao.casa_id}_{exportacao.pk}.{EXTENSOES[exportacao.formato]}'
+            exportacao.arquivo.save(nome, File(arquivo), save=False)
+    except Exception as e:
+        logger.exception(f"Erro ao gerar a exportação ID {exportacao_id}")
+        Exportacao.objects.filter(pk=exportacao_id).update(status='erro', erro=str(e)[:1000])
+        return False
+
+    agora = timezone.now()
+    Exportacao.objects.filter(pk=exportacao_id).update(
+        arquivo=exportacao.arquivo.name, status='concluida', progresso=100, concluida_em=agora,
+        expira_em=agora + timedelta(seconds=settings.EXPORTACAO_RETENCAO),
+    )
+    logger.info(f"Exportação ID {exportacao_id} concluída: {exportacao.arquivo.name}")
+    return True
+
+
+def _processar_em_thread(exportacao_id: int) -> bool:
+    try:
+        return processar_exportacao(exportacao_id)
+    finally:
+        # Cada thread abre a própria conexão; fecha ao terminar
+        connection.close()
+
+
+def processar_pendentes(workers: int = 1, limite: Optional[int] = None) -> List[int]:
+    """
+    Processa as exportações pendentes, das mais antigas para as mais novas,
+    com até ``workers`` threads. Retorna os IDs concluídos.
+    """
+    from core.models import Exportacao
+
+    pendentes = Exportacao.objects.filter(status='pendente').order_by('criada_em').values_list('pk', flat=True)
+    ids = list(pendentes[:limite] if limite else pendentes)
+    if not ids:
+        return []
+
+    if workers <= 1:
+        resultados = [processar_exportacao(pk) for pk in ids]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            resultados = list(pool.map(_processar_em_thread, ids))
+    return [pk for pk, concluida in zip(ids, resultados) if concluida]
+
+
+def recuperar_interrompidas(tempo_limite: Optional[int] = None) -> int:
+    """Devolve à fila exportações em processamento há mais de ``tempo_limite`` segundos (worker interrompido)."""
+    from core.models import Exportacao
+
+    tempo_limite = tempo_limite or settings.EXPORTACAO_TEMPO_LIMITE
+    return Exportacao.objects.filter(
+        status='processando', iniciada_em__lt=timezone.now() - timedelta(seconds=tempo_limite)
+    ).update(status='pendente', progresso=0)
+
+
+def limpar_expiradas() -> int:
+    """Apaga os arquivos e registros de exportações expiradas ou com erro antigo."""
+    from core.models import Exportacao
+
+    agora = timezone.now()
+    expiradas = Exportacao.objects.filter(
+        Q(status='concluida', expira_em__lte=agora)
+        | Q(status='erro', criada_em__lte=agora - timedelta(seconds=settings.EXPORTACAO_RETENCAO))
+    )
+    expiradas = list(expiradas)
+    for exportacao in expiradas:
+        if exportacao.arquivo:
+            exportacao.arquivo.delete(save=False)
+        exportacao.delete()
+    return len(expiradas)
+
+
+def token_download(exportacao) -> str:
+    return signing.TimestampSigner(salt=SALT_DOWNLOAD).sign(str(exportacao.pk))
+
+
+def token_valido(exportacao, token: str) -> bool:
+    """Confere a assinatura e a validade (``EXPORTACAO_LINK_VALIDADE``) do token de download."""
+    try:
+        valor = signing.TimestampSigner(salt=SALT_DOWNLOAD).unsign(
+            token, max_age=settings.EXPORTACAO_LINK_VALIDADE
+        )
+    except signing.BadSignature:
+        return False
+    return valor == str(exportacao.pk)
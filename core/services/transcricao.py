@@ -0,0 +1,153 @@
+"""
+Recebimento e transcrição dos áudios do chat.
+
+``AudioUploadHandler`` (primeiro de ``FILE_UPLOAD_HANDLERS``) grava o campo
+``audio`` direto num arquivo temporário conforme os blocos chegam, calculando
+o SHA-256 e o tamanho no caminho. Se o áudio passa de
+``CHAT_AUDIO_MAX_BYTES`` o arquivo é descartado na hora e a requisição fica
+marcada (``audio_acima_do_limite``); o restante do corpo não chega a ser
+guardado. O arquivo segue para o SDK da OpenAI sem cópias em memória.
+
+O texto transcrito fica no banco (``TranscricaoAudio``) por usuário, hash do
+áudio e modelo, durante ``CHAT_TRANSCRICAO_CACHE_TIMEOUT`` segundos. Assim o
+reenvio do mesmo áudio (repetição do celular ou envio duplicado) não chama a
+OpenAI nem registra uso, qualquer que seja o worker que receba a repetição.
+A cota da casa é verificada pelas views antes de transcrever.
+"""
+import hashlib
+import logging
+from datetime import timedelta
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopFutureHandlers
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CAMPO_AUDIO = 'audio'
+BLOCO_LEITURA = 64 * 1024
+
+
+class AudioUploadHandler(FileUploadHandler):
+    """
+    Grava o campo ``audio`` em disco calculando SHA-256 e tamanho.
+
+    Os demais arquivos seguem para os handlers padrão do Django.
+    """
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.ativo = field_name == CAMPO_AUDIO
+        if not self.ativo:
+            return
+        self.file = TemporaryUploadedFile(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+        self.hash = hashlib.sha256()
+        self.tamanho = 0
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.ativo:
+            return raw_data
+        self.tamanho += len(raw_data)
+        if self.tamanho > settings.CHAT_AUDIO_MAX_BYTES:
+            self.ativo = False
+            self.request.audio_acima_do_limite = True
+            logger.warning("Áudio descartado: passou de %d bytes", settings.CHAT_AUDIO_MAX_BYTES)
+            # Fechar o temporário já o apaga do disco (o Django só fecha os arquivos se o parse falhar)
+            self.file.close()
+            raise SkipFile()
+        self.hash.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.ativo:
+            return None
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.hash.hexdigest()
+        return self.file
+
+
+def audio_acima_do_limite(request) -> bool:
+    """Indica se o ``AudioUploadHandler`` descartou o áudio desta requisição."""
+    return getattr(request, 'audio_acima_do_limite', False)
+
+
+def mensagem_audio_acima_do_limite() -> str:
+    limite_mb = settings.CHAT_AUDIO_MAX_BYTES / (1024 * 1024)
+    return f"O áudio passa do limite de {limite_mb:g} MB. Grave uma mensagem mais curta ou digite."
+
+
+def hash_do_audio(arquivo) -> str:
+    """SHA-256 do áudio: o calculado no upload ou lido em blocos do arquivo."""
+    calculado = getattr(arquivo, 'sha256', None)
+    if calculado:
+        return calculado
+    hash_ = hashlib.sha256()
+    if hasattr(arquivo, 'chunks'):
+        for bloco in arquivo.chunks():
+            hash_.update(bloco)
+    else:
+        arquivo.seek(0)
+        for bloco in iter(lambda: arquivo.read(BLOCO_LEITURA), b''):
+            hash_.update(bloco)
+    arquivo.seek(0)
+    return hash_.hexdigest()
+
+
+def _validade():
+    return timezone.now() - timedelta(seconds=settings.CHAT_TRANSCRICAO_CACHE_TIMEOUT)
+
+
+def _guardadas(usuario, sha256: str):
+    from core.models import TranscricaoAudio
+
+    return TranscricaoAudio.objects.filter(
+        usuario_id=usuario.pk, sha256=sha256, modelo=settings.OPENAI_TRANSCRIPTION_MODEL,
+        criada_em__gte=_validade(),
+    ).values_list('texto', flat=True)
+
+
+def _guardar(usuario, sha256: str, texto: str) -> None:
+    """Grava o texto (renovando a validade) e apaga as transcrições vencidas do usuário."""
+    from core.models import TranscricaoAudio
+
+    TranscricaoAudio.objects.filter(usuario_id=usuario.pk, criada_em__lt=_validade()).delete()
+    TranscricaoAudio.objects.update_or_create(
+        usuario_id=usuario.pk, sha256=sha256, modelo=settings.OPENAI_TRANSCRIPTION_MODEL,
+        defaults={'texto': texto, 'criada_em': timezone.now()},
+    )
+
+
+def transcrever_audio(usuario, client, arquivo) -> str:
+    """Texto do áudio, do banco quando o usuário já enviou o mesmo conteúdo."""
+    sha256 = hash_do_audio(arquivo)
+    autenticado = getattr(usuario, 'is_authenticated', False)
+    if autenticado:
+        texto: Optional[str] = _guardadas(usuario, sha256).first()
+        if texto is not None:
+            logger.info("Transcrição reaproveitada de um envio anterior")
+            return texto
+    texto = client.transcribe_audio(arquivo)
+    if texto and autenticado:
+        _guardar(usuario, sha256, texto)
+    return texto
+
+
+async def atranscrever_audio(usuario, client, arquivo) -> str:
+    """Versão assíncrona de ``transcrever_audio``."""
+    sha256 = getattr(arquivo, 'sha256', None) or await sync_to_async(hash_do_audio)(arquivo)
+    autenticado = getattr(usuario, 'is_authenticated', False)
+    if autenticado:
+        texto: Optional[str] = await _guardadas(usuario, sha256).afirst()
+        if texto is not None:
+            logger.info("Transcrição reaproveitada de um envio anterior")
+            return texto
+    texto = await client.atranscribe_audio(arquivo)
+    if texto and autenticado:
+        await sync_to_async(_guardar)(usuario, sha256, texto)
+    return texto
@@ -0,0 +1,125 @@
+"""
+Telemetria de uso da OpenAI e cota diária de tokens por casa.
+
+``OpenAIClient`` anota cada chamada (operação, modelo, duração, tokens do
+prompt, da resposta e servidos do cache, repetições e sucesso) em
+``OpenAIClient.chamadas``. Ao fim da mensagem, as views gravam essas
+anotações em ``UsoLLM`` com o usuário, a casa e a intenção resultante, e o
+admin agrega a tabela.
+
+A cota é verificada antes de cada chamada: se os tokens gravados hoje (fuso
+do projeto) para a casa já alcançaram o limite, a chamada nem é feita. O
+limite vem de ``Casa.cota_diaria_tokens`` ou, se vazio, de
+``LLM_COTA_DIARIA_TOKENS``; 0 significa sem limite. A soma usa o índice
+(casa, criado_em).
+"""
+import logging
+from datetime import datetime, time
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class CotaExcedida(Exception):
+    """A casa já consumiu a cota diária de tokens da OpenAI."""
+
+    def __init__(self, limite: int, usados: int) -> None:
+        super().__init__(f"Cota diária de {limite} tokens atingida ({usados} usados hoje)")
+        self.limite = limite
+        self.usados = usados
+
+
+def _inicio_do_dia() -> datetime:
+    return timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+
+
+def _usos_de_hoje(casa_id):
+    from core.models import UsoLLM
+
+    return UsoLLM.objects.filter(casa_id=casa_id, criado_em__gte=_inicio_do_dia())
+
+
+def _limite(cota_da_casa: Optional[int]) -> int:
+    return settings.LLM_COTA_DIARIA_TOKENS if cota_da_casa is None else cota_da_casa
+
+
+def tokens_usados_hoje(casa_id) -> int:
+    return _usos_de_hoje(casa_id).aggregate(total=Sum('tokens_total'))['total'] or 0
+
+
+def verificar_cota(usuario) -> None:
+    """Levanta ``CotaExcedida`` se a casa do usuário já atingiu a cota do dia."""
+    from core.models import Casa
+
+    casa_id = getattr(usuario, 'casa_id', None)
+    if casa_id is None:
+        return
+    limite = _limite(Casa.objects.filter(pk=casa_id).values_list('cota_diaria_tokens', flat=True).first())
+    if not limite:
+        return
+    usados = tokens_usados_hoje(casa_id)
+    if usados >= limite:
+        logger.warning("Cota diária de tokens atingida pela casa %s: %d/%d", casa_id, usados, limite)
+        raise CotaExcedida(limite, usados)
+
+
+async def averificar_cota(usuario) -> None:
+    """Versão assíncrona de ``verificar_cota`` (ORM assíncrono)."""
+    from core.models import Casa
+
+    casa_id = getattr(usuario, 'casa_id', None)
+    if casa_id is None:
+        return
+    casa = await Casa.objects.filter(pk=casa_id).values('cota_diaria_tokens').afirst()
+    limite = _limite(casa['cota_diaria_tokens'] if casa else None)
+    if not limite:
+        return
+    usados = (await _usos_de_hoje(casa_id).aaggregate(total=Sum('tokens_total')))['total'] or 0
+    if usados >= limite:
+        logger.warning("Cota diária de tokens atingida pela casa %s: %d/%d", casa_id, usados, limite)
+        raise CotaExcedida(limite, usados)
+
+
+def _registros(usuario, chamadas: Iterable[Dict[str, Any]], intent: Optional[str]) -> List:
+    from core.models import UsoLLM
+
+    autenticado = getattr(usuario, 'is_authenticated', False)
+    return [
+        UsoLLM(
+            casa_id=getattr(usuario, 'casa_id', None) if autenticado else None,
+            usuario_id=usuario.pk if autenticado else None,
+            intent=intent or '',
+            **chamada,
+        )
+        for chamada in chamadas
+    ]
+
+
+def registrar_uso(usuario, chamadas: Iterable[Dict[str, Any]], intent: Optional[str] = None) -> None:
+    """Grava as chamadas anotadas pelo ``OpenAIClient``; falhas só geram aviso no log."""
+    from core.models import UsoLLM
+
+    registros = _registros(usuario, chamadas, intent)
+    if not registros:
+        return
+    try:
+        UsoLLM.objects.bulk_create(registros)
+    except Exception as e:
+        logger.warning(f"Erro ao registrar uso da OpenAI: {e}")
+
+
+async def aregistrar_uso(usuario, chamadas: Iterable[Dict[str, Any]], intent: Optional[str] = None) -> None:
+    """Versão assíncrona de ``registrar_uso``."""
+    from core.models import UsoLLM
+
+    registros = _registros(usuario, chamadas, intent)
+    if not registros:
+        return
+    try:
+        await UsoLLM.objects.abulk_create(registros)
+    except Exception as e:
+        logger.warning(f"Erro ao registrar uso da OpenAI: {e}")
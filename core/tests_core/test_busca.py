@@ -0,0 +1,161 @@
+"""
+Testes da busca textual nas transações.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from core.models import Casa, Conta, Categoria, Transacao, TransacaoBusca
+from core.services.busca import buscar_ids, buscar_transacoes
+from core.services.categorias import mesclar_categorias
+
+User = get_user_model()
+
+
+class BuscaTransacoesTestCase(TestCase):
+
+    def setUp(self):
+        self.casa = Casa.objects.create(nome="Casa Teste", codigo_convite='BUSCA001')
+        self.user = User.objects.create_user(username='testuser', password='testpass123', casa=self.casa)
+        self.conta = Conta.objects.create(casa=self.casa, nome='Cartão Nubank')
+        self.saude = Categoria.objects.create(casa=self.casa, nome='Saúde', tipo='despesa')
+        self.mercado = Categoria.objects.create(casa=self.casa, nome='Mercado', tipo='despesa')
+        self.hoje = date(2024, 6, 15)
+
+    def _criar(self, titulo, categoria=None, dias_atras=0, **kwargs):
+        return Transacao.objects.create(
+            casa=self.casa, conta=self.conta, categoria=categoria or self.mercado,
+            titulo=titulo, valor=Decimal('10.00'), data=self.hoje - timedelta(days=dias_atras),
+            pago_por=self.user, **kwargs
+        )
+
+    def _buscar(self, texto):
+        return buscar_ids(self.casa, texto, self.hoje)
+
+    def test_ignora_acentos_caixa_e_aceita_prefixo(self):
+        farmacia = self._criar('Remédios na Farmácia São João', self.saude)
+        self._criar('Pão de açúcar')
+
+        self.assertEqual(self._buscar('farmacia'), [farmacia.id])
+        self.assertEqual(self._buscar('FARMÁ'), [farmacia.id])
+        self.assertEqual(self._buscar('remedio sao'), [farmacia.id])
+        self.assertEqual(self._buscar('farmacia padaria'), [])
+        self.assertEqual(self._buscar('  !! '), [])
+
+    def test_busca_em_observacao_categoria_e_conta(self):
+        transacao = self._criar('Consulta', self.saude, observacao='Dr. Álvaro, retorno')
+
+        self.assertEqual(self._buscar('saude'), [transacao.id])
+        self.assertEqual(self._buscar('alvaro'), [transacao.id])
+        self.assertEqual(self._buscar('nubank'), [transacao.id])
+
+    def test_ordena_por_relevancia_e_data(self):
+        antiga = self._criar('Uber', dias_atras=60)
+        recente = self._criar('Uber', dias_atras=1)
+        relevante = self._criar('Uber uber uber', dias_atras=30, observacao='uber')
+
+        ids = self._buscar('uber')
+        self.assertEqual(set(ids), {antiga.id, recente.id, relevante.id})
+        # Mesma relevância: a mais recente primeiro
+        self.assertLess(ids.index(recente.id), ids.index(antiga.id))
+
+    def test_restrita_a_casa(self):
+        outra = Casa.objects.create(nome='Outra', codigo_convite='BUSCA002')
+        conta = Conta.objects.create(casa=outra, nome='Carteira')
+        categoria = Categoria.objects.create(casa=outra, nome='Mercado', tipo='despesa')
+        Transacao.objects.create(
+            casa=outra, conta=conta, categoria=categoria, titulo='Padaria',
+            valor=Decimal('5.00'), data=self.hoje, pago_por=self.user,
+        )
+        minha = self._criar('Padaria')
+
+        self.assertEqual(self._buscar('padaria'), [minha.id])
+
+    def test_documento_acompanha_gravacoes(self):
+        transacao = self._criar('Padaria')
+        self.assertEqual(self._buscar('padaria'), [transacao.id])
+
+        transacao.titulo = 'Açougue'
+        transacao.save()
+        self.assertEqual(self._buscar('padaria'), [])
+        self.assertEqual(self._buscar('acougue'), [transacao.id])
+
+        self.mercado.nome = 'Supermercado'
+        self.mercado.save()
+        self.assertEqual(self._buscar('supermercado'), [transacao.id])
+
+        self.conta.nome = 'Inter'
+        self.conta.save()
+        self.assertEqual(self._buscar('inter'), [transacao.id])
+        self.assertEqual(self._buscar('nubank'), [])
+
+        transacao.delete()
+        self.assertEqual(self._buscar('acougue'), [])
+        self.assertFalse(TransacaoBusca.objects.exists())
+
+    def test_mesclagem_reindexa_transacoes(self):
+        duplicada = Categoria.objects.create(casa=self.casa, nome='Mercadinho', tipo='despesa')
+        transacao = self._criar('Compra', duplicada)
+        self.assertEqual(self._buscar('mercadinho'), [transacao.id])
+
+        mesclar_categorias(self.mercado, [duplicada])
+        self.assertEqual(self._buscar('mercadinho'), [])
+        self.assertEqual(self._buscar('compra mercado'), [transacao.id])
+
+    def test_filtros_adicionais(self):
+        hoje = self._criar('Padaria')
+        self._criar('Padaria', dias_atras=2)
+
+        resultado = buscar_transacoes(
+            self.casa, 'padaria', self.hoje, queryset=Transacao.objects.filter(casa=self.casa, data=self.hoje)
+        )
+        self.assertEqual([t.id for t in resultado], [hoje.id])
+
+    def test_busca_do_chat(self):
+        from core.chat_views.chat_views import search_transactions
+
+        farmacia = self._criar('Drogasil', self.saude)
+        self._criar('Padaria')
+
+        encontradas = search_transactions(self.user, {'category': 'saude'})
+        self.assertEqual([t.id for t in encontradas], [farmacia.id])
+
+        encontradas = search_transactions(self.user, {'title_contains': 'drogas', 'date': self.hoje.isoformat()})
+        self.assertEqual(encontradas.count(), 1)
+        self.assertEqual(encontradas.first(), farmacia)
+
+
+class BuscaApiTestCase(TestCase):
+
+    def setUp(self):
+        self.casa = Casa.objects.create(nome="Casa Teste", codigo_convite='BUSCA003')
+        self.user = User.objects.create_user(username='testuser', password='testpass123', casa=self.casa)
+        conta = Conta.objects.create(casa=self.casa, nome='Carteira')
+        categoria = Categoria.objects.create(casa=self.casa, nome='Transporte', tipo='despesa')
+        self.transacao = Transacao.objects.create(
+            casa=self.casa, conta=conta, categoria=categoria, titulo='Ônibus',
+            valor=Decimal('4.40'), data=date.today(), pago_por=self.user,
+        )
+        self.client.login(username='testuser', password='testpass123')
+        self.url = reverse('api_busca_transacoes')
+
+    def test_retorna_resultados(self):
+        response = self.client.get(self.url, {'q': 'onibus'})
+        self.assertEqual(response.status_code, 200)
+        dados = response.json()
+        self.assertEqual([item['id'] for item in dados['resultados']], [self.transacao.id])
+        self.assertEqual(dados['resultados'][0]['categoria'], 'Transporte')
+        self.assertEqual(dados['resultados'][0]['valor'], 4.4)
+
+    def test_etag_e_limite(self):
+        response = self.client.get(self.url, {'q': 'onibus'})
+        etag = response['ETag']
+        response = self.client.get(self.url, {'q': 'onibus'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.assertEqual(self.client.get(self.url, {'q': 'x', 'limite': '0'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'q': 'x', 'limite': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url).json()['resultados'], [])
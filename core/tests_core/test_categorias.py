@@ -0,0 +1,111 @@
+"""
+Testes de normalização e mesclagem de categorias.
+"""
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import TestCase
+
+from core.forms import CategoriaForm
+from core.models import Casa, Conta, Categoria, Meta, ResumoMensal, Transacao
+from core.services.categorias import mesclar_categorias, normalizar_nome, obter_ou_criar_categoria
+from core.services.relatorios import totais_por_categoria
+from core.services.resumos import fim_do_mes
+
+User = get_user_model()
+
+
+class CategoriaNormalizadaTestCase(TestCase):
+
+    def setUp(self):
+        self.casa = Casa.objects.create(nome="Casa Teste")
+        self.mercado = Categoria.objects.create(casa=self.casa, nome='Mercado', tipo='despesa', cor='#ff0000')
+
+    def test_normalizar_nome(self):
+        self.assertEqual(normalizar_nome('  Alimentação   Fora '), 'alimentacao fora')
+        self.assertEqual(normalizar_nome('SAÚDE'), normalizar_nome('saude'))
+
+    def test_obter_ou_criar_reaproveita_por_nome_normalizado_e_tipo(self):
+        categoria, criada = obter_ou_criar_categoria(self.casa, ' mercádo ', 'despesa')
+        self.assertFalse(criada)
+        self.assertEqual(categoria, self.mercado)
+
+        receita, criada = obter_ou_criar_categoria(self.casa, 'Mercado', 'receita')
+        self.assertTrue(criada)
+        self.assertEqual(receita.tipo, 'receita')
+
+    def test_restricao_unica(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Categoria.objects.create(casa=self.casa, nome='MERCADO', tipo='despesa')
+
+    def test_formulario_rejeita_duplicata(self):
+        form = CategoriaForm({'nome': 'mercado', 'tipo': 'despesa', 'icone': 'bi-tag', 'cor': '#000000'}, casa=self.casa)
+        self.assertFalse(form.is_valid())
+        self.assertIn('nome', form.errors)
+
+        form = CategoriaForm(
+            {'nome': 'MERCADO', 'tipo': 'despesa', 'icone': 'bi-tag', 'cor': '#000000'},
+            instance=self.mercado, casa=self.casa
+        )
+        self.assertTrue(form.is_valid())
+
+
+class MesclarCategoriasTestCase(TestCase):
+
+    def setUp(self):
+        self.casa = Casa.objects.create(nome="Casa Teste")
+        self.user = User.objects.create_user(username='testuser', password='testpass123', casa=self.casa)
+        self.conta = Conta.objects.create(casa=self.casa, nome='Carteira', saldo_inicial=Decimal('100.00'))
+        self.mercado = Categoria.objects.create(casa=self.casa, nome='Mercado', tipo='despesa', cor='#ff0000')
+        self.supermercado = Categoria.objects.create(casa=self.casa, nome='Supermercado', tipo='despesa')
+        self.salario = Categoria.objects.create(casa=self.casa, nome='Salário', tipo='receita')
+        for categoria, valor in ((self.mercado, '10.00'), (self.supermercado, '5.00'), (self.supermercado, '2.50')):
+            Transacao.objects.create(
+                casa=self.casa, conta=self.conta, categoria=categoria, titulo='Compra',
+                valor=Decimal(valor), data=date.today(), pago_por=self.user,
+            )
+
+    def test_mesclar_reatribui_e_reagrega(self):
+        hoje = date.today()
+        Meta.objects.create(casa=self.casa, tipo='category_limit', categoria=self.mercado, valor=Decimal('50'), mes=hoje.month, ano=hoje.year)
+        Meta.objects.create(casa=self.casa, tipo='category_limit', categoria=self.supermercado, valor=Decimal('80'), mes=hoje.month, ano=hoje.year)
+        Meta.objects.create(casa=self.casa, tipo='category_limit', categoria=self.supermercado, valor=Decimal('90'), mes=1, ano=2000)
+
+        self.assertEqual(mesclar_categorias(self.mercado, [self.supermercado]), 2)
+
+        self.assertFalse(Categoria.objects.filter(pk=self.supermercado.pk).exists())
+        self.assertEqual(self.mercado.transacoes.count(), 3)
+        self.assertEqual(Meta.objects.filter(categoria=self.mercado).count(), 2)
+        self.assertEqual(ResumoMensal.objects.get(categoria=self.mercado).total, Decimal('17.50'))
+        self.conta.refresh_from_db()
+        self.assertEqual(self.conta.saldo_atual, Decimal('82.50'))
+
+    def test_tipos_diferentes_nao_mesclam(self):
+        with self.assertRaises(ValueError):
+            mesclar_categorias(self.mercado, [self.salario])
+
+    def test_totais_agrupados_por_id_com_cor(self):
+        inicio = date.today().replace(day=1)
+        with self.assertNumQueries(1):
+            totais = totais_por_categoria(self.casa, 'despesa', inicio, fim_do_mes(inicio))
+        self.assertEqual(totais, [
+            {'categoria': 'Mercado', 'total': 10.0, 'cor': '#ff0000'},
+            {'categoria': 'Supermercado', 'total': 7.5, 'cor': '#6c757d'},
+        ])
+
+    def test_comando(self):
+        saida = StringIO()
+        call_command('mesclar_categorias', stdout=saida)
+        self.assertIn('Nenhuma categoria duplicada', saida.getvalue())
+
+        saida = StringIO()
+        call_command('mesclar_categorias', '--destino', str(self.mercado.pk), '--origem', str(self.supermercado.pk), '--simular', stdout=saida)
+        self.assertIn('Simulação', saida.getvalue())
+        self.assertTrue(Categoria.objects.filter(pk=self.supermercado.pk).exists())
+
+        call_command('mesclar_categorias', '--destino', str(self.mercado.pk), '--origem', str(self.supermercado.pk), stdout=StringIO())
+        self.assertFalse(Categoria.objects.filter(pk=self.supermercado.pk).exists())
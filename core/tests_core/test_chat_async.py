@@ -0,0 +1,140 @@
+"""
+Testes do endpoint assíncrono do chat (``chat_message_async_view``).
+"""
+import asyncio
+import json
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.models import Casa, ChatHistory, Transacao
+from core.services import openai_client
+from core.services.openai_client import obter_cliente_openai_async
+
+User = get_user_model()
+
+ATRASO = 0.2
+
+
+def _resposta(conteudo):
+    return {'choices': [{'message': {'content': json.dumps(conteudo)}}]}
+
+
+@override_settings(OPENAI_API_KEY='sk-test')
+class ChatAssincronoTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.casa = Casa.objects.create(nome='Casa', codigo_convite='ASY00001')
+        cls.user = User.objects.create_user(username='assinc', password='x', casa=cls.casa)
+
+    def setUp(self):
+        # Transcrições ficam em cache pelo conteúdo do áudio
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.sdk = MagicMock(name='AsyncOpenAI')
+        self.sdk.with_options.return_value = self.sdk
+        self.sdk.chat.completions.create = AsyncMock(return_value=_resposta(
+            {'intent': 'greeting', 'clarification_needed': False, 'assistant_message': 'Olá!'}
+        ))
+        self.sdk.audio.transcriptions.create = AsyncMock(return_value='gastei 30 na farmácia')
+        patcher = patch('core.services.openai_client.AsyncOpenAI', MagicMock(return_value=self.sdk))
+        self.sdk_classe = patcher.start()
+        self.addCleanup(patcher.stop)
+        openai_client._compartilhados_async.clear()
+        self.addCleanup(openai_client._compartilhados_async.clear)
+        self.url = reverse('chat_message_async')
+
+    async def _post_json(self, dados):
+        return await self.async_client.post(self.url, dados, content_type='application/json')
+
+    async def test_cria_transacao_e_historico(self):
+        self.sdk.chat.completions.create.return_value = _resposta({
+            'intent': 'create_transaction', 'clarification_needed': False, 'assistant_message': 'ok',
+            'transaction': {'type': 'despesa', 'amount': 45.9, 'title': 'Padaria',
+                            'category': 'Alimentação', 'date': '2024-06-03'},
+        })
+        await self.async_client.aforce_login(self.user)
+
+        resposta = await self._post_json({'message': 'gastei 45,90 na padaria', 'context': []})
+
+        self.assertEqual(resposta.status_code, 200)
+        dados = resposta.json()
+        self.assertTrue(dados['transaction_saved'])
+        transacao = await Transacao.objects.select_related('categoria').aget(pk=dados['transaction_id'])
+        self.assertEqual((transacao.titulo, str(transacao.valor)), ('Padaria', '45.90'))
+        self.assertIn('Alimentação', dados['assistant_message'])
+        historico = await ChatHistory.objects.aget(usuario=self.user)
+        self.assertEqual(historico.intent, 'create_transaction')
+
+    async def test_audio_transcrito_pelo_cliente_assincrono(self):
+        await self.async_client.aforce_login(self.user)
+        audio = SimpleUploadedFile('gravacao.webm', b'OggS-audio', content_type='audio/webm')
+
+        resposta = await self.async_client.post(self.url, {'audio': audio, 'context': '[]'})
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['transcribed_text'], 'gastei 30 na farmácia')
+        self.sdk.audio.transcriptions.create.assert_awaited_once()
+        mensagens = self.sdk.chat.completions.create.await_args.kwargs['messages']
+        self.assertEqual(mensagens[-1], {'role': 'user', 'content': 'gastei 30 na farmácia'})
+
+    async def test_requisicoes_simultaneas_nao_se_bloqueiam(self):
+        async def criar(**kwargs):
+            await asyncio.sleep(ATRASO)
+            return _resposta({'intent': 'greeting', 'clarification_needed': False, 'assistant_message': 'Oi'})
+
+        self.sdk.chat.completions.create.side_effect = criar
+        await self.async_client.aforce_login(self.user)
+
+        inicio = time.monotonic()
+        respostas = await asyncio.gather(*[self._post_json({'message': f'oi {n}'}) for n in range(8)])
+        duracao = time.monotonic() - inicio
+
+        self.assertEqual([r.status_code for r in respostas], [200] * 8)
+        # Em série seriam 8 × ATRASO; concorrentes, pouco mais que um
+        self.assertLess(duracao, ATRASO * 4)
+        self.sdk_classe.assert_called_once()
+        self.assertEqual(await ChatHistory.objects.filter(usuario=self.user).acount(), 8)
+
+    async def test_erro_da_openai_vira_resposta_amigavel(self):
+        self.sdk.chat.completions.create.side_effect = RuntimeError('falhou')
+
+        resposta = await self._post_json({'message': 'oi'})
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn('Erro ao conectar', resposta.json()['assistant_message'])
+
+    async def test_validacao_e_metodo(self):
+        resposta = await self._post_json({'message': ''})
+        self.assertEqual(resposta.status_code, 400)
+
+        resposta = await self.async_client.post(self.url, 'não é json', content_type='application/json')
+        self.assertEqual(resposta.status_code, 400)
+
+        resposta = await self.async_client.get(self.url)
+        self.assertEqual(resposta.status_code, 405)
+
+    async def test_cliente_assincrono_unico_por_loop(self):
+        self.assertIs(obter_cliente_openai_async(), obter_cliente_openai_async())
+        self.sdk_classe.assert_called_once()
+
+    def test_endpoint_sincrono_compartilha_o_processamento(self):
+        cliente = MagicMock()
+        cliente.parse_user_message.return_value = {
+            'intent': 'create_transaction', 'clarification_needed': False, 'assistant_message': 'ok',
+            'transaction': {'type': 'despesa', 'amount': 12, 'title': 'Uber', 'date': '2024-06-03'},
+        }
+        self.client.force_login(self.user)
+        with patch('core.chat_views.chat_views.OpenAIClient', return_value=cliente):
+            resposta = self.client.post(reverse('chat_message'), {'message': 'uber 12'}, content_type='application/json')
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta.json()['transaction_saved'])
+        self.assertTrue(Transacao.objects.filter(titulo='Uber', casa=self.casa).exists())
+        self.assertEqual(ChatHistory.objects.filter(usuario=self.user).count(), 1)
@@ -0,0 +1,221 @@
+"""
+Testes do chat em streaming (SSE) e do leitor incremental de JSON.
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core.chat_views.chat_views import _eventos_chat
+from core.models import Casa, ChatHistory, Transacao
+from core.services import openai_client
+from core.services.json_incremental import LeitorJsonIncremental
+
+User = get_user_model()
+
+MENSAGEM = 'Anotei: "café" na padaria\nTotal R$ 7,50 💸'
+RESPOSTA = {
+    'intent': 'create_transaction',
+    'clarification_needed': False,
+    'assistant_message': MENSAGEM,
+    'transaction': {'type': 'despesa', 'amount': 7.5, 'title': 'Café', 'date': '2024-06-03',
+                    'notes': 'assistant_message falso'},
+}
+
+
+def _pedacos(texto, tamanho=3):
+    return [texto[i:i + tamanho] for i in range(0, len(texto), tamanho)]
+
+
+class LeitorJsonIncrementalTestCase(SimpleTestCase):
+
+    def _ler(self, texto, *caminhos, tamanho=1):
+        leitor = LeitorJsonIncremental(*(caminhos or [('assistant_message',)]))
+        emitido = [leitor.alimentar(pedaco) for pedaco in _pedacos(texto, tamanho)]
+        return leitor, emitido
+
+    def test_emite_o_campo_conforme_chega(self):
+        texto = json.dumps(RESPOSTA)  # ASCII: acentos e emoji viram \\uXXXX (par substituto)
+        for tamanho in (1, 2, 5, 64):
+            with self.subTest(tamanho=tamanho):
+                leitor, emitido = self._ler(texto, tamanho=tamanho)
+                self.assertEqual(''.join(emitido), MENSAGEM)
+                self.assertTrue(leitor.completo)
+                self.assertEqual(leitor.resultado(), RESPOSTA)
+
+        # O texto começa a sair antes de o objeto terminar
+        leitor, emitido = self._ler(texto, tamanho=8)
+        primeiro = next(i for i, trecho in enumerate(emitido) if trecho)
+        self.assertLess(primeiro, len(emitido) // 2)
+
+    def test_ignora_cercas_e_campos_aninhados(self):
+        aninhado = {'intent': 'x', 'transaction': {'assistant_message': 'não'}, 'assistant_message': 'sim'}
+        texto = '```json\n' + json.dumps(aninhado, ensure_ascii=False) + '\n```'
+        leitor, emitido = self._ler(texto)
+        self.assertEqual(''.join(emitido), 'sim')
+        self.assertEqual(leitor.resultado(), aninhado)
+
+    def test_formato_json_schema_com_properties(self):
+        texto = json.dumps({'type': 'object', 'properties': {'assistant_message': 'Olá'}})
+        _, emitido = self._ler(texto, ('assistant_message',), ('properties', 'assistant_message'))
+        self.assertEqual(''.join(emitido), 'Olá')
+
+    def test_objeto_incompleto(self):
+        leitor, _ = self._ler('{"assistant_message": "meio')
+        self.assertFalse(leitor.completo)
+        with self.assertRaises(ValueError):
+            leitor.resultado()
+
+
+def _chunk(conteudo):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=conteudo))])
+
+
+class _Stream:
+    """Stream assíncrono de chunks; opcionalmente aguarda ``liberar`` antes do primeiro."""
+
+    def __init__(self, texto, liberar=None):
+        self._chunks = [_chunk(pedaco) for pedaco in _pedacos(texto, 6)]
+        self._liberar = liberar
+        self.fechado = False
+
+    async def close(self):
+        self.fechado = True
+
+    def __aiter__(self):
+        return self._gerar()
+
+    async def _gerar(self):
+        if self._liberar:
+            await self._liberar.wait()
+        for chunk in self._chunks:
+            await asyncio.sleep(0)
+            yield chunk
+
+
+@override_settings(OPENAI_API_KEY='sk-test')
+class ChatStreamTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.casa = Casa.objects.create(nome='Casa', codigo_convite='SSE00001')
+        cls.user = User.objects.create_user(username='stream', password='x', casa=cls.casa)
+
+    def setUp(self):
+        # Transcrições ficam em cache pelo conteúdo do áudio
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.sdk = MagicMock(name='AsyncOpenAI')
+        self.sdk.with_options.return_value = self.sdk
+        self.sdk.chat.completions.create = AsyncMock(side_effect=lambda **kw: _Stream(json.dumps(RESPOSTA)))
+        self.sdk.audio.transcriptions.create = AsyncMock(return_value='café 7,50')
+        patcher = patch('core.services.openai_client.AsyncOpenAI', MagicMock(return_value=self.sdk))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        openai_client._compartilhados_async.clear()
+        self.addCleanup(openai_client._compartilhados_async.clear)
+        self.url = reverse('chat_message_stream')
+
+    @staticmethod
+    def _eventos(blocos):
+        eventos = []
+        for bloco in b''.join(blocos).decode('utf-8').split('\n\n'):
+            if not bloco:
+                continue
+            linhas = dict(linha.split(': ', 1) for linha in bloco.split('\n'))
+            eventos.append((linhas['event'], json.loads(linhas['data'])))
+        return eventos
+
+    async def _consumir(self, resposta):
+        return self._eventos([bloco async for bloco in resposta.streaming_content])
+
+    async def test_eventos_de_uma_mensagem_de_texto(self):
+        await self.async_client.aforce_login(self.user)
+        resposta = await self.async_client.post(
+            self.url, {'message': 'café 7,50 na padaria'}, content_type='application/json'
+        )
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta['Content-Type'].startswith('text/event-stream'))
+        self.assertEqual(resposta['Cache-Control'], 'no-cache')
+        eventos = await self._consumir(resposta)
+
+        nomes = [nome for nome, _ in eventos]
+        self.assertEqual(eventos[0], ('status', {'etapa': 'interpretando', 'mensagem': 'Interpretando a mensagem...'}))
+        self.assertGreater(nomes.count('texto'), 1)
+        self.assertEqual(''.join(dados['delta'] for nome, dados in eventos if nome == 'texto'), MENSAGEM)
+        self.assertLess(nomes.index('texto'), nomes.index('resposta'))
+        self.assertEqual(nomes[-2:], ['status', 'resposta'])
+        self.assertEqual(eventos[-2][1]['etapa'], 'salvando')
+
+        final = eventos[-1][1]
+        self.assertTrue(final['transaction_saved'])
+        self.assertTrue(await Transacao.objects.filter(pk=final['transaction_id'], titulo='Café').aexists())
+        self.assertEqual(await ChatHistory.objects.filter(usuario=self.user).acount(), 1)
+        self.assertIs(self.sdk.chat.completions.create.await_args.kwargs['stream'], True)
+
+    async def test_primeiro_evento_antes_do_modelo_responder(self):
+        liberar = asyncio.Event()
+        self.sdk.chat.completions.create.side_effect = lambda **kw: _Stream(json.dumps(RESPOSTA), liberar)
+
+        resposta = await self.async_client.post(self.url, {'message': 'oi'}, content_type='application/json')
+        conteudo = resposta.streaming_content.__aiter__()
+        primeiro = await asyncio.wait_for(conteudo.__anext__(), timeout=1)
+        self.assertIn(b'event: status', primeiro)
+        self.assertFalse(liberar.is_set())
+
+        liberar.set()
+        restantes = self._eventos([bloco async for bloco in conteudo])
+        self.assertEqual(restantes[-1][0], 'resposta')
+
+    async def test_desconexao_fecha_o_stream_da_openai(self):
+        streams = []
+
+        def abrir(**kw):
+            streams.append(_Stream(json.dumps(RESPOSTA)))
+            return streams[-1]
+        self.sdk.chat.completions.create.side_effect = abrir
+
+        eventos = _eventos_chat(self.user, 'oi', None, {})
+        async for evento in eventos:
+            if 'delta' in evento:
+                break
+        self.assertFalse(streams[0].fechado)
+
+        await eventos.aclose()
+        self.assertTrue(streams[0].fechado)
+
+        await self._consumir(await self.async_client.post(self.url, {'message': 'oi'}, content_type='application/json'))
+        self.assertTrue(streams[1].fechado)
+
+    async def test_audio_envia_transcricao_antes_do_texto(self):
+        audio = SimpleUploadedFile('gravacao.webm', b'OggS-audio', content_type='audio/webm')
+        resposta = await self.async_client.post(self.url, {'audio': audio})
+        eventos = await self._consumir(resposta)
+
+        nomes = [nome for nome, _ in eventos]
+        self.assertEqual(eventos[0][1]['etapa'], 'transcrevendo')
+        self.assertEqual(eventos[1], ('transcricao', {'texto': 'café 7,50'}))
+        self.assertLess(nomes.index('transcricao'), nomes.index('texto'))
+        self.assertEqual(eventos[-1][1]['transcribed_text'], 'café 7,50')
+
+    async def test_falha_do_modelo_encerra_com_resposta_de_erro(self):
+        self.sdk.chat.completions.create.side_effect = lambda **kw: _Stream('{"assistant_message": "corta')
+
+        eventos = await self._consumir(
+            await self.async_client.post(self.url, {'message': 'oi'}, content_type='application/json')
+        )
+
+        self.assertEqual(eventos[-1][0], 'resposta')
+        self.assertIn('Erro ao conectar', eventos[-1][1]['assistant_message'])
+
+    async def test_requisicao_invalida_nao_abre_stream(self):
+        resposta = await self.async_client.post(self.url, {'message': ''}, content_type='application/json')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertFalse(resposta.streaming)
@@ -0,0 +1,193 @@
+"""
+Testes do dashboard: quantidade de consultas independente do volume de dados.
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Casa, Conta, Categoria, Transacao
+
+User = get_user_model()
+
+
+class DashboardConsultasTestCase(TestCase):
+    """O dashboard deve executar um número fixo de consultas."""
+
+    def _criar_casa(self, nome, contas, categorias, transacoes):
+        casa = Casa.objects.create(nome=nome, codigo_convite=nome[:8].upper())
+        user = User.objects.create_user(username=nome, password='testpass123', casa=casa)
+        lista_contas = [
+            Conta.objects.create(casa=casa, nome=f'Conta {i}', saldo_inicial=Decimal('10.00'))
+            for i in range(contas)
+        ]
+        lista_categorias = [
+            Categoria.objects.create(casa=casa, nome=f'Categoria {i}', tipo='despesa' if i % 2 else 'receita')
+            for i in range(categorias)
+        ]
+        for i in range(transacoes):
+            Transacao.objects.create(
+                casa=casa,
+                conta=lista_contas[i % contas],
+                categoria=lista_categorias[i % categorias],
+                titulo=f'T{i}',
+                valor=Decimal('5.00'),
+                data=date.today(),
+                pago_por=user,
+            )
+        return casa, user
+
+    def _consultas_dashboard(self, user):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get('/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        return response, len(consultas)
+
+    def test_consultas_nao_crescem_com_os_dados(self):
+        _, user_pequena = self._criar_casa('pequena', contas=1, categorias=1, transacoes=1)
+        _, user_grande = self._criar_casa('grande', contas=6, categorias=8, transacoes=40)
+
+        _, consultas_pequena = self._consultas_dashboard(user_pequena)
+        response, consultas_grande = self._consultas_dashboard(user_grande)
+
+        self.assertEqual(consultas_pequena, consultas_grande)
+        self.assertLessEqual(consultas_grande, 10)
+
+        # 6 contas com saldo inicial 10; 20 receitas e 20 despesas de 5 se anulam
+        self.assertEqual(response.context['saldo_total'], Decimal('60.00'))
+        self.assertEqual(response.context['receitas_mes'], Decimal('100.00'))
+        self.assertEqual(response.context['despesas_mes'], Decimal('100.00'))
+        self.assertEqual(len(response.context['contas']), 6)
+
+    def test_contas_inativas_entram_apenas_no_saldo_total(self):
+        casa, user = self._criar_casa('inativa', contas=2, categorias=2, transacoes=2)
+        Conta.objects.filter(casa=casa, nome='Conta 1').update(ativa=False)
+
+        response, _ = self._consultas_dashboard(user)
+        self.assertEqual([conta.nome for conta in response.context['contas']], ['Conta 0'])
+        self.assertEqual(response.context['saldo_total'], Decimal('20.00'))
+
+
+class DashboardCacheTestCase(TestCase):
+    """Dashboard e relatórios ficam em cache até a próxima gravação na casa."""
+
+    def setUp(self):
+        self.casa = Casa.objects.create(nome='Casa Cache', codigo_convite='CACHE001')
+        self.user = User.objects.create_user(username='cache', password='testpass123', casa=self.casa)
+        self.conta = Conta.objects.create(casa=self.casa, nome='Carteira', saldo_inicial=Decimal('100.00'))
+        self.categoria = Categoria.objects.create(casa=self.casa, nome='Mercado', tipo='despesa')
+        self.client.force_login(self.user)
+
+    def _criar(self, valor):
+        return Transacao.objects.create(
+            casa=self.casa, conta=self.conta, categoria=self.categoria, titulo='Compra',
+            valor=Decimal(valor), data=date.today(), pago_por=self.user,
+        )
+
+    def _sql(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, ' '.join(consulta['sql'] for consulta in consultas)
+
+    def test_repeticao_nao_recalcula(self):
+        self._criar('10.00')
+        for url in ('/dashboard/', '/api/dados/evolucao/'):
+            _, sql = self._sql(url)
+            self.assertIn('core_resumomensal', sql)
+
+            _, sql = self._sql(url)
+            self.assertNotIn('core_resumomensal', sql)
+            self.assertNotIn('core_transacao', sql)
+
+    def test_gravacao_aparece_imediatamente(self):
+        self._criar('10.00')
+        response, _ = self._sql('/dashboard/')
+        self.assertEqual(response.context['despesas_mes'], Decimal('10.00'))
+
+        transacao = self._criar('5.00')
+        response, _ = self._sql('/dashboard/')
+        self.assertEqual(response.context['despesas_mes'], Decimal('15.00'))
+
+        transacao.delete()
+        response, _ = self._sql('/api/dados/evolucao/')
+        self.assertEqual(response.json()['serie'][-1]['despesas'], 10.0)
+
+    def test_versao_incrementada_por_contas_categorias_e_metas(self):
+        from core.models import Meta
+
+        versao_inicial = Casa.objects.get(pk=self.casa.pk).versao_dados
+        self.conta.nome = 'Carteira nova'
+        self.conta.save()
+        Categoria.objects.create(casa=self.casa, nome='Salário', tipo='receita')
+        meta = Meta.objects.create(casa=self.casa, tipo='monthly_spending', valor=Decimal('500.00'), mes=1, ano=2026)
+        meta.delete()
+        self.assertEqual(Casa.objects.get(pk=self.casa.pk).versao_dados, versao_inicial + 4)
+
+
+class DadosApiTestCase(TestCase):
+    """API JSON dos gráficos, com ETag e 304."""
+
+    def setUp(self):
+        self.casa = Casa.objects.create(nome='Casa API', codigo_convite='API00001')
+        self.user = User.objects.create_user(username='api', password='testpass123', casa=self.casa)
+        self.conta = Conta.objects.create(casa=self.casa, nome='Carteira', saldo_inicial=Decimal('100.00'))
+        self.mercado = Categoria.objects.create(casa=self.casa, nome='Mercado', tipo='despesa', cor='#ff0000')
+        self.lazer = Categoria.objects.create(casa=self.casa, nome='Lazer', tipo='despesa')
+        self.client.force_login(self.user)
+        for categoria, valor in ((self.mercado, '30.00'), (self.lazer, '12.50')):
+            self._criar(categoria, valor)
+
+    def _criar(self, categoria, valor):
+        return Transacao.objects.create(
+            casa=self.casa, conta=self.conta, categoria=categoria, titulo='Compra',
+            valor=Decimal(valor), data=date.today(), pago_por=self.user,
+        )
+
+    def test_payloads(self):
+        resumo = self.client.get('/api/dados/resumo/').json()
+        self.assertEqual(resumo['despesas_mes'], 42.5)
+        self.assertEqual(resumo['saldo_total'], 57.5)
+
+        categorias = self.client.get('/api/dados/categorias/?tipo=despesa&periodo=mes&limite=1').json()
+        self.assertEqual(categorias['itens'], [{'categoria': 'Mercado', 'total': 30.0, 'cor': '#ff0000'}])
+
+        contas = self.client.get('/api/dados/contas/').json()
+        self.assertEqual(contas['itens'], [{'conta': 'Carteira', 'total': 42.5}])
+
+        self.assertEqual(len(self.client.get('/api/dados/evolucao/').json()['serie']), 12)
+
+    def test_etag_e_304(self):
+        url = '/api/dados/categorias/?tipo=despesa'
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with self.assertNumQueries(3):  # sessão, usuário e casa
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Outros parâmetros geram outra ETag
+        self.assertNotEqual(self.client.get(url + '&periodo=mes')['ETag'], etag)
+
+        # Uma gravação muda a ETag e o conteúdo
+        self._criar(self.lazer, '50.00')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['itens'][0], {'categoria': 'Lazer', 'total': 62.5, 'cor': '#6c757d'})
+
+    def test_parametros_invalidos(self):
+        for query in ('tipo=outro', 'periodo=semana', 'limite=abc', 'limite=-1'):
+            response = self.client.get(f'/api/dados/categorias/?{query}')
+            self.assertEqual(response.status_code, 400)
+
+    def test_requer_login(self):
+        self.client.logout()
+        response = self.client.get('/api/dados/resumo/')
+        self.assertEqual(response.status_code, 302)
@@ -0,0 +1,207 @@
+"""
+Testes da impressão digital de transações e da detecção de duplicatas.
+"""
+import io
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.chat_views.chat_views import save_chat_transaction
+from core.models import Casa, Conta, Categoria, ResumoMensal, Transacao
+from core.services.duplicatas import (
+    duplicata_recente, grupos_duplicados, impressao_transacao, mesclar_duplicadas, pendente_recente,
+    preencher_impressoes,
+)
+from core.services.saldos import verificar_saldos
+from core.views import save_chat_transaction as save_chat_transaction_views
+
+User = get_user_model()
+
+
+class ImpressaoTransacaoTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.casa = Casa.objects.create(nome='Casa', codigo_convite='DUP00001')
+        cls.outra_casa = Casa.objects.create(nome='Outra', codigo_convite='DUP00002')
+        cls.user = User.objects.create_user(username='dup', password='x', casa=cls.casa)
+        cls.conta = Conta.objects.create(casa=cls.casa, nome='Carteira')
+        cls.mercado = Categoria.objects.create(casa=cls.casa, nome='Mercado', tipo='despesa')
+
+    def _criar(self, titulo='Padaria', valor='12.50', data=date(2024, 6, 3), casa=None, **extra):
+        casa = casa or self.casa
+        conta = self.conta if casa == self.casa else Conta.objects.create(casa=casa, nome='Outra')
+        categoria = self.mercado if casa == self.casa else Categoria.objects.create(
+            casa=casa, nome='Mercado', tipo='despesa'
+        )
+        return Transacao.objects.create(
+            casa=casa, conta=conta, categoria=categoria, titulo=titulo, valor=Decimal(valor),
+            data=data, pago_por=self.user, **extra
+        )
+
+    def test_impressao_normaliza_titulo_e_valor(self):
+        base = impressao_transacao(date(2024, 6, 3), Decimal('12.5'), 'Padaria São João')
+        self.assertEqual(base, impressao_transacao(date(2024, 6, 3), '12.50', '  padaria   SAO joão '))
+        self.assertNotEqual(base, impressao_transacao(date(2024, 6, 3), '12.51', 'Padaria São João'))
+        self.assertNotEqual(base, impressao_transacao(date(2024, 6, 4), '12.50', 'Padaria São João'))
+        self.assertEqual(len(base), 64)
+
+    def test_save_grava_e_atualiza_impressao(self):
+        transacao = self._criar()
+        self.assertEqual(transacao.impressao, impressao_transacao(date(2024, 6, 3), '12.50', 'Padaria'))
+
+        transacao.valor = Decimal('13.00')
+        transacao.save()
+        transacao.refresh_from_db()
+        self.assertEqual(transacao.impressao, impressao_transacao(date(2024, 6, 3), '13.00', 'Padaria'))
+
+    def test_duplicata_recente_respeita_casa_janela_e_cancelada(self):
+        original = self._criar()
+        self._criar(casa=self.outra_casa)
+        self.assertEqual(duplicata_recente(self.casa, date(2024, 6, 3), '12.5', 'PADARIA'), original)
+
+        Transacao.objects.filter(pk=original.pk).update(criada_em=timezone.now() - timedelta(days=3))
+        self.assertIsNone(duplicata_recente(self.casa, date(2024, 6, 3), '12.5', 'Padaria'))
+
+        cancelada = self._criar(status='cancelada')
+        self.assertIsNone(duplicata_recente(self.casa, date(2024, 6, 3), '12.5', 'Padaria'))
+        self.assertEqual(cancelada.impressao, original.impressao)
+
+    def test_grupos_e_mesclagem(self):
+        manter = self._criar()
+        self._criar(titulo='padaria ')
+        self._criar(titulo='PADARIA')
+        unica = self._criar(titulo='Farmácia', valor='30.00')
+        self._criar(casa=self.outra_casa)
+
+        grupos = grupos_duplicados(Transacao.objects.all())
+        self.assertEqual(len(grupos), 1)
+        self.assertEqual((grupos[0]['casa_id'], grupos[0]['qtd'], grupos[0]['manter']), (self.casa.pk, 3, manter.pk))
+
+        # Por padrão só conta as cópias
+        self.assertEqual(mesclar_duplicadas(Transacao.objects.all()), 2)
+        self.assertEqual(Transacao.objects.count(), 5)
+
+        versao = Casa.objects.get(pk=self.casa.pk).versao_dados
+        self.assertEqual(mesclar_duplicadas(Transacao.objects.all(), excluir=True), 2)
+        self.assertEqual(
+            set(Transacao.objects.filter(casa=self.casa).values_list('pk', flat=True)), {manter.pk, unica.pk}
+        )
+        self.assertEqual(Transacao.objects.filter(casa=self.outra_casa).count(), 1)
+        self.assertEqual(verificar_saldos(), [])
+        self.assertEqual(ResumoMensal.objects.get(casa=self.casa).quantidade, 2)
+        self.assertGreater(Casa.objects.get(pk=self.casa.pk).versao_dados, versao)
+        self.assertEqual(mesclar_duplicadas(Transacao.objects.all(), excluir=True), 0)
+
+    def test_pendente_recente_ignora_o_titulo(self):
+        pendente = self._criar(titulo='Conta de luz', status='pendente')
+        self._criar(titulo='Conta de luz')
+        self.assertEqual(pendente_recente(self.casa, date(2024, 6, 3), '12.5'), pendente)
+        self.assertIsNone(pendente_recente(self.casa, date(2024, 6, 3), '12.6'))
+
+        Transacao.objects.filter(pk=pendente.pk).update(criada_em=timezone.now() - timedelta(days=3))
+        self.assertIsNone(pendente_recente(self.casa, date(2024, 6, 3), '12.5'))
+
+    def test_comando_preenche_reporta_e_mescla(self):
+        self._criar()
+        self._criar()
+        Transacao.objects.update(impressao='')
+
+        saida = io.StringIO()
+        call_command('deduplicar_transacoes', stdout=saida)
+        self.assertIn('2 impressão(ões) preenchida(s)', saida.getvalue())
+        self.assertIn('1 grupo(s) com 1 cópia(s)', saida.getvalue())
+        self.assertEqual(Transacao.objects.count(), 2)
+
+        saida = io.StringIO()
+        call_command('deduplicar_transacoes', '--mesclar', '--casa', str(self.casa.pk), stdout=saida)
+        self.assertIn('1 transação(ões) excluída(s)', saida.getvalue())
+        self.assertEqual(Transacao.objects.count(), 1)
+
+        saida = io.StringIO()
+        call_command('deduplicar_transacoes', stdout=saida)
+        self.assertIn('Nenhuma transação duplicada', saida.getvalue())
+
+    def test_preencher_impressoes_em_lotes(self):
+        from core.services import duplicatas
+
+        for i in range(5):
+            self._criar(titulo=f'Item {i}')
+        Transacao.objects.update(impressao='')
+        original = duplicatas.TAMANHO_LOTE
+        duplicatas.TAMANHO_LOTE = 2
+        try:
+            self.assertEqual(preencher_impressoes(Transacao.objects.all()), 5)
+        finally:
+            duplicatas.TAMANHO_LOTE = original
+        self.assertFalse(Transacao.objects.filter(impressao='').exists())
+        self.assertEqual(preencher_impressoes(Transacao.objects.all(), apenas_vazias=False), 0)
+
+
+class DuplicataChatTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.casa = Casa.objects.create(nome='Casa', codigo_convite='DUP00003')
+        Categoria.objects.create(casa=cls.casa, nome='Alimentação', tipo='despesa')
+        cls.user = User.objects.create_user(username='chat', password='x', casa=cls.casa)
+
+    def _dados(self, **extra):
+        return {'amount': 45.9, 'title': 'Padaria', 'category': 'Alimentação',
+                'type': 'despesa', 'date': '2024-06-03', **extra}
+
+    def test_compra_repetida_e_gravada_com_aviso(self):
+        for salvar in (save_chat_transaction, save_chat_transaction_views):
+            with self.subTest(salvar=salvar.__module__):
+                for transacao in Transacao.objects.all():
+                    transacao.delete()
+                primeira = salvar(self.user, self._dados(), 'padaria 45,90')
+                self.assertIsNone(primeira.possivel_duplicata)
+
+                segunda = salvar(self.user, self._dados(title='padaria'), 'padaria 45,90')
+                self.assertNotEqual(primeira.pk, segunda.pk)
+                self.assertEqual(segunda.possivel_duplicata, primeira)
+                self.assertEqual(Transacao.objects.count(), 2)
+
+                outra = salvar(self.user, self._dados(amount=46), 'padaria 46')
+                self.assertIsNone(outra.possivel_duplicata)
+
+    def test_pagamento_de_pendencia_atualiza_a_existente(self):
+        for salvar in (save_chat_transaction, save_chat_transaction_views):
+            with self.subTest(salvar=salvar.__module__):
+                for transacao in Transacao.objects.all():
+                    transacao.delete()
+                pendente = salvar(self.user, self._dados(title='Conta de luz'), 'conta de luz', status='pendente')
+                paga = salvar(self.user, self._dados(title='Enel'), 'paguei a Enel')
+                self.assertEqual(paga.pk, pendente.pk)
+                self.assertIsNone(paga.possivel_duplicata)
+                self.assertEqual(Transacao.objects.values_list('status', 'titulo').get(), ('paga', 'Enel'))
+                self.assertEqual(verificar_saldos(), [])
+
+    @override_settings(OPENAI_API_KEY='sk-test', LLM_COTA_DIARIA_TOKENS=0)
+    @patch('core.services.openai_client.OpenAI')
+    def test_chat_avisa_da_possivel_duplicata(self, sdk):
+        self.client.force_login(self.user)
+
+        def enviar():
+            resposta = self.client.post(
+                reverse('chat_message'), {'message': 'gastei 20 no mercado'}, content_type='application/json'
+            )
+            return resposta.json()
+
+        primeira = enviar()
+        self.assertNotIn('Possível duplicata', primeira['assistant_message'])
+        segunda = enviar()
+
+        self.assertTrue(segunda['transaction_saved'])
+        self.assertNotEqual(segunda['transaction_id'], primeira['transaction_id'])
+        self.assertEqual(segunda['possible_duplicate_id'], primeira['transaction_id'])
+        self.assertIn('Possível duplicata', segunda['assistant_message'])
+        self.assertEqual(Transacao.objects.count(), 2)
+        sdk.return_value.chat.completions.create.assert_not_called()
@@ -0,0 +1,263 @@
+"""
+Testes da exportação de transações.
+"""
+import csv
+import io
+import os
+import shutil
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.http import StreamingHttpResponse
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Casa, Conta, Categoria, Exportacao, Transacao
+
+User = get_user_model()
+
+
+class ExportarCsvTestCase(TestCase):
+
+    def setUp(self):
+        self.casa = Casa.objects.create(nome="Casa Teste", codigo_convite='EXPORT01')
+        self.user = User.objects.create_user(
+            username='testuser', password='testpass123', casa=self.casa,
+            first_name='Maria', last_name='Silva',
+        )
+        self.outro = User.objects.create_user(username='joao', password='x', casa=self.casa)
+        self.carteira = Conta.objects.create(casa=self.casa, nome='Carteira')
+        self.banco = Conta.objects.create(casa=self.casa, nome='Banco')
+        self.mercado = Categoria.objects.create(casa=self.casa, nome='Mercado', tipo='despesa')
+        self.salario = Categoria.objects.create(casa=self.casa, nome='Salário', tipo='receita')
+        self.hoje = date(2024, 6, 15)
+        self.client.login(username='testuser', password='testpass123')
+
+    def _criar(self, titulo, categoria, conta, dias_atras=0, valor='10.00', pago_por=None, status='paga'):
+        return Transacao.objects.create(
+            casa=self.casa, conta=conta, categoria=categoria, titulo=titulo, valor=Decimal(valor),
+            data=self.hoje - timedelta(days=dias_atras), pago_por=pago_por or self.user, status=status,
+        )
+
+    def _exportar(self, query=''):
+        response = self.client.get('/exportar/csv/' + query)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        conteudo = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(conteudo.startswith('\ufeff'))
+        return response, list(csv.reader(io.StringIO(conteudo[1:])))
+
+    def test_conteudo(self):
+        self._criar('Feira', self.mercado, self.carteira, dias_atras=1, valor='45.90')
+        self._criar('Pagamento', self.salario, self.banco, valor='3000.00', pago_por=self.outro, status='pendente')
+
+        response, linhas = self._exportar()
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment;', response['Content-Disposition'])
+        self.assertEqual(linhas, [
+            ['Data', 'Tipo', 'Título', 'Categoria', 'Conta', 'Valor', 'Status', 'Pago Por'],
+            ['15/06/2024', 'Receita', 'Pagamento', 'Salário', 'Banco', 'R$ 3000.00', 'Pendente', 'joao'],
+            ['14/06/2024', 'Despesa', 'Feira', 'Mercado', 'Carteira', 'R$ 45.90', 'Paga', 'Maria Silva'],
+        ])
+
+    def test_respeita_filtros_da_lista(self):
+        self._criar('Feira', self.mercado, self.carteira, dias_atras=1)
+        self._criar('Padaria', self.mercado, self.banco, dias_atras=10)
+        self._criar('Pagamento', self.salario, self.banco)
+
+        _, linhas = self._exportar(f'?tipo=despesa&conta={self.banco.pk}')
+        self.assertEqual([linha[2] for linha in linhas[1:]], ['Padaria'])
+
+        inicio = (self.hoje - timedelta(days=2)).isoformat()
+        _, linhas = self._exportar(f'?data_inicio={inicio}')
+        self.assertEqual([linha[2] for linha in linhas[1:]], ['Pagamento', 'Feira'])
+
+    def test_consultas_nao_crescem_com_as_linhas(self):
+        for i in range(30):
+            self._criar(f'T{i}', self.mercado, self.carteira, dias_atras=i)
+
+        response = self.client.get('/exportar/csv/')
+        # Todas as linhas saem de uma única consulta, feita ao consumir a resposta
+        with self.assertNumQueries(1):
+            linhas = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(len(linhas), 31)
+
+
+class ExportarXlsxTestCase(TestCase):
+
+    def setUp(self):
+        self.casa = Casa.objects.create(nome="Casa Teste", codigo_convite='EXPORT02')
+        self.user = User.objects.create_user(username='testuser', password='testpass123', casa=self.casa)
+        conta = Conta.objects.create(casa=self.casa, nome='Carteira')
+        mercado = Categoria.objects.create(casa=self.casa, nome='Mercado', tipo='despesa')
+        salario = Categoria.objects.create(casa=self.casa, nome='Salário', tipo='receita')
+        for titulo, categoria, data, valor, status in (
+            ('Feira', mercado, date(2024, 5, 10), '45.90', 'paga'),
+            ('Padaria', mercado, date(2024, 6, 2), '12.10', 'paga'),
+            ('Pagamento', salario, date(2024, 6, 5), '3000.00', 'paga'),
+            ('Conta futura', mercado, date(2024, 6, 20), '99.00', 'pendente'),
+        ):
+            Transacao.objects.create(
+                casa=self.casa, conta=conta, categoria=categoria, titulo=titulo,
+                valor=Decimal(valor), data=data, pago_por=self.user, status=status,
+            )
+        self.client.login(username='testuser', password='testpass123')
+
+    def _planilha(self, query=''):
+        from openpyxl import load_workbook
+
+        response = self.client.get('/exportar/xlsx/' + query)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        self.assertIn('.xlsx', response['Content-Disposition'])
+        return load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_abas_com_celulas_tipadas(self):
+        workbook = self._planilha()
+        self.assertEqual(workbook.sheetnames, ['Transações', 'Por categoria', 'Por mês'])
+
+        linhas = list(workbook['Transações'].iter_rows(values_only=True))
+        self.assertEqual(linhas[0][:3], ('Data', 'Tipo', 'Título'))
+        self.assertEqual([linha[2] for linha in linhas[1:]], ['Conta futura', 'Pagamento', 'Padaria', 'Feira'])
+        data, valor = workbook['Transações']['A2'], workbook['Transações']['F2']
+        self.assertEqual(data.value.date(), date(2024, 6, 20))
+        self.assertTrue(data.is_date)
+        self.assertEqual(valor.value, 99)
+        self.assertIn('R$', valor.number_format)
+
+        categorias = list(workbook['Por categoria'].iter_rows(min_row=2, values_only=True))
+        self.assertEqual(categorias, [('Mercado', 'Despesa', 2, 58), ('Salário', 'Receita', 1, 3000)])
+
+        meses = list(workbook['Por mês'].iter_rows(min_row=2, values_only=True))
+        self.assertEqual([(m.date(), r, d, s) for m, r, d, s in meses], [
+            (date(2024, 5, 1), 0, 45.9, -45.9),
+            (date(2024, 6, 1), 3000, 12.1, 2987.9),
+        ])
+
+    def test_respeita_filtros_da_lista(self):
+        workbook = self._planilha('?tipo=receita')
+        linhas = list(workbook['Transações'].iter_rows(min_row=2, values_only=True))
+        self.assertEqual([linha[2] for linha in linhas], ['Pagamento'])
+        self.assertEqual(len(list(workbook['Por categoria'].iter_rows(min_row=2))), 1)
+
+
+class ExportacaoSegundoPlanoTestCase(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=self.media, RELATORIO_PDF_CACHE_DIR=self.media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+        self.casa = Casa.objects.create(nome="Casa Teste", codigo_convite='EXPORT03')
+        self.user = User.objects.create_user(username='testuser', password='testpass123', casa=self.casa)
+        self.conta = Conta.objects.create(casa=self.casa, nome='Carteira')
+        self.mercado = Categoria.objects.create(casa=self.casa, nome='Mercado', tipo='despesa')
+        self.salario = Categoria.objects.create(casa=self.casa, nome='Salário', tipo='receita')
+        self._criar('Feira', self.mercado)
+        self._criar('Pagamento', self.salario)
+        self.client.login(username='testuser', password='testpass123')
+
+    def _criar(self, titulo, categoria):
+        return Transacao.objects.create(
+            casa=self.casa, conta=self.conta, categoria=categoria, titulo=titulo,
+            valor=Decimal('10.00'), data=date(2024, 6, 1), pago_por=self.user,
+        )
+
+    def _solicitar(self, **dados):
+        response = self.client.post(reverse('exportacao_solicitar'), dados)
+        self.assertEqual(response.status_code, 202)
+        return response.json()
+
+    def _processar(self):
+        call_command('processar_exportacoes', '--uma-vez', '--workers', '1', stdout=io.StringIO())
+
+    def test_fluxo_completo(self):
+        estado = self._solicitar(formato='csv', tipo='despesa')
+        self.assertEqual((estado['status'], estado['progresso']), ('pendente', 0))
+        self.assertNotIn('url_download', estado)
+
+        self._processar()
+
+        estado = self.client.get(estado['url_status']).json()
+        self.assertEqual((estado['status'], estado['progresso']), ('concluida', 100))
+        exportacao = Exportacao.objects.get(pk=estado['id'])
+        self.assertTrue(os.path.exists(exportacao.arquivo.path))
+
+        response = self.client.get(estado['url_download'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        linhas = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(len(linhas), 2)
+        self.assertIn('Feira', linhas[1])
+
+    def test_xlsx_e_pdf(self):
+        ids = [self._solicitar(formato=formato)['id'] for formato in ('xlsx', 'pdf')]
+        self._processar()
+        for exportacao in Exportacao.objects.filter(pk__in=ids):
+            self.assertEqual(exportacao.status, 'concluida')
+            with exportacao.arquivo.open('rb') as arquivo:
+                inicio = arquivo.read(4)
+            self.assertEqual(inicio, b'%PDF' if exportacao.formato == 'pdf' else b'PK\x03\x04')
+
+    def test_reaproveita_pedido_igual_sobre_dados_inalterados(self):
+        primeiro = self._solicitar(formato='csv', tipo='despesa')
+        self.assertFalse(primeiro['reaproveitada'])
+        self.assertEqual(self._solicitar(formato='csv', tipo='despesa')['id'], primeiro['id'])
+
+        self._processar()
+        repetido = self._solicitar(formato='csv', tipo='despesa')
+        self.assertTrue(repetido['reaproveitada'])
+        self.assertEqual((repetido['id'], repetido['status']), (primeiro['id'], 'concluida'))
+
+        # Filtros diferentes ou dados alterados geram um novo arquivo
+        self.assertNotEqual(self._solicitar(formato='csv', tipo='receita')['id'], primeiro['id'])
+        self._criar('Padaria', self.mercado)
+        self.assertNotEqual(self._solicitar(formato='csv', tipo='despesa')['id'], primeiro['id'])
+
+    def test_link_de_download_expira(self):
+        estado = self._solicitar(formato='csv')
+        self._processar()
+        url = self.client.get(estado['url_status']).json()['url_download']
+
+        self.assertEqual(self.client.get(url + 'x').status_code, 403)
+        futuro = time.time() + settings.EXPORTACAO_LINK_VALIDADE + 60
+        with patch('django.core.signing.time.time', return_value=futuro):
+            self.assertEqual(self.client.get(url).status_code, 403)
+
+        # Arquivo expirado: download recusado e arquivo removido pelo worker
+        exportacao = Exportacao.objects.get(pk=estado['id'])
+        caminho = exportacao.arquivo.path
+        Exportacao.objects.filter(pk=exportacao.pk).update(expira_em=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.client.get(url).status_code, 410)
+        self._processar()
+        self.assertFalse(Exportacao.objects.filter(pk=exportacao.pk).exists())
+        self.assertFalse(os.path.exists(caminho))
+
+    def test_restrito_a_casa_e_validacoes(self):
+        estado = self._solicitar(formato='csv')
+        outra = Casa.objects.create(nome='Outra', codigo_convite='EXPORT04')
+        User.objects.create_user(username='outro', password='x', casa=outra)
+        self.client.login(username='outro', password='x')
+        self.assertEqual(self.client.get(estado['url_status']).status_code, 404)
+
+        self.assertEqual(self.client.post(reverse('exportacao_solicitar'), {'formato': 'doc'}).status_code, 400)
+        response = self.client.post(reverse('exportacao_solicitar'), {'formato': 'csv', 'conta': '999999'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_devolve_interrompidas_a_fila(self):
+        estado = self._solicitar(formato='csv')
+        Exportacao.objects.filter(pk=estado['id']).update(
+            status='processando', iniciada_em=timezone.now() - timedelta(hours=2)
+        )
+        self._processar()
+        self.assertEqual(Exportacao.objects.get(pk=estado['id']).status, 'concluida')
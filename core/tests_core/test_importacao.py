@@ -0,0 +1,213 @@
+"""
+Testes da importação de extratos bancários (OFX e CSV).
+"""
+import io
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.models import Casa, Conta, Categoria, ResumoMensal, Transacao
+from core.services import importacao
+from core.services.busca import buscar_transacoes
+from core.services.importacao import (
+    LAYOUTS_CSV, ErroImportacao, converter_valor, importar_extrato, ler_csv, ler_ofx,
+)
+from core.services.saldos import verificar_saldos
+
+User = get_user_model()
+
+OFX_SGML = b"""OFXHEADER:100
+DATA:OFXSGML
+CHARSET:1252
+
+<OFX>
+<BANKMSGSRSV1><STMTTRNRS><STMTRS>
+<BANKACCTFROM><BANKID>0260<ACCTID>12345-6</BANKACCTFROM>
+<BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20240603120000[-3:BRT]
+<TRNAMT>-45.90
+<FITID>0001
+<MEMO>Padaria P\xe3o Quente
+</STMTTRN>
+<STMTTRN>
+<TRNTYPE>CREDIT
+<DTPOSTED>20240605
+<TRNAMT>5000.00
+<FITID>0002
+<NAME>SALARIO
+<MEMO>SALARIO EMPRESA &amp; CIA
+</STMTTRN>
+</BANKTRANLIST>
+</STMTRS></STMTTRNRS></BANKMSGSRSV1>
+</OFX>
+"""
+
+OFX_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKACCTFROM><ACCTID>999</ACCTID></BANKACCTFROM>
+<BANKTRANLIST><STMTTRN><TRNTYPE>DEBIT</TRNTYPE><DTPOSTED>20240610</DTPOSTED><TRNAMT>-12.5</TRNAMT>
+<FITID>A1</FITID><NAME>Uber</NAME></STMTTRN></BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>"""
+
+
+def _csv(*linhas, cabecalho='Data;Descrição;Valor'):
+    return io.BytesIO('\n'.join((cabecalho,) + linhas).encode('utf-8'))
+
+
+class LeituraExtratoTestCase(TestCase):
+
+    def test_converter_valor(self):
+        self.assertEqual(converter_valor('-R$ 1.234,56'), Decimal('-1234.56'))
+        self.assertEqual(converter_valor('1,234.56', '.'), Decimal('1234.56'))
+        with self.assertRaises(ErroImportacao):
+            converter_valor('abc')
+
+    def test_ofx_sgml(self):
+        linhas = list(ler_ofx(io.BytesIO(OFX_SGML)))
+        self.assertEqual(len(linhas), 2)
+        self.assertEqual(
+            (linhas[0].data, linhas[0].valor, linhas[0].descricao, linhas[0].id_externo),
+            (date(2024, 6, 3), Decimal('-45.90'), 'Padaria Pão Quente', '12345-6:0001'),
+        )
+        self.assertEqual(linhas[1].descricao, 'SALARIO EMPRESA & CIA')
+
+    def test_ofx_xml_lido_em_blocos_pequenos(self):
+        original = importacao.TAMANHO_BLOCO_OFX
+        importacao.TAMANHO_BLOCO_OFX = 7
+        try:
+            linhas = list(ler_ofx(io.BytesIO(OFX_XML)))
+        finally:
+            importacao.TAMANHO_BLOCO_OFX = original
+        self.assertEqual(len(linhas), 1)
+        self.assertEqual((linhas[0].descricao, linhas[0].valor), ('Uber', Decimal('-12.5')))
+
+    def test_csv_layouts(self):
+        linhas = list(ler_csv(_csv('03/06/2024;Mercado;-1.234,50', '05/06/2024;Salário;5000,00'), LAYOUTS_CSV['padrao']))
+        self.assertEqual([linha.valor for linha in linhas], [Decimal('-1234.50'), Decimal('5000.00')])
+
+        cartao = io.BytesIO(b'date,category,title,amount\n2024-06-03,transporte,Uber,25.90\n')
+        linha, = ler_csv(cartao, LAYOUTS_CSV['nubank_cartao'])
+        self.assertEqual((linha.valor, linha.categoria), (Decimal('-25.90'), 'transporte'))
+
+    def test_csv_invalido(self):
+        with self.assertRaisesMessage(ErroImportacao, 'Coluna "Valor"'):
+            list(ler_csv(_csv(cabecalho='Data;Descrição'), LAYOUTS_CSV['padrao']))
+        with self.assertRaisesMessage(ErroImportacao, 'Linha 3'):
+            list(ler_csv(_csv('03/06/2024;Mercado;-10,00', '2024-06-03;Mercado;-10,00'), LAYOUTS_CSV['padrao']))
+
+
+class ImportacaoExtratoTestCase(TestCase):
+
+    def setUp(self):
+        self.casa = Casa.objects.create(nome="Casa Teste", codigo_convite='IMPORT01')
+        self.user = User.objects.create_user(username='testuser', password='testpass123', casa=self.casa)
+        self.conta = Conta.objects.create(casa=self.casa, nome='Corrente')
+        self.poupanca = Conta.objects.create(casa=self.casa, nome='Poupança')
+        self.mercado = Categoria.objects.create(casa=self.casa, nome='Mercado', tipo='despesa')
+
+    def _importar(self, arquivo, layout='padrao'):
+        linhas = ler_ofx(arquivo) if layout == 'ofx' else ler_csv(arquivo, LAYOUTS_CSV[layout])
+        return importar_extrato(self.casa, self.user, linhas, self.conta)
+
+    def test_importa_e_atualiza_dados_derivados(self):
+        resultado = self._importar(io.BytesIO(OFX_SGML), 'ofx')
+        self.assertEqual((resultado.importadas, resultado.duplicadas), (2, 0))
+
+        salario = Transacao.objects.get(titulo='SALARIO EMPRESA & CIA')
+        self.assertEqual((salario.tipo, salario.categoria.nome, salario.pago_por), ('receita', 'Outros', self.user))
+        self.conta.refresh_from_db()
+        self.assertEqual(self.conta.saldo_transacoes, Decimal('4954.10'))
+        self.assertEqual(verificar_saldos(), [])
+        self.assertEqual(
+            ResumoMensal.objects.filter(casa=self.casa).values_list('tipo', 'total').order_by('tipo')[0],
+            ('despesa', Decimal('45.90')),
+        )
+        self.assertEqual(list(buscar_transacoes(self.casa, 'pao quente')), [Transacao.objects.get(valor=Decimal('45.90'))])
+
+    def test_reimportacao_idempotente(self):
+        self._importar(io.BytesIO(OFX_SGML), 'ofx')
+        versao = Casa.objects.get(pk=self.casa.pk).versao_dados
+        resultado = self._importar(io.BytesIO(OFX_SGML), 'ofx')
+        self.assertEqual((resultado.importadas, resultado.duplicadas), (0, 2))
+        self.assertEqual(Transacao.objects.count(), 2)
+        self.assertEqual(Casa.objects.get(pk=self.casa.pk).versao_dados, versao)
+
+    def test_csv_repetidas_no_mesmo_dia_e_extrato_sobreposto(self):
+        junho = ('03/06/2024;Café;-5,00', '03/06/2024;Café;-5,00', '04/06/2024;Mercado;-80,00')
+        self.assertEqual(self._importar(_csv(*junho)).importadas, 3)
+
+        # Extrato seguinte repete os dois últimos dias e traz um novo
+        resultado = self._importar(_csv(*junho, '05/06/2024;Café;-5,00'))
+        self.assertEqual((resultado.importadas, resultado.duplicadas), (1, 3))
+        self.assertEqual(Transacao.objects.filter(titulo='Café').count(), 3)
+
+    def test_resolve_categorias_e_contas(self):
+        Transacao.objects.create(
+            casa=self.casa, conta=self.conta, categoria=self.mercado, titulo='Supermercado Dia',
+            valor=Decimal('10.00'), data=date(2024, 5, 1), pago_por=self.user,
+        )
+        arquivo = _csv(
+            '03/06/2024;supermercado dia;-50,00;;',
+            '03/06/2024;Cinema;-30,00;Lazer;Poupança',
+            '04/06/2024;Pipoca;-12,00;lazer;poupanca',
+            cabecalho='Data;Descrição;Valor;Categoria;Conta',
+        )
+        resultado = self._importar(arquivo)
+        self.assertEqual(resultado.categorias_criadas, ['Lazer'])
+        self.assertEqual(Transacao.objects.get(titulo='supermercado dia').categoria, self.mercado)
+        cinema, pipoca = Transacao.objects.filter(titulo__in=['Cinema', 'Pipoca']).order_by('data')
+        self.assertEqual(cinema.categoria_id, pipoca.categoria_id)
+        self.assertEqual((cinema.conta, pipoca.conta), (self.poupanca, self.poupanca))
+
+    def test_erro_desfaz_a_importacao(self):
+        arquivo = _csv(
+            '03/06/2024;Café;-5,00;Corrente', '04/06/2024;Café;-5,00;Inexistente',
+            cabecalho='Data;Descrição;Valor;Conta',
+        )
+        with self.assertRaisesMessage(ErroImportacao, 'Linha 3: conta "Inexistente"'):
+            self._importar(arquivo)
+        self.assertFalse(Transacao.objects.exists())
+        self.conta.refresh_from_db()
+        self.assertEqual(self.conta.saldo_transacoes, Decimal('0.00'))
+
+    def test_volume_em_poucas_consultas(self):
+        linhas = [f'{dia % 28 + 1:02d}/{dia % 12 + 1:02d}/2024;Compra {dia % 50};-{dia % 90 + 1},00' for dia in range(5000)]
+        with CaptureQueriesContext(connection) as consultas:
+            resultado = self._importar(_csv(*linhas))
+        self.assertEqual(resultado.importadas, 5000)
+        # O SQLite limita as variáveis por consulta e o Django divide cada lote em
+        # INSERTs menores; ainda assim, muito longe de uma consulta por linha
+        self.assertLess(len(consultas), 250)
+        self.assertEqual(verificar_saldos(), [])
+
+
+class ImportarExtratoViewTestCase(TestCase):
+
+    def setUp(self):
+        self.casa = Casa.objects.create(nome="Casa Teste", codigo_convite='IMPORT02')
+        self.user = User.objects.create_user(username='testuser', password='testpass123', casa=self.casa)
+        self.conta = Conta.objects.create(casa=self.casa, nome='Corrente')
+        self.client.login(username='testuser', password='testpass123')
+
+    def _enviar(self, conteudo, formato='ofx'):
+        return self.client.post(reverse('importar_extrato'), {
+            'arquivo': SimpleUploadedFile('extrato.ofx', conteudo),
+            'formato': formato, 'conta': self.conta.pk, 'status': 'paga',
+        })
+
+    def test_importa_pelo_formulario(self):
+        self.assertEqual(self.client.get(reverse('importar_extrato')).status_code, 200)
+        response = self._enviar(OFX_SGML)
+        self.assertRedirects(response, reverse('transacao_list'))
+        self.assertEqual(Transacao.objects.filter(casa=self.casa).count(), 2)
+
+    def test_erro_exibido_no_formulario(self):
+        response = self._enviar(b'Data;Valor\n01/01/2024;10\n', formato='padrao')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Descrição', response.context['form'].errors['arquivo'][0])
@@ -0,0 +1,130 @@
+"""
+Testes dos planos de execução das consultas mais frequentes de transações.
+
+Cada consulta é submetida a ``EXPLAIN`` em uma base populada com várias
+casas; o teste falha se o plano recorrer a uma leitura completa da tabela
+``core_transacao`` em vez de um dos índices de ``Transacao.Meta.indexes``.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncMonth
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Casa, Conta, Categoria, Transacao
+from core.services.busca import indexar_transacoes
+from core.services.duplicatas import duplicatas, preencher_impressoes
+from core.services.paginacao import _apos
+
+User = get_user_model()
+
+TABELA = 'core_transacao'
+
+
+class PlanoConsultasTransacaoTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        hoje = date(2024, 6, 15)
+        cls.hoje = hoje
+        transacoes = []
+        for n in range(6):
+            casa = Casa.objects.create(nome=f'Casa {n}', codigo_convite=f'IDX{n:05d}')
+            user = User.objects.create_user(username=f'usuario{n}', password='x', casa=casa)
+            conta = Conta.objects.create(casa=casa, nome='Carteira')
+            despesa = Categoria.objects.create(casa=casa, nome='Mercado', tipo='despesa')
+            receita = Categoria.objects.create(casa=casa, nome='Salário', tipo='receita')
+            for i in range(400):
+                transacoes.append(Transacao(
+                    casa=casa, conta=conta,
+                    categoria=receita if i % 5 == 0 else despesa,
+                    tipo='receita' if i % 5 == 0 else 'despesa',
+                    status='pendente' if i % 7 == 0 else 'paga',
+                    titulo=f'Lançamento {i}', valor=Decimal(10 + i % 50),
+                    data=hoje - timedelta(days=i), pago_por=user,
+                ))
+            if n == 0:
+                cls.casa, cls.user = casa, user
+        Transacao.objects.bulk_create(transacoes)
+        indexar_transacoes(Transacao.objects.all())
+        preencher_impressoes(Transacao.objects.all())
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def _plano(self, queryset) -> str:
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assertUsaIndice(self, queryset, ordenado=False):
+        plano = self._plano(queryset)
+        if connection.vendor == 'sqlite':
+            linhas = [linha for linha in plano.splitlines() if TABELA in linha]
+            self.assertTrue(linhas, plano)
+            for linha in linhas:
+                self.assertIn(f'SEARCH {TABELA}', linha, plano)
+            if ordenado:
+                self.assertNotIn('TEMP B-TREE FOR ORDER BY', plano)
+        elif connection.vendor == 'postgresql':
+            self.assertNotIn(f'Seq Scan on {TABELA}', plano)
+            if ordenado:
+                self.assertNotIn('Sort', plano)
+        return plano
+
+    def test_lista_de_transacoes(self):
+        queryset = Transacao.objects.filter(casa=self.casa).select_related(
+            'conta', 'categoria'
+        ).order_by('-data', '-criada_em', '-id')[:21]
+        plano = self.assertUsaIndice(queryset, ordenado=True)
+        if connection.vendor == 'sqlite':
+            self.assertIn('transacao_casa_ordem_idx', plano)
+
+    def test_proxima_pagina_por_cursor(self):
+        ultima = Transacao.objects.filter(casa=self.casa).order_by('-data', '-criada_em', '-id')[20]
+        campos = ('data', 'criada_em', 'id')
+        queryset = Transacao.objects.filter(casa=self.casa).filter(
+            _apos(campos, [ultima.data, ultima.criada_em, ultima.id], 'lt')
+        ).order_by('-data', '-criada_em', '-id')[:21]
+        self.assertUsaIndice(queryset, ordenado=True)
+
+    def test_lista_filtrada_por_tipo(self):
+        queryset = Transacao.objects.filter(
+            casa=self.casa, tipo='receita'
+        ).order_by('-data', '-criada_em', '-id')[:21]
+        self.assertUsaIndice(queryset)
+
+    def test_soma_das_transacoes_pagas_do_periodo(self):
+        inicio = self.hoje - timedelta(days=90)
+        queryset = Transacao.objects.filter(
+            casa=self.casa, status='paga', data__range=(inicio, self.hoje)
+        ).annotate(balde=TruncMonth('data')).values('balde').annotate(
+            receitas=Sum('valor', filter=Q(tipo='receita')),
+            despesas=Sum('valor', filter=Q(tipo='despesa')),
+        ).order_by()
+        plano = self.assertUsaIndice(queryset)
+        if connection.vendor == 'sqlite':
+            self.assertIn('transacao_paga_idx', plano)
+
+    def test_busca_do_chat(self):
+        from core.chat_views.chat_views import search_transactions
+
+        queryset = search_transactions(self.user, {'date': (self.hoje - timedelta(days=3)).isoformat()})
+        self.assertUsaIndice(queryset)
+
+        # Texto: os IDs vêm do índice textual e as linhas, da chave primária
+        queryset = search_transactions(self.user, {'title_contains': 'Lançamento 1'})
+        self.assertTrue(queryset)
+        self.assertUsaIndice(queryset)
+
+    def test_duplicata_no_chat(self):
+        queryset = duplicatas(self.casa, self.hoje - timedelta(days=7), Decimal('17'), 'Lançamento 1').filter(
+            criada_em__gte=timezone.now() - timedelta(days=2),
+        ).reverse()[:1]
+        plano = self.assertUsaIndice(queryset)
+        if connection.vendor == 'sqlite':
+            self.assertIn('transacao_impressao_idx', plano)
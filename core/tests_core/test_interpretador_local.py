@@ -0,0 +1,196 @@
+"""
+Testes do interpretador local do chat (mensagens comuns sem chamar o modelo).
+"""
+from datetime import date, datetime, time
+from io import StringIO
+from unittest.mock import MagicMock, patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Casa, Categoria, Conta, InterpretacaoChat, Transacao
+from core.services.interpretador_local import (
+    interpretar_localmente,
+    metricas_interpretador,
+    registrar_interpretacao,
+)
+
+User = get_user_model()
+
+HOJE = date(2024, 6, 12)
+
+
+class InterpretadorLocalTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.casa = Casa.objects.create(nome='Casa', codigo_convite='LOC00001')
+        for nome, tipo in (
+            ('Alimentação', 'despesa'), ('Transporte', 'despesa'), ('Saúde', 'despesa'),
+            ('Telefone/Internet', 'despesa'), ('Salário', 'receita'), ('Freelance', 'receita'),
+        ):
+            Categoria.objects.create(casa=cls.casa, nome=nome, tipo=tipo)
+        Conta.objects.create(casa=cls.casa, nome='Nubank')
+
+    def _interpretar(self, mensagem, contexto=None):
+        return interpretar_localmente(mensagem, self.casa, contexto, hoje=HOJE)
+
+    def test_transacoes_reconhecidas(self):
+        casos = {
+            'gastei 50 no mercado': ('despesa', 50.0, 'Mercado', 'Alimentação', '2024-06-12'),
+            'Recebi R$ 3.000,00 de salário': ('receita', 3000.0, 'Salário', 'Salário', '2024-06-12'),
+            'paguei 5,50 na padaria ontem.': ('despesa', 5.5, 'Padaria', 'Alimentação', '2024-06-11'),
+            'ontem comprei 35 reais de remédio': ('despesa', 35.0, 'Remédio', 'Saúde', '2024-06-11'),
+            'paguei 99.90 de internet': ('despesa', 99.9, 'Internet', 'Telefone/Internet', '2024-06-12'),
+            'ganhei 800 com freela anteontem': ('receita', 800.0, 'Freela', 'Freelance', '2024-06-10'),
+        }
+        for mensagem, (tipo, valor, titulo, categoria, data) in casos.items():
+            with self.subTest(mensagem=mensagem):
+                resposta = self._interpretar(mensagem)
+                self.assertEqual(resposta['intent'], 'create_transaction')
+                self.assertFalse(resposta['clarification_needed'])
+                self.assertTrue(resposta['assistant_message'])
+                self.assertEqual(resposta['transaction'], {
+                    'type': tipo, 'amount': valor, 'title': titulo, 'category': categoria, 'date': data,
+                })
+
+    def test_conta_conhecida_sai_da_descricao(self):
+        resposta = self._interpretar('gastei 80 no mercado com o nubank')
+        self.assertEqual(resposta['transaction']['title'], 'Mercado')
+        self.assertEqual(resposta['transaction']['account'], 'Nubank')
+
+    def test_consultas_reconhecidas(self):
+        resposta = self._interpretar('Quanto gastei este mês?')
+        self.assertEqual(resposta['intent'], 'query_summary')
+        self.assertEqual(resposta['query'], {
+            'summary_type': 'month_total', 'type': 'despesa',
+            'period': {'start_date': '2024-06-01', 'end_date': '2024-06-30'},
+        })
+
+        resposta = self._interpretar('quanto gastei com alimentação no mês passado')
+        self.assertEqual(resposta['query']['category'], 'Alimentação')
+        self.assertEqual(resposta['query']['period'], {'start_date': '2024-05-01', 'end_date': '2024-05-31'})
+
+        resposta = self._interpretar('quanto recebi ontem')
+        self.assertEqual(resposta['query']['type'], 'receita')
+        self.assertEqual(resposta['query']['period'], {'start_date': '2024-06-11', 'end_date': '2024-06-11'})
+
+    def test_casos_incertos_ficam_para_o_modelo(self):
+        for mensagem in (
+            'gastei 50 no mercado e 30 na farmácia',
+            'gastei 50 na loja',                       # categoria desconhecida
+            'gastei 50 no mercado dia 5',
+            'vou gastar 50 no mercado',
+            'comprei 3 chocolates de 3,50',
+            'gastei 50 no uber e no mercado',
+            'quanto gastei com viagem',
+            'o chocolate custa 3,50',
+            'oi',
+        ):
+            with self.subTest(mensagem=mensagem):
+                self.assertIsNone(self._interpretar(mensagem))
+
+    def test_pergunta_pendente_no_historico(self):
+        contexto = [
+            {'role': 'user', 'content': 'registra o mercado'},
+            {'role': 'assistant', 'content': 'Qual foi o valor?'},
+        ]
+        self.assertIsNone(self._interpretar('gastei 50 no mercado', contexto))
+        contexto[-1]['content'] = '✅ Registrado!'
+        self.assertIsNotNone(self._interpretar('gastei 50 no mercado', contexto))
+
+    def test_categoria_nova_entra_no_vocabulario(self):
+        self.assertIsNone(self._interpretar('gastei 200 na academia'))
+        Categoria.objects.create(casa=self.casa, nome='Academia', tipo='despesa')
+        self.casa.refresh_from_db()
+        self.assertEqual(self._interpretar('gastei 200 na academia')['transaction']['category'], 'Academia')
+
+
+class MetricasInterpretadorTestCase(TestCase):
+
+    def _registrar(self, origem, segundos, dia):
+        registrar_interpretacao(origem, segundos)
+        momento = timezone.make_aware(datetime.combine(dia, time(12)))
+        InterpretacaoChat.objects.filter(pk=InterpretacaoChat.objects.latest('pk').pk).update(criada_em=momento)
+
+    def test_taxa_de_acerto_e_economia(self):
+        for _ in range(3):
+            self._registrar('local', 0.002, HOJE)
+        self._registrar('llm', 1.2, HOJE)
+        self._registrar('llm', 0.8, date(2024, 6, 10))
+        self._registrar('llm', 5.0, date(2024, 5, 1))  # fora da janela
+
+        with self.assertNumQueries(1):
+            metricas = metricas_interpretador(dias=7, hoje=HOJE)
+
+        self.assertEqual((metricas['local'], metricas['llm']), (3, 2))
+        self.assertAlmostEqual(metricas['taxa_acerto'], 0.6)
+        self.assertAlmostEqual(metricas['llm_ms_medio'], 1000)
+        self.assertAlmostEqual(metricas['local_ms_medio'], 2)
+        self.assertEqual(metricas['chamadas_evitadas'], 3)
+        self.assertAlmostEqual(metricas['segundos_economizados'], 2.994)
+
+    def test_comando(self):
+        saida = StringIO()
+        call_command('metricas_chat', stdout=saida)
+        self.assertIn('Nenhuma mensagem', saida.getvalue())
+
+        registrar_interpretacao('local', 0.001)
+        registrar_interpretacao('llm', 1.0)
+        saida = StringIO()
+        call_command('metricas_chat', '--dias', '1', stdout=saida)
+        self.assertIn('Taxa de acerto local: 50.0%', saida.getvalue())
+
+
+@override_settings(OPENAI_API_KEY='sk-test')
+class ChatComInterpretadorLocalTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.casa = Casa.objects.create(nome='Casa', codigo_convite='LOC00002')
+        Categoria.objects.create(casa=cls.casa, nome='Alimentação', tipo='despesa')
+        cls.user = User.objects.create_user(username='local', password='x', casa=cls.casa)
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client.force_login(self.user)
+        self.modelo = MagicMock()
+        self.modelo.parse_user_message.return_value = {
+            'intent': 'greeting', 'clarification_needed': False, 'assistant_message': 'Olá!'
+        }
+        patcher = patch('core.chat_views.chat_views.OpenAIClient', return_value=self.modelo)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _enviar(self, mensagem):
+        resposta = self.client.post(reverse('chat_message'), {'message': mensagem}, content_type='application/json')
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.json()
+
+    def test_mensagem_comum_nao_chama_o_modelo(self):
+        dados = self._enviar('gastei 42,50 no mercado')
+
+        self.modelo.parse_user_message.assert_not_called()
+        self.assertTrue(dados['transaction_saved'])
+        transacao = Transacao.objects.get(pk=dados['transaction_id'])
+        self.assertEqual((transacao.titulo, str(transacao.valor), transacao.categoria.nome),
+                         ('Mercado', '42.50', 'Alimentação'))
+
+        self._enviar('bom dia')
+        self.modelo.parse_user_message.assert_called_once()
+        metricas = metricas_interpretador(dias=1)
+        self.assertEqual((metricas['local'], metricas['llm']), (1, 1))
+        self.assertEqual(
+            sorted(InterpretacaoChat.objects.values_list('origem', 'casa_id')),
+            [('llm', self.casa.pk), ('local', self.casa.pk)],
+        )
+
+    @override_settings(CHAT_INTERPRETADOR_LOCAL=False)
+    def test_desligado_pela_configuracao(self):
+        self._enviar('gastei 42,50 no mercado')
+        self.modelo.parse_user_message.assert_called_once()
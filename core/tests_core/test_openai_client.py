@@ -0,0 +1,225 @@
+"""
+Testes do cliente compartilhado da OpenAI: reaproveitamento, timeouts e repetições.
+"""
+import asyncio
+import gc
+import threading
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+
+from core.services import openai_client
+from core.services.openai_client import (
+    OpenAIClient, OpenAIClientError, obter_cliente_openai, obter_cliente_openai_async,
+)
+
+
+class FalhaConexao(Exception):
+    """Substitui ``openai.APIConnectionError`` nos testes."""
+
+
+class FalhaStatus(Exception):
+    """Substitui ``openai.APIStatusError`` nos testes."""
+
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f'HTTP {status_code}')
+        self.status_code = status_code
+        self.response = MagicMock(headers={'retry-after': retry_after} if retry_after else {})
+
+
+@override_settings(
+    OPENAI_API_KEY='sk-test', OPENAI_CONNECT_TIMEOUT=3.0, OPENAI_READ_TIMEOUT=20.0,
+    OPENAI_MAX_RETRIES=2, OPENAI_RETRY_BACKOFF=0.5, OPENAI_RETRY_BACKOFF_MAX=4.0,
+)
+class ClienteOpenAITestCase(SimpleTestCase):
+
+    def setUp(self):
+        openai_client._compartilhado = None
+        self.addCleanup(setattr, openai_client, '_compartilhado', None)
+        for nome, valor in (
+            ('OpenAI', MagicMock(side_effect=lambda **kwargs: MagicMock(name='sdk'))),
+            ('APIConnectionError', FalhaConexao),
+            ('APIStatusError', FalhaStatus),
+            ('time.sleep', MagicMock()),
+        ):
+            patcher = patch(f'core.services.openai_client.{nome}', valor)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.sdk_classe = openai_client.OpenAI
+        self.sleep = openai_client.time.sleep
+
+    def _cliente(self, *respostas):
+        cliente = OpenAIClient()
+        cliente._client.chat.completions.create.side_effect = list(respostas)
+        return cliente
+
+    def _resposta(self):
+        return {'choices': [{'message': {'content': '{"intent": "greeting", "assistant_message": "Oi"}'}}]}
+
+    def test_instancia_unica_por_processo(self):
+        primeiro = OpenAIClient()
+        segundo = OpenAIClient()
+        self.assertIs(primeiro._client, segundo._client)
+        self.sdk_classe.assert_called_once()
+        kwargs = self.sdk_classe.call_args.kwargs
+        self.assertEqual(kwargs['max_retries'], 0)
+        self.assertEqual((kwargs['timeout'].connect, kwargs['timeout'].read), (3.0, 20.0))
+
+    def test_instancia_unica_entre_threads(self):
+        instancias = []
+        threads = [threading.Thread(target=lambda: instancias.append(obter_cliente_openai())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(instancia) for instancia in instancias}), 1)
+        self.sdk_classe.assert_called_once()
+
+    def test_recria_quando_a_configuracao_muda(self):
+        primeiro = obter_cliente_openai()
+        with override_settings(OPENAI_READ_TIMEOUT=60.0):
+            segundo = obter_cliente_openai()
+        self.assertIsNot(primeiro, segundo)
+        self.assertEqual(self.sdk_classe.call_count, 2)
+
+    def test_repete_429_e_5xx_com_backoff(self):
+        cliente = self._cliente(FalhaStatus(429), FalhaConexao('reset'), self._resposta())
+        with patch('core.services.openai_client.random.uniform', side_effect=lambda a, b: b) as uniform:
+            resultado = cliente.parse_user_message('oi')
+        self.assertEqual(resultado['intent'], 'greeting')
+        self.assertEqual(cliente._client.chat.completions.create.call_count, 3)
+        self.assertEqual([c.args for c in uniform.call_args_list], [(0, 0.5), (0, 1.0)])
+        self.assertEqual([c.args[0] for c in self.sleep.call_args_list], [0.5, 1.0])
+
+    def test_respeita_retry_after_limitado_ao_maximo(self):
+        cliente = self._cliente(FalhaStatus(503, retry_after='2'), FalhaStatus(429, retry_after='30'), self._resposta())
+        cliente.parse_user_message('oi')
+        self.assertEqual([c.args[0] for c in self.sleep.call_args_list], [2.0, 4.0])
+
+    def test_limite_de_repeticoes(self):
+        cliente = self._cliente(*[FalhaStatus(500)] * 3)
+        with self.assertRaises(OpenAIClientError):
+            cliente.parse_user_message('oi')
+        self.assertEqual(cliente._client.chat.completions.create.call_count, 3)
+        self.assertEqual(self.sleep.call_count, 2)
+
+    def test_erro_do_cliente_nao_e_repetido(self):
+        cliente = self._cliente(FalhaStatus(400), self._resposta())
+        with self.assertRaises(OpenAIClientError):
+            cliente.parse_user_message('oi')
+        self.assertEqual(cliente._client.chat.completions.create.call_count, 1)
+        self.sleep.assert_not_called()
+
+    def test_transcricao_repete_desde_o_inicio_do_audio(self):
+        cliente = OpenAIClient()
+        lidos = []
+        transcricoes = cliente._client.with_options.return_value.audio.transcriptions
+
+        def criar(file, **kwargs):
+            nome, conteudo = file
+            # O SDK recebe o próprio arquivo do upload, sem cópia
+            self.assertIs(conteudo, audio.file)
+            lidos.append((nome, conteudo.read()))
+            if len(lidos) == 1:
+                raise FalhaConexao('timeout')
+            return 'gastei dez reais'
+
+        transcricoes.create.side_effect = criar
+        audio = SimpleUploadedFile('audio.webm', b'OggS-audio', content_type='audio/webm')
+        with override_settings(OPENAI_TRANSCRIPTION_TIMEOUT=90.0):
+            self.assertEqual(cliente.transcribe_audio(audio), 'gastei dez reais')
+        self.assertEqual(lidos, [('audio.webm', b'OggS-audio')] * 2)
+        cliente._client.with_options.assert_called_with(timeout=90.0)
+
+    def test_telemetria_da_chamada(self):
+        resposta = self._resposta()
+        resposta.update(model='gpt-4o-mini-2024-07-18', usage={
+            'prompt_tokens': 900, 'completion_tokens': 40, 'total_tokens': 940,
+            'prompt_tokens_details': {'cached_tokens': 768},
+        })
+        cliente = self._cliente(FalhaStatus(429), resposta)
+
+        cliente.parse_user_message('oi')
+
+        self.assertEqual(len(cliente.chamadas), 1)
+        chamada = cliente.chamadas[0]
+        self.assertEqual(
+            {campo: chamada[campo] for campo in ('operacao', 'modelo', 'sucesso', 'repeticoes')},
+            {'operacao': 'chat', 'modelo': 'gpt-4o-mini-2024-07-18', 'sucesso': True, 'repeticoes': 1},
+        )
+        self.assertEqual(
+            (chamada['tokens_prompt'], chamada['tokens_prompt_cache'], chamada['tokens_resposta'], chamada['tokens_total']),
+            (900, 768, 40, 940),
+        )
+        self.assertGreaterEqual(chamada['duracao_ms'], 0)
+
+    def test_telemetria_de_falha(self):
+        cliente = self._cliente(*[FalhaStatus(503)] * 3)
+        with self.assertRaises(OpenAIClientError):
+            cliente.parse_user_message('oi')
+        self.assertEqual(len(cliente.chamadas), 1)
+        self.assertFalse(cliente.chamadas[0]['sucesso'])
+        self.assertEqual(cliente.chamadas[0]['repeticoes'], 2)
+        self.assertEqual(cliente.chamadas[0]['tokens_total'], 0)
+
+
+@override_settings(OPENAI_API_KEY='sk-test')
+class ClienteAssincronoTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.criados = []
+
+        def criar(**kwargs):
+            cliente = MagicMock(name='AsyncOpenAI', close=AsyncMock())
+            self.criados.append(cliente)
+            return cliente
+
+        patcher = patch('core.services.openai_client.AsyncOpenAI', MagicMock(side_effect=criar))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        openai_client._compartilhados_async.clear()
+        self.addCleanup(openai_client._compartilhados_async.clear)
+
+    def test_fechado_quando_o_loop_encerra(self):
+        async def usar():
+            primeiro = obter_cliente_openai_async()
+            self.assertIs(obter_cliente_openai_async(), primeiro)
+            return primeiro
+
+        cliente = asyncio.run(usar())
+
+        self.assertEqual(self.criados, [cliente])
+        cliente.close.assert_awaited_once()
+        self.assertEqual(len(openai_client._compartilhados_async), 0)
+
+    def test_cliente_substituido_e_fechado(self):
+        async def usar():
+            antigo = obter_cliente_openai_async()
+            with override_settings(OPENAI_API_KEY='sk-outra'):
+                novo = obter_cliente_openai_async()
+            await asyncio.sleep(0)
+            antigo.close.assert_awaited_once()
+            novo.close.assert_not_awaited()
+            return novo
+
+        asyncio.run(usar()).close.assert_awaited_once()
+
+    def test_loop_fechado_sem_cancelar_sai_do_registro(self):
+        loop = asyncio.new_event_loop()
+
+        async def usar():
+            return obter_cliente_openai_async()
+
+        loop.run_until_complete(usar())
+        loop.close()
+        self.assertEqual(len(openai_client._compartilhados_async), 1)
+
+        # A tarefa pendente do loop abandonado é descartada com ele, mesmo que o
+        # coletor de lixo a finalize enquanto a trava do registro está tomada
+        with self.assertLogs('asyncio', 'ERROR'):
+            asyncio.run(usar())
+            self.assertNotIn(loop, openai_client._compartilhados_async)
+            with openai_client._trava_compartilhado:
+                gc.collect()
+        self.criados[0].close.assert_not_awaited()
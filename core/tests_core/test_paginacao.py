@@ -0,0 +1,88 @@
+"""
+Testes da paginação por cursor da lista de transações.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+from urllib.parse import quote
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Casa, Conta, Categoria, Transacao
+from core.services.paginacao import paginar_por_cursor
+
+User = get_user_model()
+
+
+class PaginacaoCursorTestCase(TestCase):
+
+    def setUp(self):
+        self.casa = Casa.objects.create(nome="Casa Teste")
+        self.user = User.objects.create_user(username='testuser', password='testpass123', casa=self.casa)
+        self.conta = Conta.objects.create(casa=self.casa, nome='Carteira')
+        self.despesa = Categoria.objects.create(casa=self.casa, nome='Mercado', tipo='despesa')
+        self.receita = Categoria.objects.create(casa=self.casa, nome='Salário', tipo='receita')
+        hoje = date.today()
+        # Várias transações por dia, para exercitar o desempate por criada_em/id
+        for i in range(45):
+            Transacao.objects.create(
+                casa=self.casa, conta=self.conta,
+                categoria=self.receita if i % 3 == 0 else self.despesa,
+                titulo=f'T{i}', valor=Decimal('1.00'), data=hoje - timedelta(days=i // 4),
+                pago_por=self.user,
+            )
+        self.campos = ('data', 'criada_em', 'id')
+
+    def _ordem_esperada(self, queryset):
+        return list(queryset.order_by('-data', '-criada_em', '-id').values_list('id', flat=True))
+
+    def test_percorre_todas_as_paginas_nos_dois_sentidos(self):
+        queryset = Transacao.objects.filter(casa=self.casa)
+        paginas = []
+        pagina = paginar_por_cursor(queryset, None, self.campos, tamanho=10)
+        self.assertFalse(pagina.tem_anterior)
+        paginas.append([t.id for t in pagina])
+        while pagina.tem_proxima:
+            pagina = paginar_por_cursor(queryset, pagina.cursor_proxima, self.campos, tamanho=10)
+            paginas.append([t.id for t in pagina])
+
+        self.assertEqual([len(p) for p in paginas], [10, 10, 10, 10, 5])
+        self.assertEqual(sum(paginas, []), self._ordem_esperada(queryset))
+
+        # Voltando a partir da última página
+        for esperada in reversed(paginas[:-1]):
+            pagina = paginar_por_cursor(queryset, pagina.cursor_anterior, self.campos, tamanho=10)
+            self.assertEqual([t.id for t in pagina], esperada)
+        self.assertFalse(pagina.tem_anterior)
+        self.assertTrue(pagina.tem_proxima)
+
+    def test_cursor_invalido_volta_para_a_primeira_pagina(self):
+        queryset = Transacao.objects.filter(casa=self.casa)
+        pagina = paginar_por_cursor(queryset, 'adulterado', self.campos, tamanho=10)
+        self.assertEqual([t.id for t in pagina], self._ordem_esperada(queryset)[:10])
+
+    def test_view_preserva_filtros_e_custo_constante(self):
+        self.client.login(username='testuser', password='testpass123')
+        url = '/transacoes/?tipo=despesa'
+
+        with CaptureQueriesContext(connection) as primeira:
+            response = self.client.get(url)
+        pagina = response.context['transacoes']
+        self.assertIn('tipo=despesa', response.context['filtros_query'])
+        self.assertTrue(all(t.tipo == 'despesa' for t in pagina))
+        self.assertEqual(response.context['total_despesas'], Decimal('30.00'))
+
+        vistos = [t.id for t in pagina]
+        while pagina.tem_proxima:
+            with CaptureQueriesContext(connection) as seguinte:
+                response = self.client.get(f'{url}&cursor={quote(pagina.cursor_proxima)}')
+            pagina = response.context['transacoes']
+            vistos.extend(t.id for t in pagina)
+            self.assertTrue(all(t.tipo == 'despesa' for t in pagina))
+            self.assertEqual(len(seguinte), len(primeira))
+
+        esperados = self._ordem_esperada(Transacao.objects.filter(casa=self.casa, tipo='despesa'))
+        self.assertEqual(vistos, esperados)
+        self.assertNotIn('COUNT(', ' '.join(q['sql'] for q in primeira.captured_queries))
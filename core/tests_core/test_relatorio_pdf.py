@@ -0,0 +1,122 @@
+"""
+Testes do relatório em PDF e do seu cache em disco.
+"""
+import os
+import re
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Casa, Conta, Categoria, Transacao
+from core.services import relatorio_pdf
+from core.services.relatorios import intervalo_periodo
+
+User = get_user_model()
+
+
+def _paginas(conteudo: bytes) -> int:
+    return len(re.findall(rb'/Type\s*/Page\b', conteudo))
+
+
+class RelatorioPdfTestCase(TestCase):
+
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.diretorio, ignore_errors=True)
+        configuracao = override_settings(RELATORIO_PDF_CACHE_DIR=self.diretorio)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+        self.casa = Casa.objects.create(nome="Casa Teste", codigo_convite='RELPDF01')
+        self.user = User.objects.create_user(username='testuser', password='testpass123', casa=self.casa)
+        self.conta = Conta.objects.create(casa=self.casa, nome='Carteira')
+        self.mercado = Categoria.objects.create(casa=self.casa, nome='Mercado', tipo='despesa')
+        self.salario = Categoria.objects.create(casa=self.casa, nome='Salário', tipo='receita')
+        self.hoje = timezone.localdate()
+        self.inicio, self.fim = intervalo_periodo(self.hoje, '12meses')
+        self.client.login(username='testuser', password='testpass123')
+
+    def _criar(self, titulo, categoria, valor='10.00', dias_atras=0):
+        return Transacao.objects.create(
+            casa=self.casa, conta=self.conta, categoria=categoria, titulo=titulo,
+            valor=Decimal(valor), data=self.hoje - timedelta(days=dias_atras), pago_por=self.user,
+        )
+
+    def _casa(self):
+        # Relê a casa para pegar a versão dos dados atualizada
+        return Casa.objects.get(pk=self.casa.pk)
+
+    def test_relatorio_completo_em_varias_paginas(self):
+        self._criar('Pagamento', self.salario, '5000.00')
+        for indice in range(150):
+            self._criar(f'Compra {indice}', self.mercado, dias_atras=indice % 60)
+
+        with relatorio_pdf.relatorio_pdf(self._casa(), self.inicio, self.fim) as arquivo:
+            conteudo = arquivo.read()
+        self.assertTrue(conteudo.startswith(b'%PDF'))
+        self.assertGreater(_paginas(conteudo), 3)
+
+    def test_relatorio_sem_transacoes(self):
+        with relatorio_pdf.relatorio_pdf(self._casa(), self.inicio, self.fim) as arquivo:
+            self.assertTrue(arquivo.read().startswith(b'%PDF'))
+
+    def _caminho(self, inicio=None, fim=None):
+        with relatorio_pdf.relatorio_pdf(self._casa(), inicio or self.inicio, fim or self.fim) as arquivo:
+            return Path(arquivo.name)
+
+    def test_cache_reaproveita_e_invalida_com_os_dados(self):
+        self._criar('Feira', self.mercado)
+        mes_inicio, mes_fim = intervalo_periodo(self.hoje, 'mes')
+        with patch.object(relatorio_pdf, 'gerar_pdf', wraps=relatorio_pdf.gerar_pdf) as gerar:
+            primeiro = self._caminho()
+            self.assertEqual(self._caminho(), primeiro)
+            self.assertEqual(gerar.call_count, 1)
+            do_mes = self._caminho(mes_inicio, mes_fim)
+
+            self._criar('Padaria', self.mercado)
+            segundo = self._caminho()
+            self.assertEqual(gerar.call_count, 3)
+
+        self.assertNotEqual(segundo, primeiro)
+        # As versões desatualizadas de todos os períodos da casa saem do disco
+        self.assertFalse(primeiro.exists())
+        self.assertFalse(do_mes.exists())
+        self.assertTrue(segundo.exists())
+
+    def test_arquivo_aberto_sobrevive_a_limpeza(self):
+        arquivo = relatorio_pdf.relatorio_pdf(self._casa(), self.inicio, self.fim)
+        self.addCleanup(arquivo.close)
+        Path(arquivo.name).unlink()
+        self.assertTrue(arquivo.read().startswith(b'%PDF'))
+
+    def test_limpeza_por_idade(self):
+        atual = self._caminho()
+        antigo = Path(self.diretorio) / 'casa999_20200101_20200131_abc.pdf'
+        antigo.write_bytes(b'%PDF')
+        agora = time.time()
+        os.utime(antigo, (agora - 8 * 24 * 3600,) * 2)
+
+        with override_settings(RELATORIO_PDF_RETENCAO=7 * 24 * 3600):
+            self.assertEqual(relatorio_pdf.limpar_cache_pdf(agora), 1)
+
+        self.assertFalse(antigo.exists())
+        self.assertTrue(atual.exists())
+
+    def test_view(self):
+        self._criar('Feira', self.mercado)
+        response = self.client.get(reverse('exportar_pdf'), {'periodo': '12meses'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn(f'relatorio_{self.inicio}_{self.fim}.pdf', response['Content-Disposition'])
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+        self.assertEqual(self.client.get(reverse('exportar_pdf'), {'periodo': 'ano'}).status_code, 400)
@@ -0,0 +1,88 @@
+"""
+Testes do motor de relatórios por intervalo e granularidade.
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from core.models import Casa, Conta, Categoria, Transacao
+from core.services.relatorios import baldes, serie_temporal, somar_meses
+
+User = get_user_model()
+
+
+class SerieTemporalTestCase(TestCase):
+
+    def setUp(self):
+        self.casa = Casa.objects.create(nome="Casa Teste")
+        self.user = User.objects.create_user(username='testuser', password='testpass123', casa=self.casa)
+        self.conta = Conta.objects.create(casa=self.casa, nome='Carteira')
+        self.despesa = Categoria.objects.create(casa=self.casa, nome='Mercado', tipo='despesa')
+        self.receita = Categoria.objects.create(casa=self.casa, nome='Salário', tipo='receita')
+        for dia, categoria, valor in (
+            (date(2025, 1, 31), self.despesa, '10.00'),
+            (date(2025, 3, 1), self.despesa, '5.00'),
+            (date(2025, 3, 3), self.receita, '100.00'),
+            (date(2026, 2, 10), self.despesa, '7.00'),
+        ):
+            Transacao.objects.create(
+                casa=self.casa, conta=self.conta, categoria=categoria, titulo='T',
+                valor=Decimal(valor), data=dia, pago_por=self.user,
+            )
+
+    def test_baldes_mensais_sem_pular_meses(self):
+        meses = baldes(date(2025, 1, 31), date(2025, 12, 31), 'mes')
+        self.assertEqual(len(meses), 12)
+        self.assertEqual(meses[1], date(2025, 2, 1))
+        self.assertEqual(somar_meses(date(2025, 1, 1), -13), date(2023, 12, 1))
+
+    def test_serie_mensal_em_uma_consulta(self):
+        with self.assertNumQueries(1):
+            serie = serie_temporal(self.casa, date(2025, 1, 1), date(2025, 4, 30), 'mes')
+        self.assertEqual([item['rotulo'] for item in serie], ['Jan/2025', 'Feb/2025', 'Mar/2025', 'Apr/2025'])
+        self.assertEqual([item['despesas'] for item in serie], [10.0, 0.0, 5.0, 0.0])
+        self.assertEqual(serie[2]['saldo'], 95.0)
+
+    def test_granularidades(self):
+        semanas = serie_temporal(self.casa, date(2025, 2, 24), date(2025, 3, 9), 'semana')
+        self.assertEqual([item['inicio'] for item in semanas], ['2025-02-24', '2025-03-03'])
+        self.assertEqual([item['despesas'] for item in semanas], [5.0, 0.0])
+        self.assertEqual(semanas[1]['receitas'], 100.0)
+
+        dias = serie_temporal(self.casa, date(2025, 3, 1), date(2025, 3, 3), 'dia')
+        self.assertEqual([item['despesas'] for item in dias], [5.0, 0.0, 0.0])
+
+        trimestres = serie_temporal(self.casa, date(2025, 1, 1), date(2025, 6, 30), 'trimestre')
+        self.assertEqual([(item['rotulo'], item['despesas']) for item in trimestres], [('T1/2025', 15.0), ('T2/2025', 0.0)])
+
+        anos = serie_temporal(self.casa, date(2021, 1, 1), date(2026, 12, 31), 'ano')
+        self.assertEqual(len(anos), 6)
+        self.assertEqual([item['despesas'] for item in anos[-2:]], [15.0, 7.0])
+
+    def test_intervalo_parcial_le_das_transacoes(self):
+        serie = serie_temporal(self.casa, date(2025, 1, 15), date(2025, 3, 2), 'mes')
+        self.assertEqual([item['despesas'] for item in serie], [10.0, 0.0, 5.0])
+        self.assertEqual(serie[2]['receitas'], 0.0)
+
+    def test_api_e_pagina(self):
+        self.client.login(username='testuser', password='testpass123')
+
+        dados = self.client.get('/api/dados/evolucao/?inicio=2021-01-01&fim=2026-12-31&granularidade=ano').json()
+        self.assertEqual(len(dados['serie']), 6)
+
+        categorias = self.client.get('/api/dados/categorias/?inicio=2025-01-01&fim=2025-01-31').json()
+        self.assertEqual(categorias['itens'][0]['total'], 10.0)
+
+        response = self.client.get('/api/dados/evolucao/?inicio=2020-01-01&fim=2026-12-31&granularidade=dia')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/dados/evolucao/?inicio=2026-01-01&fim=2025-01-01')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get('/relatorios/?inicio=2025-01-01&fim=2025-06-30&granularidade=trimestre')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('granularidade=trimestre', response.context['filtros_query'])
+
+        response = self.client.get('/relatorios/')
+        self.assertEqual(response.context['filtros']['granularidade'], 'mes')
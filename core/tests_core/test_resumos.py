@@ -0,0 +1,156 @@
+"""
+Testes do resumo mensal pré-agregado.
+"""
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.models import Casa, Conta, Categoria, Transacao, ResumoMensal
+from core.services.resumos import reconstruir_resumos, cobre_meses_completos
+from core.services.saldos import mover_transacoes
+
+User = get_user_model()
+
+
+class ResumoMensalTestCase(TestCase):
+    """Garante que o resumo incremental coincide com a reconstrução completa."""
+
+    def setUp(self):
+        self.casa = Casa.objects.create(nome="Casa Teste")
+        self.user = User.objects.create_user(username='testuser', password='testpass123', casa=self.casa)
+        self.conta = Conta.objects.create(casa=self.casa, nome='Carteira')
+        self.outra_conta = Conta.objects.create(casa=self.casa, nome='Banco')
+        self.despesa = Categoria.objects.create(casa=self.casa, nome='Mercado', tipo='despesa')
+        self.receita = Categoria.objects.create(casa=self.casa, nome='Salário', tipo='receita')
+
+    def _criar(self, valor, data, categoria=None, status='paga'):
+        return Transacao.objects.create(
+            casa=self.casa,
+            conta=self.conta,
+            categoria=categoria or self.despesa,
+            titulo='Teste',
+            valor=Decimal(valor),
+            data=data,
+            status=status,
+            pago_por=self.user,
+        )
+
+    def _linhas(self):
+        return sorted(
+            ResumoMensal.objects.filter(casa=self.casa, quantidade__gt=0).values_list(
+                'mes', 'tipo', 'status', 'categoria_id', 'conta_id', 'total', 'quantidade'
+            )
+        )
+
+    def _assert_consistente(self):
+        incremental = self._linhas()
+        reconstruir_resumos(self.casa.id)
+        self.assertEqual(incremental, self._linhas())
+
+    def test_criacao_agrega_por_mes(self):
+        self._criar('10.00', date(2026, 1, 5))
+        self._criar('15.50', date(2026, 1, 20))
+        self._criar('7.00', date(2026, 2, 1))
+        resumo = ResumoMensal.objects.get(casa=self.casa, mes=date(2026, 1, 1))
+        self.assertEqual(resumo.total, Decimal('25.50'))
+        self.assertEqual(resumo.quantidade, 2)
+        self._assert_consistente()
+
+    def test_edicoes_e_exclusao(self):
+        t1 = self._criar('10.00', date(2026, 1, 5))
+        t2 = self._criar('20.00', date(2026, 1, 6), status='pendente')
+
+        t1.valor = Decimal('12.00')
+        t1.save()
+        t2.status = 'paga'
+        t2.data = date(2026, 3, 1)
+        t2.save()
+        t1.categoria = self.receita
+        t1.save()
+        self._assert_consistente()
+
+        t2.delete()
+        self.assertFalse(ResumoMensal.objects.filter(mes=date(2026, 3, 1)).exists())
+        self._assert_consistente()
+
+    def test_mover_transacoes_reconstroi(self):
+        self._criar('10.00', date(2026, 1, 5))
+        mover_transacoes(self.conta.transacoes.all(), self.outra_conta)
+        self.assertTrue(ResumoMensal.objects.filter(conta=self.outra_conta, quantidade=1).exists())
+        self.assertFalse(ResumoMensal.objects.filter(conta=self.conta).exists())
+
+    def test_reconstrucao_agrega_com_a_casa_travada(self):
+        self._criar('10.00', date(2026, 1, 5))
+
+        with CaptureQueriesContext(connection) as consultas:
+            reconstruir_resumos(self.casa.id)
+
+        sqls = [consulta['sql'] for consulta in consultas.captured_queries]
+        trava = next(i for i, sql in enumerate(sqls) if sql.startswith('SELECT') and '"core_casa"' in sql)
+        agregacao = next(i for i, sql in enumerate(sqls) if 'GROUP BY' in sql)
+        exclusao = next(i for i, sql in enumerate(sqls) if sql.startswith('DELETE'))
+        self.assertLess(trava, agregacao)
+        self.assertLess(agregacao, exclusao)
+        if connection.features.has_select_for_update:
+            self.assertIn('FOR UPDATE', sqls[trava])
+
+    def test_excluir_categoria_reatribui_tudo_ou_nada(self):
+        self._criar('10.00', date(2026, 1, 5))
+        feira = Categoria.objects.create(casa=self.casa, nome='Feira', tipo='despesa')
+        antes = self._linhas()
+        self.client.login(username='testuser', password='testpass123')
+
+        with patch('core.views.indexar_transacoes', side_effect=RuntimeError('índice fora do ar')):
+            self.client.post(
+                reverse('categoria_delete', args=[self.despesa.pk]), {'reatribuir': 'sim', 'nova_categoria': feira.pk}
+            )
+
+        self.assertEqual(Transacao.objects.get().categoria, self.despesa)
+        self.assertEqual(self._linhas(), antes)
+        self.assertTrue(Categoria.objects.filter(pk=self.despesa.pk).exists())
+
+        self.client.post(
+            reverse('categoria_delete', args=[self.despesa.pk]), {'reatribuir': 'sim', 'nova_categoria': feira.pk}
+        )
+        self.assertEqual(Transacao.objects.get().categoria, feira)
+        self.assertFalse(Categoria.objects.filter(pk=self.despesa.pk).exists())
+        self._assert_consistente()
+
+    def test_comando_reconstruir(self):
+        self._criar('10.00', date(2026, 1, 5))
+        ResumoMensal.objects.all().delete()
+        saida = StringIO()
+        call_command('reconstruir_resumos', stdout=saida)
+        self.assertIn('1 casa(s)', saida.getvalue())
+        self.assertEqual(ResumoMensal.objects.get(casa=self.casa).total, Decimal('10.00'))
+
+    def test_cobre_meses_completos(self):
+        self.assertTrue(cobre_meses_completos(date(2026, 2, 1), date(2026, 2, 28)))
+        self.assertTrue(cobre_meses_completos(date(2026, 1, 1), date(2026, 3, 31)))
+        self.assertFalse(cobre_meses_completos(date(2026, 2, 1), date(2026, 2, 27)))
+        self.assertFalse(cobre_meses_completos(date(2026, 2, 2), date(2026, 2, 28)))
+
+    def test_views_leem_do_resumo(self):
+        self._criar('10.00', date.today())
+        self._criar('99.00', date.today(), categoria=self.receita)
+        self.client.login(username='testuser', password='testpass123')
+
+        response = self.client.get('/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['despesas_mes'], Decimal('10.00'))
+        self.assertEqual(response.context['receitas_mes'], Decimal('99.00'))
+
+        response = self.client.get('/api/dados/evolucao/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['serie'][-1]['despesas'], 10.0)
+
+        response = self.client.get('/exportar/pdf/')
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,143 @@
+"""
+Testes do saldo materializado das contas.
+"""
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Casa, Conta, Categoria, Transacao
+from core.services.saldos import mover_transacoes, verificar_saldos
+
+User = get_user_model()
+
+
+class SaldoMaterializadoTestCase(TestCase):
+    """Garante que Conta.saldo_transacoes acompanha toda gravação de Transacao."""
+
+    def setUp(self):
+        self.casa = Casa.objects.create(nome="Casa Teste")
+        self.user = User.objects.create_user(username='testuser', password='testpass123', casa=self.casa)
+        self.conta = Conta.objects.create(casa=self.casa, nome='Carteira', saldo_inicial=Decimal('100.00'))
+        self.outra_conta = Conta.objects.create(casa=self.casa, nome='Banco', saldo_inicial=Decimal('0.00'))
+        self.despesa = Categoria.objects.create(casa=self.casa, nome='Mercado', tipo='despesa')
+        self.receita = Categoria.objects.create(casa=self.casa, nome='Salário', tipo='receita')
+
+    def _criar(self, valor, categoria=None, conta=None):
+        return Transacao.objects.create(
+            casa=self.casa,
+            conta=conta or self.conta,
+            categoria=categoria or self.despesa,
+            titulo='Teste',
+            valor=Decimal(valor),
+            data=date.today(),
+            pago_por=self.user,
+        )
+
+    def _saldo(self, conta):
+        conta.refresh_from_db()
+        return conta.saldo_atual
+
+    def test_criar_receita_e_despesa(self):
+        self._criar('30.00')
+        self._criar('50.00', categoria=self.receita)
+        self.assertEqual(self._saldo(self.conta), Decimal('120.00'))
+
+    def test_editar_valor(self):
+        transacao = self._criar('30.00')
+        transacao.valor = Decimal('45.50')
+        transacao.save()
+        self.assertEqual(self._saldo(self.conta), Decimal('54.50'))
+
+    def test_mover_entre_contas(self):
+        transacao = self._criar('30.00')
+        transacao.conta = self.outra_conta
+        transacao.save()
+        self.assertEqual(self._saldo(self.conta), Decimal('100.00'))
+        self.assertEqual(self._saldo(self.outra_conta), Decimal('-30.00'))
+
+    def test_trocar_tipo_pela_categoria(self):
+        transacao = self._criar('30.00')
+        transacao.categoria = self.receita
+        transacao.save()
+        self.assertEqual(self._saldo(self.conta), Decimal('130.00'))
+
+    def test_excluir(self):
+        transacao = self._criar('30.00')
+        transacao.delete()
+        self.assertEqual(self._saldo(self.conta), Decimal('100.00'))
+
+    def test_mover_transacoes_em_massa(self):
+        self._criar('30.00')
+        self._criar('10.00', categoria=self.receita)
+        quantidade = mover_transacoes(self.conta.transacoes.all(), self.outra_conta)
+        self.assertEqual(quantidade, 2)
+        self.assertEqual(self._saldo(self.conta), Decimal('100.00'))
+        self.assertEqual(self._saldo(self.outra_conta), Decimal('-20.00'))
+
+    def test_saldo_atual_sem_consultas(self):
+        self._criar('30.00')
+        conta = Conta.objects.get(pk=self.conta.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(conta.saldo_atual, Decimal('70.00'))
+
+    def test_verificar_e_corrigir_divergencia(self):
+        self._criar('30.00')
+        Conta.objects.filter(pk=self.conta.pk).update(saldo_transacoes=Decimal('999.00'))
+
+        divergencias = verificar_saldos(Conta.objects.filter(casa=self.casa))
+        self.assertEqual(len(divergencias), 1)
+        self.assertEqual(divergencias[0]['real'], Decimal('-30.00'))
+
+        saida = StringIO()
+        call_command('verificar_saldos', '--corrigir', stdout=saida)
+        self.assertIn('corrigida', saida.getvalue())
+        self.assertEqual(self._saldo(self.conta), Decimal('70.00'))
+        self.assertEqual(verificar_saldos(), [])
+
+
+class SaldoAnotadoTestCase(TestCase):
+    """Testes de Conta.objects.with_saldo() e Casa.saldo_total."""
+
+    def setUp(self):
+        self.casa = Casa.objects.create(nome="Casa Teste")
+        self.user = User.objects.create_user(username='testuser', password='testpass123', casa=self.casa)
+        self.despesa = Categoria.objects.create(casa=self.casa, nome='Mercado', tipo='despesa')
+        self.receita = Categoria.objects.create(casa=self.casa, nome='Salário', tipo='receita')
+        self.contas = []
+        for i in range(4):
+            conta = Conta.objects.create(casa=self.casa, nome=f'Conta {i}', saldo_inicial=Decimal('10.00') * i)
+            for categoria, valor in ((self.despesa, '3.00'), (self.receita, '5.00')):
+                Transacao.objects.create(
+                    casa=self.casa, conta=conta, categoria=categoria, titulo='T',
+                    valor=Decimal(valor) * (i + 1), data=date.today(), pago_por=self.user,
+                )
+            self.contas.append(conta)
+
+    def test_with_saldo_em_uma_consulta(self):
+        with self.assertNumQueries(1):
+            saldos = {conta.pk: conta.saldo_atual for conta in Conta.objects.filter(casa=self.casa).with_saldo()}
+        for i, conta in enumerate(self.contas):
+            self.assertEqual(saldos[conta.pk], Decimal('10.00') * i + Decimal('2.00') * (i + 1))
+
+    def test_with_saldo_nao_agrega_transacoes(self):
+        with CaptureQueriesContext(connection) as consultas:
+            list(Conta.objects.filter(casa=self.casa).with_saldo())
+        self.assertNotIn(Transacao._meta.db_table, consultas[0]['sql'])
+
+    def test_saldo_total_em_uma_consulta(self):
+        with self.assertNumQueries(1):
+            total = self.casa.saldo_total
+        self.assertEqual(total, Decimal('60.00') + Decimal('20.00'))
+
+    def test_conta_list_view(self):
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get('/contas/')
+        self.assertEqual(response.status_code, 200)
+        saldos = sorted(conta.saldo_atual for conta in response.context['contas'])
+        self.assertEqual(saldos, [Decimal('2.00'), Decimal('14.00'), Decimal('26.00'), Decimal('38.00')])
@@ -0,0 +1,162 @@
+"""
+Testes da correspondência aproximada usada para achar o alvo das edições do chat.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import skipUnless
+from unittest.mock import MagicMock, patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from core.chat_views.chat_views import find_edit_target
+from core.models import Casa, Conta, Categoria, Transacao, TransacaoBusca
+from core.services.similaridade import (
+    IndiceTrigramas, consulta_trigramas, escolher_alvo, pg_trgm_disponivel, ranquear_candidatos, similaridade,
+    trigramas,
+)
+
+User = get_user_model()
+
+
+class TrigramasTestCase(SimpleTestCase):
+
+    def test_trigramas_no_formato_do_pg_trgm(self):
+        self.assertEqual(trigramas('Pão'), {'  p', ' pa', 'pao', 'ao '})
+        self.assertEqual(trigramas('!!'), set())
+
+    def test_similaridade(self):
+        self.assertEqual(similaridade(trigramas('Café'), trigramas('cafe')), 1.0)
+        self.assertGreater(similaridade(trigramas('chocolate'), trigramas('3 chocolates')), 0.5)
+        self.assertEqual(similaridade(trigramas('chocolate'), trigramas('uber')), 0.0)
+
+    def test_indice_compara_so_quem_tem_trigramas_em_comum(self):
+        indice = IndiceTrigramas([(1, '3 chocolates'), (2, 'Uber'), (3, 'Chocolate quente')])
+        resultado = indice.buscar('chocolate')
+        self.assertEqual(set(resultado), {1, 3})
+        self.assertGreater(resultado[1], resultado[3])
+
+    def test_extensao_consultada_uma_vez_por_conexao(self):
+        conexao = MagicMock(vendor='postgresql')
+        cursor = conexao.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = (1,)
+
+        with patch('core.services.similaridade.connections', {'default': conexao}):
+            self.assertTrue(pg_trgm_disponivel())
+            self.assertTrue(pg_trgm_disponivel())
+        cursor.execute.assert_called_once()
+
+        with patch('core.services.similaridade.connections', {'default': MagicMock(vendor='sqlite')}):
+            self.assertFalse(pg_trgm_disponivel())
+
+
+class AlvoEdicaoTestCase(TestCase):
+
+    def setUp(self):
+        self.casa = Casa.objects.create(nome="Casa Teste", codigo_convite='SIMIL001')
+        self.user = User.objects.create_user(username='testuser', password='testpass123', casa=self.casa)
+        self.conta = Conta.objects.create(casa=self.casa, nome='Carteira')
+        self.categoria = Categoria.objects.create(casa=self.casa, nome='Alimentação', tipo='despesa')
+        self.hoje = date(2024, 6, 15)
+
+    def _criar(self, titulo, valor='10.00', dias_atras=0):
+        return Transacao.objects.create(
+            casa=self.casa, conta=self.conta, categoria=self.categoria, titulo=titulo,
+            valor=Decimal(valor), data=self.hoje - timedelta(days=dias_atras), pago_por=self.user,
+        )
+
+    def _ranquear(self, texto, **kwargs):
+        return ranquear_candidatos(self.casa, texto, hoje=self.hoje, **kwargs)
+
+    def test_resolve_titulo_aproximado(self):
+        chocolates = self._criar('3 chocolates', '40.50')
+        self._criar('Chá gelado', '8.00')
+        self._criar('Uber', '25.00')
+
+        alvo = escolher_alvo(self._ranquear('chocolate'))
+        self.assertEqual(alvo.transacao_id, chocolates.id)
+
+    def test_valor_desempata_titulos_iguais(self):
+        self._criar('Mercado', '50.00')
+        certo = self._criar('Mercado', '120.00')
+
+        candidatos = self._ranquear('mercado')
+        self.assertIsNone(escolher_alvo(candidatos))
+
+        alvo = escolher_alvo(self._ranquear('mercado', valor=Decimal('118')))
+        self.assertEqual(alvo.transacao_id, certo.id)
+
+    def test_recencia_desempata_titulos_iguais(self):
+        self._criar('Padaria', dias_atras=60)
+        recente = self._criar('Padaria', dias_atras=1)
+
+        alvo = escolher_alvo(self._ranquear('padaria'))
+        self.assertEqual(alvo.transacao_id, recente.id)
+
+    def test_janela_limitada(self):
+        self._criar('Farmácia', dias_atras=200)
+        self.assertEqual(self._ranquear('farmacia'), [])
+
+        antiga = self.hoje - timedelta(days=200)
+        self.assertEqual(len(self._ranquear('farmacia', data=antiga)), 1)
+
+    def test_chat_resolve_sem_pedir_esclarecimento(self):
+        chocolates = self._criar('3 chocolates', '40.50')
+        self._criar('Chocolate quente', '12.00', dias_atras=20)
+        self._criar('Pão', '6.00')
+
+        with patch('core.chat_views.chat_views.timezone.localdate', return_value=self.hoje):
+            alvo, candidatas = find_edit_target(self.user, {'title_contains': 'chocolate'})
+        self.assertEqual(alvo, chocolates)
+        self.assertEqual(candidatas, [])
+
+    def test_chat_lista_candidatas_quando_ambiguo(self):
+        primeira = self._criar('Mercado', '50.00')
+        segunda = self._criar('Mercado', '50.00')
+
+        with patch('core.chat_views.chat_views.timezone.localdate', return_value=self.hoje):
+            alvo, candidatas = find_edit_target(self.user, {'title_contains': 'mercado'})
+            self.assertIsNone(alvo)
+            self.assertEqual({t.id for t in candidatas}, {primeira.id, segunda.id})
+
+            alvo, candidatas = find_edit_target(self.user, {'title_contains': 'aluguel'})
+            self.assertIsNone(alvo)
+            self.assertEqual(candidatas, [])
+
+    def test_indice_guarda_o_titulo_normalizado(self):
+        transacao = self._criar('Café  da Manhã')
+        self.assertEqual(TransacaoBusca.objects.get(transacao=transacao).titulo, 'cafe da manha')
+
+        transacao.titulo = 'Pão de Açúcar'
+        transacao.save()
+        self.assertEqual(TransacaoBusca.objects.get(transacao=transacao).titulo, 'pao de acucar')
+
+    def test_consulta_do_banco_usa_pg_trgm_sem_contrib_postgres(self):
+        sql = str(consulta_trigramas(Transacao.objects.filter(casa=self.casa), 'Chocolaté').query)
+
+        self.assertIn('"core_transacaobusca"."titulo" % chocolate', sql)
+        self.assertIn('similarity("core_transacaobusca"."titulo", chocolate)', sql)
+        self.assertIn('ORDER BY 5 DESC', sql)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'pg_trgm só existe no PostgreSQL')
+class AlvoEdicaoPgTrgmTestCase(AlvoEdicaoTestCase):
+    """Os mesmos casos pelo ramo do banco, que deve ranquear como o ramo em memória."""
+
+    def setUp(self):
+        if not pg_trgm_disponivel():
+            self.skipTest('extensão pg_trgm não instalada')
+        super().setUp()
+
+    def test_banco_e_memoria_ranqueiam_igual(self):
+        for titulo, dias in [('Café da manhã', 0), ('cafe', 3), ('Cafeteria', 1), ('Uber', 0)]:
+            self._criar(titulo, dias_atras=dias)
+
+        no_banco = self._ranquear('CAFÉ')
+        with patch('core.services.similaridade.pg_trgm_disponivel', return_value=False):
+            em_memoria = self._ranquear('CAFÉ')
+
+        self.assertEqual([c.transacao_id for c in no_banco], [c.transacao_id for c in em_memoria])
+        for banco, memoria in zip(no_banco, em_memoria):
+            self.assertAlmostEqual(banco.pontuacao, memoria.pontuacao, places=2)
@@ -0,0 +1,141 @@
+"""
+Testes do recebimento dos áudios do chat (disco, hash e limite) e das transcrições guardadas.
+"""
+import hashlib
+import os
+from datetime import timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import InMemoryUploadedFile, SimpleUploadedFile, TemporaryUploadedFile
+from django.core.files.uploadhandler import SkipFile, StopFutureHandlers
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Casa, Categoria, TranscricaoAudio, Transacao, UsoLLM
+from core.services.transcricao import AudioUploadHandler, atranscrever_audio, hash_do_audio
+
+User = get_user_model()
+
+AUDIO = b'OggS' + bytes(range(256)) * 8
+
+
+def _audio(conteudo=AUDIO):
+    return SimpleUploadedFile('gravacao.webm', conteudo, content_type='audio/webm')
+
+
+@override_settings(OPENAI_API_KEY='sk-test', LLM_COTA_DIARIA_TOKENS=0, CHAT_AUDIO_MAX_BYTES=4096)
+class TranscricaoTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.casa = Casa.objects.create(nome='Casa', codigo_convite='AUD00001')
+        Categoria.objects.create(casa=cls.casa, nome='Alimentação', tipo='despesa')
+        cls.user = User.objects.create_user(username='audio', password='x', casa=cls.casa)
+
+    def setUp(self):
+        self.modelo = MagicMock(chamadas=[])
+        self.modelo.transcribe_audio.return_value = 'gastei 20 no mercado'
+        patcher = patch('core.chat_views.chat_views.OpenAIClient', return_value=self.modelo)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.user)
+
+    def _enviar(self, **dados):
+        return self.client.post(reverse('chat_message'), dados)
+
+    def test_audio_vai_para_disco_com_hash(self):
+        resposta = self._enviar(audio=_audio())
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['transcribed_text'], 'gastei 20 no mercado')
+        arquivo = self.modelo.transcribe_audio.call_args.args[0]
+        self.assertIsInstance(arquivo, TemporaryUploadedFile)
+        self.assertEqual(arquivo.size, len(AUDIO))
+        self.assertEqual(arquivo.sha256, hashlib.sha256(AUDIO).hexdigest())
+
+    def test_audio_acima_do_limite(self):
+        resposta = self._enviar(audio=_audio(b'x' * 5000), message='gastei 20 no mercado')
+
+        self.assertEqual(resposta.status_code, 413)
+        self.assertIn('limite de 0.00390625 MB', resposta.json()['error'])
+        self.modelo.transcribe_audio.assert_not_called()
+        self.assertFalse(Transacao.objects.exists())
+
+    def test_audio_repetido_usa_a_transcricao_guardada(self):
+        self._enviar(audio=_audio())
+        resposta = self._enviar(audio=_audio())
+
+        self.assertEqual(resposta.json()['transcribed_text'], 'gastei 20 no mercado')
+        self.modelo.transcribe_audio.assert_called_once()
+        guardada = TranscricaoAudio.objects.get()
+        self.assertEqual((guardada.usuario, guardada.sha256), (self.user, hashlib.sha256(AUDIO).hexdigest()))
+
+        self._enviar(audio=_audio(AUDIO + b'!'))
+        self.assertEqual(self.modelo.transcribe_audio.call_count, 2)
+
+    def test_transcricao_vencida_ou_de_outro_usuario_nao_vale(self):
+        self._enviar(audio=_audio())
+        TranscricaoAudio.objects.update(criada_em=timezone.now() - timedelta(days=8))
+
+        self._enviar(audio=_audio())
+
+        self.assertEqual(self.modelo.transcribe_audio.call_count, 2)
+        self.assertEqual(TranscricaoAudio.objects.count(), 1)
+        self.assertGreater(TranscricaoAudio.objects.get().criada_em, timezone.now() - timedelta(minutes=1))
+
+        outro = User.objects.create_user(username='audio2', password='x', casa=self.casa)
+        self.client.force_login(outro)
+        self._enviar(audio=_audio())
+        self.assertEqual(self.modelo.transcribe_audio.call_count, 3)
+
+    def test_reenvio_nao_registra_uso_e_cota_vem_antes(self):
+        def transcrever(arquivo):
+            self.modelo.chamadas.append({'operacao': 'transcricao', 'modelo': 'whisper-1', 'tokens_total': 10})
+            return 'gastei 20 no mercado'
+        self.modelo.transcribe_audio.side_effect = transcrever
+
+        self._enviar(audio=_audio())
+        self.modelo.chamadas = []
+        resposta = self._enviar(audio=_audio())
+
+        self.assertTrue(resposta.json()['transaction_saved'])
+        self.modelo.transcribe_audio.assert_called_once()
+        self.assertEqual(UsoLLM.objects.count(), 1)
+
+        Casa.objects.filter(pk=self.casa.pk).update(cota_diaria_tokens=10)
+        resposta = self._enviar(audio=_audio(b'outro'))
+
+        self.assertIn('limite diário', resposta.json()['assistant_message'])
+        self.modelo.transcribe_audio.assert_called_once()
+
+    def test_outros_uploads_seguem_o_padrao(self):
+        request = RequestFactory().post('/', {'arquivo': _audio(), 'audio': _audio()})
+
+        self.assertIsInstance(request.FILES['arquivo'], InMemoryUploadedFile)
+        self.assertFalse(hasattr(request.FILES['arquivo'], 'sha256'))
+        self.assertIsInstance(request.FILES['audio'], TemporaryUploadedFile)
+
+    def test_audio_acima_do_limite_apaga_o_temporario(self):
+        handler = AudioUploadHandler(RequestFactory().post('/'))
+        with self.assertRaises(StopFutureHandlers):
+            handler.new_file('audio', 'gravacao.webm', 'audio/webm', None)
+        caminho = handler.file.temporary_file_path()
+        handler.receive_data_chunk(b'x' * 4096, 0)
+        self.assertTrue(os.path.exists(caminho))
+
+        with self.assertRaises(SkipFile):
+            handler.receive_data_chunk(b'x', 4096)
+
+        self.assertFalse(os.path.exists(caminho))
+        self.assertIsNone(handler.file_complete(4097))
+
+    async def test_versao_assincrona_e_hash_sem_upload(self):
+        self.assertEqual(hash_do_audio(_audio()), hashlib.sha256(AUDIO).hexdigest())
+        modelo = MagicMock(atranscribe_audio=AsyncMock(return_value='café 7,50'))
+
+        for _ in range(2):
+            self.assertEqual(await atranscrever_audio(self.user, modelo, _audio()), 'café 7,50')
+
+        modelo.atranscribe_audio.assert_awaited_once()
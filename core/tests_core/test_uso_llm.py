@@ -0,0 +1,213 @@
+"""
+Testes da telemetria de uso da OpenAI (UsoLLM) e da cota diária por casa.
+"""
+import json
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Casa, Categoria, ChatHistory, Transacao, UsoLLM
+from core.chat_views.chat_views import _eventos_chat
+from core.services import openai_client
+from core.services.uso_llm import CotaExcedida, tokens_usados_hoje, verificar_cota
+
+User = get_user_model()
+
+
+def _resposta(intent='greeting', tokens=(300, 25)):
+    prompt, completion = tokens
+    return {
+        'model': 'gpt-4o-mini-2024-07-18',
+        'choices': [{'message': {'content': json.dumps(
+            {'intent': intent, 'clarification_needed': False, 'assistant_message': 'Olá!'}
+        )}}],
+        'usage': {
+            'prompt_tokens': prompt, 'completion_tokens': completion, 'total_tokens': prompt + completion,
+            'prompt_tokens_details': {'cached_tokens': 256},
+        },
+    }
+
+
+@override_settings(OPENAI_API_KEY='sk-test', LLM_COTA_DIARIA_TOKENS=0)
+class UsoLLMTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.casa = Casa.objects.create(nome='Casa', codigo_convite='USO00001')
+        Categoria.objects.create(casa=cls.casa, nome='Alimentação', tipo='despesa')
+        cls.user = User.objects.create_user(username='uso', password='x', casa=cls.casa)
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.sdk = MagicMock(name='OpenAI')
+        self.sdk.chat.completions.create.return_value = _resposta()
+        patcher = patch('core.services.openai_client.OpenAI', MagicMock(return_value=self.sdk))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        openai_client._compartilhado = None
+        self.addCleanup(setattr, openai_client, '_compartilhado', None)
+        self.client.force_login(self.user)
+
+    def _enviar(self, mensagem):
+        resposta = self.client.post(reverse('chat_message'), {'message': mensagem}, content_type='application/json')
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.json()
+
+    def _gastar(self, tokens, quando=None):
+        uso = UsoLLM.objects.create(casa=self.casa, operacao='chat', modelo='gpt-4o-mini', tokens_total=tokens)
+        if quando:
+            UsoLLM.objects.filter(pk=uso.pk).update(criado_em=quando)
+
+    def test_registra_a_chamada_com_intencao(self):
+        self._enviar('bom dia')
+
+        uso = UsoLLM.objects.get()
+        self.assertEqual((uso.casa, uso.usuario, uso.operacao, uso.intent), (self.casa, self.user, 'chat', 'greeting'))
+        self.assertEqual(uso.modelo, 'gpt-4o-mini-2024-07-18')
+        self.assertEqual((uso.tokens_prompt, uso.tokens_prompt_cache, uso.tokens_resposta, uso.tokens_total),
+                         (300, 256, 25, 325))
+        self.assertTrue(uso.sucesso)
+        self.assertEqual(tokens_usados_hoje(self.casa.pk), 325)
+
+    def test_interpretacao_local_nao_gera_uso(self):
+        self._enviar('gastei 20 no mercado')
+        self.sdk.chat.completions.create.assert_not_called()
+        self.assertFalse(UsoLLM.objects.exists())
+
+    def test_falha_tambem_e_registrada(self):
+        self.sdk.chat.completions.create.side_effect = RuntimeError('fora do ar')
+
+        dados = self._enviar('bom dia')
+
+        self.assertIn('Erro ao conectar', dados['assistant_message'])
+        uso = UsoLLM.objects.get()
+        self.assertFalse(uso.sucesso)
+        self.assertEqual(uso.intent, '')
+
+    def test_cota_da_casa_bloqueia_antes_de_chamar(self):
+        Casa.objects.filter(pk=self.casa.pk).update(cota_diaria_tokens=1000)
+        self._gastar(600)
+        self._gastar(5000, quando=timezone.now() - timedelta(days=1))  # ontem não conta
+
+        self._enviar('bom dia')  # 600 < 1000: passa
+        self.assertEqual(self.sdk.chat.completions.create.call_count, 1)
+
+        self._gastar(100)  # 600 + 325 + 100 >= 1000
+        dados = self._enviar('bom dia')
+
+        self.assertEqual(self.sdk.chat.completions.create.call_count, 1)
+        self.assertIn('limite diário', dados['assistant_message'])
+        self.assertIn('Cota diária de 1000 tokens', dados['error'])
+        self.assertEqual(ChatHistory.objects.filter(usuario=self.user).count(), 1)
+
+        # Mensagens entendidas localmente continuam funcionando
+        dados = self._enviar('gastei 20 no mercado')
+        self.assertTrue(dados['transaction_saved'])
+        self.assertTrue(Transacao.objects.filter(pk=dados['transaction_id']).exists())
+
+    def test_cota_global_e_excecao_da_casa(self):
+        self._gastar(500)
+        with override_settings(LLM_COTA_DIARIA_TOKENS=500):
+            with self.assertRaises(CotaExcedida):
+                verificar_cota(self.user)
+
+            Casa.objects.filter(pk=self.casa.pk).update(cota_diaria_tokens=0)  # sem limite para esta casa
+            verificar_cota(self.user)
+
+            Casa.objects.filter(pk=self.casa.pk).update(cota_diaria_tokens=2000)
+            verificar_cota(self.user)
+
+    def test_admin_com_resumo(self):
+        self._enviar('bom dia')
+        admin = User.objects.create_superuser(username='admin', password='x', email='a@a.com')
+        self.client.force_login(admin)
+
+        resposta = self.client.get(reverse('admin:core_usollm_changelist'))
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertContains(resposta, 'Por intenção')
+        self.assertEqual(resposta.context['resumo_total']['tokens'], 325)
+        self.assertEqual(list(resposta.context['resumo_por_intent'].values_list('intent', flat=True)), ['greeting'])
+
+
+def _chunk(conteudo=None, usage=None):
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=conteudo))] if conteudo else []
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class _Stream:
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    async def close(self):
+        pass
+
+    def __aiter__(self):
+        return self._gerar()
+
+    async def _gerar(self):
+        for chunk in self._chunks:
+            yield chunk
+
+
+@override_settings(OPENAI_API_KEY='sk-test', LLM_COTA_DIARIA_TOKENS=0)
+class UsoLLMStreamTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.casa = Casa.objects.create(nome='Casa', codigo_convite='USO00002')
+        cls.user = User.objects.create_user(username='uso_stream', password='x', casa=cls.casa)
+
+    def setUp(self):
+        self.sdk = MagicMock(name='AsyncOpenAI')
+        conteudo = json.dumps({'intent': 'greeting', 'clarification_needed': False, 'assistant_message': 'Oi'})
+        uso = SimpleNamespace(prompt_tokens=400, completion_tokens=10, total_tokens=410,
+                              prompt_tokens_details=SimpleNamespace(cached_tokens=0))
+        self.sdk.chat.completions.create = AsyncMock(
+            side_effect=lambda **kw: _Stream([_chunk(conteudo), _chunk(usage=uso)])
+        )
+        patcher = patch('core.services.openai_client.AsyncOpenAI', MagicMock(return_value=self.sdk))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        openai_client._compartilhados_async.clear()
+        self.addCleanup(openai_client._compartilhados_async.clear)
+
+    async def _stream(self):
+        await self.async_client.aforce_login(self.user)
+        resposta = await self.async_client.post(
+            reverse('chat_message_stream'), {'message': 'e aí, tudo bem?'}, content_type='application/json'
+        )
+        return b''.join([bloco async for bloco in resposta.streaming_content]).decode()
+
+    async def test_stream_pede_e_registra_o_uso(self):
+        await self._stream()
+
+        self.assertEqual(self.sdk.chat.completions.create.await_args.kwargs['stream_options'], {'include_usage': True})
+        uso = await UsoLLM.objects.aget()
+        self.assertEqual((uso.tokens_total, uso.intent, uso.casa_id), (410, 'greeting', self.casa.pk))
+
+    async def test_stream_respeita_a_cota(self):
+        await Casa.objects.filter(pk=self.casa.pk).aupdate(cota_diaria_tokens=100)
+        await UsoLLM.objects.acreate(casa=self.casa, operacao='chat', modelo='x', tokens_total=100)
+
+        corpo = await self._stream()
+
+        self.sdk.chat.completions.create.assert_not_awaited()
+        self.assertIn('limite diário', corpo)
+
+    async def test_desconexao_no_meio_do_stream_ainda_registra(self):
+        eventos = _eventos_chat(self.user, 'e aí, tudo bem?', None, {})
+        async for evento in eventos:
+            if 'delta' in evento:
+                break
+        await eventos.aclose()
+
+        uso = await UsoLLM.objects.aget()
+        self.assertEqual((uso.operacao, uso.casa_id, uso.sucesso), ('chat', self.casa.pk, False))
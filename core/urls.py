@@ -55,13 +55,25 @@ urlpatterns = [
     # Transações
     path('transacoes/', views.transacao_list_view, name='transacao_list'),
     path('transacoes/criar/', views.transacao_create_view, name='transacao_create'),
+    path('transacoes/importar/', views.importar_extrato_view, name='importar_extrato'),
     path('transacoes/<int:pk>/editar/', views.transacao_update_view, name='transacao_update'),
     path('transacoes/<int:pk>/excluir/', views.transacao_delete_view, name='transacao_delete'),
     
     # Relatórios
     path('relatorios/', views.relatorios_view, name='relatorios'),
     path('exportar/csv/', views.exportar_csv_view, name='exportar_csv'),
+    path('exportar/xlsx/', views.exportar_xlsx_view, name='exportar_xlsx'),
     path('exportar/pdf/', views.exportar_pdf_view, name='exportar_pdf'),
+    path('exportacoes/', views.exportacao_solicitar_view, name='exportacao_solicitar'),
+    path('exportacoes/<int:pk>/', views.exportacao_status_view, name='exportacao_status'),
+    path('exportacoes/<int:pk>/download/', views.exportacao_download_view, name='exportacao_download'),
+    
+    # API de dados dos gráficos (JSON com ETag)
+    path('api/dados/resumo/', views.api_resumo_view, name='api_resumo'),
+    path('api/dados/categorias/', views.api_categorias_view, name='api_categorias'),
+    path('api/dados/contas/', views.api_contas_view, name='api_contas'),
+    path('api/dados/evolucao/', views.api_evolucao_view, name='api_evolucao'),
+    path('api/transacoes/busca/', views.api_busca_transacoes_view, name='api_busca_transacoes'),
     
     # Biometria
     path('biometria/challenge/', views.biometria_challenge_view, name='biometria_challenge'),
@@ -73,5 +85,8 @@ urlpatterns = [
     # Chat Financeiro
     path('chat/', views.chat_interface_view, name='chat_interface'),
     path('chat/message/', views.chat_message_view, name='chat_message'),
+    path('chat/message/async/', views.chat_message_async_view, name='chat_message_async'),
+    path('chat/message/stream/', views.chat_message_stream_view, name='chat_message_stream'),
     path('chat/history/', views.chat_history_view, name='chat_history'),
+    path('chat/history/clear/', views.chat_clear_history_view, name='chat_clear_history'),
 ]
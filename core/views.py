@@ -1,34 +1,37 @@
 
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum, Q, Count
-from django.core.paginator import Paginator
-from django.http import HttpResponse, JsonResponse
+from django.db import transaction
+from django.db.models import Sum, Q, Count, Value
+from django.db.models.functions import Coalesce
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
-from datetime import datetime, timedelta
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_http_methods
+from datetime import date, datetime, timedelta
 from decimal import Decimal
-import csv
+from functools import wraps
+from urllib.parse import urlencode
+import hashlib
 import logging
 import os
+import tempfile
 import base64
 import json
-from reportlab.lib.pagesizes import letter, A4
 
 # Importar views de chat do módulo separado
 from .chat_views.chat_views import (
     chat_interface_view,
     chat_message_view,
-    chat_history_view
+    chat_message_async_view,
+    chat_message_stream_view,
+    chat_history_view,
+    chat_clear_history_view
 )
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT
 
 # Django REST Framework imports
 from rest_framework import status as rest_status
@@ -36,13 +39,30 @@ from rest_framework.decorators import api_view, parser_classes
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.response import Response
 
-from .models import Usuario, Casa, Conta, Categoria, Transacao
+from .models import Usuario, Casa, Conta, Categoria, Exportacao, Transacao
 from .forms import (
     RegistroForm, LoginForm, ContaForm, CategoriaForm,
-    TransacaoForm, FiltroTransacaoForm
+    TransacaoForm, FiltroTransacaoForm, FiltroRelatorioForm, ImportacaoExtratoForm
 )
 from core.serializers.chat_serializers import ChatMessageSerializer, ChatResponseSerializer
 from core.services.openai_client import OpenAIClient, OpenAIClientError
+from core.services.busca import buscar_transacoes, indexar_transacoes
+from core.services.cache_casa import chave_casa, obter_ou_calcular
+from core.services.categorias import obter_ou_criar_categoria
+from core.services.duplicatas import duplicata_recente, pendente_recente
+from core.services.exportacao import gerar_csv, gerar_xlsx, linhas_exportacao
+from core.services.importacao import LAYOUTS_CSV, ErroImportacao, importar_extrato, ler_csv, ler_ofx
+from core.services.relatorio_pdf import relatorio_pdf
+from core.services.relatorios import (
+    GRANULARIDADES, PERIODOS, dados_dashboard, intervalo_periodo, serie_temporal,
+    totais_por_categoria, totais_por_conta,
+)
+from core.services.paginacao import paginar_por_cursor
+from core.services.resumos import reconstruir_resumos
+from core.services.saldos import mover_transacoes
+from core.services.tarefas_exportacao import (
+    EXTENSOES, TIPOS_CONTEUDO, solicitar_exportacao, token_download, token_valido,
+)
 
 # Configurar logger
 logger = logging.getLogger(__name__)
@@ -175,79 +195,15 @@ def dashboard_view(request):
         messages.warning(request, 'Você precisa estar associado a uma casa para usar o sistema.')
         return redirect('perfil')
     
-    # Obter mês atual
+    # Dados calculados ficam em cache até a próxima gravação na casa
     hoje = timezone.now().date()
-    primeiro_dia_mes = hoje.replace(day=1)
-    
-    # Estatísticas gerais
-    total_receitas = Transacao.objects.filter(
-        casa=casa,
-        tipo='receita',
-        status='paga'
-    ).aggregate(total=Sum('valor'))['total'] or Decimal('0.00')
-    
-    total_despesas = Transacao.objects.filter(
-        casa=casa,
-        tipo='despesa',
-        status='paga'
-    ).aggregate(total=Sum('valor'))['total'] or Decimal('0.00')
-    
-    saldo_total = casa.saldo_total
-    
-    # Transações do mês
-    receitas_mes = Transacao.objects.filter(
-        casa=casa,
-        tipo='receita',
-        data__gte=primeiro_dia_mes,
-        status='paga'
-    ).aggregate(total=Sum('valor'))['total'] or Decimal('0.00')
-    
-    despesas_mes = Transacao.objects.filter(
-        casa=casa,
-        tipo='despesa',
-        data__gte=primeiro_dia_mes,
-        status='paga'
-    ).aggregate(total=Sum('valor'))['total'] or Decimal('0.00')
-    
-    # Últimas transações
-    transacoes_recentes = Transacao.objects.filter(casa=casa).order_by('-data', '-criada_em')[:10]
-    
-    # Contas
-    contas = Conta.objects.filter(casa=casa, ativa=True)
-    
-    # Despesas por categoria (para gráfico)
-    # Agrupar por nome, somando valores de categorias duplicadas
-    from django.db.models import OuterRef, Subquery
-    
-    despesas_por_categoria = Transacao.objects.filter(
-        casa=casa,
-        tipo='despesa',
-        data__gte=primeiro_dia_mes,
-        status='paga'
-    ).values('categoria__nome').annotate(
-        total=Sum('valor'),
-        cor=Subquery(
-            Categoria.objects.filter(
-                nome=OuterRef('categoria__nome'),
-                casa=casa
-            ).values('cor')[:1]
-        )
-    ).order_by('-total')[:10]
-    
-    # Converter para lista para facilitar serialização no template
-    despesas_por_categoria = list(despesas_por_categoria)
+    dados = obter_ou_calcular(
+        casa, 'dashboard', lambda: dados_dashboard(casa, hoje), hoje.isoformat()
+    )
     
     context = {
         'casa': casa,
-        'total_receitas': total_receitas,
-        'total_despesas': total_despesas,
-        'saldo_total': saldo_total,
-        'receitas_mes': receitas_mes,
-        'despesas_mes': despesas_mes,
-        'saldo_mes': receitas_mes - despesas_mes,
-        'transacoes_recentes': transacoes_recentes,
-        'contas': contas,
-        'despesas_por_categoria': despesas_por_categoria,
+        **dados,
     }
     
     return render(request, 'dashboard.html', context)
@@ -265,7 +221,7 @@ def conta_list_view(request):
         messages.warning(request, 'Você precisa estar associado a uma casa.')
         return redirect('dashboard')
     
-    contas = Conta.objects.filter(casa=casa).order_by('-ativa', 'nome')
+    contas = Conta.objects.filter(casa=casa).with_saldo().order_by('-ativa', 'nome')
     
     return render(request, 'accounts/conta_list.html', {'contas': contas})
 
@@ -322,14 +278,14 @@ def conta_delete_view(request, pk):
         messages.error(request, 'Você não está associado a uma casa.')
         return redirect('conta_list')
     
-    conta = get_object_or_404(Conta, pk=pk, casa=casa)
+    conta = get_object_or_404(Conta.objects.with_saldo(), pk=pk, casa=casa)
     
     # Verificar se há transações vinculadas
     transacoes_vinculadas = conta.transacoes.all()
     qtd_transacoes = transacoes_vinculadas.count()
     
     # Buscar outras contas disponíveis para reatribuição
-    outras_contas = Conta.objects.filter(casa=casa, ativa=True).exclude(pk=pk)
+    outras_contas = Conta.objects.filter(casa=casa, ativa=True).exclude(pk=pk).with_saldo()
     
     if request.method == 'POST':
         nome = conta.nome
@@ -343,7 +299,7 @@ def conta_delete_view(request, pk):
             if reatribuir and nova_conta_id:
                 # Reatribuir todas as transações para a nova conta
                 nova_conta = get_object_or_404(Conta, pk=nova_conta_id, casa=casa)
-                qtd_reatribuidas = transacoes_vinculadas.update(conta=nova_conta)
+                qtd_reatribuidas = mover_transacoes(transacoes_vinculadas, nova_conta)
                 
                 logger.info(
                     f"Usuário {request.user.username} reatribuiu {qtd_reatribuidas} "
@@ -484,7 +440,12 @@ def categoria_delete_view(request, pk):
             if reatribuir and nova_categoria_id:
                 # Reatribuir todas as transações para a nova categoria
                 nova_categoria = get_object_or_404(Categoria, pk=nova_categoria_id, casa=casa)
-                qtd_reatribuidas = transacoes_vinculadas.update(categoria=nova_categoria)
+                ids_reatribuidas = list(transacoes_vinculadas.values_list('id', flat=True))
+                # Transações, resumos e índice de busca mudam juntos ou não mudam
+                with transaction.atomic():
+                    qtd_reatribuidas = transacoes_vinculadas.update(categoria=nova_categoria)
+                    reconstruir_resumos(casa.id)
+                    indexar_transacoes(ids_reatribuidas)
                 
                 logger.info(
                     f"Usuário {request.user.username} reatribuiu {qtd_reatribuidas} "
@@ -545,49 +506,37 @@ def transacao_list_view(request):
     
     transacoes = Transacao.objects.filter(casa=casa).select_related(
         'categoria', 'conta', 'pago_por'
-    ).order_by('-data', '-criada_em')
+    )
     
     # Aplicar filtros
     filtro_form = FiltroTransacaoForm(request.GET, casa=casa)
+    transacoes = filtro_form.filtrar_queryset(transacoes)
     
-    if filtro_form.is_valid():
-        data_inicio = filtro_form.cleaned_data.get('data_inicio')
-        data_fim = filtro_form.cleaned_data.get('data_fim')
-        tipo = filtro_form.cleaned_data.get('tipo')
-        categoria = filtro_form.cleaned_data.get('categoria')
-        conta = filtro_form.cleaned_data.get('conta')
-        status = filtro_form.cleaned_data.get('status')
-        
-        if data_inicio:
-            transacoes = transacoes.filter(data__gte=data_inicio)
-        if data_fim:
-            transacoes = transacoes.filter(data__lte=data_fim)
-        if tipo:
-            transacoes = transacoes.filter(tipo=tipo)
-        if categoria:
-            transacoes = transacoes.filter(categoria=categoria)
-        if conta:
-            transacoes = transacoes.filter(conta=conta)
-        if status:
-            transacoes = transacoes.filter(status=status)
-    
-    # Paginação
-    paginator = Paginator(transacoes, 20)
-    page = request.GET.get('page')
-    transacoes_paginadas = paginator.get_page(page)
-    
-    # Totais
-    total_receitas = transacoes.filter(tipo='receita', status='paga').aggregate(
-        total=Sum('valor'))['total'] or Decimal('0.00')
-    total_despesas = transacoes.filter(tipo='despesa', status='paga').aggregate(
-        total=Sum('valor'))['total'] or Decimal('0.00')
+    # Paginação por cursor: cada página continua da chave (data, criada_em, id)
+    # da anterior, sem COUNT nem OFFSET
+    transacoes_paginadas = paginar_por_cursor(
+        transacoes, request.GET.get('cursor'), campos=('data', 'criada_em', 'id'), tamanho=20
+    )
+    
+    # Parâmetros dos filtros, preservados nos links de navegação
+    filtros = request.GET.copy()
+    filtros.pop('cursor', None)
+    filtros.pop('page', None)
+    
+    # Totais em uma única agregação condicional
+    zero = Value(Decimal('0.00'))
+    totais = transacoes.filter(status='paga').aggregate(
+        total_receitas=Coalesce(Sum('valor', filter=Q(tipo='receita')), zero),
+        total_despesas=Coalesce(Sum('valor', filter=Q(tipo='despesa')), zero),
+    )
     
     context = {
         'transacoes': transacoes_paginadas,
         'filtro_form': filtro_form,
-        'total_receitas': total_receitas,
-        'total_despesas': total_despesas,
-        'saldo': total_receitas - total_despesas,
+        'filtros_query': filtros.urlencode(),
+        'total_receitas': totais['total_receitas'],
+        'total_despesas': totais['total_despesas'],
+        'saldo': totais['total_receitas'] - totais['total_despesas'],
     }
     
     return render(request, 'transactions/transacao_list.html', context)
@@ -723,6 +672,40 @@ def transacao_delete_view(request, pk):
     return render(request, 'transactions/transacao_confirm_delete.html', {'transacao': transacao})
 
 
+@login_required
+def importar_extrato_view(request):
+    """Importar transações de um extrato bancário (OFX ou CSV)"""
+    casa = request.user.casa
+    if not casa:
+        messages.warning(request, 'Você precisa estar associado a uma casa.')
+        return redirect('dashboard')
+    
+    form = ImportacaoExtratoForm(request.POST or None, request.FILES or None, casa=casa)
+    if request.method == 'POST' and form.is_valid():
+        dados = form.cleaned_data
+        formato = dados['formato']
+        arquivo = dados['arquivo']
+        linhas = ler_ofx(arquivo) if formato == 'ofx' else ler_csv(arquivo, LAYOUTS_CSV[formato])
+        try:
+            resultado = importar_extrato(casa, request.user, linhas, dados['conta'], dados['status'])
+        except ErroImportacao as e:
+            form.add_error('arquivo', str(e))
+        else:
+            logger.info(
+                f"Usuário {request.user.username} importou {resultado.importadas} transação(ões) "
+                f"de {arquivo.name}"
+            )
+            mensagem = f'{resultado.importadas} transação(ões) importada(s)'
+            if resultado.duplicadas:
+                mensagem += f', {resultado.duplicadas} já existente(s) ignorada(s)'
+            if resultado.categorias_criadas:
+                mensagem += f'. Categorias criadas: {", ".join(resultado.categorias_criadas)}'
+            messages.success(request, mensagem + '.')
+            return redirect('transacao_list')
+    
+    return render(request, 'transactions/importar_extrato.html', {'form': form, 'title': 'Importar Extrato'})
+
+
 # ===========================
 # Relatórios
 # ===========================
@@ -735,204 +718,374 @@ def relatorios_view(request):
         messages.warning(request, 'Você precisa estar associado a uma casa.')
         return redirect('dashboard')
     
-    # Obter período (padrão: últimos 12 meses)
+    # Os gráficos carregam seus dados da API (ver api_*_view), com ETag,
+    # repassando o intervalo e a granularidade escolhidos
     hoje = timezone.now().date()
-    mes_inicio = (hoje - timedelta(days=365)).replace(day=1)
-    
-    # Despesas por categoria (agrupar por nome para evitar duplicatas)
-    from django.db.models import OuterRef, Subquery
-    
-    despesas_categoria = Transacao.objects.filter(
-        casa=casa,
-        tipo='despesa',
-        data__gte=mes_inicio,
-        status='paga'
-    ).values('categoria__nome').annotate(
-        total=Sum('valor'),
-        categoria__cor=Subquery(
-            Categoria.objects.filter(
-                nome=OuterRef('categoria__nome'),
-                casa=casa,
-                tipo='despesa'
-            ).values('cor')[:1]
-        )
-    ).order_by('-total')
+    filtro = FiltroRelatorioForm(request.GET, hoje=hoje)
+    if not filtro.is_valid():
+        for erros in filtro.errors.values():
+            for erro in erros:
+                messages.error(request, erro)
+        filtro = FiltroRelatorioForm({}, hoje=hoje)
+        filtro.is_valid()
+    filtros = {campo: filtro.cleaned_data[campo] for campo in ('inicio', 'fim', 'granularidade')}
+    
+    return render(request, 'relatorios.html', {
+        'filtros': filtros,
+        'granularidades': [(chave, rotulo) for chave, (_, rotulo) in GRANULARIDADES.items()],
+        'granularidade_rotulo': GRANULARIDADES[filtros['granularidade']][1],
+        'filtros_query': urlencode({
+            'inicio': filtros['inicio'].isoformat(),
+            'fim': filtros['fim'].isoformat(),
+            'granularidade': filtros['granularidade'],
+        }),
+    })
+
+
+# ===========================
+# API de dados dos gráficos
+# ===========================
+
+def _etag_dados_casa(request, *args, **kwargs):
+    """ETag forte derivada da versão dos dados da casa, da data e dos parâmetros"""
+    casa = request.user.casa
+    if not casa:
+        return None
+    chave = chave_casa(
+        casa, request.path, timezone.now().date().isoformat(), request.GET.urlencode()
+    )
+    return hashlib.sha256(chave.encode()).hexdigest()
+
+
+def _dados_casa_view(calcular):
+    """
+    Transforma ``calcular(casa, hoje, params)`` em um endpoint JSON autenticado.
     
-    # Receitas por categoria (agrupar por nome para evitar duplicatas)
-    receitas_categoria = Transacao.objects.filter(
-        casa=casa,
-        tipo='receita',
-        data__gte=mes_inicio,
-        status='paga'
-    ).values('categoria__nome').annotate(
-        total=Sum('valor'),
-        categoria__cor=Subquery(
-            Categoria.objects.filter(
-                nome=OuterRef('categoria__nome'),
-                casa=casa,
-                tipo='receita'
-            ).values('cor')[:1]
-        )
-    ).order_by('-total')
-    
-    # Evolução mensal (últimos 12 meses)
-    evolucao_mensal = []
-    for i in range(12):
-        mes = (hoje.replace(day=1) - timedelta(days=30*i))
-        primeiro_dia = mes.replace(day=1)
-        if mes.month == 12:
-            ultimo_dia = mes.replace(day=31)
-        else:
-            ultimo_dia = (mes.replace(month=mes.month+1, day=1) - timedelta(days=1))
-        
-        receitas = Transacao.objects.filter(
-            casa=casa,
-            tipo='receita',
-            data__gte=primeiro_dia,
-            data__lte=ultimo_dia,
-            status='paga'
-        ).aggregate(total=Sum('valor'))['total'] or Decimal('0.00')
+    O resultado é guardado no cache por casa e servido com ETag; se nada
+    mudou desde a última leitura, o cliente recebe 304 sem nenhum cálculo.
+    """
+    @login_required
+    @require_http_methods(['GET'])
+    @cache_control(private=True, no_cache=True)
+    @condition(etag_func=_etag_dados_casa)
+    @wraps(calcular)
+    def view(request):
+        casa = request.user.casa
+        if not casa:
+            return JsonResponse({'error': 'Usuário sem casa associada'}, status=400)
         
-        despesas = Transacao.objects.filter(
-            casa=casa,
-            tipo='despesa',
-            data__gte=primeiro_dia,
-            data__lte=ultimo_dia,
-            status='paga'
-        ).aggregate(total=Sum('valor'))['total'] or Decimal('0.00')
+        hoje = timezone.now().date()
+        try:
+            params = _parametros_grafico(request, hoje)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
         
-        evolucao_mensal.append({
-            'mes': mes.strftime('%b/%Y'),
-            'receitas': float(receitas),
-            'despesas': float(despesas),
-            'saldo': float(receitas - despesas)
-        })
+        dados = obter_ou_calcular(
+            casa, f'api:{calcular.__name__}', lambda: calcular(casa, hoje, params),
+            hoje.isoformat(), *sorted(params.items())
+        )
+        return JsonResponse(dados)
     
-    evolucao_mensal.reverse()
+    return view
+
+
+def _parametros_grafico(request, hoje):
+    """
+    Valida os parâmetros opcionais ``tipo``, ``limite`` e o intervalo.
     
-    # Despesas por conta
-    despesas_conta = Transacao.objects.filter(
-        casa=casa,
-        tipo='despesa',
-        data__gte=mes_inicio,
-        status='paga'
-    ).values('conta__nome').annotate(
-        total=Sum('valor')
-    ).order_by('-total')
+    O intervalo vem de ``inicio``/``fim``/``granularidade`` (ver
+    FiltroRelatorioForm) ou, na falta deles, de ``periodo`` (``mes`` ou ``12meses``).
+    """
+    tipo = request.GET.get('tipo', 'despesa')
+    if tipo not in dict(Transacao.TIPO_CHOICES):
+        raise ValueError('Tipo inválido')
     
-    context = {
-        'despesas_categoria': despesas_categoria,
-        'receitas_categoria': receitas_categoria,
-        'evolucao_mensal': evolucao_mensal,
-        'despesas_conta': despesas_conta,
+    limite = request.GET.get('limite') or 0
+    try:
+        limite = int(limite)
+    except (TypeError, ValueError):
+        raise ValueError('Limite inválido')
+    if limite < 0:
+        raise ValueError('Limite inválido')
+    
+    filtro = FiltroRelatorioForm(request.GET, hoje=hoje)
+    if not filtro.is_valid():
+        raise ValueError(' '.join(erro for erros in filtro.errors.values() for erro in erros))
+    inicio, fim = filtro.cleaned_data['inicio'], filtro.cleaned_data['fim']
+    
+    periodo = request.GET.get('periodo')
+    if periodo and not (request.GET.get('inicio') or request.GET.get('fim')):
+        if periodo not in PERIODOS:
+            raise ValueError('Período inválido')
+        inicio, fim = intervalo_periodo(hoje, periodo)
+    
+    return {
+        'tipo': tipo,
+        'limite': limite,
+        'inicio': inicio.isoformat(),
+        'fim': fim.isoformat(),
+        'granularidade': filtro.cleaned_data['granularidade'],
+    }
+
+
+def _intervalo(params):
+    return date.fromisoformat(params['inicio']), date.fromisoformat(params['fim'])
+
+
+@_dados_casa_view
+def api_resumo_view(casa, hoje, params):
+    """Totais gerais e do mês exibidos nos cards do dashboard"""
+    dados = dados_dashboard(casa, hoje)
+    campos = ('receitas_mes', 'despesas_mes', 'saldo_mes', 'saldo_total', 'total_receitas', 'total_despesas')
+    return {campo: float(dados[campo]) for campo in campos}
+
+
+@_dados_casa_view
+def api_categorias_view(casa, hoje, params):
+    """Totais pagos por categoria no intervalo"""
+    inicio, fim = _intervalo(params)
+    return {
+        'tipo': params['tipo'],
+        'inicio': params['inicio'],
+        'fim': params['fim'],
+        'itens': totais_por_categoria(casa, params['tipo'], inicio, fim, params['limite']),
     }
+
+
+@_dados_casa_view
+def api_contas_view(casa, hoje, params):
+    """Totais pagos por conta no intervalo"""
+    inicio, fim = _intervalo(params)
+    return {
+        'tipo': params['tipo'],
+        'inicio': params['inicio'],
+        'fim': params['fim'],
+        'itens': totais_por_conta(casa, params['tipo'], inicio, fim),
+    }
+
+
+@_dados_casa_view
+def api_evolucao_view(casa, hoje, params):
+    """Receitas, despesas e saldo por dia/semana/mês/trimestre/ano no intervalo"""
+    inicio, fim = _intervalo(params)
+    return {
+        'inicio': params['inicio'],
+        'fim': params['fim'],
+        'granularidade': params['granularidade'],
+        'serie': serie_temporal(casa, inicio, fim, params['granularidade']),
+    }
+
+
+BUSCA_LIMITE_MAXIMO = 50
+
+
+@login_required
+@require_http_methods(['GET'])
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_dados_casa)
+def api_busca_transacoes_view(request):
+    """
+    Busca textual nas transações da casa (título, observação, categoria e
+    conta), ordenada por relevância e data. Parâmetros: ``q`` e ``limite``.
+    """
+    casa = request.user.casa
+    if not casa:
+        return JsonResponse({'error': 'Usuário sem casa associada'}, status=400)
+    
+    texto = request.GET.get('q', '').strip()
+    try:
+        limite = int(request.GET.get('limite') or 20)
+    except ValueError:
+        return JsonResponse({'error': 'Limite inválido'}, status=400)
+    if not 1 <= limite <= BUSCA_LIMITE_MAXIMO:
+        return JsonResponse({'error': 'Limite inválido'}, status=400)
+    
+    transacoes = buscar_transacoes(
+        casa, texto, timezone.now().date(), limite=limite
+    ).select_related('categoria', 'conta')
     
-    return render(request, 'relatorios.html', context)
+    return JsonResponse({
+        'q': texto,
+        'resultados': [
+            {
+                'id': transacao.id,
+                'titulo': transacao.titulo,
+                'valor': float(transacao.valor),
+                'data': transacao.data.isoformat(),
+                'tipo': transacao.tipo,
+                'status': transacao.status,
+                'categoria': transacao.categoria.nome,
+                'conta': transacao.conta.nome,
+            }
+            for transacao in transacoes
+        ],
+    })
 
 
 @login_required
 def exportar_csv_view(request):
-    """Exportar transações para CSV"""
+    """
+    Exportar para CSV as transações, com os mesmos filtros da lista.
+    
+    A resposta é gerada em streaming, a partir de um iterador em lotes sobre
+    tuplas já com os nomes relacionados (ver core.services.exportacao), de
+    modo que a memória usada não cresce com a quantidade de linhas.
+    """
     casa = request.user.casa
     if not casa:
         return HttpResponse('Erro: você não está associado a uma casa.', status=400)
     
-    response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
-    response['Content-Disposition'] = f'attachment; filename="transacoes_{timezone.now().date()}.csv"'
+    filtro_form = FiltroTransacaoForm(request.GET, casa=casa)
+    transacoes = filtro_form.filtrar_queryset(Transacao.objects.filter(casa=casa))
     
-    writer = csv.writer(response)
-    writer.writerow(['Data', 'Tipo', 'Título', 'Categoria', 'Conta', 'Valor', 'Status', 'Pago Por'])
+    response = StreamingHttpResponse(
+        gerar_csv(linhas_exportacao(transacoes)), content_type='text/csv; charset=utf-8'
+    )
+    response['Content-Disposition'] = f'attachment; filename="transacoes_{timezone.now().date()}.csv"'
+    return response
+
+
+@login_required
+def exportar_xlsx_view(request):
+    """
+    Exportar para XLSX as transações (com os mesmos filtros da lista), os
+    totais por categoria e os totais mensais.
     
-    transacoes = Transacao.objects.filter(casa=casa).order_by('-data')
+    A planilha é escrita em modo ``write_only`` em um arquivo temporário e
+    enviada em blocos; o arquivo é apagado quando a resposta é fechada.
+    """
+    casa = request.user.casa
+    if not casa:
+        return HttpResponse('Erro: você não está associado a uma casa.', status=400)
     
-    for t in transacoes:
-        writer.writerow([
-            t.data.strftime('%d/%m/%Y'),
-            t.get_tipo_display(),
-            t.titulo,
-            t.categoria.nome,
-            t.conta.nome,
-            f'R$ {t.valor}',
-            t.get_status_display(),
-            t.pago_por.get_full_name() or t.pago_por.username
-        ])
+    filtro_form = FiltroTransacaoForm(request.GET, casa=casa)
+    transacoes = filtro_form.filtrar_queryset(Transacao.objects.filter(casa=casa))
     
-    return response
+    arquivo = tempfile.TemporaryFile()
+    try:
+        gerar_xlsx(transacoes, arquivo)
+        arquivo.seek(0)
+    except Exception:
+        arquivo.close()
+        raise
+    
+    return FileResponse(
+        arquivo,
+        as_attachment=True,
+        filename=f'transacoes_{timezone.now().date()}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
 
 
 @login_required
 def exportar_pdf_view(request):
-    """Exportar relatório para PDF"""
+    """
+    Exportar relatório para PDF (``periodo``: mes ou 12meses). O arquivo é
+    servido do cache em disco enquanto os dados da casa não mudam.
+    """
     casa = request.user.casa
     if not casa:
         return HttpResponse('Erro: você não está associado a uma casa.', status=400)
     
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="relatorio_{timezone.now().date()}.pdf"'
-    
-    doc = SimpleDocTemplate(response, pagesize=A4)
-    elements = []
-    
-    # Estilos
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        textColor=colors.HexColor('#0d6efd'),
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    
-    # Título
-    elements.append(Paragraph(f'Relatório Financeiro - {casa.nome}', title_style))
-    elements.append(Spacer(1, 0.2*inch))
-    
-    # Resumo
-    hoje = timezone.now().date()
-    primeiro_dia_mes = hoje.replace(day=1)
-    
-    receitas_mes = Transacao.objects.filter(
-        casa=casa,
-        tipo='receita',
-        data__gte=primeiro_dia_mes,
-        status='paga'
-    ).aggregate(total=Sum('valor'))['total'] or Decimal('0.00')
+    periodo = request.GET.get('periodo', 'mes')
+    if periodo not in PERIODOS:
+        return HttpResponse('Período inválido.', status=400)
     
-    despesas_mes = Transacao.objects.filter(
-        casa=casa,
-        tipo='despesa',
-        data__gte=primeiro_dia_mes,
-        status='paga'
-    ).aggregate(total=Sum('valor'))['total'] or Decimal('0.00')
-    
-    resumo_data = [
-        ['Descrição', 'Valor'],
-        ['Receitas do Mês', f'R$ {receitas_mes:.2f}'],
-        ['Despesas do Mês', f'R$ {despesas_mes:.2f}'],
-        ['Saldo do Mês', f'R$ {(receitas_mes - despesas_mes):.2f}'],
-    ]
-    
-    resumo_table = Table(resumo_data, colWidths=[4*inch, 2*inch])
-    resumo_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0d6efd')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    elements.append(resumo_table)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Construir PDF
-    doc.build(elements)
+    inicio, fim = intervalo_periodo(timezone.localdate(), periodo)
+    return FileResponse(
+        relatorio_pdf(casa, inicio, fim),
+        as_attachment=True,
+        filename=f'relatorio_{inicio}_{fim}.pdf',
+        content_type='application/pdf',
+    )
+
+
+# ===========================
+# Exportações em segundo plano
+# ===========================
+
+def _exportacao_json(exportacao):
+    """Estado de uma exportação, com o link de download assinado quando concluída"""
+    dados = {
+        'id': exportacao.pk,
+        'formato': exportacao.formato,
+        'status': exportacao.status,
+        'progresso': exportacao.progresso,
+        'url_status': reverse('exportacao_status', args=[exportacao.pk]),
+    }
+    if exportacao.status == 'erro':
+        dados['erro'] = 'Não foi possível gerar o arquivo. Tente novamente.'
+    if exportacao.status == 'concluida' and exportacao.arquivo:
+        dados['url_download'] = (
+            reverse('exportacao_download', args=[exportacao.pk])
+            + '?' + urlencode({'token': token_download(exportacao)})
+        )
+        dados['expira_em'] = exportacao.expira_em.isoformat()
+    return dados
+
+
+@login_required
+@require_http_methods(['POST'])
+def exportacao_solicitar_view(request):
+    """
+    Solicita uma exportação (``formato``: csv, xlsx ou pdf) com os filtros da
+    lista de transações. Responde 202 com o estado; pedidos iguais sobre
+    dados inalterados reaproveitam o arquivo já gerado.
+    """
+    casa = request.user.casa
+    if not casa:
+        return JsonResponse({'error': 'Usuário sem casa associada'}, status=400)
+    
+    formato = request.POST.get('formato')
+    if formato not in dict(Exportacao.FORMATO_CHOICES):
+        return JsonResponse({'error': 'Formato inválido'}, status=400)
+    
+    parametros = {}
+    if formato == 'pdf':
+        periodo = request.POST.get('periodo', 'mes')
+        if periodo not in PERIODOS:
+            return JsonResponse({'error': 'Período inválido'}, status=400)
+        parametros = {'periodo': periodo}
+    else:
+        filtro_form = FiltroTransacaoForm(request.POST, casa=casa)
+        if not filtro_form.is_valid():
+            return JsonResponse({'error': 'Filtros inválidos', 'campos': filtro_form.errors}, status=400)
+        parametros = {
+            campo: request.POST[campo] for campo in filtro_form.fields if request.POST.get(campo)
+        }
     
-    return response
+    exportacao, reaproveitada = solicitar_exportacao(casa, request.user, formato, parametros)
+    dados = _exportacao_json(exportacao)
+    dados['reaproveitada'] = reaproveitada
+    return JsonResponse(dados, status=202)
+
+
+@login_required
+@require_http_methods(['GET'])
+@cache_control(private=True, no_store=True)
+def exportacao_status_view(request, pk):
+    """Progresso de uma exportação da casa do usuário"""
+    exportacao = get_object_or_404(Exportacao, pk=pk, casa=request.user.casa)
+    return JsonResponse(_exportacao_json(exportacao))
+
+
+@login_required
+@require_http_methods(['GET'])
+def exportacao_download_view(request, pk):
+    """Baixa o arquivo de uma exportação concluída, com o token assinado do link"""
+    exportacao = get_object_or_404(Exportacao, pk=pk, casa=request.user.casa, status='concluida')
+    if not token_valido(exportacao, request.GET.get('token', '')):
+        return HttpResponse('Link de download inválido ou expirado.', status=403)
+    if not exportacao.arquivo or exportacao.expira_em <= timezone.now():
+        return HttpResponse('Este arquivo expirou. Solicite a exportação novamente.', status=410)
+    
+    prefixo = 'relatorio' if exportacao.formato == 'pdf' else 'transacoes'
+    return FileResponse(
+        exportacao.arquivo.open('rb'),
+        as_attachment=True,
+        filename=f'{prefixo}_{exportacao.concluida_em.date()}.{EXTENSOES[exportacao.formato]}',
+        content_type=TIPOS_CONTEUDO[exportacao.formato],
+    )
 
 
 # ===========================
@@ -1248,10 +1401,11 @@ def save_chat_transaction(user, transaction_data, original_message, status='paga
     tipo_transacao = transaction_data.get('type', 'despesa')
     tipo_categoria = 'despesa' if tipo_transacao == 'despesa' else 'receita'
     
-    categoria, _ = Categoria.objects.get_or_create(
-        casa=user.casa,
-        nome=category_name,
-        defaults={'tipo': tipo_categoria, 'cor': '#6c757d', 'icone': '💰', 'ativa': True}
+    categoria, _ = obter_ou_criar_categoria(
+        user.casa,
+        category_name,
+        tipo_categoria,
+        defaults={'cor': '#6c757d', 'icone': '💰', 'ativa': True}
     )
     
     # Processar data - usar a data fornecida pela IA ou a data atual se não informada
@@ -1274,38 +1428,29 @@ def save_chat_transaction(user, transaction_data, original_message, status='paga
         data_transacao = timezone.now().astimezone(tz_br).date()
         logger.info(f"Nenhuma data fornecida, usando data atual (timezone BR): {data_transacao}")
     
-    # Se estamos criando uma transação definitiva, tentar unir com
-    # uma transação pendente similar (mesmo valor/data) para evitar duplicação.
+    valor = Decimal(str(transaction_data.get('amount', 0)))
+    titulo = transaction_data.get('title', original_message[:100])
+
+    # Se estamos criando uma transação definitiva, unir com uma transação
+    # pendente recente de mesmo valor/data para evitar duplicação
     if status == 'paga':
-        try:
-            from datetime import timedelta
-            from django.utils import timezone as dj_timezone
-
-            cutoff = dj_timezone.now() - timedelta(days=2)
-            amount_val = Decimal(str(transaction_data.get('amount', 0)))
-
-            similar = Transacao.objects.filter(
-                casa=user.casa,
-                valor=amount_val,
-                data=data_transacao,
-                status='pendente',
-                criada_em__gte=cutoff
-            ).order_by('-criada_em')
-
-            if similar.exists():
-                transacao = similar.first()
-                transacao.conta = conta
-                transacao.categoria = categoria
-                transacao.tipo = tipo_transacao
-                transacao.titulo = transaction_data.get('title', original_message[:100])
-                transacao.observacao = transaction_data.get('notes', f'Atualizado via chat: {original_message}')
-                transacao.pago_por = user
-                transacao.status = 'paga'
-                transacao.save()
-                logger.info(f"Transação pendente atualizada para paga: ID {transacao.id}")
-                return transacao
-        except Exception as e:
-            logger.warning(f"Erro ao tentar unir com transação pendente: {e}")
+        pendente = pendente_recente(user.casa, data_transacao, valor)
+        if pendente:
+            pendente.conta = conta
+            pendente.categoria = categoria
+            pendente.tipo = tipo_transacao
+            pendente.titulo = titulo
+            pendente.observacao = transaction_data.get('notes', f'Atualizado via chat: {original_message}')
+            pendente.pago_por = user
+            pendente.status = 'paga'
+            pendente.save()
+            pendente.possivel_duplicata = None
+            logger.info(f"Transação pendente atualizada para paga: ID {pendente.id}")
+            return pendente
+
+    # Mesma data, valor e título gravados há pouco: possível duplicata, que é
+    # apenas apontada (duas compras iguais no mesmo dia são legítimas)
+    similar = duplicata_recente(user.casa, data_transacao, valor, titulo)
 
     # Criar a transação normalmente
     transacao = Transacao.objects.create(
@@ -1313,13 +1458,16 @@ def save_chat_transaction(user, transaction_data, original_message, status='paga
         conta=conta,
         categoria=categoria,
         tipo=tipo_transacao,
-        valor=Decimal(str(transaction_data.get('amount', 0))),
-        titulo=transaction_data.get('title', original_message[:100]),
+        valor=valor,
+        titulo=titulo,
         data=data_transacao,
         observacao=transaction_data.get('notes', f'Criado via chat: {original_message}'),
         pago_por=user,
         status=status
     )
+    transacao.possivel_duplicata = similar
+    if similar:
+        logger.info(f"Transação {transacao.id} é possível duplicata da ID {similar.id}")
 
     return transacao
 
@@ -1350,10 +1498,11 @@ def update_chat_transaction(transaction_id, user, transaction_data, original_mes
     if 'category' in transaction_data and transaction_data['category']:
         category_name = transaction_data['category']
         tipo_categoria = transacao.tipo  # Usar o tipo atual da transação
-        categoria, _ = Categoria.objects.get_or_create(
-            casa=user.casa,
-            nome=category_name,
-            defaults={'tipo': tipo_categoria, 'cor': '#6c757d', 'icone': '💰', 'ativa': True}
+        categoria, _ = obter_ou_criar_categoria(
+            user.casa,
+            category_name,
+            tipo_categoria,
+            defaults={'cor': '#6c757d', 'icone': '💰', 'ativa': True}
         )
         transacao.categoria = categoria
     
@@ -1407,14 +1556,6 @@ def search_transactions(user, criteria):
     # Começar com todas as transações do usuário
     queryset = Transacao.objects.filter(casa=user.casa)
     
-    # Filtrar por categoria
-    if criteria.get('category'):
-        queryset = queryset.filter(categoria__nome__icontains=criteria['category'])
-    
-    # Filtrar por conta
-    if criteria.get('account'):
-        queryset = queryset.filter(conta__nome__icontains=criteria['account'])
-    
     # Filtrar por data
     if criteria.get('date'):
         try:
@@ -1429,12 +1570,15 @@ def search_transactions(user, criteria):
     if criteria.get('max_amount'):
         queryset = queryset.filter(valor__lte=criteria['max_amount'])
     
-    # Filtrar por título/descrição
-    if criteria.get('title_contains'):
-        queryset = queryset.filter(titulo__icontains=criteria['title_contains'])
+    # Categoria, conta e título: busca textual ordenada por relevância e data
+    texto = ' '.join(filter(None, (
+        criteria.get('category'), criteria.get('account'), criteria.get('title_contains')
+    )))
+    if texto:
+        return buscar_transacoes(user.casa, texto, timezone.localdate(), limite=10, queryset=queryset)
     
-    # Ordenar por data (mais recentes primeiro)
-    queryset = queryset.order_by('-data', '-id')
+    # Ordenar por data (mais recentes primeiro), na ordem do índice transacao_casa_ordem_idx
+    queryset = queryset.order_by('-data', '-criada_em', '-id')
     
     # Limitar a 10 resultados
     return queryset[:10]